@@ -2,9 +2,64 @@
 #define KALMAN_H
 #include <stdbool.h>
 #include <stddef.h>
+#include <stdint.h>
 
 #include "matrix_types.h"
 
+/**
+ * @brief Linkage of the public functions of the library.
+ *
+ * Empty by default. An amalgamated build defines it as static inline before including this header, so the
+ * library is compiled into the translation unit of a single filter.
+ */
+#ifndef KF_API
+#define KF_API
+#endif
+
+/**
+ * @brief Number of elements of a packed lower-triangular n * n symmetric matrix.
+ */
+#define KF_PACKED_SIZE(n) (((n) * ((n) + 1U)) / 2U)
+
+/**
+ * @brief Maximum number of measurements of a filter with steady_state_threshold set, one bit of a validity pattern each.
+ */
+#define KF_STEADY_STATE_MAX_MEASUREMENTS (32U)
+
+/**
+ * @brief Compile-time assertion, used by statically initialized filters to check their configuration.
+ *
+ * _Static_assert is only available from C11, earlier standards declare an array type of negative size instead.
+ */
+#if defined(__STDC_VERSION__) && (__STDC_VERSION__ >= 201112L)
+#define KF_STATIC_ASSERT(condition, message) _Static_assert(condition, message)
+#else
+#define KF_STATIC_ASSERT_NAME(line) KF_STATIC_ASSERT_NAME_EXPANDED(line)
+#define KF_STATIC_ASSERT_NAME_EXPANDED(line) kf_static_assert_##line
+#define KF_STATIC_ASSERT(condition, message) typedef char KF_STATIC_ASSERT_NAME(__LINE__)[(condition) ? 1 : -1]
+#endif
+
+/**
+ * @brief Width in bytes of the vectors of the KF_BACKEND_VECTOR kernels.
+ *
+ * Compiling the library with KF_BACKEND_VECTOR defined replaces the matrix multiplications, additions and
+ * subtractions of kf_predict and kf_update with kernels written with the GCC/Clang vector extensions. 32 bytes
+ * matches AVX on x86-64, define it as 16 for SSE or ARM64 NEON. Other compilers use the portable kernels.
+ */
+#ifndef KF_VECTOR_BYTES
+#define KF_VECTOR_BYTES (32U)
+#endif
+
+/**
+ * @brief Alignment of the storage generated for the vector backend, so its rows start on a vector boundary
+ * whenever the number of columns is a multiple of the vector width. The kernels do not rely on it.
+ */
+#if defined(__GNUC__) || defined(__clang__)
+#define KF_VECTOR_ALIGNED __attribute__((aligned(KF_VECTOR_BYTES)))
+#else
+#define KF_VECTOR_ALIGNED
+#endif
+
 /**
  * @brief Error codes for the Kalman filter functions.
  */
@@ -15,9 +70,80 @@ typedef enum {
     KF_ERROR_STORAGE_TOO_SMALL,          /**< Insufficient storage allocated */
     KF_ERROR_NOT_INITIALIZED,            /**< Kalman filter not initialized */
     KF_ERROR_CONTROL_MATRIX_NOT_ENABLED, /**< Control matrix not enabled */
+    KF_ERROR_MEASUREMENT_REJECTED,       /**< Measurement rejected by the innovation gate, the filter is unchanged */
+    KF_ERROR_NOT_POSITIVE_DEFINITE,      /**< Innovation covariance is not positive definite, the filter is unchanged */
     KF_ERROR_COUNT                       /**< Total number of error types */
 } kf_error_E;
 
+/**
+ * @brief Method used to invert the innovation covariance S during the update step.
+ */
+typedef enum {
+    KF_S_INVERSION_CHOLESKY = 0,    /**< Generic Cholesky decomposition and inversion, any number of measurements */
+    KF_S_INVERSION_SCALAR,          /**< Reciprocal, requires a single measurement */
+    KF_S_INVERSION_CLOSED_FORM_2X2, /**< Unrolled L * D * L' factorization and inverse, requires 2 measurements */
+    KF_S_INVERSION_CLOSED_FORM_3X3, /**< Unrolled L * D * L' factorization and inverse, requires 3 measurements */
+} kf_s_inversion_E;
+
+/**
+ * @brief Evaluation order of the covariance update P = P - K * H * P of a dense H and covariance.
+ */
+typedef enum {
+    KF_COVARIANCE_UPDATE_K_H_P = 0, /**< (K * H) * P, n^2 * m + n^3 multiply-adds and two n * n temporaries */
+    KF_COVARIANCE_UPDATE_K_P_HT,    /**< K * (P * H')', reusing P * H' from the gain, n * (n + 1) / 2 * m multiply-adds */
+} kf_covariance_update_E;
+
+/**
+ * @brief Stages of the predict and update steps that are timed when KF_ENABLE_PROFILING is defined.
+ */
+typedef enum {
+    KF_PROFILE_STAGE_PREDICT_STATE = 0,  /**< x = F*x + B*u */
+    KF_PROFILE_STAGE_PREDICT_COVARIANCE, /**< P = F*P*F' + Q */
+    KF_PROFILE_STAGE_UPDATE_INNOVATION,  /**< y = z - H*x and S = H*P*H' + R */
+    KF_PROFILE_STAGE_UPDATE_INVERSION,   /**< Cholesky decomposition and inversion of S */
+    KF_PROFILE_STAGE_UPDATE_GAIN,        /**< K = P*H'*S^-1 */
+    KF_PROFILE_STAGE_UPDATE_STATE,       /**< x = x + K*y */
+    KF_PROFILE_STAGE_UPDATE_COVARIANCE,  /**< P = P - K*H*P */
+    KF_PROFILE_STAGE_COUNT               /**< Total number of profiled stages */
+} kf_profile_stage_E;
+
+/**
+ * @brief Timestamp type returned by the user-supplied kf_profile_timestamp() function, typically a cycle counter.
+ */
+typedef uint32_t kf_profile_cycles_t;
+
+/**
+ * @brief Accumulated timing statistics for a single profiled stage.
+ */
+typedef struct {
+    kf_profile_cycles_t min; /**< Shortest observed duration of the stage */
+    kf_profile_cycles_t max; /**< Longest observed duration of the stage */
+    uint64_t total;          /**< Sum of all observed durations, used to compute the mean */
+    uint32_t count;          /**< Number of times the stage was observed */
+} kf_profile_stage_stats_S;
+
+/**
+ * @brief Per-filter timing statistics for every profiled stage.
+ */
+typedef struct {
+    kf_profile_stage_stats_S stages[KF_PROFILE_STAGE_COUNT]; /**< Statistics indexed by kf_profile_stage_E */
+} kf_profile_S;
+
+/**
+ * @brief Nonlinear state transition model of an extended Kalman filter.
+ *
+ * Evaluates the predicted state X_next = f(X, u) and the Jacobian F = df/dX at X.
+ * u is NULL if the model has no control inputs.
+ */
+typedef void (*kf_predict_model_t)(const matrix_t* const X, const matrix_t* const u, matrix_t* const X_next, matrix_t* const F);
+
+/**
+ * @brief Nonlinear measurement model of an extended Kalman filter.
+ *
+ * Evaluates the expected measurement Z_hat = h(X) and the Jacobian H = dh/dX at X.
+ */
+typedef void (*kf_measurement_model_t)(const matrix_t* const X, matrix_t* const Z_hat, matrix_t* const H);
+
 /**
  * @brief Structure for storing matrix data.
  */
@@ -26,6 +152,20 @@ typedef struct {
     matrix_data_t* data; /**< Pointer to the matrix data */
 } kf_matrix_storage_S;
 
+/**
+ * @brief Constant matrix in compressed sparse row (CSR) format.
+ *
+ * The nonzeros of row i are values[row_offsets[i]] to values[row_offsets[i + 1] - 1], in the columns given by the
+ * same entries of col_indices. Products with a sparse matrix cost one multiply-add per nonzero instead of per element.
+ */
+typedef struct {
+    size_t rows;                 /**< Number of rows */
+    size_t cols;                 /**< Number of columns */
+    const size_t* row_offsets;   /**< Offset of the first nonzero of each row, rows + 1 entries starting at 0 */
+    const size_t* col_indices;   /**< Column of each nonzero, row_offsets[rows] entries */
+    const matrix_data_t* values; /**< Value of each nonzero, row_offsets[rows] entries */
+} kf_sparse_matrix_S;
+
 /**
  * @brief Kalman filter configuration structure.
  *
@@ -34,25 +174,27 @@ typedef struct {
  */
 typedef struct {
     const matrix_t* X_init; /**< Initial state estimate matrix */
-    const matrix_t* F;      /**< State transition matrix */
+    const matrix_t* F;      /**< State transition matrix, optional if predict_model is set */
     const matrix_t* B;      /**< Control input matrix (optional) */
 
     const matrix_t* Q;      /**< Process noise covariance matrix */
     const matrix_t* P_init; /**< Initial state covariance matrix */
 
-    const matrix_t* H; /**< State to measurement transformation matrix */
+    const matrix_t* H; /**< State to measurement transformation matrix, optional if measurement_model is set */
     const matrix_t* R; /**< Measurement noise covariance matrix */
 
     kf_matrix_storage_S X_matrix_storage; /**< Storage for the state estimate matrix, size: num_states * 1 */
-    kf_matrix_storage_S P_matrix_storage; /**< Storage for the covariance matrix, size: num_states * num_states */
+    kf_matrix_storage_S P_matrix_storage; /**< Storage for the covariance matrix, size: num_states * num_states, or
+                                           * KF_PACKED_SIZE(num_states) if packed_covariance is set, or the sum of the
+                                           * squared covariance_blocks if they are set */
 
     kf_matrix_storage_S temp_X_hat_matrix_storage; /**< Temporary storage for the state estimate, size: num_states * 1 */
     kf_matrix_storage_S temp_Bu_matrix_storage;    /**< Temporary storage for control matrix, size: num_states * 1 */
 
     kf_matrix_storage_S temp_Z_matrix_storage; /**< Temporary storage for measurement vector, size: num_measurements * 1 */
 
-    kf_matrix_storage_S
-        H_temp_storage; /**< Temporary storage for the transformation matrix, size: num_measurements * num_states */
+    kf_matrix_storage_S H_temp_storage; /**< Temporary storage for the transformation matrix, size: num_measurements * num_states,
+                                         * unused if H_selection or H_sparse is set */
     kf_matrix_storage_S R_temp_storage; /**< Temporary storage for the measurement noise covariance matrix, size: num_measurements
                                          * num_measurements */
 
@@ -64,8 +206,60 @@ typedef struct {
 
     kf_matrix_storage_S K_matrix_storage; /**< Storage for Kalman gain matrix, size: num_states * num_measurements */
 
-    kf_matrix_storage_S K_H_storage;   /**< Storage for K * H, size: num_states * num_states */
-    kf_matrix_storage_S K_H_P_storage; /**< Storage for K * H * P, size: num_states * num_states */
+    kf_matrix_storage_S K_H_storage;   /**< Storage for K * H and the Jacobian of predict_model, size: num_states * num_states,
+                                        * unused if packed_covariance, covariance_blocks, H_selection, H_sparse or
+                                        * KF_COVARIANCE_UPDATE_K_P_HT is set without a predict_model */
+    kf_matrix_storage_S K_H_P_storage; /**< Storage for K * H * P, size: num_states * num_states, or the size of P if
+                                        * packed_covariance or covariance_blocks is set, unused if H_selection, H_sparse or
+                                        * KF_COVARIANCE_UPDATE_K_P_HT is set without either of them */
+    kf_matrix_storage_S tile_storage;  /**< Panel of P gathered by the tiled products of the covariance, size: num_states *
+                                        * tile_size, unused if tile_size is 0 */
+
+    matrix_data_t innovation_gate;     /**< Normalized innovation squared above which a measurement is rejected before the
+                                        * gain and covariance update, 0 disables gating */
+    matrix_data_t innovation_deadband; /**< Normalized innovation squared below which the covariance update is skipped,
+                                        * 0 disables the deadband */
+
+    kf_s_inversion_E S_inversion; /**< Method used to invert S, must match the number of measurements */
+
+    bool packed_covariance; /**< Store only the lower triangle of the symmetric covariance, row by row */
+
+    const size_t* covariance_blocks; /**< Number of states of each diagonal block of an approximate block-diagonal covariance,
+                                      * in state order, NULL for the full covariance. The covariances between the blocks are
+                                      * dropped after every predict and update, and the blocks are stored one after the other */
+    size_t num_covariance_blocks;    /**< Number of entries of covariance_blocks */
+
+    kf_covariance_update_E covariance_update; /**< Evaluation order of the covariance update, the packed and block
+                                               * covariances and H_selection always reuse P * H' */
+
+    size_t tile_size; /**< Edge of the cache tiles of the dense num_states * num_states products, F * P * F' and K * H * P,
+                       * 0 for the untiled kernels. Ignored if packed_covariance is set */
+
+    kf_predict_model_t predict_model; /**< Nonlinear state transition of an extended Kalman filter, NULL to use F and B */
+    size_t num_model_controls;        /**< Number of control inputs of predict_model, B must be NULL if predict_model is set */
+    kf_measurement_model_t measurement_model; /**< Nonlinear measurement model of an extended Kalman filter, NULL to use H */
+
+    const size_t* H_selection; /**< State measured by each row of H if H is a selection matrix (every row a unit vector), NULL
+                                * for a dense H. The update then gathers entries of X and rows of P instead of multiplying by H */
+
+    matrix_data_t steady_state_threshold; /**< Relative change of trace(P) per update below which the covariance is considered
+                                           * converged, 0 disables steady-state detection */
+    uint32_t steady_state_updates;        /**< Number of consecutive converged updates, with the same measurement validity, after
+                                           * which the gain is latched and the covariance is frozen */
+
+    const kf_sparse_matrix_S* F_sparse; /**< Sparse state transition matrix, replaces F which must then be NULL */
+    const kf_sparse_matrix_S* B_sparse; /**< Sparse control input matrix, replaces B which must then be NULL */
+    const kf_sparse_matrix_S*
+        H_sparse;                       /**< Sparse state to measurement transformation matrix, replaces H which must then be
+                                         * NULL. Like H_selection, H_temp is unused and P * H' is reused by the covariance update */
+    const kf_sparse_matrix_S* Q_sparse; /**< Sparse process noise covariance matrix, replaces Q which must then be NULL */
+
+    size_t covariance_decimation; /**< Number of kf_predict calls per propagation of the covariance, 0 or 1 propagates it every
+                                   * call. X is still propagated every call. An update between two propagations uses the
+                                   * covariance of the last one */
+    const matrix_t* F_decimated;  /**< F^covariance_decimation, required if covariance_decimation is above 1 */
+    const matrix_t* Q_decimated;  /**< Process noise accumulated over covariance_decimation steps, the sum of F^i * Q * F^i'
+                                   * for i below covariance_decimation, required if covariance_decimation is above 1 */
 } kf_config_S;
 
 /**
@@ -80,7 +274,9 @@ typedef struct {
     bool initialized; /**< Flag indicating whether the filter has been initialized */
 
     matrix_t X; /**< Current state estimate matrix */
-    matrix_t P; /**< Current covariance matrix */
+    matrix_t P; /**< Current covariance matrix, a KF_PACKED_SIZE(num_states) * 1 vector if packed_covariance is set, or a
+                 * vector of the diagonal blocks if covariance_blocks is set. Use kf_get_covariance() to read it independently
+                 * of the layout */
 
     matrix_t H_temp; /**< Temporary matrix for H during prediction step, used for asynchronous updates */
     matrix_t R_temp; /**< Temporary matrix for R during prediction step */
@@ -92,11 +288,28 @@ typedef struct {
     matrix_t K_temp;     /**< Temporary matrix for the Kalman gain */
 
     matrix_t K_H_temp;   /**< Temporary matrix for K * H */
+    matrix_t F_jacobian; /**< Jacobian of predict_model, shares its storage with K * H */
     matrix_t K_H_P_temp; /**< Temporary matrix for K * H * P */
+    matrix_t tile_temp;  /**< Scratch panel of the tiled products */
 
     size_t num_states;       /**< Number of states in the system */
     size_t num_measurements; /**< Number of measurements in the system */
     size_t num_controls;     /**< Number of control inputs in the system */
+
+    matrix_data_t innovation_nis; /**< Normalized innovation squared (y' * S^-1 * y) of the last update */
+
+    bool steady_state;                       /**< The gain is latched and the covariance is frozen at its posterior */
+    uint32_t steady_state_streak;            /**< Consecutive converged updates with the same measurement validity */
+    uint32_t validity_pattern;               /**< Measurement validity of the last full update, one bit per measurement */
+    matrix_data_t previous_covariance_trace; /**< trace(P) after the last full update */
+    size_t latched_predictions;              /**< Predicts since the last update while the gain is latched, the covariance
+                                              * is propagated over them when the gain is unlatched */
+
+    size_t skipped_covariance_predictions; /**< Predicts since the covariance was last propagated, with covariance_decimation */
+
+#ifdef KF_ENABLE_PROFILING
+    kf_profile_S profile; /**< Stage timing statistics, only present when KF_ENABLE_PROFILING is defined */
+#endif
 } kf_data_S;
 
 /**
@@ -110,13 +323,14 @@ typedef struct {
  *
  * @return kf_error_E Error code indicating the success of the initialization
  */
-kf_error_E kf_init(kf_data_S* const kf_data, const kf_config_S* const config);
+KF_API kf_error_E kf_init(kf_data_S* const kf_data, const kf_config_S* const config);
 
 /**
  * @brief Predict the next state of the Kalman filter.
  *
  * This function performs the prediction step of the Kalman filter using the state transition
- * matrix and the optional control input matrix.
+ * matrix and the optional control input matrix, or the predict_model and its Jacobian for an extended Kalman filter.
+ * With F_sparse set, the covariance prediction costs 2 * nnz(F) * num_states multiply-adds instead of 2 * num_states^3.
  *
  * @param kf_data The Kalman filter data
  * @param u The control input (can be NULL if no control input is provided)
@@ -131,12 +345,21 @@ kf_error_E kf_init(kf_data_S* const kf_data, const kf_config_S* const config);
  * @warning This function is not thread-safe. The user must ensure that the predict function and the update function are not
  * called together
  */
-kf_error_E kf_predict(kf_data_S* const kf_data, const matrix_t* const u);
+KF_API kf_error_E kf_predict(kf_data_S* const kf_data, const matrix_t* const u);
 
 /**
  * @brief Update the Kalman filter with a new measurement.
  *
- * This function performs the update step of the Kalman filter using the provided measurement vector.
+ * This function performs the update step of the Kalman filter using the provided measurement vector. For an
+ * extended Kalman filter, the expected measurement and its Jacobian are evaluated by the measurement_model. If
+ * H_selection is set, H * x, P * H' and H * P * H' are gathered from X and P without any matrix product. If H_sparse is
+ * set, they only visit the nonzeros of H.
+ *
+ * If steady_state_threshold is set, the gain is latched once trace(P) has changed by less than the threshold (relative)
+ * for steady_state_updates consecutive updates with the same measurement validity. A latched update only computes the
+ * innovation and x = x + K * y, reusing K and S^-1, and kf_predict no longer propagates the covariance. Full updates
+ * resume as soon as the measurement validity differs from the one the gain was latched with, after the frozen
+ * covariance has been propagated over the predicts since the last update.
  *
  * @param kf_data The Kalman filter data
  * @param z The measurement vector
@@ -145,11 +368,80 @@ kf_error_E kf_predict(kf_data_S* const kf_data, const matrix_t* const u);
  * @param num_measurements The number of measurements in the measurement vector. This is ignored if
  * measurement_validity is NULL.
  *
- * @return kf_error_E Error code indicating the success of the update
+ * @return kf_error_E Error code indicating the success of the update. KF_ERROR_MEASUREMENT_REJECTED is returned,
+ * and the state and covariance are left unchanged, if the normalized innovation squared exceeds the configured
+ * innovation_gate.
+ *
+ * @note If an innovation_deadband is configured and the normalized innovation squared is below it, the state is
+ * corrected but the covariance update is skipped.
  * @warning This function is not thread-safe. The user must ensure that the predict function and the update function are not
  * called together
  */
-kf_error_E kf_update(kf_data_S* const kf_data, const matrix_t* const z, const bool* const measurement_validity,
-                     const size_t num_measurements);
+KF_API kf_error_E kf_update(kf_data_S* const kf_data, const matrix_t* const z, const bool* const measurement_validity,
+                            const size_t num_measurements);
+
+/**
+ * @brief Read an element of the covariance matrix.
+ *
+ * This function hides the storage layout of the covariance, which is packed if packed_covariance is set. With
+ * covariance_blocks, the elements outside the diagonal blocks are 0.
+ *
+ * @param kf_data The Kalman filter data
+ * @param row The row of the element
+ * @param col The column of the element
+ * @param value Output for the value of the element
+ *
+ * @return kf_error_E Error code indicating the success of the read
+ */
+KF_API kf_error_E kf_get_covariance(const kf_data_S* const kf_data, const size_t row, const size_t col,
+                                    matrix_data_t* const value);
+
+/**
+ * @brief Read the log-likelihood of the innovation of the last update.
+ *
+ * The log-likelihood is -(NIS + ln det S) / 2, without the constant -num_measurements * ln(2 * pi) / 2 that is the same
+ * for every filter with the same measurements. It is the weight of the filter in an interacting multiple model bank.
+ * An invalid measurement adds ln R of its variance, the same for every filter of a bank with a diagonal R.
+ *
+ * @param kf_data The Kalman filter data
+ * @param log_likelihood Output for the log-likelihood
+ *
+ * @return kf_error_E Error code indicating the success of the read
+ *
+ * @warning S is only held by the scratch storage until the next update, so this function must be called right after
+ * a successful kf_update, before the scratch storage is used by another filter sharing it
+ */
+KF_API kf_error_E kf_innovation_log_likelihood(const kf_data_S* const kf_data, matrix_data_t* const log_likelihood);
+
+#ifdef KF_ENABLE_PROFILING
+/**
+ * @brief Read the current timestamp used to profile the predict and update stages.
+ *
+ * This function is not provided by the library. It must be implemented by the user when KF_ENABLE_PROFILING
+ * is defined, typically by returning a free-running cycle counter (e.g. DWT->CYCCNT on Cortex-M).
+ * Wrap-around of the counter between two consecutive calls is handled.
+ *
+ * @return kf_profile_cycles_t The current timestamp
+ */
+kf_profile_cycles_t kf_profile_timestamp(void);
+
+/**
+ * @brief Reset the stage timing statistics of the Kalman filter.
+ *
+ * @param kf_data The Kalman filter data
+ *
+ * @return kf_error_E Error code indicating the success of the reset
+ */
+KF_API kf_error_E kf_profile_reset(kf_data_S* const kf_data);
+
+/**
+ * @brief Compute the mean duration of a profiled stage.
+ *
+ * @param stats The statistics of the stage
+ *
+ * @return kf_profile_cycles_t The mean duration of the stage, or 0 if the stage was never observed
+ */
+KF_API kf_profile_cycles_t kf_profile_get_mean(const kf_profile_stage_stats_S* const stats);
+#endif
 
 #endif
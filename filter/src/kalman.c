@@ -1,16 +1,123 @@
 #include "kalman.h"
 
+#include <math.h>
 #include <string.h>
 
 #include "cholesky.h"
 #include "matrix.h"
 
+#ifdef KF_ENABLE_PROFILING
+#define KF_PROFILE_BEGIN(timestamp) kf_profile_cycles_t timestamp = kf_profile_timestamp()
+#define KF_PROFILE_STAGE(kf_data, stage, timestamp) kf_profile_record_stage(&(kf_data)->profile, (stage), &(timestamp))
+#else
+#define KF_PROFILE_BEGIN(timestamp)
+#define KF_PROFILE_STAGE(kf_data, stage, timestamp)
+#endif
+
+// An amalgamated build of a single filter knows its dimensions at compile time, so the loops over them can be unrolled
+#ifdef KF_AMALGAMATED_NUM_STATES
+#define KF_NUM_STATES(kf_data) ((void)(kf_data), KF_AMALGAMATED_NUM_STATES)
+#define KF_NUM_MEASUREMENTS(kf_data) ((void)(kf_data), KF_AMALGAMATED_NUM_MEASUREMENTS)
+#else
+#define KF_NUM_STATES(kf_data) ((kf_data)->num_states)
+#define KF_NUM_MEASUREMENTS(kf_data) ((kf_data)->num_measurements)
+#endif
+
+// Every filter of a statically initialized build is initialized at compile time, so the initialized flag is not checked
+#ifdef KF_STATIC_INITIALIZATION
+#define KF_IS_INITIALIZED(kf_data) ((void)(kf_data), true)
+#else
+#define KF_IS_INITIALIZED(kf_data) ((kf_data)->initialized)
+#endif
+
+// The vector backend needs the GCC/Clang vector extensions, other compilers fall back to the portable kernels
+#if defined(KF_BACKEND_VECTOR) && (defined(__GNUC__) || defined(__clang__))
+#define KF_VECTOR_KERNELS
+#define KF_VECTOR_LANES (KF_VECTOR_BYTES / sizeof(matrix_data_t))
+// loads and stores through a vector only assume the alignment of matrix_data_t, so any storage works
+typedef matrix_data_t kf_vector_t __attribute__((vector_size(KF_VECTOR_BYTES), aligned(sizeof(matrix_data_t)), may_alias));
+#endif
+
 static bool is_matrix_square_and_matches_states(const matrix_t* matrix, size_t num_states);
 static kf_error_E validate_matrix_storage(const kf_matrix_storage_S* storage, size_t required_size);
+static kf_error_E validate_sparse_matrix(const kf_sparse_matrix_S* matrix, size_t rows, size_t cols);
 
 static kf_error_E kf_setup_matrix_from_storage(matrix_t* matrix, const kf_matrix_storage_S* storage, size_t rows, size_t cols);
 static kf_error_E kf_validate_configuration(kf_data_S* kf_data);
 static kf_error_E kf_setup_temporary_matrixes(kf_data_S* kf_data);
+static matrix_data_t kf_compute_nis(const kf_data_S* kf_data);
+static kf_error_E kf_invert_innovation_covariance(kf_data_S* kf_data);
+static matrix_data_t kf_innovation_log_determinant(const kf_data_S* kf_data);
+static kf_error_E kf_invert_symmetric_2x2(matrix_data_t* S, matrix_data_t* S_inv);
+static kf_error_E kf_invert_symmetric_3x3(matrix_data_t* S, matrix_data_t* S_inv);
+static size_t kf_packed_index(size_t row, size_t col);
+static kf_error_E kf_setup_covariance(kf_data_S* kf_data);
+static void kf_predict_packed_covariance(kf_data_S* kf_data, const matrix_t* F_matrix, const matrix_t* Q_matrix);
+static void kf_packed_mult_transb(const matrix_t* P, const matrix_t* H, matrix_t* P_Ht);
+static void kf_update_packed_covariance(kf_data_S* kf_data);
+static size_t kf_block_covariance_size(const kf_config_S* config);
+static bool kf_block_index(const kf_config_S* config, size_t row, size_t col, size_t* index);
+static bool kf_is_zero_block(const matrix_t* F, size_t first_row, size_t rows, size_t first_col, size_t cols);
+static void kf_predict_block_covariance(kf_data_S* kf_data, const matrix_t* F_matrix, const matrix_t* Q_matrix);
+static void kf_block_mult_transb(kf_data_S* kf_data);
+static void kf_update_block_covariance(kf_data_S* kf_data);
+static void kf_gather_selected_innovation(kf_data_S* kf_data, const matrix_t* z, const bool* measurement_validity);
+static void kf_gather_selected_covariance(kf_data_S* kf_data, const bool* measurement_validity);
+static void kf_update_covariance_from_P_Ht(kf_data_S* kf_data);
+static void kf_sparse_mult_vector(const kf_sparse_matrix_S* A, const matrix_data_t* x, matrix_data_t* result);
+static void kf_sparse_predict_covariance(kf_data_S* kf_data);
+static void kf_sparse_add_inplace(matrix_t* A, const kf_sparse_matrix_S* B);
+static void kf_compute_sparse_innovation(kf_data_S* kf_data, const matrix_t* z, const bool* measurement_validity);
+static void kf_compute_sparse_innovation_covariance(kf_data_S* kf_data, const bool* measurement_validity);
+static void kf_compute_innovation(kf_data_S* kf_data, const matrix_t* z, const bool* measurement_validity);
+static void kf_compute_innovation_covariance(kf_data_S* kf_data);
+static uint32_t kf_validity_pattern(const kf_data_S* kf_data, const bool* measurement_validity);
+static matrix_data_t kf_covariance_trace(const kf_data_S* kf_data);
+static void kf_predict_covariance(kf_data_S* kf_data, const matrix_t* F, const matrix_t* Q);
+static void kf_unlatch_steady_state(kf_data_S* kf_data);
+static void kf_track_steady_state(kf_data_S* kf_data, uint32_t validity_pattern);
+static void kf_matrix_mult(const matrix_t* a, const matrix_t* b, const matrix_t* c, matrix_data_t* baux);
+static void kf_matrix_mult_transb(const matrix_t* a, const matrix_t* b, const matrix_t* c, matrix_data_t* row_buffer);
+static void kf_matrix_add_inplace(const matrix_t* a, const matrix_t* b);
+static void kf_matrix_sub(const matrix_t* a, const matrix_t* b, const matrix_t* c);
+static void kf_matrix_sub_inplace_b(const matrix_t* a, const matrix_t* b);
+static matrix_data_t kf_dot(const matrix_data_t* a, const matrix_data_t* b, size_t length);
+static void kf_dot4(const matrix_data_t* a, const matrix_data_t* b, size_t b_stride, size_t length, matrix_data_t* result);
+static size_t kf_tile_end(size_t start, size_t tile, size_t length);
+static void kf_tiled_mult(const matrix_t* a, const matrix_t* b, const matrix_t* c, size_t tile, matrix_data_t* panel);
+static void kf_tiled_predict_covariance(kf_data_S* kf_data, const matrix_t* F);
+
+#ifdef KF_VECTOR_KERNELS
+static matrix_data_t kf_vector_dot(const matrix_data_t* a, const matrix_data_t* b, size_t length);
+static void kf_vector_axpy(matrix_data_t scale, const matrix_data_t* x, matrix_data_t* y, size_t length);
+static void kf_vector_add(const matrix_data_t* a, const matrix_data_t* b, matrix_data_t* result, size_t length);
+static void kf_vector_sub(const matrix_data_t* a, const matrix_data_t* b, matrix_data_t* result, size_t length);
+#endif
+
+#ifdef KF_ENABLE_PROFILING
+static void kf_profile_record_stage(kf_profile_S* profile, kf_profile_stage_E stage, kf_profile_cycles_t* timestamp);
+
+static void kf_profile_record_stage(kf_profile_S* const profile, const kf_profile_stage_E stage,
+                                    kf_profile_cycles_t* const timestamp) {
+    const kf_profile_cycles_t now = kf_profile_timestamp();
+    // unsigned subtraction handles a wrap-around of the user's counter
+    const kf_profile_cycles_t elapsed = now - *timestamp;
+    kf_profile_stage_stats_S* const stats = &profile->stages[stage];
+
+    if ((stats->count == 0U) || (elapsed < stats->min)) {
+        stats->min = elapsed;
+    }
+
+    if (elapsed > stats->max) {
+        stats->max = elapsed;
+    }
+
+    stats->total += elapsed;
+    stats->count++;
+
+    *timestamp = now;
+}
+#endif
 
 static bool is_matrix_square_and_matches_states(const matrix_t* matrix, size_t num_states) {
     return (matrix->rows == matrix->cols) && (matrix->rows == num_states);
@@ -28,6 +135,29 @@ static kf_error_E validate_matrix_storage(const kf_matrix_storage_S* storage, si
     return ret;
 }
 
+static kf_error_E validate_sparse_matrix(const kf_sparse_matrix_S* matrix, size_t rows, size_t cols) {
+    kf_error_E ret = KF_ERROR_NONE;
+    if ((matrix->row_offsets == NULL) || (matrix->col_indices == NULL) || (matrix->values == NULL)) {
+        ret = KF_ERROR_INVALID_POINTER;
+    } else if ((matrix->rows != rows) || (matrix->cols != cols) || (matrix->row_offsets[0] != 0U)) {
+        ret = KF_ERROR_INVALID_DIMENSIONS;
+    } else {
+        // the rows must follow each other and every nonzero must be in a column of the matrix
+        for (size_t i = 0; (ret == KF_ERROR_NONE) && (i < rows); i++) {
+            if (matrix->row_offsets[i + 1U] < matrix->row_offsets[i]) {
+                ret = KF_ERROR_INVALID_DIMENSIONS;
+            }
+
+            for (size_t k = matrix->row_offsets[i]; (ret == KF_ERROR_NONE) && (k < matrix->row_offsets[i + 1U]); k++) {
+                if (matrix->col_indices[k] >= cols) {
+                    ret = KF_ERROR_INVALID_DIMENSIONS;
+                }
+            }
+        }
+    }
+    return ret;
+}
+
 static kf_error_E kf_setup_matrix_from_storage(matrix_t* matrix, const kf_matrix_storage_S* storage, size_t rows, size_t cols) {
     kf_error_E ret = validate_matrix_storage(storage, rows * cols);
     if (ret == KF_ERROR_NONE) {
@@ -46,8 +176,19 @@ static kf_error_E kf_validate_configuration(kf_data_S* const kf_data) {
     // Make sure all the pointers in the config are not NULL
     bool invalid_matrix_pointer = false;
     if (config != NULL) {
-        invalid_matrix_pointer = (config->X_init == NULL) || (config->F == NULL) || (config->P_init == NULL) ||
-                                 (config->Q == NULL) || (config->H == NULL) || (config->R == NULL);
+        // F and H are only optional if they are replaced by the models of an extended Kalman filter or by sparse matrices
+        const bool has_F = (config->F != NULL) || (config->F_sparse != NULL) || (config->predict_model != NULL);
+        const bool has_H = (config->H != NULL) || (config->H_sparse != NULL) || (config->measurement_model != NULL);
+        const bool has_Q = (config->Q != NULL) || (config->Q_sparse != NULL);
+        invalid_matrix_pointer = (config->X_init == NULL) || (has_F == false) || (config->P_init == NULL) || (has_Q == false) ||
+                                 (has_H == false) || (config->R == NULL);
+
+        // a sparse matrix replaces its dense counterpart and the model it would be the Jacobian of
+        invalid_matrix_pointer = invalid_matrix_pointer ||
+                                 ((config->F_sparse != NULL) && ((config->F != NULL) || (config->predict_model != NULL))) ||
+                                 ((config->B_sparse != NULL) && ((config->B != NULL) || (config->predict_model != NULL))) ||
+                                 ((config->H_sparse != NULL) && ((config->H != NULL) || (config->measurement_model != NULL))) ||
+                                 ((config->Q_sparse != NULL) && (config->Q != NULL));
     }
 
     if ((ret == KF_ERROR_NONE) && invalid_matrix_pointer) {
@@ -59,7 +200,7 @@ static kf_error_E kf_validate_configuration(kf_data_S* const kf_data) {
     }
 
     // F should be square
-    if (ret == KF_ERROR_NONE) {
+    if ((ret == KF_ERROR_NONE) && (config->F != NULL)) {
         const matrix_t* F = config->F;
         if (is_matrix_square_and_matches_states(F, kf_data->num_states) == false) {
             ret = KF_ERROR_INVALID_DIMENSIONS;
@@ -73,15 +214,23 @@ static kf_error_E kf_validate_configuration(kf_data_S* const kf_data) {
         }
     }
 
-    if (ret == KF_ERROR_NONE) {
+    if ((ret == KF_ERROR_NONE) && (config->F_sparse != NULL)) {
+        ret = validate_sparse_matrix(config->F_sparse, kf_data->num_states, kf_data->num_states);
+    }
+
+    if ((ret == KF_ERROR_NONE) && (config->Q != NULL)) {
         const matrix_t* Q = config->Q;
         if (is_matrix_square_and_matches_states(Q, kf_data->num_states) == false) {
             ret = KF_ERROR_INVALID_DIMENSIONS;
         }
     }
 
+    if ((ret == KF_ERROR_NONE) && (config->Q_sparse != NULL)) {
+        ret = validate_sparse_matrix(config->Q_sparse, kf_data->num_states, kf_data->num_states);
+    }
+
     // H should have the same number of columns as F
-    if (ret == KF_ERROR_NONE) {
+    if ((ret == KF_ERROR_NONE) && (config->H != NULL)) {
         const matrix_t* H = config->H;
         if (H->cols != kf_data->num_states) {
             ret = KF_ERROR_INVALID_DIMENSIONS;
@@ -90,6 +239,16 @@ static kf_error_E kf_validate_configuration(kf_data_S* const kf_data) {
         kf_data->num_measurements = H->rows;
     }
 
+    if ((ret == KF_ERROR_NONE) && (config->H_sparse != NULL)) {
+        kf_data->num_measurements = config->H_sparse->rows;
+        ret = validate_sparse_matrix(config->H_sparse, kf_data->num_measurements, kf_data->num_states);
+    }
+
+    // without H, the number of measurements of the measurement model is given by R
+    if ((ret == KF_ERROR_NONE) && (config->H == NULL) && (config->H_sparse == NULL)) {
+        kf_data->num_measurements = config->R->rows;
+    }
+
     // R should be square and should be measurement * measurement
     if (ret == KF_ERROR_NONE) {
         const matrix_t* R = config->R;
@@ -98,6 +257,32 @@ static kf_error_E kf_validate_configuration(kf_data_S* const kf_data) {
         }
     }
 
+    // closed-form inversions of S are only valid for their number of measurements
+    if (ret == KF_ERROR_NONE) {
+        bool inversion_matches_measurements = true;
+        switch (config->S_inversion) {
+            case KF_S_INVERSION_CHOLESKY:
+                inversion_matches_measurements = true;
+                break;
+            case KF_S_INVERSION_SCALAR:
+                inversion_matches_measurements = (kf_data->num_measurements == 1U);
+                break;
+            case KF_S_INVERSION_CLOSED_FORM_2X2:
+                inversion_matches_measurements = (kf_data->num_measurements == 2U);
+                break;
+            case KF_S_INVERSION_CLOSED_FORM_3X3:
+                inversion_matches_measurements = (kf_data->num_measurements == 3U);
+                break;
+            default:
+                inversion_matches_measurements = false;
+                break;
+        }
+
+        if (inversion_matches_measurements == false) {
+            ret = KF_ERROR_INVALID_DIMENSIONS;
+        }
+    }
+
     // if B is defined, then make sure it has the same number of rows as F
     if ((ret == KF_ERROR_NONE) && (config->B != NULL)) {
         const matrix_t* B = config->B;
@@ -108,6 +293,81 @@ static kf_error_E kf_validate_configuration(kf_data_S* const kf_data) {
         kf_data->num_controls = config->B->cols;
     }
 
+    if ((ret == KF_ERROR_NONE) && (config->B_sparse != NULL)) {
+        kf_data->num_controls = config->B_sparse->cols;
+        ret = validate_sparse_matrix(config->B_sparse, kf_data->num_states, kf_data->num_controls);
+    }
+
+    // a nonlinear state transition takes its control inputs directly, B would be ignored
+    if ((ret == KF_ERROR_NONE) && (config->predict_model != NULL)) {
+        if (config->B != NULL) {
+            ret = KF_ERROR_INVALID_POINTER;
+        }
+
+        kf_data->num_controls = config->num_model_controls;
+    }
+
+    // the covariance update order decides which temporaries are set up, like the inversion of S it must be known
+    if ((ret == KF_ERROR_NONE) && (config->covariance_update != KF_COVARIANCE_UPDATE_K_H_P) &&
+        (config->covariance_update != KF_COVARIANCE_UPDATE_K_P_HT)) {
+        ret = KF_ERROR_INVALID_DIMENSIONS;
+    }
+
+    // the validity pattern of every measurement must fit in a bit of the steady-state detection
+    if ((ret == KF_ERROR_NONE) && (config->steady_state_threshold > 0) &&
+        (kf_data->num_measurements > KF_STEADY_STATE_MAX_MEASUREMENTS)) {
+        ret = KF_ERROR_INVALID_DIMENSIONS;
+    }
+
+    // a selection of states describes a constant H, every selected state must exist
+    if ((ret == KF_ERROR_NONE) && (config->H_selection != NULL)) {
+        if ((config->H == NULL) || (config->measurement_model != NULL)) {
+            ret = KF_ERROR_INVALID_POINTER;
+        }
+
+        for (size_t i = 0; (ret == KF_ERROR_NONE) && (i < kf_data->num_measurements); i++) {
+            if (config->H_selection[i] >= kf_data->num_states) {
+                ret = KF_ERROR_INVALID_DIMENSIONS;
+            }
+        }
+    }
+
+    // the approximate block-diagonal covariance has kernels of its own, for dense matrices. Its blocks cover every state
+    if ((ret == KF_ERROR_NONE) && (config->covariance_blocks != NULL)) {
+        if (config->packed_covariance || (config->H_selection != NULL) || (config->F_sparse != NULL) ||
+            (config->H_sparse != NULL) || (config->Q_sparse != NULL)) {
+            ret = KF_ERROR_INVALID_POINTER;
+        }
+
+        size_t num_block_states = 0U;
+        for (size_t b = 0; (ret == KF_ERROR_NONE) && (b < config->num_covariance_blocks); b++) {
+            if (config->covariance_blocks[b] == 0U) {
+                ret = KF_ERROR_INVALID_DIMENSIONS;
+            }
+            num_block_states += config->covariance_blocks[b];
+        }
+
+        if ((ret == KF_ERROR_NONE) && (num_block_states != kf_data->num_states)) {
+            ret = KF_ERROR_INVALID_DIMENSIONS;
+        }
+    }
+
+    // the decimated covariance propagation needs the constant F^k and the accumulated Q of k steps
+    if ((ret == KF_ERROR_NONE) && (config->covariance_decimation > 1U)) {
+        if ((config->F_decimated == NULL) || (config->Q_decimated == NULL) || (config->predict_model != NULL)) {
+            ret = KF_ERROR_INVALID_POINTER;
+        } else if ((is_matrix_square_and_matches_states(config->F_decimated, kf_data->num_states) == false) ||
+                   (is_matrix_square_and_matches_states(config->Q_decimated, kf_data->num_states) == false)) {
+            ret = KF_ERROR_INVALID_DIMENSIONS;
+        }
+    }
+
+    // an amalgamated build only runs the filter it was generated for
+    if ((ret == KF_ERROR_NONE) &&
+        ((kf_data->num_states != KF_NUM_STATES(kf_data)) || (kf_data->num_measurements != KF_NUM_MEASUREMENTS(kf_data)))) {
+        ret = KF_ERROR_INVALID_DIMENSIONS;
+    }
+
     return ret;
 }
 
@@ -126,12 +386,7 @@ static kf_error_E kf_setup_temporary_matrixes(kf_data_S* const kf_data) {
     }
 
     if (ret == KF_ERROR_NONE) {
-        ret = validate_matrix_storage(&config->P_matrix_storage, kf_data->num_states * kf_data->num_states);
-    }
-
-    if (ret == KF_ERROR_NONE) {
-        ret = kf_setup_matrix_from_storage(&kf_data->P, &config->P_matrix_storage, kf_data->num_states, kf_data->num_states);
-        matrix_copy(config->P_init, &kf_data->P);
+        ret = kf_setup_covariance(kf_data);
     }
 
     // init temporary matrices
@@ -139,7 +394,7 @@ static kf_error_E kf_setup_temporary_matrixes(kf_data_S* const kf_data) {
         ret = validate_matrix_storage(&config->temp_X_hat_matrix_storage, kf_data->num_states);
     }
 
-    if ((ret == KF_ERROR_NONE) && (kf_data->num_controls > 0)) {
+    if ((ret == KF_ERROR_NONE) && (kf_data->num_controls > 0) && (config->predict_model == NULL)) {
         ret = validate_matrix_storage(&config->temp_Bu_matrix_storage, kf_data->num_states);
     }
 
@@ -147,7 +402,9 @@ static kf_error_E kf_setup_temporary_matrixes(kf_data_S* const kf_data) {
         ret = validate_matrix_storage(&config->temp_Z_matrix_storage, kf_data->num_measurements);
     }
 
-    if (ret == KF_ERROR_NONE) {
+    const bool dense_H = (config->H_selection == NULL) && (config->H_sparse == NULL);
+
+    if ((ret == KF_ERROR_NONE) && dense_H) {
         ret = validate_matrix_storage(&config->H_temp_storage, kf_data->num_states * kf_data->num_measurements);
         kf_data->H_temp.data = config->H_temp_storage.data;
     }
@@ -180,19 +437,1049 @@ static kf_error_E kf_setup_temporary_matrixes(kf_data_S* const kf_data) {
                                            kf_data->num_measurements);
     }
 
-    if (ret == KF_ERROR_NONE) {
+    // only the (K * H) * P covariance update needs K * H, and the packed one uses K_H_P as packed scratch for the
+    // prediction. K * H is only formed at the end of the update, so its storage holds the Jacobian of the predict_model
+    const bool full_covariance = (config->packed_covariance == false) && (config->covariance_blocks == NULL);
+    const bool dense_covariance_update = full_covariance && dense_H && (config->covariance_update == KF_COVARIANCE_UPDATE_K_H_P);
+
+    if ((ret == KF_ERROR_NONE) && (dense_covariance_update || (config->predict_model != NULL))) {
         ret = kf_setup_matrix_from_storage(&kf_data->K_H_temp, &config->K_H_storage, kf_data->num_states, kf_data->num_states);
+        kf_data->F_jacobian = kf_data->K_H_temp;
     }
 
-    if (ret == KF_ERROR_NONE) {
+    if ((ret == KF_ERROR_NONE) && dense_covariance_update) {
         ret =
             kf_setup_matrix_from_storage(&kf_data->K_H_P_temp, &config->K_H_P_storage, kf_data->num_states, kf_data->num_states);
     }
 
+    if ((ret == KF_ERROR_NONE) && config->packed_covariance) {
+        ret = kf_setup_matrix_from_storage(&kf_data->K_H_P_temp, &config->K_H_P_storage, KF_PACKED_SIZE(kf_data->num_states), 1);
+    }
+
+    // like the packed covariance, the diagonal blocks are predicted into a scratch of their own size
+    if ((ret == KF_ERROR_NONE) && (config->covariance_blocks != NULL)) {
+        ret = kf_setup_matrix_from_storage(&kf_data->K_H_P_temp, &config->K_H_P_storage, kf_block_covariance_size(config), 1);
+    }
+
+    // the tiled products of the dense covariance gather a panel of tile_size rows or columns of P
+    if ((ret == KF_ERROR_NONE) && full_covariance && (config->tile_size > 0U)) {
+        ret = kf_setup_matrix_from_storage(&kf_data->tile_temp, &config->tile_storage, kf_data->num_states, config->tile_size);
+    }
+
     return ret;
 }
 
-kf_error_E kf_init(kf_data_S* const kf_data, const kf_config_S* const config) {
+static size_t kf_packed_index(size_t row, size_t col) {
+    // only the lower triangle is stored, row by row, the upper triangle is its mirror
+    size_t index = 0;
+    if (row >= col) {
+        index = KF_PACKED_SIZE(row) + col;
+    } else {
+        index = KF_PACKED_SIZE(col) + row;
+    }
+    return index;
+}
+
+static kf_error_E kf_setup_covariance(kf_data_S* const kf_data) {
+    kf_error_E ret = KF_ERROR_NONE;
+
+    const kf_config_S* const config = kf_data->config;
+    const size_t num_states = kf_data->num_states;
+
+    if (config->packed_covariance) {
+        ret = kf_setup_matrix_from_storage(&kf_data->P, &config->P_matrix_storage, KF_PACKED_SIZE(num_states), 1);
+
+        if (ret == KF_ERROR_NONE) {
+            for (size_t i = 0; i < num_states; i++) {
+                for (size_t j = 0; j <= i; j++) {
+                    kf_data->P.data[kf_packed_index(i, j)] = config->P_init->data[i * num_states + j];
+                }
+            }
+        }
+    } else if (config->covariance_blocks != NULL) {
+        ret = kf_setup_matrix_from_storage(&kf_data->P, &config->P_matrix_storage, kf_block_covariance_size(config), 1);
+
+        for (size_t i = 0; (ret == KF_ERROR_NONE) && (i < num_states); i++) {
+            for (size_t j = 0; j < num_states; j++) {
+                size_t index = 0U;
+                if (kf_block_index(config, i, j, &index)) {
+                    kf_data->P.data[index] = config->P_init->data[i * num_states + j];
+                }
+            }
+        }
+    } else {
+        ret = kf_setup_matrix_from_storage(&kf_data->P, &config->P_matrix_storage, num_states, num_states);
+
+        if (ret == KF_ERROR_NONE) {
+            matrix_copy(config->P_init, &kf_data->P);
+        }
+    }
+
+    return ret;
+}
+
+static void kf_predict_packed_covariance(kf_data_S* const kf_data, const matrix_t* const F_matrix,
+                                         const matrix_t* const Q_matrix) {
+    // P(k|k-1) = F*P(k-1)*F' + Q, one row of F*P at a time. The lower triangle of the result is written to the packed
+    // scratch and copied back once P is no longer read. Without a dense F or Q, the sparse F only visits its nonzeros,
+    // and the sparse Q is added to the lower triangle at the end
+    const size_t num_states = KF_NUM_STATES(kf_data);
+    const kf_sparse_matrix_S* const F_sparse = (F_matrix == NULL) ? kf_data->config->F_sparse : NULL;
+    const kf_sparse_matrix_S* const Q_sparse = (Q_matrix == NULL) ? kf_data->config->Q_sparse : NULL;
+    const matrix_data_t* const F = (F_matrix != NULL) ? F_matrix->data : NULL;
+    const matrix_data_t* const Q = (Q_matrix != NULL) ? Q_matrix->data : NULL;
+    matrix_data_t* const P = kf_data->P.data;
+    matrix_data_t* const F_P_row = kf_data->config->temp_X_hat_matrix_storage.data;
+    matrix_data_t* const P_next = kf_data->K_H_P_temp.data;
+
+    for (size_t i = 0; i < num_states; i++) {
+        for (size_t j = 0; j < num_states; j++) {
+            matrix_data_t sum = 0;
+            if (F_sparse != NULL) {
+                for (size_t k = F_sparse->row_offsets[i]; k < F_sparse->row_offsets[i + 1U]; k++) {
+                    sum += F_sparse->values[k] * P[kf_packed_index(F_sparse->col_indices[k], j)];
+                }
+            } else {
+                for (size_t k = 0; k < num_states; k++) {
+                    sum += F[i * num_states + k] * P[kf_packed_index(k, j)];
+                }
+            }
+            F_P_row[j] = sum;
+        }
+
+        for (size_t j = 0; j <= i; j++) {
+            matrix_data_t sum = (Q != NULL) ? Q[i * num_states + j] : 0;
+            if (F_sparse != NULL) {
+                for (size_t k = F_sparse->row_offsets[j]; k < F_sparse->row_offsets[j + 1U]; k++) {
+                    sum += F_P_row[F_sparse->col_indices[k]] * F_sparse->values[k];
+                }
+            } else {
+                for (size_t k = 0; k < num_states; k++) {
+                    sum += F_P_row[k] * F[j * num_states + k];
+                }
+            }
+            P_next[kf_packed_index(i, j)] = sum;
+        }
+    }
+
+    if (Q_sparse != NULL) {
+        for (size_t i = 0; i < num_states; i++) {
+            for (size_t k = Q_sparse->row_offsets[i]; k < Q_sparse->row_offsets[i + 1U]; k++) {
+                if (Q_sparse->col_indices[k] <= i) {
+                    P_next[kf_packed_index(i, Q_sparse->col_indices[k])] += Q_sparse->values[k];
+                }
+            }
+        }
+    }
+
+    memcpy(P, P_next, KF_PACKED_SIZE(num_states) * sizeof(matrix_data_t));
+}
+
+static void kf_packed_mult_transb(const matrix_t* const P, const matrix_t* const H, matrix_t* const P_Ht) {
+    // P_Ht = P * H', with P packed
+    const size_t num_states = H->cols;
+    const size_t num_measurements = H->rows;
+
+    for (size_t i = 0; i < num_states; i++) {
+        for (size_t k = 0; k < num_measurements; k++) {
+            matrix_data_t sum = 0;
+            for (size_t j = 0; j < num_states; j++) {
+                sum += P->data[kf_packed_index(i, j)] * H->data[k * num_states + j];
+            }
+            P_Ht->data[i * num_measurements + k] = sum;
+        }
+    }
+}
+
+static void kf_update_packed_covariance(kf_data_S* const kf_data) {
+    // P = P - K * H * P = P - K * (P * H')', P * H' is already known from the gain so K * H is never formed
+    const size_t num_states = KF_NUM_STATES(kf_data);
+    const size_t num_measurements = KF_NUM_MEASUREMENTS(kf_data);
+    const matrix_data_t* const K = kf_data->K_temp.data;
+    const matrix_data_t* const P_Ht = kf_data->P_Ht_temp.data;
+
+    for (size_t i = 0; i < num_states; i++) {
+        for (size_t j = 0; j <= i; j++) {
+            matrix_data_t sum = 0;
+            for (size_t k = 0; k < num_measurements; k++) {
+                sum += K[i * num_measurements + k] * P_Ht[j * num_measurements + k];
+            }
+            kf_data->P.data[kf_packed_index(i, j)] -= sum;
+        }
+    }
+}
+
+static size_t kf_block_covariance_size(const kf_config_S* const config) {
+    // the diagonal blocks are stored one after the other, each as a dense matrix
+    size_t size = 0U;
+    for (size_t b = 0; b < config->num_covariance_blocks; b++) {
+        size += config->covariance_blocks[b] * config->covariance_blocks[b];
+    }
+    return size;
+}
+
+static bool kf_block_index(const kf_config_S* const config, const size_t row, const size_t col, size_t* const index) {
+    // only the elements of a diagonal block are stored, the others are 0
+    bool stored = false;
+    size_t first = 0U;
+    size_t offset = 0U;
+    for (size_t b = 0; (stored == false) && (b < config->num_covariance_blocks); b++) {
+        const size_t size = config->covariance_blocks[b];
+        if ((row >= first) && (row < first + size)) {
+            stored = (col >= first) && (col < first + size);
+            *index = offset + ((row - first) * size) + (col - first);
+            break;
+        }
+        first += size;
+        offset += size * size;
+    }
+    return stored;
+}
+
+static bool kf_is_zero_block(const matrix_t* const F, const size_t first_row, const size_t rows, const size_t first_col,
+                             const size_t cols) {
+    bool zero = true;
+    for (size_t i = first_row; zero && (i < first_row + rows); i++) {
+        for (size_t j = first_col; j < first_col + cols; j++) {
+            const matrix_data_t value = F->data[i * F->cols + j];
+            if ((value > 0) || (value < 0)) {
+                zero = false;
+                break;
+            }
+        }
+    }
+    return zero;
+}
+
+static void kf_predict_block_covariance(kf_data_S* const kf_data, const matrix_t* const F_matrix,
+                                        const matrix_t* const Q_matrix) {
+    // P_b(k|k-1) = sum over c of F_bc * P_c(k-1) * F_bc' + Q_bb for every diagonal block b, where F_bc is the block of F
+    // from the states of c to the states of b. The covariances between blocks are dropped, and the zero blocks of F are
+    // skipped, so a block-diagonal F costs the sum of the cubed block sizes. The blocks are written to the scratch and
+    // copied back once P is no longer read
+    const size_t num_states = KF_NUM_STATES(kf_data);
+    const size_t* const blocks = kf_data->config->covariance_blocks;
+    const size_t num_blocks = kf_data->config->num_covariance_blocks;
+    const matrix_data_t* const F = F_matrix->data;
+    const matrix_data_t* const Q = Q_matrix->data;
+    const matrix_data_t* const P = kf_data->P.data;
+    matrix_data_t* const F_P_row = kf_data->config->temp_X_hat_matrix_storage.data;
+    matrix_data_t* const P_next = kf_data->K_H_P_temp.data;
+
+    size_t b_first = 0U;
+    size_t b_offset = 0U;
+    for (size_t b = 0; b < num_blocks; b++) {
+        const size_t b_size = blocks[b];
+        matrix_data_t* const P_next_b = &P_next[b_offset];
+
+        for (size_t i = 0; i < b_size; i++) {
+            for (size_t j = 0; j <= i; j++) {
+                P_next_b[i * b_size + j] = Q[(b_first + i) * num_states + b_first + j];
+            }
+        }
+
+        size_t c_first = 0U;
+        size_t c_offset = 0U;
+        for (size_t c = 0; c < num_blocks; c++) {
+            const size_t c_size = blocks[c];
+            if (kf_is_zero_block(F_matrix, b_first, b_size, c_first, c_size) == false) {
+                const matrix_data_t* const P_c = &P[c_offset];
+                for (size_t i = 0; i < b_size; i++) {
+                    // row i of F_bc * P_c, then the lower triangle of row i of F_bc * P_c * F_bc'
+                    const matrix_data_t* const F_row = &F[(b_first + i) * num_states + c_first];
+                    for (size_t l = 0; l < c_size; l++) {
+                        matrix_data_t sum = 0;
+                        for (size_t k = 0; k < c_size; k++) {
+                            sum += F_row[k] * P_c[k * c_size + l];
+                        }
+                        F_P_row[l] = sum;
+                    }
+
+                    for (size_t j = 0; j <= i; j++) {
+                        const matrix_data_t* const F_row_j = &F[(b_first + j) * num_states + c_first];
+                        matrix_data_t sum = 0;
+                        for (size_t l = 0; l < c_size; l++) {
+                            sum += F_P_row[l] * F_row_j[l];
+                        }
+                        P_next_b[i * b_size + j] += sum;
+                    }
+                }
+            }
+            c_first += c_size;
+            c_offset += c_size * c_size;
+        }
+
+        for (size_t i = 0; i < b_size; i++) {
+            for (size_t j = 0; j < i; j++) {
+                P_next_b[j * b_size + i] = P_next_b[i * b_size + j];
+            }
+        }
+        b_first += b_size;
+        b_offset += b_size * b_size;
+    }
+
+    memcpy(kf_data->P.data, P_next, b_offset * sizeof(matrix_data_t));
+}
+
+static void kf_block_mult_transb(kf_data_S* const kf_data) {
+    // P_Ht = P * H', a row of the block-diagonal P only has the columns of its block
+    const size_t num_states = KF_NUM_STATES(kf_data);
+    const size_t num_measurements = KF_NUM_MEASUREMENTS(kf_data);
+    const matrix_data_t* const H = kf_data->H_temp.data;
+    matrix_data_t* const P_Ht = kf_data->P_Ht_temp.data;
+
+    size_t first = 0U;
+    size_t offset = 0U;
+    for (size_t b = 0; b < kf_data->config->num_covariance_blocks; b++) {
+        const size_t size = kf_data->config->covariance_blocks[b];
+        const matrix_data_t* const P_b = &kf_data->P.data[offset];
+        for (size_t i = 0; i < size; i++) {
+            for (size_t k = 0; k < num_measurements; k++) {
+                matrix_data_t sum = 0;
+                for (size_t j = 0; j < size; j++) {
+                    sum += P_b[i * size + j] * H[k * num_states + first + j];
+                }
+                P_Ht[(first + i) * num_measurements + k] = sum;
+            }
+        }
+        first += size;
+        offset += size * size;
+    }
+}
+
+static void kf_update_block_covariance(kf_data_S* const kf_data) {
+    // P_b = P_b - K_b * (P_Ht_b)' for every diagonal block, with the rows of K and P * H' of its states. The lower
+    // triangle is computed and mirrored
+    const size_t num_measurements = KF_NUM_MEASUREMENTS(kf_data);
+    const matrix_data_t* const K = kf_data->K_temp.data;
+    const matrix_data_t* const P_Ht = kf_data->P_Ht_temp.data;
+
+    size_t first = 0U;
+    size_t offset = 0U;
+    for (size_t b = 0; b < kf_data->config->num_covariance_blocks; b++) {
+        const size_t size = kf_data->config->covariance_blocks[b];
+        matrix_data_t* const P_b = &kf_data->P.data[offset];
+        for (size_t i = 0; i < size; i++) {
+            for (size_t j = 0; j <= i; j++) {
+                matrix_data_t sum = 0;
+                for (size_t k = 0; k < num_measurements; k++) {
+                    sum += K[(first + i) * num_measurements + k] * P_Ht[(first + j) * num_measurements + k];
+                }
+                P_b[i * size + j] -= sum;
+                P_b[j * size + i] = P_b[i * size + j];
+            }
+        }
+        first += size;
+        offset += size * size;
+    }
+}
+
+static void kf_gather_selected_innovation(kf_data_S* const kf_data, const matrix_t* const z,
+                                          const bool* const measurement_validity) {
+    // every row of H picks a single state, so y = z - H * x only reads entries of X. An invalid measurement acts as a
+    // zero row of H
+    const size_t* const selection = kf_data->config->H_selection;
+
+    for (size_t k = 0; k < KF_NUM_MEASUREMENTS(kf_data); k++) {
+        const bool valid = (measurement_validity == NULL) || measurement_validity[k];
+        kf_data->Y_temp.data[k] = valid ? (z->data[k] - kf_data->X.data[selection[k]]) : 0;
+    }
+}
+
+static void kf_gather_selected_covariance(kf_data_S* const kf_data, const bool* const measurement_validity) {
+    // P * H' and H * P * H' are columns and elements of P
+    const size_t num_states = KF_NUM_STATES(kf_data);
+    const size_t num_measurements = KF_NUM_MEASUREMENTS(kf_data);
+    const size_t* const selection = kf_data->config->H_selection;
+    const bool packed = kf_data->config->packed_covariance;
+    matrix_data_t* const P_Ht = kf_data->P_Ht_temp.data;
+    matrix_data_t* const S = kf_data->S_temp.data;
+
+    for (size_t k = 0; k < num_measurements; k++) {
+        const bool valid = (measurement_validity == NULL) || measurement_validity[k];
+        const size_t state = selection[k];
+
+        for (size_t i = 0; i < num_states; i++) {
+            matrix_data_t P_value = 0;
+            if (valid) {
+                P_value = packed ? kf_data->P.data[kf_packed_index(i, state)] : kf_data->P.data[i * num_states + state];
+            }
+            P_Ht[i * num_measurements + k] = P_value;
+        }
+    }
+
+    for (size_t k = 0; k < num_measurements; k++) {
+        const bool valid = (measurement_validity == NULL) || measurement_validity[k];
+
+        for (size_t j = 0; j < num_measurements; j++) {
+            S[k * num_measurements + j] = valid ? P_Ht[selection[k] * num_measurements + j] : 0;
+        }
+    }
+}
+
+static void kf_compute_innovation(kf_data_S* const kf_data, const matrix_t* const z, const bool* const measurement_validity) {
+    const size_t num_measurements = KF_NUM_MEASUREMENTS(kf_data);
+
+    kf_data->H_temp.cols = KF_NUM_STATES(kf_data);
+    kf_data->H_temp.rows = num_measurements;
+
+    if (kf_data->config->measurement_model != NULL) {
+        // expected measurement h(x_hat) and the Jacobian H = dh/dx at x_hat
+        kf_data->config->measurement_model(&kf_data->X, &kf_data->Y_temp, &kf_data->H_temp);
+    } else {
+        matrix_copy(kf_data->config->H, &kf_data->H_temp);
+    }
+
+    if (measurement_validity != NULL) {
+        // zero out columns of the H_temp matrix if the corrosponding measurement is invalid
+        for (size_t i = 0; i < num_measurements; i++) {
+            if (measurement_validity[i] == false) {
+                for (size_t j = 0; j < KF_NUM_STATES(kf_data); j++) {
+                    kf_data->H_temp.data[i * KF_NUM_STATES(kf_data) + j] = 0;
+                }
+            }
+        }
+    }
+
+    // calculate innovation: y = z - H * x_hat, or y = z - h(x_hat) with a measurement model
+    if (kf_data->config->measurement_model == NULL) {
+        kf_matrix_mult(&kf_data->H_temp, &kf_data->X, &kf_data->Y_temp, kf_data->config->temp_Z_matrix_storage.data);
+    }
+    kf_matrix_sub_inplace_b(z, &kf_data->Y_temp);
+
+    if (measurement_validity != NULL) {
+        // invalid measurements carry no innovation
+        for (size_t i = 0; i < num_measurements; i++) {
+            if (measurement_validity[i] == false) {
+                kf_data->Y_temp.data[i] = 0;
+            }
+        }
+    }
+}
+
+static void kf_compute_innovation_covariance(kf_data_S* const kf_data) {
+    // calculate S: S = H * P * H^T + R
+
+    // first, determine P * H^T
+    if (kf_data->config->packed_covariance) {
+        kf_packed_mult_transb(&kf_data->P, &kf_data->H_temp, &kf_data->P_Ht_temp);
+    } else if (kf_data->config->covariance_blocks != NULL) {
+        kf_block_mult_transb(kf_data);
+    } else {
+        kf_matrix_mult_transb(&kf_data->P, &kf_data->H_temp, &kf_data->P_Ht_temp, NULL);
+    }
+
+    kf_matrix_mult(&kf_data->H_temp, &kf_data->P_Ht_temp, &kf_data->S_temp, kf_data->config->temp_Z_matrix_storage.data);
+}
+
+static uint32_t kf_validity_pattern(const kf_data_S* const kf_data, const bool* const measurement_validity) {
+    uint32_t pattern = 0U;
+    for (size_t i = 0; i < KF_NUM_MEASUREMENTS(kf_data); i++) {
+        if ((measurement_validity == NULL) || measurement_validity[i]) {
+            pattern |= ((uint32_t)1U << i);
+        }
+    }
+    return pattern;
+}
+
+static matrix_data_t kf_covariance_trace(const kf_data_S* const kf_data) {
+    matrix_data_t trace = 0;
+    for (size_t i = 0; i < KF_NUM_STATES(kf_data); i++) {
+        size_t index = 0U;
+        if (kf_data->config->packed_covariance) {
+            trace += kf_data->P.data[kf_packed_index(i, i)];
+        } else if (kf_block_index(kf_data->config, i, i, &index)) {
+            trace += kf_data->P.data[index];
+        } else {
+            trace += kf_data->P.data[i * KF_NUM_STATES(kf_data) + i];
+        }
+    }
+    return trace;
+}
+
+static void kf_predict_covariance(kf_data_S* const kf_data, const matrix_t* const F, const matrix_t* const Q) {
+    // P = F * P * F' + Q, a NULL F or Q is stored sparse
+    if (kf_data->config->packed_covariance) {
+        kf_predict_packed_covariance(kf_data, F, Q);
+    } else if (kf_data->config->covariance_blocks != NULL) {
+        kf_predict_block_covariance(kf_data, F, Q);
+    } else {
+        if (F == NULL) {
+            kf_sparse_predict_covariance(kf_data);
+        } else if (kf_data->config->tile_size > 0U) {
+            kf_tiled_predict_covariance(kf_data, F);
+        } else {
+            kf_matrix_mult(F, &kf_data->P, &kf_data->P, kf_data->config->temp_X_hat_matrix_storage.data);
+            kf_matrix_mult_transb(&kf_data->P, F, &kf_data->P, kf_data->config->temp_X_hat_matrix_storage.data);
+        }
+
+        if (Q == NULL) {
+            kf_sparse_add_inplace(&kf_data->P, kf_data->config->Q_sparse);
+        } else {
+            kf_matrix_add_inplace(&kf_data->P, Q);
+        }
+    }
+}
+
+static void kf_unlatch_steady_state(kf_data_S* const kf_data) {
+    // P was frozen at the converged posterior, propagate it over the predicts since the last update so the next gain
+    // is computed from the a-priori covariance the full filter would have. An extended Kalman filter reuses the
+    // Jacobian of the last predict
+    const matrix_t* const F = (kf_data->config->predict_model != NULL) ? &kf_data->F_jacobian : kf_data->config->F;
+
+    for (size_t i = 0; i < kf_data->latched_predictions; i++) {
+        kf_predict_covariance(kf_data, F, kf_data->config->Q);
+    }
+
+    kf_data->steady_state = false;
+    kf_data->steady_state_streak = 0U;
+    kf_data->latched_predictions = 0U;
+}
+
+static void kf_track_steady_state(kf_data_S* const kf_data, const uint32_t validity_pattern) {
+    // the gain only converges for a fixed measurement validity, a new pattern restarts the detection
+    const matrix_data_t trace = kf_covariance_trace(kf_data);
+    const matrix_data_t change = trace - kf_data->previous_covariance_trace;
+    const matrix_data_t tolerance = kf_data->config->steady_state_threshold * kf_data->previous_covariance_trace;
+    const bool converged = (validity_pattern == kf_data->validity_pattern) && (change <= tolerance) && (-change <= tolerance);
+
+    kf_data->steady_state_streak = converged ? (kf_data->steady_state_streak + 1U) : 0U;
+    kf_data->validity_pattern = validity_pattern;
+    kf_data->previous_covariance_trace = trace;
+
+    if ((kf_data->steady_state_streak > 0U) && (kf_data->steady_state_streak >= kf_data->config->steady_state_updates)) {
+        kf_data->steady_state = true;
+    }
+}
+
+static void kf_update_covariance_from_P_Ht(kf_data_S* const kf_data) {
+    // P = P - K * H * P = P - K * (P * H')', P * H' is already known from the gain so neither K * H nor H * P is formed.
+    // The lower triangle is computed and mirrored
+    const size_t num_states = KF_NUM_STATES(kf_data);
+    const size_t num_measurements = KF_NUM_MEASUREMENTS(kf_data);
+    const matrix_data_t* const K = kf_data->K_temp.data;
+    const matrix_data_t* const P_Ht = kf_data->P_Ht_temp.data;
+    matrix_data_t* const P = kf_data->P.data;
+
+    for (size_t i = 0; i < num_states; i++) {
+        for (size_t j = 0; j <= i; j++) {
+            matrix_data_t sum = 0;
+            for (size_t k = 0; k < num_measurements; k++) {
+                sum += K[i * num_measurements + k] * P_Ht[j * num_measurements + k];
+            }
+            P[i * num_states + j] -= sum;
+            P[j * num_states + i] = P[i * num_states + j];
+        }
+    }
+}
+
+#ifdef KF_VECTOR_KERNELS
+static matrix_data_t kf_vector_dot(const matrix_data_t* const a, const matrix_data_t* const b, const size_t length) {
+    // two accumulators hide the latency of the multiply-adds, the sum is reordered compared to the portable kernels
+    kf_vector_t sum_even = {0};
+    kf_vector_t sum_odd = {0};
+    const size_t pair_length = length - (length % (2U * KF_VECTOR_LANES));
+    const size_t vector_length = length - (length % KF_VECTOR_LANES);
+    for (size_t k = 0U; k < pair_length; k += 2U * KF_VECTOR_LANES) {
+        sum_even += *(const kf_vector_t*)&a[k] * *(const kf_vector_t*)&b[k];
+        sum_odd += *(const kf_vector_t*)&a[k + KF_VECTOR_LANES] * *(const kf_vector_t*)&b[k + KF_VECTOR_LANES];
+    }
+    if (pair_length < vector_length) {
+        sum_even += *(const kf_vector_t*)&a[pair_length] * *(const kf_vector_t*)&b[pair_length];
+    }
+    sum_even += sum_odd;
+
+    matrix_data_t result = 0;
+    for (size_t lane = 0U; lane < KF_VECTOR_LANES; lane++) {
+        result += sum_even[lane];
+    }
+    for (size_t k = vector_length; k < length; k++) {
+        result += a[k] * b[k];
+    }
+    return result;
+}
+
+static void kf_vector_axpy(const matrix_data_t scale, const matrix_data_t* const x, matrix_data_t* const y, const size_t length) {
+    const size_t vector_length = length - (length % KF_VECTOR_LANES);
+    for (size_t k = 0U; k < vector_length; k += KF_VECTOR_LANES) {
+        *(kf_vector_t*)&y[k] += scale * *(const kf_vector_t*)&x[k];
+    }
+    for (size_t k = vector_length; k < length; k++) {
+        y[k] += scale * x[k];
+    }
+}
+
+static void kf_vector_add(const matrix_data_t* const a, const matrix_data_t* const b, matrix_data_t* const result,
+                          const size_t length) {
+    const size_t vector_length = length - (length % KF_VECTOR_LANES);
+    for (size_t k = 0U; k < vector_length; k += KF_VECTOR_LANES) {
+        *(kf_vector_t*)&result[k] = *(const kf_vector_t*)&a[k] + *(const kf_vector_t*)&b[k];
+    }
+    for (size_t k = vector_length; k < length; k++) {
+        result[k] = a[k] + b[k];
+    }
+}
+
+static void kf_vector_sub(const matrix_data_t* const a, const matrix_data_t* const b, matrix_data_t* const result,
+                          const size_t length) {
+    const size_t vector_length = length - (length % KF_VECTOR_LANES);
+    for (size_t k = 0U; k < vector_length; k += KF_VECTOR_LANES) {
+        *(kf_vector_t*)&result[k] = *(const kf_vector_t*)&a[k] - *(const kf_vector_t*)&b[k];
+    }
+    for (size_t k = vector_length; k < length; k++) {
+        result[k] = a[k] - b[k];
+    }
+}
+#endif
+
+static void kf_matrix_mult(const matrix_t* const a, const matrix_t* const b, const matrix_t* const c, matrix_data_t* const baux) {
+#ifdef KF_VECTOR_KERNELS
+    if (c->data == b->data) {
+        // like matrix_mult, column j of b is copied to baux before column j of c is written
+        for (size_t j = 0U; j < b->cols; j++) {
+            for (size_t k = 0U; k < b->rows; k++) {
+                baux[k] = b->data[(k * b->cols) + j];
+            }
+            for (size_t i = 0U; i < a->rows; i++) {
+                c->data[(i * c->cols) + j] = kf_vector_dot(&a->data[i * a->cols], baux, a->cols);
+            }
+        }
+    } else if (b->cols == 1U) {
+        for (size_t i = 0U; i < a->rows; i++) {
+            c->data[i] = kf_vector_dot(&a->data[i * a->cols], b->data, a->cols);
+        }
+    } else {
+        // row i of c accumulates the rows of b scaled by row i of a, all of them contiguous
+        for (size_t i = 0U; i < a->rows; i++) {
+            matrix_data_t* const c_row = &c->data[i * c->cols];
+            memset(c_row, 0, c->cols * sizeof(matrix_data_t));
+            for (size_t k = 0U; k < a->cols; k++) {
+                kf_vector_axpy(a->data[(i * a->cols) + k], &b->data[k * b->cols], c_row, b->cols);
+            }
+        }
+    }
+#else
+    matrix_mult(a, b, c, baux);
+#endif
+}
+
+static void kf_matrix_mult_transb(const matrix_t* const a, const matrix_t* const b, const matrix_t* const c,
+                                  matrix_data_t* const row_buffer) {
+#ifdef KF_VECTOR_KERNELS
+    // the rows of a and b are contiguous, c may be a if row_buffer holds a row of a
+    for (size_t i = 0U; i < a->rows; i++) {
+        const matrix_data_t* row = &a->data[i * a->cols];
+        if (a->data == c->data) {
+            memcpy(row_buffer, row, a->cols * sizeof(matrix_data_t));
+            row = row_buffer;
+        }
+        for (size_t j = 0U; j < b->rows; j++) {
+            c->data[(i * c->cols) + j] = kf_vector_dot(row, &b->data[j * b->cols], a->cols);
+        }
+    }
+#else
+    (void)row_buffer;
+    matrix_mult_transb(a, b, c);
+#endif
+}
+
+static void kf_matrix_add_inplace(const matrix_t* const a, const matrix_t* const b) {
+#ifdef KF_VECTOR_KERNELS
+    kf_vector_add(a->data, b->data, a->data, a->rows * a->cols);
+#else
+    matrix_add_inplace(a, b);
+#endif
+}
+
+static void kf_matrix_sub(const matrix_t* const a, const matrix_t* const b, const matrix_t* const c) {
+#ifdef KF_VECTOR_KERNELS
+    kf_vector_sub(a->data, b->data, c->data, a->rows * a->cols);
+#else
+    matrix_sub(a, b, c);
+#endif
+}
+
+static void kf_matrix_sub_inplace_b(const matrix_t* const a, const matrix_t* const b) {
+#ifdef KF_VECTOR_KERNELS
+    kf_vector_sub(a->data, b->data, b->data, a->rows * a->cols);
+#else
+    matrix_sub_inplace_b(a, b);
+#endif
+}
+
+static matrix_data_t kf_dot(const matrix_data_t* const a, const matrix_data_t* const b, const size_t length) {
+#ifdef KF_VECTOR_KERNELS
+    return kf_vector_dot(a, b, length);
+#else
+    matrix_data_t sum = 0;
+    for (size_t k = 0U; k < length; k++) {
+        sum += a[k] * b[k];
+    }
+    return sum;
+#endif
+}
+
+static void kf_dot4(const matrix_data_t* const a, const matrix_data_t* const b, const size_t b_stride, const size_t length,
+                    matrix_data_t* const result) {
+    // result[r] = a . b[r * b_stride], r < 4. Each element of a is loaded once for four independent accumulators
+    const matrix_data_t* const b0 = b;
+    const matrix_data_t* const b1 = &b[b_stride];
+    const matrix_data_t* const b2 = &b[2U * b_stride];
+    const matrix_data_t* const b3 = &b[3U * b_stride];
+    size_t k = 0U;
+#ifdef KF_VECTOR_KERNELS
+    kf_vector_t sum0 = {0};
+    kf_vector_t sum1 = {0};
+    kf_vector_t sum2 = {0};
+    kf_vector_t sum3 = {0};
+    const size_t vector_length = length - (length % KF_VECTOR_LANES);
+    for (; k < vector_length; k += KF_VECTOR_LANES) {
+        const kf_vector_t a_k = *(const kf_vector_t*)&a[k];
+        sum0 += a_k * *(const kf_vector_t*)&b0[k];
+        sum1 += a_k * *(const kf_vector_t*)&b1[k];
+        sum2 += a_k * *(const kf_vector_t*)&b2[k];
+        sum3 += a_k * *(const kf_vector_t*)&b3[k];
+    }
+    result[0] = 0;
+    result[1] = 0;
+    result[2] = 0;
+    result[3] = 0;
+    for (size_t lane = 0U; lane < KF_VECTOR_LANES; lane++) {
+        result[0] += sum0[lane];
+        result[1] += sum1[lane];
+        result[2] += sum2[lane];
+        result[3] += sum3[lane];
+    }
+#else
+    result[0] = 0;
+    result[1] = 0;
+    result[2] = 0;
+    result[3] = 0;
+#endif
+    for (; k < length; k++) {
+        result[0] += a[k] * b0[k];
+        result[1] += a[k] * b1[k];
+        result[2] += a[k] * b2[k];
+        result[3] += a[k] * b3[k];
+    }
+}
+
+static size_t kf_tile_end(const size_t start, const size_t tile, const size_t length) {
+    // the last tile of a dimension that is not a multiple of the tile size is shorter
+    return ((length - start) < tile) ? length : (start + tile);
+}
+
+static void kf_tiled_mult(const matrix_t* const a, const matrix_t* const b, const matrix_t* const c, const size_t tile,
+                          matrix_data_t* const panel) {
+    // c = a * b, one panel of tile columns of b at a time. The columns are gathered into contiguous rows of panel, so
+    // every element of c is a dot product of two contiguous rows, and a tile of rows of a is reused from cache for the
+    // whole panel. Only the gathered columns of c are written, so c may be b
+    for (size_t j0 = 0U; j0 < b->cols; j0 += tile) {
+        const size_t width = kf_tile_end(j0, tile, b->cols) - j0;
+        for (size_t k = 0U; k < b->rows; k++) {
+            for (size_t j = 0U; j < width; j++) {
+                panel[(j * b->rows) + k] = b->data[(k * b->cols) + j0 + j];
+            }
+        }
+        for (size_t i0 = 0U; i0 < a->rows; i0 += tile) {
+            const size_t i_end = kf_tile_end(i0, tile, a->rows);
+            for (size_t i = i0; i < i_end; i++) {
+                const matrix_data_t* const a_row = &a->data[i * a->cols];
+                matrix_data_t* const c_row = &c->data[(i * c->cols) + j0];
+                size_t j = 0U;
+                for (; (j + 4U) <= width; j += 4U) {
+                    kf_dot4(a_row, &panel[j * b->rows], b->rows, a->cols, &c_row[j]);
+                }
+                for (; j < width; j++) {
+                    c_row[j] = kf_dot(a_row, &panel[j * b->rows], a->cols);
+                }
+            }
+        }
+    }
+}
+
+static void kf_tiled_predict_covariance(kf_data_S* const kf_data, const matrix_t* const F_matrix) {
+    // P = F * P * F' in place, with a panel of tile_size rows or columns of P copied to tile_temp
+    const size_t num_states = KF_NUM_STATES(kf_data);
+    const size_t tile = kf_data->config->tile_size;
+    const matrix_data_t* const F = F_matrix->data;
+    matrix_data_t* const P = kf_data->P.data;
+    matrix_data_t* const panel = kf_data->tile_temp.data;
+
+    kf_tiled_mult(F_matrix, &kf_data->P, &kf_data->P, tile, panel);
+
+    // (F * P) * F', a panel of rows of F * P at a time against a tile of rows of F. The result is symmetric, so only
+    // the lower triangle is computed and mirrored into rows that are already done or in the panel
+    for (size_t i0 = 0U; i0 < num_states; i0 += tile) {
+        const size_t i_end = kf_tile_end(i0, tile, num_states);
+        memcpy(panel, &P[i0 * num_states], (i_end - i0) * num_states * sizeof(matrix_data_t));
+        for (size_t j0 = 0U; j0 < i_end; j0 += tile) {
+            const size_t j_end = kf_tile_end(j0, tile, num_states);
+            for (size_t i = i0; i < i_end; i++) {
+                const matrix_data_t* const panel_row = &panel[(i - i0) * num_states];
+                const size_t j_last = (j_end <= i) ? j_end : (i + 1U);
+                size_t j = j0;
+                for (; (j + 4U) <= j_last; j += 4U) {
+                    kf_dot4(panel_row, &F[j * num_states], num_states, num_states, &P[(i * num_states) + j]);
+                }
+                for (; j < j_last; j++) {
+                    P[(i * num_states) + j] = kf_dot(panel_row, &F[j * num_states], num_states);
+                }
+            }
+        }
+        for (size_t i = i0; i < i_end; i++) {
+            for (size_t j = 0U; j < i; j++) {
+                P[(j * num_states) + i] = P[(i * num_states) + j];
+            }
+        }
+    }
+}
+
+static void kf_sparse_mult_vector(const kf_sparse_matrix_S* const A, const matrix_data_t* const x, matrix_data_t* const result) {
+    // result = A * x, one multiply-add per nonzero. result must not overlap x
+    for (size_t i = 0; i < A->rows; i++) {
+        matrix_data_t sum = 0;
+        for (size_t k = A->row_offsets[i]; k < A->row_offsets[i + 1U]; k++) {
+            sum += A->values[k] * x[A->col_indices[k]];
+        }
+        result[i] = sum;
+    }
+}
+
+static void kf_sparse_predict_covariance(kf_data_S* const kf_data) {
+    // P = F * P * F' with a sparse F, in place. A column of F * P only reads the same column of P, and a row of
+    // (F * P) * F' only reads the same row of F * P, so a single vector of scratch is enough
+    const size_t num_states = KF_NUM_STATES(kf_data);
+    const kf_sparse_matrix_S* const F = kf_data->config->F_sparse;
+    matrix_data_t* const P = kf_data->P.data;
+    matrix_data_t* const scratch = kf_data->config->temp_X_hat_matrix_storage.data;
+
+    for (size_t j = 0; j < num_states; j++) {
+        for (size_t i = 0; i < num_states; i++) {
+            matrix_data_t sum = 0;
+            for (size_t k = F->row_offsets[i]; k < F->row_offsets[i + 1U]; k++) {
+                sum += F->values[k] * P[F->col_indices[k] * num_states + j];
+            }
+            scratch[i] = sum;
+        }
+
+        for (size_t i = 0; i < num_states; i++) {
+            P[i * num_states + j] = scratch[i];
+        }
+    }
+
+    for (size_t i = 0; i < num_states; i++) {
+        kf_sparse_mult_vector(F, &P[i * num_states], scratch);
+        memcpy(&P[i * num_states], scratch, num_states * sizeof(matrix_data_t));
+    }
+}
+
+static void kf_sparse_add_inplace(matrix_t* const A, const kf_sparse_matrix_S* const B) {
+    for (size_t i = 0; i < B->rows; i++) {
+        for (size_t k = B->row_offsets[i]; k < B->row_offsets[i + 1U]; k++) {
+            A->data[i * A->cols + B->col_indices[k]] += B->values[k];
+        }
+    }
+}
+
+static void kf_compute_sparse_innovation(kf_data_S* const kf_data, const matrix_t* const z,
+                                         const bool* const measurement_validity) {
+    // y = z - H * x only visits the nonzeros of H. An invalid measurement acts as a zero row of H
+    kf_sparse_mult_vector(kf_data->config->H_sparse, kf_data->X.data, kf_data->Y_temp.data);
+
+    for (size_t k = 0; k < KF_NUM_MEASUREMENTS(kf_data); k++) {
+        const bool valid = (measurement_validity == NULL) || measurement_validity[k];
+        kf_data->Y_temp.data[k] = valid ? (z->data[k] - kf_data->Y_temp.data[k]) : 0;
+    }
+}
+
+static void kf_compute_sparse_innovation_covariance(kf_data_S* const kf_data, const bool* const measurement_validity) {
+    // P * H' and H * P * H' only visit the nonzeros of H, n * nnz(H) and m * nnz(H) multiply-adds
+    const size_t num_states = KF_NUM_STATES(kf_data);
+    const size_t num_measurements = KF_NUM_MEASUREMENTS(kf_data);
+    const kf_sparse_matrix_S* const H = kf_data->config->H_sparse;
+    const bool packed = kf_data->config->packed_covariance;
+    matrix_data_t* const P_Ht = kf_data->P_Ht_temp.data;
+    matrix_data_t* const S = kf_data->S_temp.data;
+
+    for (size_t i = 0; i < num_states; i++) {
+        for (size_t k = 0; k < num_measurements; k++) {
+            const bool valid = (measurement_validity == NULL) || measurement_validity[k];
+            matrix_data_t sum = 0;
+            for (size_t l = H->row_offsets[k]; valid && (l < H->row_offsets[k + 1U]); l++) {
+                const size_t col = H->col_indices[l];
+                const matrix_data_t P_value =
+                    packed ? kf_data->P.data[kf_packed_index(i, col)] : kf_data->P.data[i * num_states + col];
+                sum += P_value * H->values[l];
+            }
+            P_Ht[i * num_measurements + k] = sum;
+        }
+    }
+
+    for (size_t k = 0; k < num_measurements; k++) {
+        const bool valid = (measurement_validity == NULL) || measurement_validity[k];
+
+        for (size_t j = 0; j < num_measurements; j++) {
+            matrix_data_t sum = 0;
+            for (size_t l = H->row_offsets[k]; valid && (l < H->row_offsets[k + 1U]); l++) {
+                sum += H->values[l] * P_Ht[H->col_indices[l] * num_measurements + j];
+            }
+            S[k * num_measurements + j] = sum;
+        }
+    }
+}
+
+static matrix_data_t kf_compute_nis(const kf_data_S* const kf_data) {
+    // NIS = y' * S^-1 * y, reusing the inverse of S computed for the gain
+    const size_t num_measurements = KF_NUM_MEASUREMENTS(kf_data);
+    const matrix_data_t* const y = kf_data->Y_temp.data;
+    const matrix_data_t* const S_inv = kf_data->S_inv_temp.data;
+
+    matrix_data_t nis = 0;
+    for (size_t i = 0; i < num_measurements; i++) {
+        matrix_data_t S_inv_y = 0;
+        for (size_t j = 0; j < num_measurements; j++) {
+            S_inv_y += S_inv[i * num_measurements + j] * y[j];
+        }
+        nis += y[i] * S_inv_y;
+    }
+
+    return nis;
+}
+
+static kf_error_E kf_invert_symmetric_2x2(matrix_data_t* const S, matrix_data_t* const S_inv) {
+    kf_error_E ret = KF_ERROR_NONE;
+
+    // S = L * D * L' with a unit lower triangular L, only the lower triangle of S = [a b; b d] is read. The
+    // factorization is as accurate as Cholesky when S is dominated by a large rank-one term, where cofactors cancel
+    const matrix_data_t d1 = S[0];
+    const matrix_data_t l21 = S[2] / d1;
+    const matrix_data_t d2 = S[3] - (l21 * S[2]);
+
+    // positive pivots, written so that NaNs are rejected as well
+    if ((d1 > 0) && (d2 > 0)) {
+        const matrix_data_t inv_d1 = 1.0F / d1;
+        const matrix_data_t inv_d2 = 1.0F / d2;
+
+        // S^-1 = L^-T * D^-1 * L^-1, with L^-1 = [1 0; -l21 1]
+        S_inv[0] = inv_d1 + (l21 * l21 * inv_d2);
+        S_inv[1] = -l21 * inv_d2;
+        S_inv[2] = S_inv[1];
+        S_inv[3] = inv_d2;
+
+        // keep the pivots on the diagonal of S for the log-determinant
+        S[3] = d2;
+    } else {
+        ret = KF_ERROR_NOT_POSITIVE_DEFINITE;
+    }
+
+    return ret;
+}
+
+static kf_error_E kf_invert_symmetric_3x3(matrix_data_t* const S, matrix_data_t* const S_inv) {
+    kf_error_E ret = KF_ERROR_NONE;
+
+    // S = L * D * L' with a unit lower triangular L, only the lower triangle of S = [a b c; b d e; c e f] is read
+    const matrix_data_t d1 = S[0];
+    const matrix_data_t l21 = S[3] / d1;
+    const matrix_data_t l31 = S[6] / d1;
+    const matrix_data_t d2 = S[4] - (l21 * S[3]);
+    const matrix_data_t e = S[7] - (l31 * S[3]);
+    const matrix_data_t l32 = e / d2;
+    const matrix_data_t d3 = S[8] - (l31 * S[6]) - (l32 * e);
+
+    // positive pivots, written so that NaNs are rejected as well
+    if ((d1 > 0) && (d2 > 0) && (d3 > 0)) {
+        const matrix_data_t inv_d1 = 1.0F / d1;
+        const matrix_data_t inv_d2 = 1.0F / d2;
+        const matrix_data_t inv_d3 = 1.0F / d3;
+        // L^-1 = [1 0 0; -l21 1 0; m31 -l32 1]
+        const matrix_data_t m31 = (l21 * l32) - l31;
+
+        // S^-1 = L^-T * D^-1 * L^-1
+        S_inv[0] = inv_d1 + (l21 * l21 * inv_d2) + (m31 * m31 * inv_d3);
+        S_inv[1] = -(l21 * inv_d2) - (m31 * l32 * inv_d3);
+        S_inv[2] = m31 * inv_d3;
+        S_inv[3] = S_inv[1];
+        S_inv[4] = inv_d2 + (l32 * l32 * inv_d3);
+        S_inv[5] = -l32 * inv_d3;
+        S_inv[6] = S_inv[2];
+        S_inv[7] = S_inv[5];
+        S_inv[8] = inv_d3;
+
+        // keep the pivots on the diagonal of S for the log-determinant
+        S[4] = d2;
+        S[8] = d3;
+    } else {
+        ret = KF_ERROR_NOT_POSITIVE_DEFINITE;
+    }
+
+    return ret;
+}
+
+static kf_error_E kf_invert_innovation_covariance(kf_data_S* const kf_data) {
+    kf_error_E ret = KF_ERROR_NONE;
+
+    matrix_data_t* const S = kf_data->S_temp.data;
+    matrix_data_t* const S_inv = kf_data->S_inv_temp.data;
+
+    switch (kf_data->config->S_inversion) {
+        case KF_S_INVERSION_SCALAR:
+            if (S[0] > 0) {
+                S_inv[0] = 1.0F / S[0];
+            } else {
+                ret = KF_ERROR_NOT_POSITIVE_DEFINITE;
+            }
+            break;
+        case KF_S_INVERSION_CLOSED_FORM_2X2:
+            ret = kf_invert_symmetric_2x2(S, S_inv);
+            break;
+        case KF_S_INVERSION_CLOSED_FORM_3X3:
+            ret = kf_invert_symmetric_3x3(S, S_inv);
+            break;
+        case KF_S_INVERSION_CHOLESKY:
+        default:
+            if (cholesky_decompose_lower(&kf_data->S_temp) != 0U) {
+                matrix_invert_lower(&kf_data->S_temp, &kf_data->S_inv_temp);
+            } else {
+                ret = KF_ERROR_NOT_POSITIVE_DEFINITE;
+            }
+            break;
+    }
+
+    return ret;
+}
+
+static matrix_data_t kf_innovation_log_determinant(const kf_data_S* const kf_data) {
+    // ln det S of the S_temp left by kf_invert_innovation_covariance, only the lower triangle is read
+    const matrix_data_t* const S = kf_data->S_temp.data;
+    const size_t num_measurements = KF_NUM_MEASUREMENTS(kf_data);
+    matrix_data_t log_determinant = 0;
+
+    switch (kf_data->config->S_inversion) {
+        case KF_S_INVERSION_SCALAR:
+            log_determinant = logf(S[0]);
+            break;
+        case KF_S_INVERSION_CLOSED_FORM_2X2:
+        case KF_S_INVERSION_CLOSED_FORM_3X3:
+            // the diagonal of S_temp holds the pivots D of S = L * D * L', det S is their product
+            for (size_t i = 0; i < num_measurements; i++) {
+                log_determinant += logf(S[i * num_measurements + i]);
+            }
+            break;
+        case KF_S_INVERSION_CHOLESKY:
+        default:
+            // S_temp holds the Cholesky factor L of S = L * L', det S is the square of the product of its diagonal
+            for (size_t i = 0; i < num_measurements; i++) {
+                log_determinant += 2.0F * logf(S[i * num_measurements + i]);
+            }
+            break;
+    }
+
+    return log_determinant;
+}
+
+KF_API kf_error_E kf_init(kf_data_S* const kf_data, const kf_config_S* const config) {
     kf_error_E ret = KF_ERROR_NONE;
 
     const bool invalid_pointer = (kf_data == NULL) || (config == NULL);
@@ -219,7 +1506,7 @@ kf_error_E kf_init(kf_data_S* const kf_data, const kf_config_S* const config) {
     return ret;
 }
 
-kf_error_E kf_predict(kf_data_S* const kf_data, const matrix_t* const u) {
+KF_API kf_error_E kf_predict(kf_data_S* const kf_data, const matrix_t* const u) {
     (void)u;
     kf_error_E ret = KF_ERROR_NONE;
 
@@ -227,7 +1514,7 @@ kf_error_E kf_predict(kf_data_S* const kf_data, const matrix_t* const u) {
 
     if (kf_data == NULL) {
         ret = KF_ERROR_INVALID_POINTER;
-    } else if (kf_data->initialized == false) {
+    } else if (KF_IS_INITIALIZED(kf_data) == false) {
         ret = KF_ERROR_NOT_INITIALIZED;
     } else {
         control_matrix_enabled = (kf_data->num_controls > 0);
@@ -249,87 +1536,243 @@ kf_error_E kf_predict(kf_data_S* const kf_data, const matrix_t* const u) {
     }
 
     if (ret == KF_ERROR_NONE) {
-        // Calculate the next x hat, x(k|k-1) = F*x(k-1) + B*u
-        matrix_mult(kf_data->config->F, &kf_data->X, &kf_data->X, kf_data->config->temp_X_hat_matrix_storage.data);
+        KF_PROFILE_BEGIN(timestamp);
+        const matrix_t* F = kf_data->config->F;
+
+        if (kf_data->config->predict_model != NULL) {
+            // Calculate the next x hat, x(k|k-1) = f(x(k-1), u), and the Jacobian F = df/dx at x(k-1)
+            matrix_t X_next = {KF_NUM_STATES(kf_data), 1, kf_data->config->temp_X_hat_matrix_storage.data};
+            kf_data->config->predict_model(&kf_data->X, u, &X_next, &kf_data->F_jacobian);
+            matrix_copy(&X_next, &kf_data->X);
+            F = &kf_data->F_jacobian;
+        } else {
+            // Calculate the next x hat, x(k|k-1) = F*x(k-1) + B*u
+            if (kf_data->config->F_sparse != NULL) {
+                kf_sparse_mult_vector(kf_data->config->F_sparse, kf_data->X.data,
+                                      kf_data->config->temp_X_hat_matrix_storage.data);
+                memcpy(kf_data->X.data, kf_data->config->temp_X_hat_matrix_storage.data,
+                       KF_NUM_STATES(kf_data) * sizeof(matrix_data_t));
+            } else {
+                kf_matrix_mult(F, &kf_data->X, &kf_data->X, kf_data->config->temp_X_hat_matrix_storage.data);
+            }
 
-        if (control_matrix_enabled) {
-            matrix_t Bu = {kf_data->num_states, 1, kf_data->config->temp_Bu_matrix_storage.data};
-            matrix_mult(kf_data->config->B, u, &Bu, kf_data->config->temp_X_hat_matrix_storage.data);
-            matrix_add_inplace(&kf_data->X, &Bu);
+            if (control_matrix_enabled) {
+                matrix_t Bu = {KF_NUM_STATES(kf_data), 1, kf_data->config->temp_Bu_matrix_storage.data};
+                if (kf_data->config->B_sparse != NULL) {
+                    kf_sparse_mult_vector(kf_data->config->B_sparse, u->data, Bu.data);
+                } else {
+                    kf_matrix_mult(kf_data->config->B, u, &Bu, kf_data->config->temp_X_hat_matrix_storage.data);
+                }
+                kf_matrix_add_inplace(&kf_data->X, &Bu);
+            }
+        }
+        KF_PROFILE_STAGE(kf_data, KF_PROFILE_STAGE_PREDICT_STATE, timestamp);
+
+        // Calculate the next P, P(k|k-1) = F*P(k-1)*F' + Q. A latched gain freezes P at its converged posterior. With
+        // covariance_decimation, P is propagated over the skipped predicts by F^k and the accumulated Q every k-th call
+        const matrix_t* Q = kf_data->config->Q;
+        bool propagate_covariance = (kf_data->steady_state == false);
+        if (propagate_covariance && (kf_data->config->covariance_decimation > 1U)) {
+            kf_data->skipped_covariance_predictions++;
+            propagate_covariance = (kf_data->skipped_covariance_predictions == kf_data->config->covariance_decimation);
+            if (propagate_covariance) {
+                kf_data->skipped_covariance_predictions = 0U;
+                F = kf_data->config->F_decimated;
+                Q = kf_data->config->Q_decimated;
+            }
         }
 
-        // Calculate the next P, P(k|k-1) = F*P(k-1)*F' + Q
-        matrix_mult(kf_data->config->F, &kf_data->P, &kf_data->P, kf_data->config->temp_X_hat_matrix_storage.data);
-        matrix_mult_transb(&kf_data->P, kf_data->config->F, &kf_data->P);
-        matrix_add_inplace(&kf_data->P, kf_data->config->Q);
+        if (propagate_covariance) {
+            kf_predict_covariance(kf_data, F, Q);
+            KF_PROFILE_STAGE(kf_data, KF_PROFILE_STAGE_PREDICT_COVARIANCE, timestamp);
+        } else if (kf_data->steady_state) {
+            // counted so the covariance can catch up if the gain is unlatched before the next latched update
+            kf_data->latched_predictions++;
+        }
     }
 
     return ret;
 }
 
-kf_error_E kf_update(kf_data_S* const kf_data, const matrix_t* const z, const bool* const measurement_validity,
-                     const size_t num_measurements) {
+KF_API kf_error_E kf_update(kf_data_S* const kf_data, const matrix_t* const z, const bool* const measurement_validity,
+                            const size_t num_measurements) {
     kf_error_E ret = KF_ERROR_NONE;
 
     if ((kf_data == NULL) || (z == NULL)) {
         ret = KF_ERROR_INVALID_POINTER;
-    } else if (kf_data->initialized == false) {
+    } else if (KF_IS_INITIALIZED(kf_data) == false) {
         ret = KF_ERROR_NOT_INITIALIZED;
     } else {
-        if ((measurement_validity != NULL) && (num_measurements != kf_data->num_measurements)) {
+        if ((measurement_validity != NULL) && (num_measurements != KF_NUM_MEASUREMENTS(kf_data))) {
             ret = KF_ERROR_INVALID_DIMENSIONS;
         } else {
             ret = KF_ERROR_NONE;
         }
     }
 
+    bool skip_covariance_update = false;
+    uint32_t validity_pattern = 0U;
+    KF_PROFILE_BEGIN(timestamp);
+
     if (ret == KF_ERROR_NONE) {
-        kf_data->H_temp.cols = kf_data->num_states;
-        kf_data->H_temp.rows = kf_data->num_measurements;
-        matrix_copy(kf_data->config->H, &kf_data->H_temp);
+        validity_pattern = kf_validity_pattern(kf_data, measurement_validity);
 
-        if (measurement_validity != NULL) {
-            // zero out columns of the H_temp matrix if the corrosponding measurement is invalid
-            for (size_t i = 0; i < num_measurements; i++) {
-                if (measurement_validity[i] == false) {
-                    for (size_t j = 0; j < kf_data->num_states; j++) {
-                        kf_data->H_temp.data[i * kf_data->num_states + j] = 0;
-                    }
-                }
-            }
+        // the latched gain is only valid for the measurements it converged with
+        if (kf_data->steady_state && (validity_pattern != kf_data->validity_pattern)) {
+            kf_unlatch_steady_state(kf_data);
         }
 
-        // calculate innovation: y = z - H * x_hat
-        matrix_mult(&kf_data->H_temp, &kf_data->X, &kf_data->Y_temp, kf_data->config->temp_Z_matrix_storage.data);
-        matrix_sub_inplace_b(z, &kf_data->Y_temp);
-
-        // calculate S: S = H * P * H^T + R
+        if (kf_data->config->H_selection != NULL) {
+            kf_gather_selected_innovation(kf_data, z, measurement_validity);
+        } else if (kf_data->config->H_sparse != NULL) {
+            kf_compute_sparse_innovation(kf_data, z, measurement_validity);
+        } else {
+            kf_compute_innovation(kf_data, z, measurement_validity);
+        }
+    }
 
-        // first, determine P * H^T
-        matrix_mult_transb(&kf_data->P, &kf_data->H_temp, &kf_data->P_Ht_temp);
+    if ((ret == KF_ERROR_NONE) && (kf_data->steady_state == false)) {
+        if (kf_data->config->H_selection != NULL) {
+            kf_gather_selected_covariance(kf_data, measurement_validity);
+        } else if (kf_data->config->H_sparse != NULL) {
+            kf_compute_sparse_innovation_covariance(kf_data, measurement_validity);
+        } else {
+            kf_compute_innovation_covariance(kf_data);
+        }
 
-        matrix_mult(&kf_data->H_temp, &kf_data->P_Ht_temp, &kf_data->S_temp, kf_data->config->temp_Z_matrix_storage.data);
         // now, add R to S
-        matrix_add_inplace(&kf_data->S_temp, kf_data->config->R);
+        kf_matrix_add_inplace(&kf_data->S_temp, kf_data->config->R);
+    }
+
+    if (ret == KF_ERROR_NONE) {
+        KF_PROFILE_STAGE(kf_data, KF_PROFILE_STAGE_UPDATE_INNOVATION, timestamp);
+
+        // calculate S^-1, a latched filter keeps the converged one
+        if (kf_data->steady_state == false) {
+            ret = kf_invert_innovation_covariance(kf_data);
+            KF_PROFILE_STAGE(kf_data, KF_PROFILE_STAGE_UPDATE_INVERSION, timestamp);
+        }
+    }
+
+    if (ret == KF_ERROR_NONE) {
+        // gate the measurement on its normalized innovation squared before doing any of the K/P work. A latched filter
+        // reuses the converged S^-1
+        kf_data->innovation_nis = kf_compute_nis(kf_data);
 
+        if ((kf_data->config->innovation_gate > 0) && (kf_data->innovation_nis > kf_data->config->innovation_gate)) {
+            ret = KF_ERROR_MEASUREMENT_REJECTED;
+        }
+
+        skip_covariance_update = kf_data->steady_state || ((kf_data->config->innovation_deadband > 0) &&
+                                                           (kf_data->innovation_nis < kf_data->config->innovation_deadband));
+    }
+
+    if ((ret == KF_ERROR_NONE) && (kf_data->steady_state == false)) {
         // calculate K: K = P * H^T * S^-1
-        cholesky_decompose_lower(&kf_data->S_temp);
-        matrix_invert_lower(&kf_data->S_temp, &kf_data->S_inv_temp);
-        matrix_mult(&kf_data->P_Ht_temp, &kf_data->S_inv_temp, &kf_data->K_temp, kf_data->config->temp_Z_matrix_storage.data);
+        kf_matrix_mult(&kf_data->P_Ht_temp, &kf_data->S_inv_temp, &kf_data->K_temp, kf_data->config->temp_Z_matrix_storage.data);
+        KF_PROFILE_STAGE(kf_data, KF_PROFILE_STAGE_UPDATE_GAIN, timestamp);
+    }
 
+    if (ret == KF_ERROR_NONE) {
         // update x_hat: x = x + K * y
-        matrix_t X_hat_temp = {kf_data->num_states, 1, kf_data->config->temp_X_hat_matrix_storage.data};
-        matrix_mult(&kf_data->K_temp, &kf_data->Y_temp, &X_hat_temp, kf_data->config->temp_Z_matrix_storage.data);
+        matrix_t X_hat_temp = {KF_NUM_STATES(kf_data), 1, kf_data->config->temp_X_hat_matrix_storage.data};
+        kf_matrix_mult(&kf_data->K_temp, &kf_data->Y_temp, &X_hat_temp, kf_data->config->temp_Z_matrix_storage.data);
 
-        matrix_add_inplace(&kf_data->X, &X_hat_temp);
+        kf_matrix_add_inplace(&kf_data->X, &X_hat_temp);
+        KF_PROFILE_STAGE(kf_data, KF_PROFILE_STAGE_UPDATE_STATE, timestamp);
 
+        // a latched update brings the frozen covariance back to the converged posterior
+        kf_data->latched_predictions = 0U;
+    }
+
+    if ((ret == KF_ERROR_NONE) && (skip_covariance_update == false)) {
         // update P: P = (I - K * H) * P
         // which is equivalent to P = P - K * H * P
-        matrix_mult(&kf_data->K_temp, &kf_data->H_temp, &kf_data->K_H_temp, kf_data->config->temp_Z_matrix_storage.data);
-        matrix_mult(&kf_data->K_H_temp, &kf_data->P, &kf_data->K_H_P_temp, kf_data->config->temp_X_hat_matrix_storage.data);
+        if (kf_data->config->packed_covariance) {
+            kf_update_packed_covariance(kf_data);
+        } else if (kf_data->config->covariance_blocks != NULL) {
+            kf_update_block_covariance(kf_data);
+        } else if ((kf_data->config->H_selection != NULL) || (kf_data->config->H_sparse != NULL) ||
+                   (kf_data->config->covariance_update == KF_COVARIANCE_UPDATE_K_P_HT)) {
+            kf_update_covariance_from_P_Ht(kf_data);
+        } else {
+            kf_matrix_mult(&kf_data->K_temp, &kf_data->H_temp, &kf_data->K_H_temp, kf_data->config->temp_Z_matrix_storage.data);
+            if (kf_data->config->tile_size > 0U) {
+                kf_tiled_mult(&kf_data->K_H_temp, &kf_data->P, &kf_data->K_H_P_temp, kf_data->config->tile_size,
+                              kf_data->tile_temp.data);
+            } else {
+                kf_matrix_mult(&kf_data->K_H_temp, &kf_data->P, &kf_data->K_H_P_temp,
+                               kf_data->config->temp_X_hat_matrix_storage.data);
+            }
 
-        matrix_sub(&kf_data->P, &kf_data->K_H_P_temp, &kf_data->P);
+            kf_matrix_sub(&kf_data->P, &kf_data->K_H_P_temp, &kf_data->P);
+        }
+        KF_PROFILE_STAGE(kf_data, KF_PROFILE_STAGE_UPDATE_COVARIANCE, timestamp);
+
+        if (kf_data->config->steady_state_threshold > 0) {
+            kf_track_steady_state(kf_data, validity_pattern);
+        }
     }
 
     return ret;
-}
\ No newline at end of file
+}
+
+KF_API kf_error_E kf_get_covariance(const kf_data_S* const kf_data, const size_t row, const size_t col,
+                                    matrix_data_t* const value) {
+    kf_error_E ret = KF_ERROR_NONE;
+
+    if ((kf_data == NULL) || (value == NULL)) {
+        ret = KF_ERROR_INVALID_POINTER;
+    } else if (KF_IS_INITIALIZED(kf_data) == false) {
+        ret = KF_ERROR_NOT_INITIALIZED;
+    } else if ((row >= KF_NUM_STATES(kf_data)) || (col >= KF_NUM_STATES(kf_data))) {
+        ret = KF_ERROR_INVALID_DIMENSIONS;
+    } else if (kf_data->config->packed_covariance) {
+        *value = kf_data->P.data[kf_packed_index(row, col)];
+    } else if (kf_data->config->covariance_blocks != NULL) {
+        size_t index = 0U;
+        *value = kf_block_index(kf_data->config, row, col, &index) ? kf_data->P.data[index] : 0;
+    } else {
+        *value = matrix_get(&kf_data->P, row, col);
+    }
+
+    return ret;
+}
+
+KF_API kf_error_E kf_innovation_log_likelihood(const kf_data_S* const kf_data, matrix_data_t* const log_likelihood) {
+    kf_error_E ret = KF_ERROR_NONE;
+
+    if ((kf_data == NULL) || (log_likelihood == NULL)) {
+        ret = KF_ERROR_INVALID_POINTER;
+    } else if (KF_IS_INITIALIZED(kf_data) == false) {
+        ret = KF_ERROR_NOT_INITIALIZED;
+    } else {
+        *log_likelihood = -0.5F * (kf_data->innovation_nis + kf_innovation_log_determinant(kf_data));
+    }
+
+    return ret;
+}
+
+#ifdef KF_ENABLE_PROFILING
+KF_API kf_error_E kf_profile_reset(kf_data_S* const kf_data) {
+    kf_error_E ret = KF_ERROR_NONE;
+
+    if (kf_data == NULL) {
+        ret = KF_ERROR_INVALID_POINTER;
+    } else {
+        memset(&kf_data->profile, 0, sizeof(kf_profile_S));
+    }
+
+    return ret;
+}
+
+KF_API kf_profile_cycles_t kf_profile_get_mean(const kf_profile_stage_stats_S* const stats) {
+    kf_profile_cycles_t mean = 0U;
+
+    if ((stats != NULL) && (stats->count > 0U)) {
+        mean = (kf_profile_cycles_t)(stats->total / stats->count);
+    }
+
+    return mean;
+}
+#endif
@@ -67,4 +67,122 @@ const kf_config_S default_simple_config = {
 
     .K_H_storage = {4, K_H_storage_data},
     .K_H_P_storage = {4, K_H_P_storage_data},
-};
\ No newline at end of file
+    .tile_storage = {0, NULL},
+
+    .innovation_gate = 0,
+    .innovation_deadband = 0,
+
+    .S_inversion = KF_S_INVERSION_CHOLESKY,
+
+    .packed_covariance = false,
+    .covariance_blocks = NULL,
+    .num_covariance_blocks = 0,
+
+    .covariance_update = KF_COVARIANCE_UPDATE_K_H_P,
+
+    .tile_size = 0,
+
+    .predict_model = NULL,
+    .num_model_controls = 0,
+    .measurement_model = NULL,
+
+    .H_selection = NULL,
+
+    .steady_state_threshold = 0,
+    .steady_state_updates = 0,
+    .F_sparse = NULL,
+    .B_sparse = NULL,
+    .H_sparse = NULL,
+    .Q_sparse = NULL,
+    .covariance_decimation = 0,
+    .F_decimated = NULL,
+    .Q_decimated = NULL,
+};
+static matrix_data_t three_X_init_data[3] = {1, 2, 3};
+static matrix_data_t three_F_data[9] = {1, 0.01F, 0, 0, 1, 0.01F, 0, 0, 1};
+static matrix_data_t three_P_init_data[9] = {10, 1, 0.5F, 1, 8, 0.25F, 0.5F, 0.25F, 6};
+static matrix_data_t three_Q_data[9] = {0.1F, 0, 0, 0, 0.1F, 0, 0, 0, 0.1F};
+
+static matrix_data_t three_R_data[9] = {1, 0.2F, 0, 0.2F, 2, 0.1F, 0, 0.1F, 3};
+static matrix_data_t three_H_data[9] = {1, 0, 0, 0, 1, 0, 0.5F, 0, 1};
+
+static matrix_t three_X_init = {3, 1, three_X_init_data};
+static matrix_t three_F = {3, 3, three_F_data};
+static matrix_t three_P_init = {3, 3, three_P_init_data};
+static matrix_t three_Q = {3, 3, three_Q_data};
+static matrix_t three_R = {3, 3, three_R_data};
+static matrix_t three_H = {3, 3, three_H_data};
+
+static matrix_data_t three_X_storage[3];
+static matrix_data_t three_P_storage[9];
+static matrix_data_t three_temp_H_storage[9];
+static matrix_data_t three_temp_R_storage[9];
+static matrix_data_t three_temp_X_hat_matrix_storage[3];
+static matrix_data_t three_temp_Z_matrix_storage_data[3];
+static matrix_data_t three_P_Ht_storage[9];
+static matrix_data_t three_Y_matrix_storage[3];
+static matrix_data_t three_S_matrix_storage[9];
+static matrix_data_t three_S_inv_storage_data[9];
+static matrix_data_t three_K_matrix_storage[9];
+static matrix_data_t three_K_H_storage_data[9];
+static matrix_data_t three_K_H_P_storage_data[9];
+
+const kf_config_S three_measurement_config = {
+    .X_init = &three_X_init,
+    .F = &three_F,
+    .B = NULL,
+    .Q = &three_Q,
+    .P_init = &three_P_init,
+    .H = &three_H,
+    .R = &three_R,
+
+    .X_matrix_storage = {3, three_X_storage},
+    .P_matrix_storage = {9, three_P_storage},
+
+    .temp_X_hat_matrix_storage = {3, three_temp_X_hat_matrix_storage},
+    .temp_Bu_matrix_storage = {0, NULL},
+
+    .temp_Z_matrix_storage = {3, three_temp_Z_matrix_storage_data},
+
+    .H_temp_storage = {9, three_temp_H_storage},
+    .R_temp_storage = {9, three_temp_R_storage},
+
+    .P_Ht_storage = {9, three_P_Ht_storage},
+    .Y_matrix_storage = {3, three_Y_matrix_storage},
+    .S_matrix_storage = {9, three_S_matrix_storage},
+    .S_inv_matrix_storage = {9, three_S_inv_storage_data},
+    .K_matrix_storage = {9, three_K_matrix_storage},
+
+    .K_H_storage = {9, three_K_H_storage_data},
+    .K_H_P_storage = {9, three_K_H_P_storage_data},
+    .tile_storage = {0, NULL},
+
+    .innovation_gate = 0,
+    .innovation_deadband = 0,
+
+    .S_inversion = KF_S_INVERSION_CHOLESKY,
+
+    .packed_covariance = false,
+    .covariance_blocks = NULL,
+    .num_covariance_blocks = 0,
+
+    .covariance_update = KF_COVARIANCE_UPDATE_K_H_P,
+
+    .tile_size = 0,
+
+    .predict_model = NULL,
+    .num_model_controls = 0,
+    .measurement_model = NULL,
+
+    .H_selection = NULL,
+
+    .steady_state_threshold = 0,
+    .steady_state_updates = 0,
+    .F_sparse = NULL,
+    .B_sparse = NULL,
+    .H_sparse = NULL,
+    .Q_sparse = NULL,
+    .covariance_decimation = 0,
+    .F_decimated = NULL,
+    .Q_decimated = NULL,
+};
@@ -6,5 +6,6 @@ extern "C" {
 }
 
 extern const kf_config_S default_simple_config;
+extern const kf_config_S three_measurement_config;
 
 #endif
\ No newline at end of file
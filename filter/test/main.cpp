@@ -5,5 +5,9 @@ IMPORT_TEST_GROUP(dummy_test);
 IMPORT_TEST_GROUP(kalman_api_test);
 IMPORT_TEST_GROUP(kalman_predict_test);
 IMPORT_TEST_GROUP(kalman_update_test);
+#ifdef KF_ENABLE_PROFILING
+IMPORT_TEST_GROUP(kalman_profile_test);
+#endif
+IMPORT_TEST_GROUP(kalman_ekf_test);
 
 int main(int ac, char **av) { return CommandLineTestRunner::RunAllTests(ac, av); }
\ No newline at end of file
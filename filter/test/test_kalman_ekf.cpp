@@ -0,0 +1,146 @@
+#include "CppUTest/TestHarness.h"
+
+extern "C" {
+#include "kalman.h"
+#include "matrix.h"
+}
+
+#include "configs.hpp"
+#include "matrix_test_util.hpp"
+
+TEST_GROUP(kalman_ekf_test){void setup(){} void teardown(){}};
+
+// Models reproducing the linear F and H of the three measurement config
+static void linear_predict_model(const matrix_t* const X, const matrix_t* const u, matrix_t* const X_next, matrix_t* const F) {
+    (void)u;
+    matrix_data_t aux[3];
+    matrix_copy(three_measurement_config.F, F);
+    matrix_mult(F, X, X_next, aux);
+}
+
+static void linear_measurement_model(const matrix_t* const X, matrix_t* const Z_hat, matrix_t* const H) {
+    matrix_data_t aux[3];
+    matrix_copy(three_measurement_config.H, H);
+    matrix_mult(H, X, Z_hat, aux);
+}
+
+// Range-squared measurement of the first state, h(x) = x0^2
+static void squared_measurement_model(const matrix_t* const X, matrix_t* const Z_hat, matrix_t* const H) {
+    Z_hat->data[0] = X->data[0] * X->data[0];
+    H->data[0] = 2 * X->data[0];
+    H->data[1] = 0;
+}
+
+// Integrator driven by its control input, x(k+1) = x(k) + u
+static void integrator_predict_model(const matrix_t* const X, const matrix_t* const u, matrix_t* const X_next,
+                                     matrix_t* const F) {
+    X_next->data[0] = X->data[0] + u->data[0];
+    X_next->data[1] = X->data[1];
+    F->data[0] = 1;
+    F->data[1] = 0;
+    F->data[2] = 0;
+    F->data[3] = 1;
+}
+
+// Test that an extended Kalman filter with linear models matches the linear filter
+TEST(kalman_ekf_test, ekf_with_linear_models_matches_kf) {
+    kf_data_S reference_kf_data;
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&reference_kf_data, &three_measurement_config));
+
+    matrix_data_t Z_data[3] = {4, -1, 7};
+    matrix_t Z = {3, 1, Z_data};
+    bool measurement_validity[3] = {true, false, true};
+
+    for (size_t i = 0; i < 3; i++) {
+        CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&reference_kf_data, NULL));
+        CHECK_EQUAL(KF_ERROR_NONE, kf_update(&reference_kf_data, &Z, measurement_validity, 3));
+    }
+
+    // both configs share their storage, copy the reference results out
+    matrix_data_t X_data[3];
+    matrix_data_t P_data[9];
+    matrix_t X_expected = {3, 1, X_data};
+    matrix_t P_expected = {3, 3, P_data};
+    matrix_copy(&reference_kf_data.X, &X_expected);
+    matrix_copy(&reference_kf_data.P, &P_expected);
+
+    kf_data_S kf_data;
+    kf_config_S ekf_config = three_measurement_config;
+    ekf_config.F = NULL;
+    ekf_config.H = NULL;
+    ekf_config.predict_model = linear_predict_model;
+    ekf_config.measurement_model = linear_measurement_model;
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&kf_data, &ekf_config));
+    CHECK_EQUAL(3, kf_data.num_measurements);
+
+    for (size_t i = 0; i < 3; i++) {
+        CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, NULL));
+        CHECK_EQUAL(KF_ERROR_NONE, kf_update(&kf_data, &Z, measurement_validity, 3));
+    }
+
+    verify_matrix_equal(&X_expected, &kf_data.X);
+    verify_matrix_equal(&P_expected, &kf_data.P);
+}
+
+// Test that the innovation and the linearization use the measurement model
+TEST(kalman_ekf_test, ekf_nonlinear_measurement) {
+    kf_data_S kf_data;
+    kf_config_S ekf_config = default_simple_config;
+    ekf_config.H = NULL;
+    ekf_config.measurement_model = squared_measurement_model;
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&kf_data, &ekf_config));
+
+    matrix_data_t Z_data[1] = {10};
+    matrix_t Z = {1, 1, Z_data};
+    CHECK_EQUAL(KF_ERROR_NONE, kf_update(&kf_data, &Z, NULL, 0U));
+
+    // linearized around X_init = (3, 4)
+    DOUBLES_EQUAL(1, kf_data.Y_temp.data[0], 0.0001);
+    DOUBLES_EQUAL(6, kf_data.H_temp.data[0], 0.0001);
+    DOUBLES_EQUAL(0, kf_data.H_temp.data[1], 0.0001);
+}
+
+// Test that the control input is passed to the predict model
+TEST(kalman_ekf_test, ekf_predict_model_with_control) {
+    kf_data_S kf_data;
+    kf_config_S ekf_config = default_simple_config;
+    ekf_config.F = NULL;
+    ekf_config.predict_model = integrator_predict_model;
+    ekf_config.num_model_controls = 1;
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&kf_data, &ekf_config));
+
+    matrix_data_t u_data[1] = {2};
+    matrix_t u = {1, 1, u_data};
+    CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, &u));
+    DOUBLES_EQUAL(5, kf_data.X.data[0], 0.0001);
+    DOUBLES_EQUAL(4, kf_data.X.data[1], 0.0001);
+
+    CHECK_EQUAL(KF_ERROR_INVALID_POINTER, kf_predict(&kf_data, NULL));
+
+    matrix_data_t wrong_u_data[2] = {2, 2};
+    matrix_t wrong_u = {2, 1, wrong_u_data};
+    CHECK_EQUAL(KF_ERROR_INVALID_DIMENSIONS, kf_predict(&kf_data, &wrong_u));
+}
+
+// Test the configurations of the models that are rejected
+TEST(kalman_ekf_test, ekf_invalid_model_configuration) {
+    kf_data_S kf_data;
+
+    // F and H can only be omitted when they are replaced by a model
+    kf_config_S config_without_F = default_simple_config;
+    config_without_F.F = NULL;
+    CHECK_EQUAL(KF_ERROR_INVALID_POINTER, kf_init(&kf_data, &config_without_F));
+
+    kf_config_S config_without_H = default_simple_config;
+    config_without_H.H = NULL;
+    CHECK_EQUAL(KF_ERROR_INVALID_POINTER, kf_init(&kf_data, &config_without_H));
+
+    // the predict model takes the control inputs directly
+    static matrix_data_t B_data[2] = {1, 1};
+    static matrix_t B = {2, 1, B_data};
+    kf_config_S config_with_B = default_simple_config;
+    config_with_B.B = &B;
+    config_with_B.predict_model = integrator_predict_model;
+    config_with_B.num_model_controls = 1;
+    CHECK_EQUAL(KF_ERROR_INVALID_POINTER, kf_init(&kf_data, &config_with_B));
+}
@@ -481,3 +481,23 @@ TEST(kalman_api_test, storage_space_for_K_H_P) {
 
     check_kf_init(&kf_data, &config_with_invalid_K_H_P_storage, KF_ERROR_STORAGE_TOO_SMALL);
 }
+
+// Test storage space for a packed covariance
+TEST(kalman_api_test, storage_space_packed_covariance) {
+    kf_data_S kf_data;
+    kf_config_S config_with_packed_covariance = default_simple_config;
+    config_with_packed_covariance.packed_covariance = true;
+    config_with_packed_covariance.K_H_storage.data = NULL;
+
+    // a packed 2x2 covariance only needs 3 elements, K * H is not needed
+    config_with_packed_covariance.P_matrix_storage.size = 3;
+    config_with_packed_covariance.K_H_P_storage.size = 3;
+    check_kf_init(&kf_data, &config_with_packed_covariance, KF_ERROR_NONE);
+
+    config_with_packed_covariance.P_matrix_storage.size = 2;
+    check_kf_init(&kf_data, &config_with_packed_covariance, KF_ERROR_STORAGE_TOO_SMALL);
+
+    config_with_packed_covariance.P_matrix_storage.size = 3;
+    config_with_packed_covariance.K_H_P_storage.size = 2;
+    check_kf_init(&kf_data, &config_with_packed_covariance, KF_ERROR_STORAGE_TOO_SMALL);
+}
@@ -1,3 +1,5 @@
+#include <cmath>
+
 #include "CppUTest/TestHarness.h"
 
 extern "C" {
@@ -116,4 +118,168 @@ TEST(kalman_predict_test, invalid_control_input_dims) {
 
     error = kf_predict(&kf_data, &u);
     CHECK_EQUAL(KF_ERROR_CONTROL_MATRIX_NOT_ENABLED, error);
-}
\ No newline at end of file
+}
+// Test that predicting with sparse F, B and Q matches the dense products
+TEST(kalman_predict_test, kalman_predict_sparse_matrices) {
+    // F = [1 0.001; 0 1], B = [0 1; 2 0], Q = [1 0; 0 1]
+    static const size_t F_row_offsets[3] = {0, 2, 3};
+    static const size_t F_col_indices[3] = {0, 1, 1};
+    static const matrix_data_t F_values[3] = {1, 0.001F, 1};
+    static const kf_sparse_matrix_S F_sparse = {2, 2, F_row_offsets, F_col_indices, F_values};
+    static const size_t B_row_offsets[3] = {0, 1, 2};
+    static const size_t B_col_indices[2] = {1, 0};
+    static const matrix_data_t B_values[2] = {1, 2};
+    static const kf_sparse_matrix_S B_sparse = {2, 2, B_row_offsets, B_col_indices, B_values};
+    static const size_t Q_row_offsets[3] = {0, 1, 2};
+    static const size_t Q_col_indices[2] = {0, 1};
+    static const matrix_data_t Q_values[2] = {1, 1};
+    static const kf_sparse_matrix_S Q_sparse = {2, 2, Q_row_offsets, Q_col_indices, Q_values};
+
+    static matrix_data_t B_data[4] = {0, 1, 2, 0};
+    static matrix_t B = {2, 2, B_data};
+    static matrix_data_t temp_Bu_matrix_storage[2] = {0, 0};
+
+    kf_config_S config_with_B = default_simple_config;
+    config_with_B.B = &B;
+    config_with_B.temp_Bu_matrix_storage = {2, temp_Bu_matrix_storage};
+
+    kf_config_S config_with_sparse_matrices = config_with_B;
+    config_with_sparse_matrices.F = NULL;
+    config_with_sparse_matrices.B = NULL;
+    config_with_sparse_matrices.Q = NULL;
+    config_with_sparse_matrices.F_sparse = &F_sparse;
+    config_with_sparse_matrices.B_sparse = &B_sparse;
+    config_with_sparse_matrices.Q_sparse = &Q_sparse;
+
+    matrix_data_t u_data[2] = {1, -2};
+    matrix_t u = {2, 1, u_data};
+
+    kf_data_S kf_data;
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&kf_data, &config_with_B));
+    CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, &u));
+    CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, &u));
+
+    // both configs share their storage, copy the reference results out
+    matrix_data_t X_data[2];
+    matrix_data_t P_data[4];
+    memcpy(X_data, kf_data.X.data, sizeof(X_data));
+    memcpy(P_data, kf_data.P.data, sizeof(P_data));
+    matrix_t X_expected = {2, 1, X_data};
+    matrix_t P_expected = {2, 2, P_data};
+
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&kf_data, &config_with_sparse_matrices));
+    CHECK_EQUAL(2U, kf_data.num_controls);
+    CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, &u));
+    CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, &u));
+
+    verify_matrix_equal(&X_expected, &kf_data.X);
+    verify_matrix_equal(&P_expected, &kf_data.P);
+}
+
+// F^2 and Q + F * Q * F' of the three measurement config
+static matrix_data_t F_decimated_data[9] = {1, 0.02F, 0.0001F, 0, 1, 0.02F, 0, 0, 1};
+static matrix_data_t Q_decimated_data[9] = {0.20001F, 0.001F, 0, 0.001F, 0.20001F, 0.001F, 0, 0.001F, 0.2F};
+static matrix_t F_decimated = {3, 3, F_decimated_data};
+static matrix_t Q_decimated = {3, 3, Q_decimated_data};
+
+static kf_config_S three_measurement_decimated_config(void) {
+    kf_config_S decimated_config = three_measurement_config;
+    decimated_config.covariance_decimation = 2;
+    decimated_config.F_decimated = &F_decimated;
+    decimated_config.Q_decimated = &Q_decimated;
+    return decimated_config;
+}
+
+// Test that a decimated covariance is propagated by F^k and the accumulated Q every k-th predict only
+TEST(kalman_predict_test, kalman_predict_covariance_decimation) {
+    kf_config_S decimated_config = three_measurement_decimated_config();
+
+    kf_data_S kf_data;
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&kf_data, &three_measurement_config));
+    CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, NULL));
+    matrix_data_t X_one_step_data[3];
+    memcpy(X_one_step_data, kf_data.X.data, sizeof(X_one_step_data));
+    matrix_t X_one_step = {3, 1, X_one_step_data};
+    CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, NULL));
+
+    // both configs share their storage, copy the reference results out
+    matrix_data_t X_data[3];
+    matrix_data_t P_data[9];
+    memcpy(X_data, kf_data.X.data, sizeof(X_data));
+    memcpy(P_data, kf_data.P.data, sizeof(P_data));
+    matrix_t X_expected = {3, 1, X_data};
+    matrix_t P_expected = {3, 3, P_data};
+
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&kf_data, &decimated_config));
+    CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, NULL));
+    verify_matrix_equal(&X_one_step, &kf_data.X);
+    verify_matrix_equal(three_measurement_config.P_init, &kf_data.P);
+    CHECK_EQUAL(1U, kf_data.skipped_covariance_predictions);
+
+    CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, NULL));
+    verify_matrix_equal(&X_expected, &kf_data.X);
+    verify_matrix_equal(&P_expected, &kf_data.P);
+    CHECK_EQUAL(0U, kf_data.skipped_covariance_predictions);
+
+    kf_config_S config_without_Q_decimated = decimated_config;
+    config_without_Q_decimated.Q_decimated = NULL;
+    CHECK_EQUAL(KF_ERROR_INVALID_POINTER, kf_init(&kf_data, &config_without_Q_decimated));
+
+    kf_config_S config_with_wrong_F_decimated = decimated_config;
+    config_with_wrong_F_decimated.F_decimated = default_simple_config.F;
+    CHECK_EQUAL(KF_ERROR_INVALID_DIMENSIONS, kf_init(&kf_data, &config_with_wrong_F_decimated));
+}
+
+static const size_t INTERLEAVED_STEPS = 200U;
+static const size_t INTERLEAVED_RECORDED_STEPS = 10U;
+
+// runs an update after every predict and records P after every predict and update of the last steps
+static void run_interleaved(const kf_config_S* config, matrix_data_t P_recorded[][9]) {
+    kf_data_S kf_data;
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&kf_data, config));
+
+    matrix_data_t Z_data[3] = {0, 0, 0};
+    matrix_t Z = {3, 1, Z_data};
+    for (size_t step = 0; step < INTERLEAVED_STEPS; step++) {
+        const size_t record = 2U * (step + INTERLEAVED_RECORDED_STEPS - INTERLEAVED_STEPS);
+        const bool recorded = (step >= (INTERLEAVED_STEPS - INTERLEAVED_RECORDED_STEPS));
+
+        CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, NULL));
+        if (recorded) {
+            memcpy(P_recorded[record], kf_data.P.data, 9U * sizeof(matrix_data_t));
+        }
+        CHECK_EQUAL(KF_ERROR_NONE, kf_update(&kf_data, &Z, NULL, 0U));
+        if (recorded) {
+            memcpy(P_recorded[record + 1U], kf_data.P.data, 9U * sizeof(matrix_data_t));
+        }
+    }
+}
+
+// Test that with an update after every predict, the decimated covariance stays within the bound the generator reports
+TEST(kalman_predict_test, kalman_predict_covariance_decimation_with_update_every_predict) {
+    // decimation_error_bound of the three measurement config, with covariance_decimation 2 and update_interval 1
+    const double reported_bound = 0.127845;
+
+    // both configs share their storage, so the filters run one after the other
+    matrix_data_t P_exact[2U * INTERLEAVED_RECORDED_STEPS][9];
+    run_interleaved(&three_measurement_config, P_exact);
+    kf_config_S decimated_config = three_measurement_decimated_config();
+    matrix_data_t P_decimated[2U * INTERLEAVED_RECORDED_STEPS][9];
+    run_interleaved(&decimated_config, P_decimated);
+
+    double largest_difference = 0.0;
+    for (size_t record = 0; record < (2U * INTERLEAVED_RECORDED_STEPS); record++) {
+        double difference_norm = 0.0;
+        double exact_norm = 0.0;
+        for (size_t i = 0; i < 9U; i++) {
+            const double difference = (double)P_decimated[record][i] - (double)P_exact[record][i];
+            difference_norm += difference * difference;
+            exact_norm += (double)P_exact[record][i] * (double)P_exact[record][i];
+        }
+        largest_difference = fmax(largest_difference, sqrt(difference_norm / exact_norm));
+    }
+
+    CHECK(largest_difference <= (reported_bound + 0.0001));
+    // the bound is reached, it is the one of this schedule
+    CHECK(largest_difference >= (0.99 * reported_bound));
+}
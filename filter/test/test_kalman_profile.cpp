@@ -0,0 +1,91 @@
+#include "CppUTest/TestHarness.h"
+
+extern "C" {
+#include "kalman.h"
+#include "matrix.h"
+}
+
+#include "configs.hpp"
+
+static const kf_profile_cycles_t FAKE_CYCLES_PER_STAGE = 10U;
+static kf_profile_cycles_t fake_cycle_counter = 0U;
+
+// Fake cycle counter advancing a fixed amount on every read, so every stage appears to take the same time
+extern "C" kf_profile_cycles_t kf_profile_timestamp(void) {
+    fake_cycle_counter += FAKE_CYCLES_PER_STAGE;
+    return fake_cycle_counter;
+}
+
+TEST_GROUP(kalman_profile_test){void setup(){} void teardown(){}};
+
+TEST(kalman_profile_test, profile_cleared_on_init) {
+    kf_data_S kf_data;
+    memset(&kf_data, 0xFF, sizeof(kf_data));
+
+    kf_error_E error = kf_init(&kf_data, &default_simple_config);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+
+    for (size_t i = 0; i < KF_PROFILE_STAGE_COUNT; i++) {
+        CHECK_EQUAL(0U, kf_data.profile.stages[i].count);
+        CHECK_EQUAL(0U, kf_profile_get_mean(&kf_data.profile.stages[i]));
+    }
+}
+
+TEST(kalman_profile_test, predict_and_update_stages_recorded) {
+    kf_data_S kf_data;
+    kf_error_E error = kf_init(&kf_data, &default_simple_config);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+
+    error = kf_predict(&kf_data, NULL);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+
+    CHECK_EQUAL(1U, kf_data.profile.stages[KF_PROFILE_STAGE_PREDICT_STATE].count);
+    CHECK_EQUAL(1U, kf_data.profile.stages[KF_PROFILE_STAGE_PREDICT_COVARIANCE].count);
+    CHECK_EQUAL(0U, kf_data.profile.stages[KF_PROFILE_STAGE_UPDATE_INNOVATION].count);
+
+    matrix_data_t Z_data[1] = {0};
+    matrix_t Z = {1, 1, Z_data};
+
+    error = kf_update(&kf_data, &Z, NULL, 0U);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+
+    for (size_t i = 0; i < KF_PROFILE_STAGE_COUNT; i++) {
+        const kf_profile_stage_stats_S* stats = &kf_data.profile.stages[i];
+        CHECK_EQUAL(1U, stats->count);
+        CHECK_EQUAL(FAKE_CYCLES_PER_STAGE, stats->min);
+        CHECK_EQUAL(FAKE_CYCLES_PER_STAGE, stats->max);
+        CHECK_EQUAL(FAKE_CYCLES_PER_STAGE, kf_profile_get_mean(stats));
+    }
+}
+
+TEST(kalman_profile_test, counter_wrap_around) {
+    kf_data_S kf_data;
+    kf_error_E error = kf_init(&kf_data, &default_simple_config);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+
+    // start just below the wrap-around point of the counter
+    fake_cycle_counter = (kf_profile_cycles_t)(0U - FAKE_CYCLES_PER_STAGE);
+
+    error = kf_predict(&kf_data, NULL);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+
+    CHECK_EQUAL(FAKE_CYCLES_PER_STAGE, kf_data.profile.stages[KF_PROFILE_STAGE_PREDICT_STATE].max);
+    CHECK_EQUAL(FAKE_CYCLES_PER_STAGE, kf_data.profile.stages[KF_PROFILE_STAGE_PREDICT_COVARIANCE].max);
+}
+
+TEST(kalman_profile_test, profile_reset) {
+    CHECK_EQUAL(KF_ERROR_INVALID_POINTER, kf_profile_reset(NULL));
+
+    kf_data_S kf_data;
+    kf_error_E error = kf_init(&kf_data, &default_simple_config);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+
+    error = kf_predict(&kf_data, NULL);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+    CHECK_EQUAL(1U, kf_data.profile.stages[KF_PROFILE_STAGE_PREDICT_STATE].count);
+
+    error = kf_profile_reset(&kf_data);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+    CHECK_EQUAL(0U, kf_data.profile.stages[KF_PROFILE_STAGE_PREDICT_STATE].count);
+    CHECK_EQUAL(0U, kf_data.profile.stages[KF_PROFILE_STAGE_PREDICT_STATE].max);
+}
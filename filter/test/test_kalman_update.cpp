@@ -1,3 +1,5 @@
+#include <cmath>
+
 #include "CppUTest/TestHarness.h"
 
 extern "C" {
@@ -159,4 +161,782 @@ TEST(kalman_update_test, kalman_update_invalid_measurement) {
 
     verify_matrix_equal(&kf_data.X, default_simple_config.X_init);
     verify_matrix_equal(&kf_data.P, default_simple_config.P_init);
-}
\ No newline at end of file
+}
+// Test that the normalized innovation squared of the update is computed from S
+TEST(kalman_update_test, kalman_update_normalized_innovation_squared) {
+    kf_data_S kf_data;
+    kf_error_E error = kf_init(&kf_data, &default_simple_config);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+
+    matrix_data_t Z_data[1] = {100};
+    matrix_t Z = {1, 1, Z_data};
+
+    error = kf_update(&kf_data, &Z, NULL, 0U);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+
+    // y = z - x(0) = 100 - 3, S = P(0, 0) + R = 9999 + 1
+    DOUBLES_EQUAL((97.0 * 97.0) / 10000.0, kf_data.innovation_nis, 0.0001);
+}
+
+// Test that the log-likelihood of the innovation is computed from the NIS and the determinant of S
+TEST(kalman_update_test, kalman_update_innovation_log_likelihood) {
+    kf_data_S kf_data;
+    matrix_data_t log_likelihood = 0;
+    CHECK_EQUAL(KF_ERROR_INVALID_POINTER, kf_innovation_log_likelihood(NULL, &log_likelihood));
+
+    kf_error_E error = kf_init(&kf_data, &default_simple_config);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+    CHECK_EQUAL(KF_ERROR_INVALID_POINTER, kf_innovation_log_likelihood(&kf_data, NULL));
+
+    matrix_data_t Z_data[1] = {100};
+    matrix_t Z = {1, 1, Z_data};
+
+    error = kf_update(&kf_data, &Z, NULL, 0U);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+
+    // S = 10000, factored by Cholesky
+    error = kf_innovation_log_likelihood(&kf_data, &log_likelihood);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+    DOUBLES_EQUAL(-0.5 * (((97.0 * 97.0) / 10000.0) + log(10000.0)), log_likelihood, 0.0001);
+}
+
+// Test that the log-likelihood does not depend on the inversion of S
+TEST(kalman_update_test, kalman_update_innovation_log_likelihood_inversions) {
+    kf_config_S config_with_closed_form_inversion = three_measurement_config;
+    config_with_closed_form_inversion.S_inversion = KF_S_INVERSION_CLOSED_FORM_3X3;
+
+    matrix_data_t Z_data[3] = {4, -1, 7};
+    matrix_t Z = {3, 1, Z_data};
+    matrix_data_t log_likelihoods[2] = {0, 0};
+    const kf_config_S* configs[2] = {&three_measurement_config, &config_with_closed_form_inversion};
+
+    for (size_t i = 0; i < 2; i++) {
+        kf_data_S kf_data;
+        CHECK_EQUAL(KF_ERROR_NONE, kf_init(&kf_data, configs[i]));
+        CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, NULL));
+        CHECK_EQUAL(KF_ERROR_NONE, kf_update(&kf_data, &Z, NULL, 3U));
+        CHECK_EQUAL(KF_ERROR_NONE, kf_innovation_log_likelihood(&kf_data, &log_likelihoods[i]));
+    }
+
+    DOUBLES_EQUAL(log_likelihoods[0], log_likelihoods[1], 0.0001);
+}
+
+// Test that a measurement outside of the innovation gate is rejected without modifying the filter
+TEST(kalman_update_test, kalman_update_innovation_gate) {
+    kf_data_S kf_data;
+    kf_config_S config_with_gate = default_simple_config;
+    config_with_gate.innovation_gate = 0.5F;
+
+    kf_error_E error = kf_init(&kf_data, &config_with_gate);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+
+    // NIS of ~0.94, outside of the gate
+    matrix_data_t Z_data[1] = {100};
+    matrix_t Z = {1, 1, Z_data};
+
+    error = kf_update(&kf_data, &Z, NULL, 0U);
+    CHECK_EQUAL(KF_ERROR_MEASUREMENT_REJECTED, error);
+
+    verify_matrix_equal(&kf_data.X, config_with_gate.X_init);
+    verify_matrix_equal(&kf_data.P, config_with_gate.P_init);
+
+    // NIS of ~0.005, inside of the gate
+    Z_data[0] = 10;
+    error = kf_update(&kf_data, &Z, NULL, 0U);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+
+    CHECK(kf_data.X.data[0] > 3.0F);
+}
+
+// Test that a negligible innovation corrects the state but skips the covariance update
+TEST(kalman_update_test, kalman_update_innovation_deadband) {
+    kf_data_S kf_data;
+    kf_config_S config_with_deadband = default_simple_config;
+    config_with_deadband.innovation_deadband = 0.01F;
+
+    kf_error_E error = kf_init(&kf_data, &config_with_deadband);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+
+    // NIS of 0.25 / 10000, inside of the deadband
+    matrix_data_t Z_data[1] = {3.5};
+    matrix_t Z = {1, 1, Z_data};
+
+    error = kf_update(&kf_data, &Z, NULL, 0U);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+
+    CHECK(kf_data.X.data[0] > 3.0F);
+    verify_matrix_equal(&kf_data.P, config_with_deadband.P_init);
+}
+
+static void get_covariance(const kf_data_S* kf_data, matrix_t* P) {
+    for (size_t i = 0; i < kf_data->num_states; i++) {
+        for (size_t j = 0; j < kf_data->num_states; j++) {
+            CHECK_EQUAL(KF_ERROR_NONE, kf_get_covariance(kf_data, i, j, &P->data[i * kf_data->num_states + j]));
+        }
+    }
+}
+
+static void run_updates_and_compare(const kf_config_S* reference_config, const kf_config_S* config,
+                                    const bool* measurement_validity = NULL) {
+    kf_data_S reference_kf_data;
+    kf_error_E error = kf_init(&reference_kf_data, reference_config);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+
+    // copy the reference results out, both configs share their storage
+    const size_t num_states = reference_kf_data.num_states;
+    const size_t num_measurements = reference_kf_data.num_measurements;
+
+    matrix_data_t Z_data[3] = {4, -1, 7};
+    matrix_t Z = {num_measurements, 1, Z_data};
+
+    for (size_t i = 0; i < 3; i++) {
+        CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&reference_kf_data, NULL));
+        CHECK_EQUAL(KF_ERROR_NONE, kf_update(&reference_kf_data, &Z, measurement_validity, num_measurements));
+    }
+
+    matrix_data_t X_data[3];
+    matrix_data_t P_data[9];
+    memcpy(X_data, reference_kf_data.X.data, num_states * sizeof(matrix_data_t));
+    matrix_t X_expected = {num_states, 1, X_data};
+    matrix_t P_expected = {num_states, num_states, P_data};
+    get_covariance(&reference_kf_data, &P_expected);
+
+    kf_data_S kf_data;
+    error = kf_init(&kf_data, config);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+
+    for (size_t i = 0; i < 3; i++) {
+        CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, NULL));
+        CHECK_EQUAL(KF_ERROR_NONE, kf_update(&kf_data, &Z, measurement_validity, num_measurements));
+    }
+
+    matrix_data_t P_actual_data[9];
+    matrix_t P_actual = {num_states, num_states, P_actual_data};
+    get_covariance(&kf_data, &P_actual);
+
+    verify_matrix_equal(&X_expected, &kf_data.X);
+    verify_matrix_equal(&P_expected, &P_actual);
+}
+
+// Test that the scalar inversion of S matches the generic Cholesky inversion
+TEST(kalman_update_test, kalman_update_scalar_S_inversion) {
+    // the default P_init is singular, use a well conditioned one so both inversions round the same way
+    static matrix_data_t P_init_data[4] = {10, 1, 1, 8};
+    static matrix_t P_init = {2, 2, P_init_data};
+
+    kf_config_S reference_config = default_simple_config;
+    reference_config.P_init = &P_init;
+
+    kf_config_S config_with_scalar_inversion = reference_config;
+    config_with_scalar_inversion.S_inversion = KF_S_INVERSION_SCALAR;
+
+    run_updates_and_compare(&reference_config, &config_with_scalar_inversion);
+}
+
+// Test that the closed-form 3x3 inversion of S matches the generic Cholesky inversion
+TEST(kalman_update_test, kalman_update_closed_form_3x3_S_inversion) {
+    kf_config_S config_with_closed_form_inversion = three_measurement_config;
+    config_with_closed_form_inversion.S_inversion = KF_S_INVERSION_CLOSED_FORM_3X3;
+
+    run_updates_and_compare(&three_measurement_config, &config_with_closed_form_inversion);
+}
+
+// Test that the closed-form 3x3 inversion of S stays accurate when S is dominated by a large rank-one term
+TEST(kalman_update_test, kalman_update_closed_form_3x3_S_inversion_ill_conditioned) {
+    // P_init = a * J with J all ones, so the first S = a * J + b * I, whose cofactors cancel in single precision
+    const matrix_data_t a = 9980;
+    const matrix_data_t b = 2;
+    static matrix_data_t P_init_data[9];
+    static matrix_data_t identity_data[9] = {1, 0, 0, 0, 1, 0, 0, 0, 1};
+    static matrix_data_t R_data[9] = {2, 0, 0, 0, 2, 0, 0, 0, 2};
+    for (size_t i = 0; i < 9; i++) {
+        P_init_data[i] = a;
+    }
+    static matrix_t P_init = {3, 3, P_init_data};
+    static matrix_t identity = {3, 3, identity_data};
+    static matrix_t R = {3, 3, R_data};
+
+    kf_config_S reference_config = three_measurement_config;
+    reference_config.F = &identity;
+    reference_config.Q = &identity;
+    reference_config.H = &identity;
+    reference_config.R = &R;
+    reference_config.P_init = &P_init;
+
+    kf_config_S config_with_closed_form_inversion = reference_config;
+    config_with_closed_form_inversion.S_inversion = KF_S_INVERSION_CLOSED_FORM_3X3;
+
+    kf_data_S kf_data;
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&kf_data, &config_with_closed_form_inversion));
+
+    matrix_data_t Z_data[3] = {0.5F, -0.25F, 1};
+    matrix_t Z = {3, 1, Z_data};
+    CHECK_EQUAL(KF_ERROR_NONE, kf_update(&kf_data, &Z, NULL, 3U));
+
+    // S^-1 = (I - a / (b + 3 * a) * J) / b
+    for (size_t i = 0; i < 3; i++) {
+        for (size_t j = 0; j < 3; j++) {
+            const double expected = (((i == j) ? 1.0 : 0.0) - (a / (b + (3.0 * a)))) / b;
+            DOUBLES_EQUAL(expected, kf_data.S_inv_temp.data[(i * 3U) + j], 0.0001);
+        }
+    }
+
+    // the updates that follow accept every measurement and keep the covariance positive, like the Cholesky inversion
+    kf_data_S reference_kf_data;
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&reference_kf_data, &reference_config));
+    CHECK_EQUAL(KF_ERROR_NONE, kf_update(&reference_kf_data, &Z, NULL, 3U));
+
+    for (size_t step = 0; step < 30; step++) {
+        Z_data[0] = 0.01F * (matrix_data_t)step;
+        CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, NULL));
+        CHECK_EQUAL(KF_ERROR_NONE, kf_update(&kf_data, &Z, NULL, 3U));
+        CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&reference_kf_data, NULL));
+        CHECK_EQUAL(KF_ERROR_NONE, kf_update(&reference_kf_data, &Z, NULL, 3U));
+    }
+
+    for (size_t i = 0; i < 9; i++) {
+        DOUBLES_EQUAL(reference_kf_data.P.data[i], kf_data.P.data[i], 0.001);
+    }
+    for (size_t i = 0; i < 3; i++) {
+        CHECK(kf_data.P.data[(i * 3U) + i] > 0);
+        DOUBLES_EQUAL(reference_kf_data.X.data[i], kf_data.X.data[i], 0.001);
+    }
+}
+
+// Test that a specialized inversion of S is rejected if it does not match the number of measurements
+TEST(kalman_update_test, kalman_update_S_inversion_dimension_mismatch) {
+    kf_data_S kf_data;
+    kf_config_S config_with_mismatched_inversion = default_simple_config;
+
+    config_with_mismatched_inversion.S_inversion = KF_S_INVERSION_CLOSED_FORM_2X2;
+    CHECK_EQUAL(KF_ERROR_INVALID_DIMENSIONS, kf_init(&kf_data, &config_with_mismatched_inversion));
+
+    config_with_mismatched_inversion.S_inversion = KF_S_INVERSION_CLOSED_FORM_3X3;
+    CHECK_EQUAL(KF_ERROR_INVALID_DIMENSIONS, kf_init(&kf_data, &config_with_mismatched_inversion));
+
+    config_with_mismatched_inversion = three_measurement_config;
+    config_with_mismatched_inversion.S_inversion = KF_S_INVERSION_SCALAR;
+    CHECK_EQUAL(KF_ERROR_INVALID_DIMENSIONS, kf_init(&kf_data, &config_with_mismatched_inversion));
+}
+
+// Test that an S that is not positive definite is reported and leaves the filter unchanged
+TEST(kalman_update_test, kalman_update_S_not_positive_definite) {
+    static matrix_data_t negative_R_data[1] = {-20000};
+    static matrix_t negative_R = {1, 1, negative_R_data};
+    const kf_s_inversion_E inversions[2] = {KF_S_INVERSION_SCALAR, KF_S_INVERSION_CHOLESKY};
+
+    for (size_t i = 0; i < 2; i++) {
+        kf_data_S kf_data;
+        kf_config_S config_with_negative_R = default_simple_config;
+        config_with_negative_R.R = &negative_R;
+        config_with_negative_R.S_inversion = inversions[i];
+
+        kf_error_E error = kf_init(&kf_data, &config_with_negative_R);
+        CHECK_EQUAL(KF_ERROR_NONE, error);
+
+        matrix_data_t Z_data[1] = {10};
+        matrix_t Z = {1, 1, Z_data};
+
+        error = kf_update(&kf_data, &Z, NULL, 0U);
+        CHECK_EQUAL(KF_ERROR_NOT_POSITIVE_DEFINITE, error);
+
+        verify_matrix_equal(&kf_data.X, config_with_negative_R.X_init);
+        verify_matrix_equal(&kf_data.P, config_with_negative_R.P_init);
+    }
+}
+
+// Test that predicting and updating with a packed covariance matches the full covariance
+TEST(kalman_update_test, kalman_update_packed_covariance) {
+    static matrix_data_t packed_P_storage[KF_PACKED_SIZE(3U)];
+    static matrix_data_t packed_scratch_storage[KF_PACKED_SIZE(3U)];
+
+    kf_config_S config_with_packed_covariance = three_measurement_config;
+    config_with_packed_covariance.packed_covariance = true;
+    config_with_packed_covariance.P_matrix_storage.size = KF_PACKED_SIZE(3U);
+    config_with_packed_covariance.P_matrix_storage.data = packed_P_storage;
+    config_with_packed_covariance.K_H_P_storage.size = KF_PACKED_SIZE(3U);
+    config_with_packed_covariance.K_H_P_storage.data = packed_scratch_storage;
+    config_with_packed_covariance.K_H_storage.size = 0;
+    config_with_packed_covariance.K_H_storage.data = NULL;
+
+    run_updates_and_compare(&three_measurement_config, &config_with_packed_covariance);
+}
+
+// Test that the packed covariance is read back symmetrically and that reads are validated
+TEST(kalman_update_test, kalman_get_covariance_packed) {
+    static matrix_data_t packed_P_storage[KF_PACKED_SIZE(3U)];
+
+    kf_data_S kf_data;
+    kf_config_S config_with_packed_covariance = three_measurement_config;
+    config_with_packed_covariance.packed_covariance = true;
+    config_with_packed_covariance.P_matrix_storage.size = KF_PACKED_SIZE(3U);
+    config_with_packed_covariance.P_matrix_storage.data = packed_P_storage;
+
+    kf_error_E error = kf_init(&kf_data, &config_with_packed_covariance);
+    CHECK_EQUAL(KF_ERROR_NONE, error);
+
+    // lower triangle of P_init, row by row
+    CHECK_EQUAL(KF_PACKED_SIZE(3U), kf_data.P.rows);
+    DOUBLES_EQUAL(10, packed_P_storage[0], 0.0001);
+    DOUBLES_EQUAL(1, packed_P_storage[1], 0.0001);
+    DOUBLES_EQUAL(8, packed_P_storage[2], 0.0001);
+    DOUBLES_EQUAL(0.5, packed_P_storage[3], 0.0001);
+    DOUBLES_EQUAL(0.25, packed_P_storage[4], 0.0001);
+    DOUBLES_EQUAL(6, packed_P_storage[5], 0.0001);
+
+    matrix_data_t P_data[9];
+    matrix_t P = {3, 3, P_data};
+    get_covariance(&kf_data, &P);
+    verify_matrix_equal(three_measurement_config.P_init, &P);
+
+    matrix_data_t value = 0;
+    CHECK_EQUAL(KF_ERROR_INVALID_DIMENSIONS, kf_get_covariance(&kf_data, 3, 0, &value));
+    CHECK_EQUAL(KF_ERROR_INVALID_POINTER, kf_get_covariance(&kf_data, 0, 0, NULL));
+    CHECK_EQUAL(KF_ERROR_INVALID_POINTER, kf_get_covariance(NULL, 0, 0, &value));
+}
+
+static kf_config_S block_covariance_config(const kf_config_S* reference_config, const size_t* covariance_blocks,
+                                           size_t num_covariance_blocks, size_t block_covariance_size) {
+    static matrix_data_t block_P_storage[9];
+    static matrix_data_t block_scratch_storage[9];
+
+    kf_config_S config = *reference_config;
+    config.covariance_blocks = covariance_blocks;
+    config.num_covariance_blocks = num_covariance_blocks;
+    config.P_matrix_storage.size = block_covariance_size;
+    config.P_matrix_storage.data = block_P_storage;
+    config.K_H_P_storage.size = block_covariance_size;
+    config.K_H_P_storage.data = block_scratch_storage;
+    config.K_H_storage.size = 0;
+    config.K_H_storage.data = NULL;
+    return config;
+}
+
+// Test that the block-diagonal covariance matches the full covariance when the blocks are decoupled
+TEST(kalman_update_test, kalman_update_block_covariance) {
+    static const size_t single_block[1] = {3};
+    kf_config_S config_with_single_block = block_covariance_config(&three_measurement_config, single_block, 1, 9);
+    run_updates_and_compare(&three_measurement_config, &config_with_single_block);
+
+    // neither the model, the noise nor the initial covariance couple the states 0 and 1 to the state 2
+    static matrix_data_t decoupled_F_data[9] = {1, 0.01F, 0, 0, 1, 0, 0, 0, 1};
+    static matrix_data_t decoupled_P_init_data[9] = {10, 1, 0, 1, 8, 0, 0, 0, 6};
+    static matrix_data_t decoupled_H_data[9] = {1, 0, 0, 0, 1, 0, 0, 0, 1};
+    static matrix_data_t decoupled_R_data[9] = {1, 0.2F, 0, 0.2F, 2, 0, 0, 0, 3};
+    static matrix_t decoupled_F = {3, 3, decoupled_F_data};
+    static matrix_t decoupled_P_init = {3, 3, decoupled_P_init_data};
+    static matrix_t decoupled_H = {3, 3, decoupled_H_data};
+    static matrix_t decoupled_R = {3, 3, decoupled_R_data};
+    static const size_t decoupled_blocks[2] = {2, 1};
+
+    kf_config_S decoupled_config = three_measurement_config;
+    decoupled_config.F = &decoupled_F;
+    decoupled_config.P_init = &decoupled_P_init;
+    decoupled_config.H = &decoupled_H;
+    decoupled_config.R = &decoupled_R;
+    kf_config_S config_with_blocks = block_covariance_config(&decoupled_config, decoupled_blocks, 2, 5);
+    run_updates_and_compare(&decoupled_config, &config_with_blocks);
+
+    bool measurement_validity[3] = {true, false, true};
+    run_updates_and_compare(&decoupled_config, &config_with_blocks, measurement_validity);
+}
+
+// Test that a diagonal covariance keeps the variances and reads the covariances as 0, and that the blocks are validated
+TEST(kalman_update_test, kalman_block_covariance_diagonal) {
+    static const size_t diagonal_blocks[3] = {1, 1, 1};
+    kf_data_S kf_data;
+    kf_config_S diagonal_config = block_covariance_config(&three_measurement_config, diagonal_blocks, 3, 3);
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&kf_data, &diagonal_config));
+
+    CHECK_EQUAL(3, kf_data.P.rows);
+    matrix_data_t value = 1;
+    CHECK_EQUAL(KF_ERROR_NONE, kf_get_covariance(&kf_data, 2, 2, &value));
+    DOUBLES_EQUAL(6, value, 0.0001);
+    CHECK_EQUAL(KF_ERROR_NONE, kf_get_covariance(&kf_data, 0, 1, &value));
+    DOUBLES_EQUAL(0, value, 0.0001);
+
+    // the variances grow by Q and the coupling of F through the variance of the next state
+    CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, NULL));
+    CHECK_EQUAL(KF_ERROR_NONE, kf_get_covariance(&kf_data, 0, 0, &value));
+    DOUBLES_EQUAL(10 + 0.0001F * 8 + 0.1F, value, 0.0001);
+    CHECK_EQUAL(KF_ERROR_NONE, kf_get_covariance(&kf_data, 2, 1, &value));
+    DOUBLES_EQUAL(0, value, 0.0001);
+
+    kf_config_S config_with_small_storage = diagonal_config;
+    config_with_small_storage.P_matrix_storage.size = 2;
+    CHECK_EQUAL(KF_ERROR_STORAGE_TOO_SMALL, kf_init(&kf_data, &config_with_small_storage));
+
+    static const size_t too_few_blocks[2] = {1, 1};
+    kf_config_S config_with_missing_state = block_covariance_config(&three_measurement_config, too_few_blocks, 2, 3);
+    CHECK_EQUAL(KF_ERROR_INVALID_DIMENSIONS, kf_init(&kf_data, &config_with_missing_state));
+
+    static const size_t empty_block[4] = {1, 0, 1, 1};
+    kf_config_S config_with_empty_block = block_covariance_config(&three_measurement_config, empty_block, 4, 3);
+    CHECK_EQUAL(KF_ERROR_INVALID_DIMENSIONS, kf_init(&kf_data, &config_with_empty_block));
+
+    kf_config_S config_also_packed = diagonal_config;
+    config_also_packed.packed_covariance = true;
+    CHECK_EQUAL(KF_ERROR_INVALID_POINTER, kf_init(&kf_data, &config_also_packed));
+}
+
+// Test that reusing P * H' for the covariance update matches (K * H) * P
+TEST(kalman_update_test, kalman_update_covariance_from_P_Ht) {
+    kf_config_S config_reusing_P_Ht = three_measurement_config;
+    config_reusing_P_Ht.covariance_update = KF_COVARIANCE_UPDATE_K_P_HT;
+    // neither K * H nor K * H * P is formed
+    config_reusing_P_Ht.K_H_storage.size = 0;
+    config_reusing_P_Ht.K_H_storage.data = NULL;
+    config_reusing_P_Ht.K_H_P_storage.size = 0;
+    config_reusing_P_Ht.K_H_P_storage.data = NULL;
+
+    run_updates_and_compare(&three_measurement_config, &config_reusing_P_Ht);
+
+    bool measurement_validity[3] = {false, true, true};
+    run_updates_and_compare(&three_measurement_config, &config_reusing_P_Ht, measurement_validity);
+
+    kf_data_S kf_data;
+    kf_config_S config_with_unknown_update = three_measurement_config;
+    config_with_unknown_update.covariance_update = (kf_covariance_update_E)2;
+    CHECK_EQUAL(KF_ERROR_INVALID_DIMENSIONS, kf_init(&kf_data, &config_with_unknown_update));
+}
+
+// Test that the tiled products, with tiles that do not divide the number of states, match the untiled ones
+TEST(kalman_update_test, kalman_update_tiled_products) {
+    static matrix_data_t tile_storage[6];
+    kf_config_S tiled_config = three_measurement_config;
+    tiled_config.tile_size = 2;
+    tiled_config.tile_storage = {6, tile_storage};
+    run_updates_and_compare(&three_measurement_config, &tiled_config);
+
+    kf_config_S config_with_single_tile = tiled_config;
+    config_with_single_tile.tile_size = 1;
+    run_updates_and_compare(&three_measurement_config, &config_with_single_tile);
+
+    // the scratch holds a panel of tile_size columns of P
+    kf_data_S kf_data;
+    kf_config_S config_with_small_tile_storage = tiled_config;
+    config_with_small_tile_storage.tile_size = 3;
+    CHECK_EQUAL(KF_ERROR_STORAGE_TOO_SMALL, kf_init(&kf_data, &config_with_small_tile_storage));
+}
+
+static kf_config_S selection_config(const kf_config_S* reference_config, const size_t* H_selection) {
+    kf_config_S config = *reference_config;
+    config.H_selection = H_selection;
+    // the gathered update never forms H, K * H or K * H * P
+    config.H_temp_storage.size = 0;
+    config.H_temp_storage.data = NULL;
+    config.K_H_storage.size = 0;
+    config.K_H_storage.data = NULL;
+    config.K_H_P_storage.size = 0;
+    config.K_H_P_storage.data = NULL;
+    return config;
+}
+
+// Test that gathering the update of a selection matrix H matches the dense products
+TEST(kalman_update_test, kalman_update_H_selection) {
+    static matrix_data_t permuted_H_data[9] = {0, 1, 0, 0, 0, 1, 1, 0, 0};
+    static matrix_t permuted_H = {3, 3, permuted_H_data};
+    static const size_t H_selection[3] = {1, 2, 0};
+
+    kf_config_S reference_config = three_measurement_config;
+    reference_config.H = &permuted_H;
+
+    kf_config_S config_with_selection = selection_config(&reference_config, H_selection);
+    run_updates_and_compare(&reference_config, &config_with_selection);
+
+    bool measurement_validity[3] = {true, false, true};
+    run_updates_and_compare(&reference_config, &config_with_selection, measurement_validity);
+}
+
+// Test that the gathered update also works on a packed covariance
+TEST(kalman_update_test, kalman_update_H_selection_packed_covariance) {
+    static matrix_data_t packed_P_storage[KF_PACKED_SIZE(2U)];
+    static matrix_data_t packed_scratch_storage[KF_PACKED_SIZE(2U)];
+    static const size_t H_selection[1] = {0};
+
+    kf_config_S config_with_selection = selection_config(&default_simple_config, H_selection);
+    config_with_selection.packed_covariance = true;
+    config_with_selection.P_matrix_storage.size = KF_PACKED_SIZE(2U);
+    config_with_selection.P_matrix_storage.data = packed_P_storage;
+    config_with_selection.K_H_P_storage.size = KF_PACKED_SIZE(2U);
+    config_with_selection.K_H_P_storage.data = packed_scratch_storage;
+
+    run_updates_and_compare(&default_simple_config, &config_with_selection);
+}
+
+// Test that a selection is rejected if it does not describe a constant H of the filter
+TEST(kalman_update_test, kalman_update_invalid_H_selection) {
+    kf_data_S kf_data;
+    static const size_t out_of_range_selection[1] = {2};
+    kf_config_S config_with_selection = default_simple_config;
+    config_with_selection.H_selection = out_of_range_selection;
+    CHECK_EQUAL(KF_ERROR_INVALID_DIMENSIONS, kf_init(&kf_data, &config_with_selection));
+
+    static const size_t H_selection[1] = {0};
+    config_with_selection.H_selection = H_selection;
+    config_with_selection.H = NULL;
+    CHECK_EQUAL(KF_ERROR_INVALID_POINTER, kf_init(&kf_data, &config_with_selection));
+}
+
+static kf_config_S sparse_config(const kf_config_S* reference_config, const kf_sparse_matrix_S* F_sparse,
+                                 const kf_sparse_matrix_S* H_sparse, const kf_sparse_matrix_S* Q_sparse) {
+    kf_config_S config = *reference_config;
+    config.F = NULL;
+    config.H = NULL;
+    config.Q = NULL;
+    config.F_sparse = F_sparse;
+    config.H_sparse = H_sparse;
+    config.Q_sparse = Q_sparse;
+    // like a selection, a sparse H is never copied and P * H' is reused by the covariance update
+    config.H_temp_storage.size = 0;
+    config.H_temp_storage.data = NULL;
+    config.K_H_storage.size = 0;
+    config.K_H_storage.data = NULL;
+    config.K_H_P_storage.size = 0;
+    config.K_H_P_storage.data = NULL;
+    return config;
+}
+
+// F, H and Q of three_measurement_config in compressed sparse row format
+static const size_t three_F_row_offsets[4] = {0, 2, 4, 5};
+static const size_t three_F_col_indices[5] = {0, 1, 1, 2, 2};
+static const matrix_data_t three_F_values[5] = {1, 0.01F, 1, 0.01F, 1};
+static const kf_sparse_matrix_S three_F_sparse = {3, 3, three_F_row_offsets, three_F_col_indices, three_F_values};
+static const size_t three_H_row_offsets[4] = {0, 1, 2, 4};
+static const size_t three_H_col_indices[4] = {0, 1, 0, 2};
+static const matrix_data_t three_H_values[4] = {1, 1, 0.5F, 1};
+static const kf_sparse_matrix_S three_H_sparse = {3, 3, three_H_row_offsets, three_H_col_indices, three_H_values};
+static const size_t three_Q_row_offsets[4] = {0, 1, 2, 3};
+static const size_t three_Q_col_indices[3] = {0, 1, 2};
+static const matrix_data_t three_Q_values[3] = {0.1F, 0.1F, 0.1F};
+static const kf_sparse_matrix_S three_Q_sparse = {3, 3, three_Q_row_offsets, three_Q_col_indices, three_Q_values};
+
+// Test that predicting and updating with sparse F, H and Q matches the dense products
+TEST(kalman_update_test, kalman_update_sparse_matrices) {
+    kf_config_S config_with_sparse_matrices =
+        sparse_config(&three_measurement_config, &three_F_sparse, &three_H_sparse, &three_Q_sparse);
+    run_updates_and_compare(&three_measurement_config, &config_with_sparse_matrices);
+
+    bool measurement_validity[3] = {true, false, true};
+    run_updates_and_compare(&three_measurement_config, &config_with_sparse_matrices, measurement_validity);
+}
+
+// Test that the sparse kernels also work on a packed covariance
+TEST(kalman_update_test, kalman_update_sparse_matrices_packed_covariance) {
+    static matrix_data_t packed_P_storage[KF_PACKED_SIZE(3U)];
+    static matrix_data_t packed_scratch_storage[KF_PACKED_SIZE(3U)];
+
+    kf_config_S config_with_sparse_matrices =
+        sparse_config(&three_measurement_config, &three_F_sparse, &three_H_sparse, &three_Q_sparse);
+    config_with_sparse_matrices.packed_covariance = true;
+    config_with_sparse_matrices.P_matrix_storage.size = KF_PACKED_SIZE(3U);
+    config_with_sparse_matrices.P_matrix_storage.data = packed_P_storage;
+    config_with_sparse_matrices.K_H_P_storage.size = KF_PACKED_SIZE(3U);
+    config_with_sparse_matrices.K_H_P_storage.data = packed_scratch_storage;
+
+    run_updates_and_compare(&three_measurement_config, &config_with_sparse_matrices);
+
+    bool measurement_validity[3] = {false, true, true};
+    run_updates_and_compare(&three_measurement_config, &config_with_sparse_matrices, measurement_validity);
+}
+
+// Test that a sparse matrix is rejected if it is ambiguous or does not match the filter dimensions
+TEST(kalman_update_test, kalman_update_invalid_sparse_matrices) {
+    kf_data_S kf_data;
+    kf_config_S config = sparse_config(&three_measurement_config, &three_F_sparse, &three_H_sparse, &three_Q_sparse);
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&kf_data, &config));
+
+    // a sparse matrix replaces its dense counterpart
+    config.H = three_measurement_config.H;
+    CHECK_EQUAL(KF_ERROR_INVALID_POINTER, kf_init(&kf_data, &config));
+    config.H = NULL;
+
+    static const size_t out_of_range_col_indices[4] = {0, 1, 0, 3};
+    kf_sparse_matrix_S out_of_range_H = three_H_sparse;
+    out_of_range_H.col_indices = out_of_range_col_indices;
+    config.H_sparse = &out_of_range_H;
+    CHECK_EQUAL(KF_ERROR_INVALID_DIMENSIONS, kf_init(&kf_data, &config));
+
+    static const size_t decreasing_row_offsets[4] = {0, 2, 1, 4};
+    kf_sparse_matrix_S decreasing_H = three_H_sparse;
+    decreasing_H.row_offsets = decreasing_row_offsets;
+    config.H_sparse = &decreasing_H;
+    CHECK_EQUAL(KF_ERROR_INVALID_DIMENSIONS, kf_init(&kf_data, &config));
+    config.H_sparse = &three_H_sparse;
+
+    kf_sparse_matrix_S rectangular_F = three_F_sparse;
+    rectangular_F.cols = 2;
+    config.F_sparse = &rectangular_F;
+    CHECK_EQUAL(KF_ERROR_INVALID_DIMENSIONS, kf_init(&kf_data, &config));
+
+    kf_sparse_matrix_S F_without_values = three_F_sparse;
+    F_without_values.values = NULL;
+    config.F_sparse = &F_without_values;
+    CHECK_EQUAL(KF_ERROR_INVALID_POINTER, kf_init(&kf_data, &config));
+}
+
+static void run_predict_update_cycles(kf_data_S* kf_data, size_t num_cycles, const bool* measurement_validity) {
+    matrix_data_t Z_data[1] = {3};
+    matrix_t Z = {1, 1, Z_data};
+
+    for (size_t i = 0; i < num_cycles; i++) {
+        CHECK_EQUAL(KF_ERROR_NONE, kf_predict(kf_data, NULL));
+        CHECK_EQUAL(KF_ERROR_NONE, kf_update(kf_data, &Z, measurement_validity, 1U));
+    }
+}
+
+static kf_config_S steady_state_config(void) {
+    // the velocity of the default F is barely observable and its variance keeps growing, damp it so P converges. The
+    // default P_init is singular, start from a well conditioned one
+    static matrix_data_t F_data[4] = {1, 0.1F, 0, 0.9F};
+    static matrix_t F = {2, 2, F_data};
+    static matrix_data_t P_init_data[4] = {10, 1, 1, 8};
+    static matrix_t P_init = {2, 2, P_init_data};
+
+    kf_config_S config = default_simple_config;
+    config.F = &F;
+    config.P_init = &P_init;
+    config.steady_state_threshold = 0.0001F;
+    config.steady_state_updates = 5;
+    return config;
+}
+
+// Test that the gain is latched once the covariance has converged, after which P is frozen and x is still corrected
+TEST(kalman_update_test, kalman_update_steady_state_latch) {
+    kf_data_S kf_data;
+    kf_config_S config = steady_state_config();
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&kf_data, &config));
+
+    run_predict_update_cycles(&kf_data, 5, NULL);
+    CHECK_FALSE(kf_data.steady_state);
+
+    run_predict_update_cycles(&kf_data, 500, NULL);
+    CHECK_TRUE(kf_data.steady_state);
+
+    matrix_data_t P_data[4];
+    matrix_data_t K_data[2];
+    matrix_t P_latched = {2, 2, P_data};
+    matrix_t K_latched = {2, 1, K_data};
+    matrix_copy(&kf_data.P, &P_latched);
+    matrix_copy(&kf_data.K_temp, &K_latched);
+
+    // the latched update still applies x = x + K * y
+    const matrix_data_t x_before = kf_data.X.data[0];
+    matrix_data_t Z_data[1] = {x_before + 10};
+    matrix_t Z = {1, 1, Z_data};
+    CHECK_EQUAL(KF_ERROR_NONE, kf_update(&kf_data, &Z, NULL, 0U));
+    DOUBLES_EQUAL(x_before + 10 * K_data[0], kf_data.X.data[0], 0.0001);
+
+    CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, NULL));
+    verify_matrix_equal(&P_latched, &kf_data.P);
+    verify_matrix_equal(&K_latched, &kf_data.K_temp);
+}
+
+// Test that the steady state matches the covariance the full filter converges to
+TEST(kalman_update_test, kalman_update_steady_state_matches_full_filter) {
+    kf_data_S reference_kf_data;
+    kf_config_S reference_config = steady_state_config();
+    reference_config.steady_state_threshold = 0;
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&reference_kf_data, &reference_config));
+    run_predict_update_cycles(&reference_kf_data, 500, NULL);
+
+    matrix_data_t P_data[4];
+    matrix_t P_expected = {2, 2, P_data};
+    matrix_copy(&reference_kf_data.P, &P_expected);
+
+    kf_data_S kf_data;
+    kf_config_S config = steady_state_config();
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&kf_data, &config));
+    run_predict_update_cycles(&kf_data, 500, NULL);
+
+    // the covariance is latched while it still changes by up to the threshold
+    CHECK_TRUE(kf_data.steady_state);
+    for (size_t i = 0; i < 4; i++) {
+        DOUBLES_EQUAL(P_data[i], kf_data.P.data[i], 0.001 * P_data[i]);
+    }
+}
+
+// Test that full updates resume when the measurement validity changes
+TEST(kalman_update_test, kalman_update_steady_state_resumes_on_validity_change) {
+    kf_data_S kf_data;
+    kf_config_S config = steady_state_config();
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&kf_data, &config));
+
+    run_predict_update_cycles(&kf_data, 500, NULL);
+    CHECK_TRUE(kf_data.steady_state);
+
+    matrix_data_t P_data[4];
+    matrix_t P_latched = {2, 2, P_data};
+    matrix_copy(&kf_data.P, &P_latched);
+
+    // without the measurement the covariance grows again
+    bool measurement_validity[1] = {false};
+    run_predict_update_cycles(&kf_data, 1, measurement_validity);
+    CHECK_FALSE(kf_data.steady_state);
+    CHECK_EQUAL(0, kf_data.steady_state_streak);
+
+    CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, NULL));
+    CHECK_TRUE(kf_data.P.data[0] > P_latched.data[0]);
+}
+
+static void run_validity_change(const kf_config_S* config, matrix_data_t* P_after_change, matrix_data_t* X_resumed) {
+    kf_data_S kf_data;
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&kf_data, config));
+
+    // the measurement drops out at step 120, after two predicts, and comes back with a new value. Before that both
+    // filters settle on the same constant measurement, the latched gain only differs within the threshold
+    for (size_t step = 0; step <= 130U; step++) {
+        bool measurement_validity[1] = {(step < 120U) || (step >= 125U)};
+        matrix_data_t Z_data[1] = {(step < 120U) ? 3.0F : 5.0F};
+        matrix_t Z = {1, 1, Z_data};
+
+        for (size_t predict = 0; predict < ((step == 120U) ? 2U : 1U); predict++) {
+            CHECK_EQUAL(KF_ERROR_NONE, kf_predict(&kf_data, NULL));
+        }
+        CHECK_EQUAL(KF_ERROR_NONE, kf_update(&kf_data, &Z, measurement_validity, 1U));
+
+        if (step == 120U) {
+            memcpy(P_after_change, kf_data.P.data, 4U * sizeof(matrix_data_t));
+        }
+        if ((config->steady_state_threshold > 0) && ((step == 119U) || (step == 120U))) {
+            CHECK_EQUAL(step == 119U, kf_data.steady_state);
+        }
+        if (step == 130U) {
+            memcpy(X_resumed, kf_data.X.data, 2U * sizeof(matrix_data_t));
+        }
+    }
+}
+
+// Test that a filter unlatched by a validity change follows the full filter, from the propagated covariance
+TEST(kalman_update_test, kalman_update_steady_state_unlatch_matches_full_filter) {
+    // both configs share their storage, so the filters run one after the other
+    kf_config_S reference_config = steady_state_config();
+    reference_config.steady_state_threshold = 0;
+    matrix_data_t P_expected[4];
+    matrix_data_t X_expected[2];
+    run_validity_change(&reference_config, P_expected, X_expected);
+
+    kf_config_S config = steady_state_config();
+    matrix_data_t P_actual[4];
+    matrix_data_t X_actual[2];
+    run_validity_change(&config, P_actual, X_actual);
+
+    for (size_t i = 0; i < 4; i++) {
+        DOUBLES_EQUAL(P_expected[i], P_actual[i], 0.001 * fabs(P_expected[i]));
+    }
+    // the full updates after the measurement comes back start from the same covariance
+    for (size_t i = 0; i < 2; i++) {
+        DOUBLES_EQUAL(X_expected[i], X_actual[i], 0.001);
+    }
+}
+
+// Test that steady-state detection is off unless a threshold is configured
+TEST(kalman_update_test, kalman_update_steady_state_disabled) {
+    kf_data_S kf_data;
+    kf_config_S config = steady_state_config();
+    config.steady_state_threshold = 0;
+    CHECK_EQUAL(KF_ERROR_NONE, kf_init(&kf_data, &config));
+
+    run_predict_update_cycles(&kf_data, 500, NULL);
+    CHECK_FALSE(kf_data.steady_state);
+}
@@ -0,0 +1,200 @@
+import os
+import re
+
+INCLUDE_PATTERN = re.compile(r'^\s*#\s*include\s+"([^"]+)"')
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+MACRO_PATTERN = re.compile(r"^[A-Z_][A-Z0-9_]*$")
+EXTERN_C_PATTERN = re.compile(r'extern\s*"C"\s*$')
+
+# declarations starting with one of these already have internal linkage or do not define a symbol
+NON_EXTERNAL_KEYWORDS = {
+    "static",
+    "inline",
+    "typedef",
+    "struct",
+    "enum",
+    "union",
+    "extern",
+}
+
+
+class AmalgamationException(Exception):
+    pass
+
+
+def resolve_include(name, include_dirs):
+    """
+    Path of a quoted include in the include directories, or None if it is not part of them.
+    """
+    for include_dir in include_dirs:
+        path = os.path.join(include_dir, name)
+        if os.path.isfile(path):
+            return os.path.abspath(path)
+    return None
+
+
+def reachable_includes(header_path, include_dirs):
+    """
+    Paths of the header and of every local header it includes, directly or not.
+    """
+    reachable = set()
+    pending = [os.path.abspath(header_path)]
+    while pending:
+        path = pending.pop()
+        if path in reachable:
+            continue
+        reachable.add(path)
+        with open(path) as f:
+            for line in f:
+                match = INCLUDE_PATTERN.match(line)
+                if match:
+                    included_path = resolve_include(match.group(1), include_dirs)
+                    if included_path is not None:
+                        pending.append(included_path)
+    return reachable
+
+
+def _top_level_declarations(source):
+    """
+    Start offsets of the file-scope declarations and function definitions of C source, skipping the
+    preprocessor lines, comments and literals.
+    """
+    starts = []
+    depth = 0
+    linkage_blocks = 0
+    statement_start = None
+    previous_significant = ""
+    i = 0
+    at_line_start = True
+    while i < len(source):
+        char = source[i]
+
+        if at_line_start and char in " \t":
+            i += 1
+            continue
+        if at_line_start and char == "#":
+            # preprocessor line, including its backslash continuations
+            while i < len(source) and source[i] != "\n":
+                if source[i] == "\\" and i + 1 < len(source) and source[i + 1] == "\n":
+                    i += 1
+                i += 1
+            continue
+        at_line_start = char == "\n"
+
+        if source.startswith("//", i):
+            end = source.find("\n", i)
+            i = len(source) if end == -1 else end
+            continue
+        if source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            if end == -1:
+                raise AmalgamationException("Unterminated comment")
+            i = end + 2
+            continue
+        if char in "\"'":
+            i += 1
+            while i < len(source) and source[i] != char:
+                i += 2 if source[i] == "\\" else 1
+            i += 1
+            previous_significant = char
+            continue
+        if char.isspace():
+            i += 1
+            continue
+
+        if depth == 0 and statement_start is None:
+            statement_start = i
+            starts.append(i)
+
+        if (
+            char == "{"
+            and depth == 0
+            and EXTERN_C_PATTERN.match(source, statement_start, i)
+        ):
+            # the declarations of an extern "C" block are still at file scope
+            linkage_blocks += 1
+            statement_start = None
+        elif char == "}" and depth == 0 and linkage_blocks > 0:
+            linkage_blocks -= 1
+            statement_start = None
+        elif char == "{":
+            # the body of a function definition ends the declaration with its closing brace
+            if depth == 0 and previous_significant == ")":
+                statement_start = -1
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth < 0:
+                raise AmalgamationException("Unbalanced braces")
+            if depth == 0 and statement_start == -1:
+                statement_start = None
+        elif char == ";" and depth == 0:
+            statement_start = None
+
+        previous_significant = char
+        i += 1
+
+    if depth != 0:
+        raise AmalgamationException("Unbalanced braces")
+    return starts
+
+
+def make_internal_linkage(source):
+    """
+    Give every file-scope function and variable of C source internal linkage: functions become
+    static inline and variables static. Declarations that are already static or inline, type
+    definitions, extern declarations and declarations starting with a macro are left alone.
+    """
+    offset = 0
+    output = []
+    for start in _top_level_declarations(source):
+        match = IDENTIFIER_PATTERN.match(source, start)
+        if match is None:
+            continue
+        first_word = match.group(0)
+        if first_word in NON_EXTERNAL_KEYWORDS or MACRO_PATTERN.match(first_word):
+            continue
+
+        # a function declarator has its parameter list before any initializer, array size or body
+        declarator = re.search(r"[(=\[;{]", source[start:])
+        is_function = declarator is not None and declarator.group(0) == "("
+
+        output.append(source[offset:start])
+        output.append("static inline " if is_function else "static ")
+        offset = start
+    output.append(source[offset:])
+    return "".join(output)
+
+
+def amalgamate(source_paths, include_dirs, kept_headers):
+    """
+    Concatenate the C sources, inlining every local header of the include directories the first
+    time it is included. The kept headers stay as includes. Functions and variables get internal
+    linkage, so the result can be compiled into the translation unit of a single filter.
+    """
+    kept_headers = {os.path.abspath(path) for path in kept_headers}
+    inlined = set()
+
+    def expand(path):
+        lines = []
+        with open(path) as f:
+            for line in f:
+                match = INCLUDE_PATTERN.match(line)
+                included_path = (
+                    resolve_include(match.group(1), include_dirs) if match else None
+                )
+                if included_path is None or included_path in kept_headers:
+                    lines.append(line)
+                elif included_path not in inlined:
+                    inlined.add(included_path)
+                    lines.append(expand(included_path))
+        text = "".join(lines)
+        return text if text.endswith("\n") else text + "\n"
+
+    sections = []
+    for path in source_paths:
+        path = os.path.abspath(path)
+        inlined.add(path)
+        sections.append(f"/* {os.path.basename(path)} */\n" + expand(path))
+
+    return make_internal_linkage("\n".join(sections))
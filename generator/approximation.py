@@ -0,0 +1,247 @@
+import numpy as np
+
+try:
+    from generator.ingestor import KalmanFilterConfig, InvalidConfigException
+    from generator.tuning import simulate_truth, run_batch_filter
+except ImportError:
+    from ingestor import KalmanFilterConfig, InvalidConfigException
+    from tuning import simulate_truth, run_batch_filter
+
+
+def covariance_block_mask(covariance_blocks):
+    """
+    Boolean mask of the elements of a block-diagonal covariance kept by the approximate filter.
+    """
+    num_states = sum(covariance_blocks)
+    mask = np.zeros((num_states, num_states), dtype=bool)
+    first = 0
+    for size in covariance_blocks:
+        mask[first : first + size, first : first + size] = True
+        first += size
+    return mask
+
+
+def block_prediction_multiply_adds(F, covariance_blocks):
+    """
+    Multiply-adds of the block-diagonal covariance prediction F * P * F' of the library. Every pair of blocks whose
+    block of F is nonzero costs the product of the block of F with the source block of P, and the lower triangle of
+    its product with the block of F transposed. The Jacobian of an extended Kalman filter (F is None) is dense.
+    """
+    multiply_adds = 0
+    b_first = 0
+    for b_size in covariance_blocks:
+        c_first = 0
+        for c_size in covariance_blocks:
+            F_bc = (
+                None
+                if F is None
+                else F[b_first : b_first + b_size, c_first : c_first + c_size]
+            )
+            if (F_bc is None) or np.any(F_bc):
+                multiply_adds += b_size * c_size * c_size
+                multiply_adds += (b_size * (b_size + 1) // 2) * c_size
+            c_first += c_size
+        b_first += b_size
+    return multiply_adds
+
+
+def format_block_covariance_report(name, F, covariance_blocks):
+    """
+    One line summary of the storage and of the multiply-adds of the covariance prediction the blocks save.
+    """
+    num_states = sum(covariance_blocks)
+    if all(size == 1 for size in covariance_blocks):
+        layout = "a diagonal covariance"
+    elif len(covariance_blocks) == 1:
+        layout = f"a single covariance block of {num_states} states"
+    else:
+        sizes = [str(size) for size in covariance_blocks]
+        layout = f"{len(sizes)} covariance blocks of {', '.join(sizes[:-1])} and {sizes[-1]} states"
+    return (
+        f"{name}: approximate filter with {layout}, the covariance prediction takes "
+        f"{block_prediction_multiply_adds(F, covariance_blocks)} multiply-adds instead of {2 * num_states**3}, "
+        f"and P holds {sum(size * size for size in covariance_blocks)} elements instead of {num_states * num_states}"
+    )
+
+
+def compare_block_covariance(
+    config: KalmanFilterConfig,
+    covariance_blocks=None,
+    num_seeds=20,
+    num_steps=200,
+    seed=0,
+):
+    """
+    Offline accuracy of the approximate block-diagonal filter against the full filter of the same config.
+
+    Both filters run on the same simulated truth trajectories and measurements, see simulate_truth, and are scored
+    on the steps after a burn-in of a tenth of the run. The blocks default to the covariance_blocks of the config.
+
+    Returns a dict with the per-state RMSE and the average NEES and NIS of the "full" and "approximate" filters, and
+    the multiply-adds of both covariance predictions.
+    """
+    if covariance_blocks is None:
+        covariance_blocks = config.covariance_blocks
+    if covariance_blocks is None:
+        raise InvalidConfigException(
+            "The config has no covariance_blocks to compare with the full filter"
+        )
+    if sum(covariance_blocks) != config.num_states:
+        raise InvalidConfigException(
+            f"Expected covariance_blocks to sum to {config.num_states} states, but got {sum(covariance_blocks)}"
+        )
+    if config.model is not None:
+        raise InvalidConfigException(
+            "The comparison is only supported for linear filters, not f or h models"
+        )
+    if num_steps < 2:
+        raise ValueError("At least two steps are required")
+
+    seeds = [seed + 1 + i for i in range(num_seeds)]
+    x_true, z = simulate_truth(config, num_steps, seeds)
+    burn_in = num_steps // 10
+
+    model = {
+        key: getattr(config, key).astype(np.float64)
+        for key in ["F", "H", "Q", "R", "P_init", "X_init"]
+    }
+    # the untouched Q and R, as the single candidate of the batch
+    q_scales = np.ones((1, config.num_states))
+    r_scales = np.ones((1, config.num_measurements))
+
+    results = {}
+    for label, mask in [
+        ("full", None),
+        ("approximate", covariance_block_mask(covariance_blocks)),
+    ]:
+        mean_squared_error, average_nees, average_nis = run_batch_filter(
+            model, q_scales, r_scales, x_true, z, burn_in, covariance_mask=mask
+        )
+        results[label] = {
+            "rmse": np.sqrt(mean_squared_error[0]),
+            "nees": float(average_nees[0]),
+            "nis": float(average_nis[0]),
+        }
+
+    results["covariance_blocks"] = list(covariance_blocks)
+    results["multiply_adds"] = {
+        "full": 2 * config.num_states**3,
+        "approximate": block_prediction_multiply_adds(
+            config.F.astype(np.float64), covariance_blocks
+        ),
+    }
+    return results
+
+
+def format_comparison_report(name, comparison):
+    """
+    Lines of a table of the per-state RMSE of both filters, followed by their consistency and cost.
+    """
+    full = comparison["full"]
+    approximate = comparison["approximate"]
+    num_states = len(full["rmse"])
+    lines = [
+        f"{name}: full filter against covariance blocks {comparison['covariance_blocks']}",
+        f"{'state':>5} {'full RMSE':>12} {'approx RMSE':>12} {'ratio':>8}",
+    ]
+    for state in range(num_states):
+        ratio = approximate["rmse"][state] / max(
+            full["rmse"][state], np.finfo(np.float64).tiny
+        )
+        lines.append(
+            f"{state:>5} {full['rmse'][state]:>12.4g} {approximate['rmse'][state]:>12.4g} {ratio:>7.2f}x"
+        )
+    lines.append(
+        f"ANEES {full['nees']:.3f} full, {approximate['nees']:.3f} approximate (expected {num_states}), "
+        f"ANIS {full['nis']:.3f} full, {approximate['nis']:.3f} approximate"
+    )
+    lines.append(
+        f"covariance prediction: {comparison['multiply_adds']['approximate']} multiply-adds instead of "
+        f"{comparison['multiply_adds']['full']}"
+    )
+    return lines
+
+
+def decimated_model(F, Q, decimation):
+    """
+    F^k and the process noise accumulated over k steps, the sum of F^i * Q * F^i' for i below k, which propagate
+    the covariance over k predicts at once.
+    """
+    F = F.astype(np.float64)
+    F_power = np.eye(F.shape[0])
+    Q_accumulated = np.zeros(F.shape)
+    for _ in range(decimation):
+        Q_accumulated = F @ Q_accumulated @ F.T + Q
+        F_power = F @ F_power
+    return F_power, Q_accumulated
+
+
+def decimation_error_bound(
+    config: KalmanFilterConfig, decimation, update_interval=1, max_periods=1000
+):
+    """
+    Largest relative difference, in the Frobenius norm, between the covariance of a decimated filter and the one of
+    the same filter without decimation, after every predict and update once both have converged.
+
+    Both filters start from P_init, predict every tick and update every measurement after every update_interval-th
+    predict, every predict by default like a loop that updates every tick. The decimated filter updates the covariance
+    it holds between two propagations by F^k and the accumulated Q, so the propagations also apply F^k to the updates
+    of the skipped ticks. The recursion runs by periods of lcm(k, update_interval) predicts until both covariances
+    have converged, or for max_periods periods, and the bound is taken over the following period.
+    """
+    F = config.F.astype(np.float64)
+    Q = config.Q.astype(np.float64)
+    H = config.H.astype(np.float64)
+    R = config.R.astype(np.float64)
+    F_decimated, Q_decimated = decimated_model(F, Q, decimation)
+    period = int(np.lcm(decimation, update_interval))
+
+    def update(P):
+        S = H @ P @ H.T + R
+        P = P - P @ H.T @ np.linalg.solve(S, H @ P)
+        return 0.5 * (P + P.T)
+
+    def relative_difference(P, P_exact):
+        return np.linalg.norm(P - P_exact) / max(
+            np.linalg.norm(P_exact), np.finfo(np.float64).tiny
+        )
+
+    def run_period(P, P_exact):
+        differences = []
+        for tick in range(1, period + 1):
+            P_exact = F @ P_exact @ F.T + Q
+            if tick % decimation == 0:
+                P = F_decimated @ P @ F_decimated.T + Q_decimated
+            differences.append(relative_difference(P, P_exact))
+            if tick % update_interval == 0:
+                P = update(P)
+                P_exact = update(P_exact)
+                differences.append(relative_difference(P, P_exact))
+        return P, P_exact, differences
+
+    P = P_exact = config.P_init.astype(np.float64)
+    for _ in range(max_periods):
+        P_next, P_exact_next, _ = run_period(P, P_exact)
+        converged = (
+            relative_difference(P_next, P) <= 1e-9
+            and relative_difference(P_exact_next, P_exact) <= 1e-9
+        )
+        P, P_exact = P_next, P_exact_next
+        if converged:
+            break
+
+    return max(run_period(P, P_exact)[2])
+
+
+def format_decimation_report(name, num_states, decimation, error_bound):
+    """
+    One line summary of the decimation, the covariance prediction it saves and its error bound with an update after
+    every predict.
+    """
+    full = 2 * num_states**3
+    return (
+        f"{name}: covariance propagated every {decimation} predicts with F^{decimation} and the accumulated Q, "
+        f"its prediction averages {full / decimation:.0f} multiply-adds per predict instead of {full}, "
+        f"and once converged, with an update after every predict, the covariance differs from the one of the "
+        f"undecimated filter by at most {100.0 * error_bound:.3g}%"
+    )
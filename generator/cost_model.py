@@ -0,0 +1,46 @@
+def covariance_update_plans(num_states, num_measurements):
+    """
+    Evaluation orders of the covariance update P = P - K * H * P supported by the library, with their
+    multiply-add counts and the n * n scratch elements they need.
+
+    K * (P * H')' reuses P * H' from the gain (H * P = (P * H')' as P is symmetric), and only computes the
+    lower triangle of the symmetric result. K * (H * P) would cost an extra n^2 * m, so it is never cheaper.
+    """
+    n = num_states
+    m = num_measurements
+    return [
+        {
+            "enum": "KF_COVARIANCE_UPDATE_K_H_P",
+            "expression": "(K * H) * P",
+            "multiply_adds": n * m * n + n * n * n,
+            "scratch": 2 * n * n,
+        },
+        {
+            "enum": "KF_COVARIANCE_UPDATE_K_P_HT",
+            "expression": "K * (P * H')'",
+            "multiply_adds": (n * (n + 1) // 2) * m,
+            "scratch": 0,
+        },
+    ]
+
+
+def choose_covariance_update(num_states, num_measurements):
+    """
+    Cheapest covariance update plan for the dimensions, and the (K * H) * P baseline it is compared to.
+    """
+    plans = covariance_update_plans(num_states, num_measurements)
+    best = min(plans, key=lambda plan: (plan["multiply_adds"], plan["scratch"]))
+    return best, plans[0]
+
+
+def format_covariance_update_report(name, plan, baseline):
+    """
+    One line summary of the multiply-adds and scratch saved by the chosen plan.
+    """
+    saved = baseline["multiply_adds"] - plan["multiply_adds"]
+    percent = 100.0 * saved / baseline["multiply_adds"]
+    return (
+        f"{name}: covariance update {plan['expression']} takes {plan['multiply_adds']} multiply-adds "
+        f"instead of {baseline['multiply_adds']} for {baseline['expression']} ({percent:.0f}% fewer), "
+        f"and {baseline['scratch'] - plan['scratch']} fewer scratch elements"
+    )
@@ -0,0 +1,119 @@
+import numpy as np
+
+
+def _find_root(parents, node):
+    while parents[node] != node:
+        parents[node] = parents[parents[node]]
+        node = parents[node]
+    return node
+
+
+def find_blocks(F, B, Q, H, R, P_init):
+    """
+    Independent blocks of a linear filter: the connected components of the graph of states and measurements, with an
+    edge for every nonzero of F, Q, P_init (state to state), H (measurement to state) and R (measurement to
+    measurement). A control input shared by several blocks does not couple them.
+
+    A component without a state or without a measurement cannot run as a filter on its own, so it is merged into the
+    first complete one, or the whole filter is a single block if there is none. Returns a list of dicts of the sorted
+    state, measurement and control indices of each block, ordered by their first state.
+    """
+    num_states = F.shape[0]
+    num_measurements = H.shape[0]
+    parents = list(range(num_states + num_measurements))
+
+    def union(a, b):
+        root_a = _find_root(parents, a)
+        root_b = _find_root(parents, b)
+        if root_a != root_b:
+            parents[max(root_a, root_b)] = min(root_a, root_b)
+
+    for matrix in [F, Q, P_init]:
+        for row, col in zip(*np.nonzero(matrix)):
+            union(int(row), int(col))
+    for row, col in zip(*np.nonzero(H)):
+        union(num_states + int(row), int(col))
+    for row, col in zip(*np.nonzero(R)):
+        union(num_states + int(row), num_states + int(col))
+
+    components = {}
+    for node in range(num_states + num_measurements):
+        components.setdefault(_find_root(parents, node), []).append(node)
+
+    complete = []
+    incomplete = []
+    for nodes in components.values():
+        states = [node for node in nodes if node < num_states]
+        measurements = [node - num_states for node in nodes if node >= num_states]
+        if states and measurements:
+            complete.append({"states": states, "measurements": measurements})
+        else:
+            incomplete.append({"states": states, "measurements": measurements})
+
+    if not complete:
+        return [
+            {
+                "states": list(range(num_states)),
+                "measurements": list(range(num_measurements)),
+                "controls": list(range(0 if B is None else B.shape[1])),
+            }
+        ]
+
+    complete.sort(key=lambda block: block["states"][0])
+    for block in incomplete:
+        complete[0]["states"] = sorted(complete[0]["states"] + block["states"])
+        complete[0]["measurements"] = sorted(
+            complete[0]["measurements"] + block["measurements"]
+        )
+
+    for block in complete:
+        # the control inputs that act on the states of the block
+        block["controls"] = (
+            []
+            if B is None
+            else [
+                int(col)
+                for col in np.flatnonzero(np.any(B[block["states"]] != 0, axis=0))
+            ]
+        )
+    return complete
+
+
+def block_raw_config(raw_config, config, block, name):
+    """
+    Raw JSON config of the sub-filter of a block, with the rows and columns of the model matrices of its states,
+    measurements and controls. The optional settings of the filter are kept.
+    """
+    states = block["states"]
+    measurements = block["measurements"]
+
+    block_config = {
+        key: value
+        for key, value in raw_config.items()
+        if key not in ["name", "F", "B", "Q", "H", "R", "P_init", "X_init"]
+    }
+    block_config["name"] = name
+    block_config["decompose"] = False
+    block_config["F"] = config.F[np.ix_(states, states)].tolist()
+    block_config["Q"] = config.Q[np.ix_(states, states)].tolist()
+    block_config["P_init"] = config.P_init[np.ix_(states, states)].tolist()
+    block_config["X_init"] = config.X_init[states, 0].tolist()
+    block_config["H"] = config.H[np.ix_(measurements, states)].tolist()
+    block_config["R"] = config.R[np.ix_(measurements, measurements)].tolist()
+    if block["controls"]:
+        block_config["B"] = config.B[np.ix_(states, block["controls"])].tolist()
+    return block_config
+
+
+def format_decomposition_report(name, blocks):
+    """
+    One line summary of the sub-filters and of the multiply-adds of the covariance prediction F * P * F' they save.
+    """
+    sizes = [len(block["states"]) for block in blocks]
+    num_states = sum(sizes)
+    size_list = ", ".join(str(size) for size in sizes[:-1]) + f" and {sizes[-1]}"
+    return (
+        f"{name}: split into {len(blocks)} independent sub-filters of {size_list} states, "
+        f"the covariance prediction takes {sum(2 * size**3 for size in sizes)} multiply-adds "
+        f"instead of {2 * num_states**3}"
+    )
@@ -1,19 +1,183 @@
+import functools
+
 import numpy as np
 
 try:
     from generator.ingestor import KalmanFilterConfig
+    from generator.cost_model import (
+        choose_covariance_update,
+        format_covariance_update_report,
+    )
+    from generator.decomposition import block_raw_config, format_decomposition_report
+    from generator.imm import first_equal_models, format_imm_report, model_raw_config
+    from generator.approximation import (
+        decimation_error_bound,
+        format_block_covariance_report,
+        format_decimation_report,
+    )
 except ImportError:
     from ingestor import KalmanFilterConfig
+    from cost_model import choose_covariance_update, format_covariance_update_report
+    from decomposition import block_raw_config, format_decomposition_report
+    from imm import first_equal_models, format_imm_report, model_raw_config
+    from approximation import (
+        decimation_error_bound,
+        format_block_covariance_report,
+        format_decimation_report,
+    )
+
+
+# the formats of the last row lengths, a packed covariance has rows of every length
+FORMAT_CACHE_SIZE = 8
+
+
+@functools.lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _values_format(count):
+    return ", ".join(["%.6fF"] * count)
+
+
+def format_values(values) -> str:
+    """
+    Comma separated C float literals of the values, 6 decimal places. The whole list is formatted by one
+    printf-style format, so large matrices are not formatted element by element in Python.
+    """
+    values = np.asarray(values, dtype=np.float64).ravel()
+    return _values_format(len(values)) % tuple(values.tolist())
+
+
+@functools.lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _indices_format(count):
+    return ", ".join(["%dU"] * count)
+
+
+def format_indices(indices) -> str:
+    """Comma separated C unsigned literals of the indices, formatted like format_values."""
+    indices = np.asarray(indices, dtype=np.int64).ravel()
+    return _indices_format(len(indices)) % tuple(indices.tolist())
+
+
+class Initializer:
+    """
+    Braced C initializer of the rows of a matrix. The rows are only formatted while the initializer is iterated,
+    one chunk per row, so the initializer of a large matrix is never held as one string.
+
+    The rows are a matrix, iterated row by row, or a function returning an iterator over the rows.
+    """
+
+    def __init__(
+        self,
+        rows,
+        format_row=format_values,
+        separator=",\n    ",
+        braces=("{\n    ", "\n}"),
+    ):
+        # the rows are taken one at a time on every iteration, neither they nor their views are kept
+        self.rows = rows
+        self.format_row = format_row
+        self.separator = separator
+        self.braces = braces
+
+    def __iter__(self):
+        yield self.braces[0]
+        rows = self.rows() if callable(self.rows) else self.rows
+        for index, row in enumerate(rows):
+            if index > 0:
+                yield self.separator
+            yield self.format_row(row)
+        yield self.braces[1]
+
+    def __str__(self):
+        return "".join(self)
+
+
+def packed_rows(matrix):
+    """The rows of the lower triangle of a square matrix."""
+    for i in range(matrix.shape[0]):
+        yield matrix[i, : i + 1]
+
+
+def block_rows(matrix, sizes):
+    """The rows of the diagonal blocks of the given sizes, one block after the other."""
+    first = 0
+    for size in sizes:
+        yield from matrix[first : first + size, first : first + size]
+        first += size
+
+
+def nonempty_row_slices(values, row_offsets):
+    """The values of every row of a compressed sparse row matrix, skipping the empty rows."""
+    for start, end in zip(row_offsets[:-1], row_offsets[1:]):
+        if end > start:
+            yield values[start:end]
+
+
+class Definition:
+    """
+    A C definition made of strings and initializers. FileWriter writes it chunk by chunk, str() renders all of it.
+    """
+
+    def __init__(self, *parts):
+        self.parts = parts
+
+    def __iter__(self):
+        for part in self.parts:
+            if isinstance(part, str):
+                yield part
+            else:
+                yield from part
+
+    def __str__(self):
+        return "".join(self)
+
+
+def write_definitions(output_file, definitions, separator="\n"):
+    """Write the definitions to an open file, the initializers of a Definition one row at a time."""
+    for index, definition in enumerate(definitions):
+        if index > 0:
+            output_file.write(separator)
+        if isinstance(definition, str):
+            output_file.write(definition)
+        else:
+            for chunk in definition:
+                output_file.write(chunk)
+
+
+def format_rows(rows) -> str:
+    """Braced initializer of the rows, one row per line."""
+    return str(Initializer(rows))
 
 
 class KalmanFilterConfigGenerator:
-    def __init__(self, config: KalmanFilterConfig):
+    def __init__(self, config: KalmanFilterConfig, shared_symbols: dict = None):
         self.config = config
+        # the C symbols of the matrices and storage defined by an interacting multiple model bank for all its models
+        self.shared_symbols = shared_symbols if shared_symbols is not None else {}
         self.filter_name = config.raw_config["name"]
         filter_name_uppercase = self.filter_name.upper()
 
         self.generated_structure_names = self.generate_structure_names()
 
+        # the cheapest evaluation order of the covariance update for the filter dimensions
+        (
+            self.covariance_update_plan,
+            covariance_update_baseline,
+        ) = choose_covariance_update(config.num_states, config.num_measurements)
+        self.covariance_update_report = format_covariance_update_report(
+            self.filter_name, self.covariance_update_plan, covariance_update_baseline
+        )
+        if config.covariance_blocks is not None:
+            # the blocks have a covariance update of their own
+            self.covariance_update_report = format_block_covariance_report(
+                self.filter_name, config.F, config.covariance_blocks
+            )
+        if config.covariance_decimation > 1:
+            self.covariance_update_report += "\n" + format_decimation_report(
+                self.filter_name,
+                config.num_states,
+                config.covariance_decimation,
+                decimation_error_bound(config, config.covariance_decimation),
+            )
+
         self.error_enum = "kf_error_E"
         self.preprocessor_define_expressions = (
             self.generate_preprocessor_define_expressions(filter_name_uppercase)
@@ -24,22 +188,59 @@ class KalmanFilterConfigGenerator:
 
         self.generated_preprocessor_defines = self.generate_preprocessor_defines()
 
-        matrices = self.build_matrix_list()
-        self.generated_filter_static_data_struct = (
-            self.generate_static_filter_data_struct()
-        )
+        # decoupled groups of states run as sub-filters, each generated like a filter of its own
+        self.block_generators = self.generate_block_generators()
 
-        self.generated_config_definitions = self.add_matrix_definitions(matrices)
-        storage_variables = self.build_storage_variables_list()
+        # the models of an interacting multiple model bank, each generated like a filter sharing the rest of the bank
+        self.imm_generators = self.generate_imm_generators()
 
-        self.generated_storage_definitions = self.add_storage_definitions(
-            filter_name_uppercase, storage_variables
-        )
-        self.generated_struct_config_definition = (
-            self.generate_struct_config_definition(
-                filter_name_uppercase, storage_variables
+        if self.block_generators:
+            self.generate_block_definitions(filter_name_uppercase)
+        elif self.imm_generators:
+            self.generate_imm_definitions(filter_name_uppercase)
+        else:
+            matrices = self.build_matrix_list()
+
+            self.generated_config_definitions = self.add_matrix_definitions(
+                [matrix for matrix in matrices if matrix[0] not in self.shared_symbols]
+            )
+            if "H_selection" not in self.shared_symbols:
+                self.generated_config_definitions.extend(
+                    self.generate_selection_definition()
+                )
+            self.generated_config_definitions.extend(
+                self.generate_covariance_blocks_definition()
+            )
+            self.generated_config_definitions.extend(self.generate_sparse_definitions())
+            self.generated_model_function_definitions = (
+                self.generate_model_function_definitions()
+            )
+            storage_variables = self.build_storage_variables_list()
+
+            self.generated_storage_definitions = self.add_storage_definitions(
+                filter_name_uppercase,
+                [
+                    variable
+                    for variable in storage_variables
+                    if variable[0] not in self.shared_symbols
+                ],
+            )
+            self.generated_struct_config_definition = (
+                self.generate_struct_config_definition(
+                    filter_name_uppercase, storage_variables
+                )
+            )
+            self.generated_static_assertions = self.generate_static_assertions(
+                filter_name_uppercase, matrices, storage_variables
+            )
+            self.generated_filter_static_data_struct = (
+                self.generate_static_filter_data_struct(
+                    filter_name_uppercase, storage_variables
+                )
             )
-        )
+
+        # the dimensions an amalgamated build compiles the library for
+        self.library_dimensions = self.generate_library_dimensions()
 
         self.generated_function_headers = self.generate_function_headers()
         self.generated_structure_definitions = self.generate_structure_definitions()
@@ -59,14 +260,378 @@ class KalmanFilterConfigGenerator:
             "num_controls": f"{self.config.num_controls}U",
         }
 
-    def generate_static_filter_data_struct(self):
-        return f"static kf_data_S {self.generated_structure_names['filter_data']};"
+    def generate_block_generators(self):
+        if self.config.blocks is None:
+            return []
+        return [
+            KalmanFilterConfigGenerator(
+                KalmanFilterConfig(
+                    block_raw_config(
+                        self.config.raw_config,
+                        self.config,
+                        block,
+                        f"{self.filter_name}_block{index}",
+                    )
+                )
+            )
+            for index, block in enumerate(self.config.blocks)
+        ]
+
+    def generate_block_definitions(self, name):
+        blocks = self.block_generators
+        self.covariance_update_report = "\n".join(
+            [format_decomposition_report(self.filter_name, self.config.blocks)]
+            + [block.covariance_update_report for block in blocks]
+        )
+
+        # the definitions of the sub-filters, their dimensions are part of the header
+        self.generated_preprocessor_defines.append(
+            f"#define {name}_NUM_BLOCKS ({len(blocks)}U)"
+        )
+        self.generated_config_definitions = []
+        self.generated_model_function_definitions = []
+        self.generated_storage_definitions = []
+        self.generated_struct_config_definition = []
+        self.generated_static_assertions = []
+        for block in blocks:
+            self.generated_preprocessor_defines.extend(
+                block.generated_preprocessor_defines
+            )
+            self.generated_config_definitions.extend(block.generated_config_definitions)
+            self.generated_storage_definitions.extend(
+                block.generated_storage_definitions
+            )
+            if self.generated_struct_config_definition:
+                self.generated_struct_config_definition.append("")
+            self.generated_struct_config_definition.extend(
+                block.generated_struct_config_definition
+            )
+            self.generated_static_assertions.extend(block.generated_static_assertions)
+
+        self.generated_filter_static_data_struct = "\n".join(
+            [block.generated_filter_static_data_struct for block in blocks]
+            + self.generate_block_tables(name)
+        )
+
+    def generate_block_tables(self, name):
+        num_states = self.preprocessor_define_expressions["num_states"]
+        state_blocks = [0] * self.config.num_states
+        state_indices = [0] * self.config.num_states
+        for block_index, block in enumerate(self.config.blocks):
+            for index, state in enumerate(block["states"]):
+                state_blocks[state] = block_index
+                state_indices[state] = index
+
+        block_data = ", ".join(
+            f"&{block.generated_structure_names['filter_data']}"
+            for block in self.block_generators
+        )
+        return [
+            "// the sub-filter of every state, and its index in the state of the sub-filter",
+            f"static const size_t {name}_state_blocks[{num_states}] = {{{', '.join(f'{block}U' for block in state_blocks)}}};",
+            f"static const size_t {name}_state_indices[{num_states}] = {{{', '.join(f'{index}U' for index in state_indices)}}};",
+            f"static kf_data_S * const {name}_block_data[{name}_NUM_BLOCKS] = {{{block_data}}};",
+        ]
+
+    def generate_imm_generators(self):
+        if self.config.models is None:
+            return []
+
+        name = self.filter_name.upper()
+        # every model has its own X and P, the constant matrices and the scratch storage of an update are shared
+        shared_symbols = {
+            key: f"{name}_{key}" for key in ["X_init", "H", "R", "P_init"]
+        }
+        if self.config.H_selection is not None:
+            shared_symbols["H_selection"] = f"{name}_H_selection"
+        shared_symbols.update(
+            (variable[0], f"{name}_{variable[0]}")
+            for variable in self.build_storage_variables_list()
+            if variable[0] not in ["X_matrix_storage", "P_matrix_storage"]
+        )
+        # equal F, Q and B of several models are only defined by the first of them
+        first_models = {
+            key: first_equal_models(self.config.models, key) for key in ["F", "Q", "B"]
+        }
+
+        generators = []
+        for index, model in enumerate(self.config.models):
+            model_symbols = dict(shared_symbols)
+            for key, first in first_models.items():
+                if first[index] != index:
+                    model_symbols[key] = f"{name}_MODEL{first[index]}_{key}"
+            generators.append(
+                KalmanFilterConfigGenerator(
+                    KalmanFilterConfig(
+                        model_raw_config(
+                            self.config.raw_config,
+                            model,
+                            f"{self.filter_name}_model{index}",
+                        )
+                    ),
+                    model_symbols,
+                )
+            )
+        return generators
+
+    def generate_imm_definitions(self, name):
+        models = self.imm_generators
+        self.covariance_update_report = (
+            format_imm_report(self.filter_name, self.config.models)
+            + "\n"
+            + self.covariance_update_report
+        )
+
+        self.generated_preprocessor_defines.append(
+            f"#define {name}_NUM_MODELS ({len(models)}U)"
+        )
+        # the definitions shared by the models, followed by the ones of every model
+        shared_storage_variables = [
+            variable
+            for variable in self.build_storage_variables_list()
+            if variable[0] in models[0].shared_symbols
+        ]
+        self.generated_config_definitions = self.add_matrix_definitions(
+            [
+                matrix
+                for matrix in self.build_matrix_list()
+                if matrix[0] in ["H", "R", "P_init", "X_init"]
+            ]
+        )
+        self.generated_config_definitions.extend(self.generate_selection_definition())
+        self.generated_storage_definitions = self.add_storage_definitions(
+            name, shared_storage_variables
+        )
+        self.generated_model_function_definitions = []
+        self.generated_struct_config_definition = []
+        self.generated_static_assertions = []
+        for model in models:
+            self.generated_preprocessor_defines.extend(
+                model.generated_preprocessor_defines
+            )
+            self.generated_config_definitions.extend(model.generated_config_definitions)
+            self.generated_storage_definitions.extend(
+                model.generated_storage_definitions
+            )
+            if self.generated_struct_config_definition:
+                self.generated_struct_config_definition.append("")
+            self.generated_struct_config_definition.extend(
+                model.generated_struct_config_definition
+            )
+
+        self.generated_filter_static_data_struct = "\n".join(
+            [model.generated_filter_static_data_struct for model in models]
+            + self.generate_imm_tables(name)
+        )
+
+    def generate_imm_tables(self, name):
+        num_states = self.preprocessor_define_expressions["num_states"]
+        num_models = f"{name}_NUM_MODELS"
+        model_data = ", ".join(
+            f"&{model.generated_structure_names['filter_data']}"
+            for model in self.imm_generators
+        )
+        transition_probabilities = format_values(self.config.transition_probabilities)
+        model_probabilities = format_values(self.config.model_probabilities)
+        # fmt: off
+        return [
+            f"static kf_data_S * const {name}_model_data[{num_models}] = {{{model_data}}};",
+            "// the element (i, j) is the probability of a switch from model i to model j",
+            f"static const matrix_data_t {name}_transition_probabilities[{num_models} * {num_models}] = {{{transition_probabilities}}};",
+            f"static const matrix_data_t {name}_initial_model_probabilities[{num_models}] = {{{model_probabilities}}};",
+            f"static matrix_data_t {name}_model_probabilities[{num_models}];",
+            "// the estimate of the bank, combined from the estimates of the models",
+            f"static matrix_data_t {name}_X[{num_states}];",
+            f"static matrix_data_t {name}_P[{num_states} * {num_states}];",
+            "// the initial conditions of the models are mixed from all of them before any is overwritten",
+            f"static matrix_data_t {name}_mixed_X[{num_models} * {num_states}];",
+            f"static matrix_data_t {name}_mixed_P[{num_models} * {num_states} * {num_states}];",
+        ]
+        # fmt: on
+
+    def generate_library_dimensions(self):
+        if not self.block_generators:
+            return {
+                key: self.preprocessor_define_expressions[key]
+                for key in ["num_states", "num_measurements"]
+            }
+
+        # the library can only be specialized for the sub-filters if they all have the same dimensions
+        dimensions = {
+            (block.config.num_states, block.config.num_measurements)
+            for block in self.block_generators
+        }
+        if len(dimensions) > 1:
+            return None
+        return self.block_generators[0].generate_library_dimensions()
+
+    def generate_block_calls(self, block_calls, finish=()):
+        # the sub-filters run one after the other, an error stops the step before finish
+        lines = [f"\t{self.error_enum} ret = KF_ERROR_NONE;"]
+        for setup, call in block_calls:
+            lines.append("\tif (ret == KF_ERROR_NONE) {")
+            lines.extend(f"\t\t{line}" for line in setup)
+            lines.append(f"\t\tret = {call};")
+            lines.append("\t}")
+        if finish:
+            lines.append("\tif (ret == KF_ERROR_NONE) {")
+            lines.extend(f"\t\t{line}" for line in finish)
+            lines.append("\t}")
+        lines.append("\treturn ret;")
+        return "\n".join(lines)
+
+    def generate_independent_block_calls(self, block_calls):
+        # a sub-filter that fails is left unchanged by the library, the others still take the step
+        lines = [
+            f"\t{self.error_enum} ret = KF_ERROR_NONE;",
+            "\t// every sub-filter takes the step, the first error is returned",
+        ]
+        for setup, call in block_calls:
+            lines.append("\t{")
+            lines.extend(f"\t\t{line}" for line in setup)
+            lines.append(f"\t\tconst {self.error_enum} block_ret = {call};")
+            lines.append("\t\tif (ret == KF_ERROR_NONE) {")
+            lines.append("\t\t\tret = block_ret;")
+            lines.append("\t\t}")
+            lines.append("\t}")
+        lines.append("\treturn ret;")
+        return "\n".join(lines)
+
+    def generate_block_gather(self, indices, source, type_name, array_name, size):
+        # a contiguous range of the caller's array is passed in place, other indices are gathered into a local array
+        if indices == list(range(indices[0], indices[0] + len(indices))):
+            return [], f"&{source}[{indices[0]}]"
+        values = ", ".join(f"{source}[{index}]" for index in indices)
+        return [f"{type_name} {array_name}[{size}] = {{{values}}};"], array_name
+
+    def generate_static_filter_data_struct(self, name, storage_variables):
+        if not self.config.static_initialization:
+            return f"static kf_data_S {self.generated_structure_names['filter_data']};"
+
+        # the filter data kf_init would set up, with X and P pointing to their initialized storage
+        num_states = self.preprocessor_define_expressions["num_states"]
+        num_measurements = self.preprocessor_define_expressions["num_measurements"]
+        storage_names = {variable[0] for variable in storage_variables}
+        covariance_dims = (num_states, num_states)
+        if self.config.packed_covariance:
+            covariance_dims = (f"KF_PACKED_SIZE({num_states})", "1U")
+        elif self.config.covariance_blocks is not None:
+            covariance_dims = (f"{self.block_covariance_size()}U", "1U")
+
+        matrices = [
+            ("X", "X_matrix_storage", num_states, "1U"),
+            ("P", "P_matrix_storage", *covariance_dims),
+            ("Y_temp", "Y_matrix_storage", num_measurements, "1U"),
+            ("S_temp", "S_matrix_storage", num_measurements, num_measurements),
+            ("K_temp", "K_matrix_storage", num_states, num_measurements),
+            ("P_Ht_temp", "P_Ht_storage", num_states, num_measurements),
+            ("S_inv_temp", "S_inv_matrix_storage", num_measurements, num_measurements),
+        ]
+        # H is copied into H_temp, with its dimensions, by every update
+        if "H_temp_storage" in storage_names:
+            matrices.append(("H_temp", "H_temp_storage", "0U", "0U"))
+        if "K_H_storage" in storage_names:
+            matrices.append(("K_H_temp", "K_H_storage", num_states, num_states))
+            matrices.append(("F_jacobian", "K_H_storage", num_states, num_states))
+        if "K_H_P_storage" in storage_names:
+            matrices.append(("K_H_P_temp", "K_H_P_storage", *covariance_dims))
+        if "tile_storage" in storage_names:
+            matrices.append(
+                ("tile_temp", "tile_storage", num_states, f"{self.config.tile_size}U")
+            )
+
+        data_struct = [
+            f"static kf_data_S {self.generated_structure_names['filter_data']} = {{",
+            f"\t.config = &{self.generated_structure_names['filter_config']},",
+            "\t.initialized = true,",
+        ]
+        data_struct.extend(
+            f"\t.{field} = {{{rows}, {cols}, {name}_{storage}}},"
+            for field, storage, rows, cols in matrices
+        )
+        data_struct.extend(
+            [
+                f"\t.num_states = {num_states},",
+                f"\t.num_measurements = {num_measurements},",
+                f"\t.num_controls = {self.preprocessor_define_expressions['num_controls']},",
+                "};",
+            ]
+        )
+        return "\n".join(data_struct)
+
+    def generate_static_assertions(self, name, matrices, storage_variables):
+        if not self.config.static_initialization:
+            return []
+
+        # the checks of kf_init that depend on the C definitions, the ingestor has checked the rest
+        num_states = self.preprocessor_define_expressions["num_states"]
+        num_measurements = self.preprocessor_define_expressions["num_measurements"]
+        covariance_size = (
+            f"KF_PACKED_SIZE({num_states})"
+            if self.config.packed_covariance
+            else f"{num_states} * {num_states}"
+        )
+        if self.config.covariance_blocks is not None:
+            covariance_size = f"{self.block_covariance_size()}U"
+        required_storage_sizes = {
+            "X_matrix_storage": num_states,
+            "P_matrix_storage": covariance_size,
+            "temp_X_hat_matrix_storage": num_states,
+            "temp_Bu_matrix_storage": num_states,
+            "temp_Z_matrix_storage": num_measurements,
+            "H_temp_storage": f"{num_measurements} * {num_states}",
+            "R_temp_storage": f"{num_measurements} * {num_measurements}",
+            "P_Ht_storage": f"{num_states} * {num_measurements}",
+            "Y_matrix_storage": num_measurements,
+            "S_matrix_storage": f"{num_measurements} * {num_measurements}",
+            "S_inv_matrix_storage": f"{num_measurements} * {num_measurements}",
+            "K_matrix_storage": f"{num_states} * {num_measurements}",
+            "K_H_storage": f"{num_states} * {num_states}",
+            "K_H_P_storage": covariance_size,
+            "tile_storage": f"{num_states} * {self.config.tile_size}U",
+        }
+
+        assertions = [
+            f"KF_STATIC_ASSERT(sizeof({name}_{matrix_name}_data) == {rows_expr} * {cols_expr} * sizeof(matrix_data_t), "
+            f'"{name}_{matrix_name} does not match the filter dimensions");'
+            for matrix_name, _, rows_expr, cols_expr in matrices
+        ]
+        assertions.extend(
+            f"KF_STATIC_ASSERT(sizeof({name}_{var}) >= {required_storage_sizes[var]} * sizeof(matrix_data_t), "
+            f'"{name}_{var} is too small");'
+            for var, _, _ in storage_variables
+        )
+
+        closed_form_measurements = {1: "scalar", 2: "2x2", 3: "3x3"}
+        if self.config.num_measurements in closed_form_measurements:
+            assertions.append(
+                f"KF_STATIC_ASSERT({num_measurements} == {self.config.num_measurements}U, "
+                f'"the {closed_form_measurements[self.config.num_measurements]} inversion of S does not match the number of measurements");'
+            )
+        if self.config.steady_state_threshold > 0:
+            assertions.append(
+                f"KF_STATIC_ASSERT({num_measurements} <= KF_STEADY_STATE_MAX_MEASUREMENTS, "
+                '"too many measurements for the steady-state detection");'
+            )
+        if self.config.H_selection is not None:
+            assertions.append(
+                f"KF_STATIC_ASSERT({max(self.config.H_selection)}U < {num_states}, "
+                '"H_selection selects a state that does not exist");'
+            )
+        assertions.extend(
+            f"KF_STATIC_ASSERT(sizeof({name}_{matrix_name}_row_offsets) == ({rows_expr} + 1U) * sizeof(size_t), "
+            f'"{name}_{matrix_name}_sparse does not match the filter dimensions");'
+            for matrix_name, _, rows_expr, _ in self.build_sparse_matrix_list()
+        )
+        return assertions
 
     def generate_function_definitions(self):
         init_function = self.generate_init_function()
         measurement_update_function = self.generate_measurement_update_function()
 
-        generated_function_definitions = [init_function, measurement_update_function]
+        generated_function_definitions = self.generate_snapshot_definitions()
+        generated_function_definitions += self.generate_imm_function_definitions()
+        generated_function_definitions += [init_function, measurement_update_function]
 
         if self.config.num_controls > 0:
             predict_function = self.generate_predict_function(with_control=True)
@@ -79,57 +644,575 @@ class KalmanFilterConfigGenerator:
             self.generate_covariance_getter_function()
         )
         generated_function_definitions.append(self.generate_get_data_function())
+        if self.block_generators:
+            generated_function_definitions.append(
+                self.generate_get_block_data_function()
+            )
+        if self.imm_generators:
+            generated_function_definitions.append(
+                self.generate_get_model_data_function()
+            )
+            generated_function_definitions.append(
+                self.generate_get_model_probability_function()
+            )
+        generated_function_definitions.append(self.generate_get_profile_function())
 
         return generated_function_definitions
 
+    def generate_snapshot_definitions(self):
+        if not self.config.snapshot:
+            return []
+
+        name = self.filter_name.upper()
+        filter_data = self.generated_structure_names["filter_data"]
+        num_states = self.preprocessor_define_expressions["num_states"]
+        covariance_size = (
+            f"KF_PACKED_SIZE({num_states})"
+            if self.config.packed_covariance
+            else f"{num_states} * {num_states}"
+        )
+
+        buffers = f"static volatile {name}_snapshot_buffer_S {name}_snapshot_buffers[2]"
+        buffers_definition = f"{buffers};"
+        if self.config.static_initialization:
+            # the filter is never initialized at runtime, the first snapshot is X_init and P_init
+            buffers_definition = Definition(
+                f"{buffers} = {{{{",
+                Initializer(self.config.X_init),
+                ", ",
+                self.covariance_storage_initializer(self.config.P_init),
+                "}};",
+            )
+
+        if self.config.packed_covariance:
+            # the reader gets the full covariance, the upper triangle is the mirror of the packed lower triangle
+            copy_covariance = [
+                "\t\t\tsize_t k = 0U;",
+                f"\t\t\tfor (size_t i = 0U; i < {num_states}; i++) {{",
+                "\t\t\t\tfor (size_t j = 0U; j <= i; j++) {",
+                f"\t\t\t\t\tsnapshot->P[i * {num_states} + j] = buffer->P[k];",
+                f"\t\t\t\t\tsnapshot->P[j * {num_states} + i] = buffer->P[k];",
+                "\t\t\t\t\tk++;",
+                "\t\t\t\t}",
+                "\t\t\t}",
+            ]
+        else:
+            copy_covariance = [
+                f"\t\t\tfor (size_t i = 0U; i < {covariance_size}; i++) {{",
+                "\t\t\t\tsnapshot->P[i] = buffer->P[i];",
+                "\t\t\t}",
+            ]
+
+        # fmt: off
+        definitions = [
+            "\n".join([
+                "typedef struct {",
+                f"\tmatrix_data_t X[{num_states}];",
+                f"\tmatrix_data_t P[{covariance_size}];",
+                f"}} {name}_snapshot_buffer_S;",
+            ]),
+            "// The last published snapshot is buffers[end % 2]. A publication writes buffers[begin % 2] before end catches up,",
+            "// so a copy of the last snapshot is only torn if begin moved on by two publications while it was copied",
+            buffers_definition,
+            f"static volatile uint32_t {name}_snapshot_begin = 0U;",
+            f"static volatile uint32_t {name}_snapshot_end = 0U;",
+            "\n".join([
+                f"static void {name}_publish_snapshot(void) {{",
+                f"\tconst uint32_t begin = {name}_snapshot_begin + 1U;",
+                f"\tvolatile {name}_snapshot_buffer_S* const buffer = &{name}_snapshot_buffers[begin % 2U];",
+                f"\t{name}_snapshot_begin = begin;",
+                f"\tfor (size_t i = 0U; i < {num_states}; i++) {{",
+                f"\t\tbuffer->X[i] = {filter_data}.X.data[i];",
+                "\t}",
+                f"\tfor (size_t i = 0U; i < {covariance_size}; i++) {{",
+                f"\t\tbuffer->P[i] = {filter_data}.P.data[i];",
+                "\t}",
+                f"\t{name}_snapshot_end = begin;",
+                "}",
+            ]),
+            "\n".join([
+                f"{self.error_enum} {self.filter_name}_get_snapshot({self.generated_structure_names['snapshot']}_S * const snapshot, const bool with_covariance) {{",
+                f"\t{self.error_enum} ret = KF_ERROR_NONE;",
+                "\tif (snapshot == NULL) {",
+                "\t\tret = KF_ERROR_INVALID_POINTER;",
+                f"\t}} else if ({filter_data}.initialized == false) {{",
+                "\t\tret = KF_ERROR_NOT_INITIALIZED;",
+                "\t} else {",
+                "\t\tbool consistent = false;",
+                "\t\twhile (consistent == false) {",
+                f"\t\t\tconst uint32_t end = {name}_snapshot_end;",
+                f"\t\t\tconst volatile {name}_snapshot_buffer_S* const buffer = &{name}_snapshot_buffers[end % 2U];",
+                f"\t\t\tfor (size_t i = 0U; i < {num_states}; i++) {{",
+                "\t\t\t\tsnapshot->X[i] = buffer->X[i];",
+                "\t\t\t}",
+                "\t\t\tif (with_covariance) {",
+                *["\t" + line for line in copy_covariance],
+                "\t\t\t}",
+                f"\t\t\tconsistent = (({name}_snapshot_begin - end) <= 1U);",
+                "\t\t}",
+                "\t}",
+                "\treturn ret;",
+                "}",
+            ]),
+        ]
+        # fmt: on
+        return definitions
+
+    def generate_imm_function_definitions(self):
+        if not self.imm_generators:
+            return []
+
+        name = self.filter_name.upper()
+        num_states = self.preprocessor_define_expressions["num_states"]
+        num_models = f"{name}_NUM_MODELS"
+        # fmt: off
+        return [
+            "\n".join([
+                f"static void {name}_mix(void) {{",
+                "\t// the predicted probability of model j is c_j = sum_i p_ij * mu_i",
+                f"\tmatrix_data_t predicted[{num_models}];",
+                f"\tfor (size_t j = 0U; j < {num_models}; j++) {{",
+                "\t\tpredicted[j] = 0;",
+                f"\t\tfor (size_t i = 0U; i < {num_models}; i++) {{",
+                f"\t\t\tpredicted[j] += {name}_transition_probabilities[i * {num_models} + j] * {name}_model_probabilities[i];",
+                "\t\t}",
+                "\t}",
+                "\t// model j starts from the mixture of the models i weighted by p_ij * mu_i / c_j, the models that cannot",
+                "\t// switch to j have no weight and are skipped",
+                f"\tfor (size_t j = 0U; j < {num_models}; j++) {{",
+                f"\t\tmatrix_data_t* const X = &{name}_mixed_X[j * {num_states}];",
+                f"\t\tmatrix_data_t* const P = &{name}_mixed_P[j * {num_states} * {num_states}];",
+                f"\t\tfor (size_t k = 0U; k < {num_states}; k++) {{",
+                "\t\t\tX[k] = 0;",
+                "\t\t}",
+                f"\t\tfor (size_t k = 0U; k < {num_states} * {num_states}; k++) {{",
+                "\t\t\tP[k] = 0;",
+                "\t\t}",
+                f"\t\tfor (size_t i = 0U; (i < {num_models}) && (predicted[j] > 0); i++) {{",
+                f"\t\t\tconst matrix_data_t weight = {name}_transition_probabilities[i * {num_models} + j] * {name}_model_probabilities[i] / predicted[j];",
+                "\t\t\tif (weight > 0) {",
+                f"\t\t\t\tfor (size_t k = 0U; k < {num_states}; k++) {{",
+                f"\t\t\t\t\tX[k] += weight * {name}_model_data[i]->X.data[k];",
+                "\t\t\t\t}",
+                "\t\t\t}",
+                "\t\t}",
+                f"\t\tfor (size_t i = 0U; (i < {num_models}) && (predicted[j] > 0); i++) {{",
+                f"\t\t\tconst matrix_data_t weight = {name}_transition_probabilities[i * {num_models} + j] * {name}_model_probabilities[i] / predicted[j];",
+                "\t\t\tif (weight > 0) {",
+                f"\t\t\t\tconst matrix_data_t* const X_i = {name}_model_data[i]->X.data;",
+                f"\t\t\t\tconst matrix_data_t* const P_i = {name}_model_data[i]->P.data;",
+                f"\t\t\t\tfor (size_t row = 0U; row < {num_states}; row++) {{",
+                "\t\t\t\t\tconst matrix_data_t spread = X_i[row] - X[row];",
+                f"\t\t\t\t\tfor (size_t col = 0U; col < {num_states}; col++) {{",
+                f"\t\t\t\t\t\tP[row * {num_states} + col] += weight * (P_i[row * {num_states} + col] + spread * (X_i[col] - X[col]));",
+                "\t\t\t\t\t}",
+                "\t\t\t\t}",
+                "\t\t\t}",
+                "\t\t}",
+                "\t}",
+                "\t// a model that no model can switch to keeps its own estimate",
+                f"\tfor (size_t j = 0U; j < {num_models}; j++) {{",
+                "\t\tif (predicted[j] > 0) {",
+                f"\t\t\tfor (size_t k = 0U; k < {num_states}; k++) {{",
+                f"\t\t\t\t{name}_model_data[j]->X.data[k] = {name}_mixed_X[j * {num_states} + k];",
+                "\t\t\t}",
+                f"\t\t\tfor (size_t k = 0U; k < {num_states} * {num_states}; k++) {{",
+                f"\t\t\t\t{name}_model_data[j]->P.data[k] = {name}_mixed_P[j * {num_states} * {num_states} + k];",
+                "\t\t\t}",
+                "\t\t}",
+                f"\t\t{name}_model_probabilities[j] = predicted[j];",
+                "\t}",
+                "}",
+            ]),
+            "\n".join([
+                f"static void {name}_update_model_probabilities(const matrix_data_t* const log_likelihoods) {{",
+                "\t// mu_j is proportional to c_j * exp(l_j), the largest log-likelihood is subtracted so that exp cannot",
+                "\t// underflow for every model",
+                "\tmatrix_data_t largest = log_likelihoods[0];",
+                f"\tfor (size_t j = 1U; j < {num_models}; j++) {{",
+                "\t\tif (log_likelihoods[j] > largest) {",
+                "\t\t\tlargest = log_likelihoods[j];",
+                "\t\t}",
+                "\t}",
+                "\tmatrix_data_t total = 0;",
+                f"\tfor (size_t j = 0U; j < {num_models}; j++) {{",
+                f"\t\t{name}_model_probabilities[j] *= expf(log_likelihoods[j] - largest);",
+                f"\t\ttotal += {name}_model_probabilities[j];",
+                "\t}",
+                "\tif (total > 0) {",
+                f"\t\tfor (size_t j = 0U; j < {num_models}; j++) {{",
+                f"\t\t\t{name}_model_probabilities[j] /= total;",
+                "\t\t}",
+                "\t}",
+                "}",
+            ]),
+            "\n".join([
+                f"static void {name}_combine(void) {{",
+                "\t// the estimate of the bank is the mixture of the estimates of the models weighted by mu_j",
+                f"\tfor (size_t k = 0U; k < {num_states}; k++) {{",
+                f"\t\t{name}_X[k] = 0;",
+                "\t}",
+                f"\tfor (size_t k = 0U; k < {num_states} * {num_states}; k++) {{",
+                f"\t\t{name}_P[k] = 0;",
+                "\t}",
+                f"\tfor (size_t j = 0U; j < {num_models}; j++) {{",
+                f"\t\tfor (size_t k = 0U; k < {num_states}; k++) {{",
+                f"\t\t\t{name}_X[k] += {name}_model_probabilities[j] * {name}_model_data[j]->X.data[k];",
+                "\t\t}",
+                "\t}",
+                f"\tfor (size_t j = 0U; j < {num_models}; j++) {{",
+                f"\t\tconst matrix_data_t* const X_j = {name}_model_data[j]->X.data;",
+                f"\t\tconst matrix_data_t* const P_j = {name}_model_data[j]->P.data;",
+                f"\t\tfor (size_t row = 0U; row < {num_states}; row++) {{",
+                f"\t\t\tconst matrix_data_t spread = X_j[row] - {name}_X[row];",
+                f"\t\t\tfor (size_t col = 0U; col < {num_states}; col++) {{",
+                f"\t\t\t\t{name}_P[row * {num_states} + col] += {name}_model_probabilities[j] * (P_j[row * {num_states} + col] + spread * (X_j[col] - {name}_X[col]));",
+                "\t\t\t}",
+                "\t\t}",
+                "\t}",
+                "}",
+            ]),
+        ]
+        # fmt: on
+
     def generate_state_getter_function(self):
+        if self.block_generators:
+            name = self.filter_name.upper()
+            return (
+                f"matrix_data_t {self.filter_name}_get_state(size_t state) {{\n"
+                f"\treturn matrix_get(&{name}_block_data[{name}_state_blocks[state]]->X, {name}_state_indices[state], 0U);\n}}"
+            )
+        if self.imm_generators:
+            return (
+                f"matrix_data_t {self.filter_name}_get_state(size_t state) {{\n"
+                f"\treturn {self.filter_name.upper()}_X[state];\n}}"
+            )
         return (
             f"matrix_data_t {self.filter_name}_get_state(size_t state) {{\n"
             f"\treturn matrix_get(&{self.generated_structure_names['filter_data']}.X, state, 0U);\n}}"
         )
 
     def generate_covariance_getter_function(self):
+        if self.block_generators:
+            name = self.filter_name.upper()
+            # states of different sub-filters are uncorrelated
+            return (
+                f"matrix_data_t {self.filter_name}_get_covariance(size_t row, size_t col) {{\n"
+                "\tmatrix_data_t value = 0;\n"
+                f"\tif ({name}_state_blocks[row] == {name}_state_blocks[col]) {{\n"
+                f"\t\t(void)kf_get_covariance({name}_block_data[{name}_state_blocks[row]], "
+                f"{name}_state_indices[row], {name}_state_indices[col], &value);\n"
+                "\t}\n"
+                "\treturn value;\n}"
+            )
+        if self.imm_generators:
+            return (
+                f"matrix_data_t {self.filter_name}_get_covariance(size_t row, size_t col) {{\n"
+                f"\treturn {self.filter_name.upper()}_P[row * {self.preprocessor_define_expressions['num_states']} + col];\n}}"
+            )
+        if self.config.packed_covariance or (self.config.covariance_blocks is not None):
+            # the packed and block layouts are only known to the library
+            return (
+                f"matrix_data_t {self.filter_name}_get_covariance(size_t row, size_t col) {{\n"
+                "\tmatrix_data_t value = 0;\n"
+                f"\t(void)kf_get_covariance(&{self.generated_structure_names['filter_data']}, row, col, &value);\n"
+                "\treturn value;\n}"
+            )
         return (
             f"matrix_data_t {self.filter_name}_get_covariance(size_t row, size_t col) {{\n"
             f"\treturn matrix_get(&{self.generated_structure_names['filter_data']}.P, row, col);\n}}"
         )
 
     def generate_get_data_function(self):
+        if self.block_generators:
+            return (
+                f"kf_data_S * {self.filter_name}_get_data(void) {{\n"
+                "\t// the filter is split into sub-filters, see get_block_data\n"
+                "\treturn NULL;\n}"
+            )
+        if self.imm_generators:
+            return (
+                f"kf_data_S * {self.filter_name}_get_data(void) {{\n"
+                "\t// the filter is a bank of models, see get_model_data\n"
+                "\treturn NULL;\n}"
+            )
         return (
             f"kf_data_S * {self.filter_name}_get_data(void) {{\n"
             f"\treturn &{self.generated_structure_names['filter_data']};\n}}"
         )
 
+    def generate_get_block_data_function(self):
+        name = self.filter_name.upper()
+        return (
+            f"kf_data_S * {self.filter_name}_get_block_data(size_t block) {{\n"
+            f"\treturn (block < {name}_NUM_BLOCKS) ? {name}_block_data[block] : NULL;\n}}"
+        )
+
+    def generate_get_model_data_function(self):
+        name = self.filter_name.upper()
+        return (
+            f"kf_data_S * {self.filter_name}_get_model_data(size_t model) {{\n"
+            f"\treturn (model < {name}_NUM_MODELS) ? {name}_model_data[model] : NULL;\n}}"
+        )
+
+    def generate_get_model_probability_function(self):
+        name = self.filter_name.upper()
+        return (
+            f"matrix_data_t {self.filter_name}_get_model_probability(size_t model) {{\n"
+            f"\treturn (model < {name}_NUM_MODELS) ? {name}_model_probabilities[model] : 0;\n}}"
+        )
+
+    def generate_get_profile_function(self):
+        if self.block_generators or self.imm_generators:
+            name = self.filter_name.upper()
+            data, count = (
+                (f"{name}_block_data", f"{name}_NUM_BLOCKS")
+                if self.block_generators
+                else (f"{name}_model_data", f"{name}_NUM_MODELS")
+            )
+            # fmt: off
+            return "\n".join([
+                "#ifdef KF_ENABLE_PROFILING",
+                f"const kf_profile_S * {self.filter_name}_get_profile(void) {{",
+                "\t// the stages of the sub-filters, or of the models, run one after the other, so their cycles add up",
+                "\tstatic kf_profile_S profile;",
+                "\tfor (size_t stage = 0U; stage < KF_PROFILE_STAGE_COUNT; stage++) {",
+                "\t\tprofile.stages[stage].min = 0U;",
+                "\t\tprofile.stages[stage].max = 0U;",
+                "\t\tprofile.stages[stage].total = 0U;",
+                f"\t\tprofile.stages[stage].count = {data}[0]->profile.stages[stage].count;",
+                f"\t\tfor (size_t block = 0U; block < {count}; block++) {{",
+                f"\t\t\tconst kf_profile_stage_stats_S* const stage_profile = &{data}[block]->profile.stages[stage];",
+                "\t\t\tprofile.stages[stage].min += stage_profile->min;",
+                "\t\t\tprofile.stages[stage].max += stage_profile->max;",
+                "\t\t\tprofile.stages[stage].total += stage_profile->total;",
+                "\t\t}",
+                "\t}",
+                "\treturn &profile;",
+                "}",
+                "#endif",
+            ])
+            # fmt: on
+        return (
+            "#ifdef KF_ENABLE_PROFILING\n"
+            f"const kf_profile_S * {self.filter_name}_get_profile(void) {{\n"
+            f"\treturn &{self.generated_structure_names['filter_data']}.profile;\n}}\n"
+            "#endif"
+        )
+
     def generate_init_function(self):
+        # a statically initialized filter does not need to be initialized at boot, but its init still resets it
+        if self.block_generators or self.imm_generators:
+            block_calls = [
+                (
+                    [],
+                    f"kf_init(&{block.generated_structure_names['filter_data']}, "
+                    f"&{block.generated_structure_names['filter_config']})",
+                )
+                for block in self.block_generators + self.imm_generators
+            ]
+            finish = []
+            if self.imm_generators:
+                name = self.filter_name.upper()
+                finish = [
+                    f"for (size_t model = 0U; model < {name}_NUM_MODELS; model++) {{",
+                    f"\t{name}_model_probabilities[model] = {name}_initial_model_probabilities[model];",
+                    "}",
+                    f"{name}_combine();",
+                ]
+            return (
+                f"{self.error_enum} {self.filter_name}_init(void) {{\n"
+                + self.generate_block_calls(block_calls, finish)
+                + "\n}"
+            )
         return (
             f"{self.error_enum} {self.filter_name}_init(void) {{\n"
-            f"\treturn kf_init(&{self.generated_structure_names['filter_data']}, "
-            f"&{self.generated_structure_names['filter_config']});\n}}"
+            + self.generate_filter_call(
+                f"kf_init(&{self.generated_structure_names['filter_data']}, "
+                f"&{self.generated_structure_names['filter_config']})"
+            )
+            + "\n}"
+        )
+
+    def generate_filter_call(self, call):
+        if not self.config.snapshot:
+            return f"\treturn {call};"
+        # readers only see the state after a successful step
+        return (
+            f"\tconst {self.error_enum} ret = {call};\n"
+            f"\tif (ret == KF_ERROR_NONE) {{\n"
+            f"\t\t{self.filter_name.upper()}_publish_snapshot();\n"
+            "\t}\n"
+            "\treturn ret;"
         )
 
+    def generate_block_update_calls(self):
+        block_calls = []
+        for block, block_generator in zip(self.config.blocks, self.block_generators):
+            num_measurements = block_generator.preprocessor_define_expressions[
+                "num_measurements"
+            ]
+            data_setup, data = self.generate_block_gather(
+                block["measurements"],
+                "measurement->data",
+                "matrix_data_t",
+                "data",
+                num_measurements,
+            )
+            valid_setup, valid = self.generate_block_gather(
+                block["measurements"],
+                "measurement->valid",
+                "const bool",
+                "valid",
+                num_measurements,
+            )
+            block_calls.append(
+                (
+                    data_setup
+                    + valid_setup
+                    + [f"matrix_t Z = {{{num_measurements}, 1U, {data}}};"],
+                    f"kf_update(&{block_generator.generated_structure_names['filter_data']}, &Z, {valid}, {num_measurements})",
+                )
+            )
+        return block_calls
+
+    def generate_block_predict_calls(self):
+        block_calls = []
+        for block, block_generator in zip(self.config.blocks, self.block_generators):
+            filter_data = block_generator.generated_structure_names["filter_data"]
+            if not block["controls"]:
+                block_calls.append(([], f"kf_predict(&{filter_data}, NULL)"))
+                continue
+            num_controls = block_generator.preprocessor_define_expressions[
+                "num_controls"
+            ]
+            data_setup, data = self.generate_block_gather(
+                block["controls"],
+                "control->data",
+                "matrix_data_t",
+                "data",
+                num_controls,
+            )
+            block_calls.append(
+                (
+                    data_setup + [f"matrix_t U = {{{num_controls}, 1U, {data}}};"],
+                    f"kf_predict(&{filter_data}, &U)",
+                )
+            )
+        return block_calls
+
+    def generate_imm_update_function(self):
+        name = self.filter_name.upper()
+        num_measurements = self.preprocessor_define_expressions["num_measurements"]
+        # fmt: off
+        return "\n".join([
+            f"{self.error_enum} {self.filter_name}_update({self.generated_structure_names['measurement']}_S * const measurement) {{",
+            f"\tmatrix_t Z = {{{num_measurements}, 1U, measurement->data}};",
+            f"\tmatrix_data_t log_likelihoods[{name}_NUM_MODELS];",
+            f"\t{self.error_enum} ret = KF_ERROR_NONE;",
+            "\t// the models share the scratch storage, so the likelihood of a model is read before the next update overwrites S",
+            f"\tfor (size_t model = 0U; (ret == KF_ERROR_NONE) && (model < {name}_NUM_MODELS); model++) {{",
+            f"\t\tret = kf_update({name}_model_data[model], &Z, measurement->valid, {num_measurements});",
+            "\t\tif (ret == KF_ERROR_NONE) {",
+            f"\t\t\tret = kf_innovation_log_likelihood({name}_model_data[model], &log_likelihoods[model]);",
+            "\t\t}",
+            "\t}",
+            "\tif (ret == KF_ERROR_NONE) {",
+            f"\t\t{name}_update_model_probabilities(log_likelihoods);",
+            f"\t\t{name}_combine();",
+            "\t}",
+            "\treturn ret;",
+            "}",
+        ])
+        # fmt: on
+
+    def generate_imm_predict_function(self, with_control):
+        name = self.filter_name.upper()
+        parameters = (
+            f"{self.generated_structure_names['control']}_S * const control"
+            if with_control
+            else "void"
+        )
+        control_setup = (
+            [
+                f"\tmatrix_t U = {{{self.preprocessor_define_expressions['num_controls']}, 1U, control->data}};"
+            ]
+            if with_control
+            else []
+        )
+        control = "&U" if with_control else "NULL"
+        # fmt: off
+        return "\n".join([
+            f"{self.error_enum} {self.filter_name}_predict({parameters}) {{",
+            *control_setup,
+            f"\t{self.error_enum} ret = KF_ERROR_NONE;",
+            f"\tif ({name}_model_data[0]->initialized == false) {{",
+            "\t\tret = KF_ERROR_NOT_INITIALIZED;",
+            "\t} else {",
+            f"\t\t{name}_mix();",
+            "\t}",
+            f"\tfor (size_t model = 0U; (ret == KF_ERROR_NONE) && (model < {name}_NUM_MODELS); model++) {{",
+            f"\t\tret = kf_predict({name}_model_data[model], {control});",
+            "\t}",
+            "\tif (ret == KF_ERROR_NONE) {",
+            f"\t\t{name}_combine();",
+            "\t}",
+            "\treturn ret;",
+            "}",
+        ])
+        # fmt: on
+
     def generate_measurement_update_function(self):
+        if self.imm_generators:
+            return self.generate_imm_update_function()
+        if self.block_generators:
+            return (
+                f"{self.error_enum} {self.filter_name}_update({self.generated_structure_names['measurement']}_S * const measurement) {{\n"
+                + self.generate_independent_block_calls(
+                    self.generate_block_update_calls()
+                )
+                + "\n}"
+            )
         # fmt: off
         return (
             f"{self.error_enum} {self.filter_name}_update({self.generated_structure_names['measurement']}_S * const measurement) {{\n"
             f"\tmatrix_t Z = {{{self.preprocessor_define_expressions['num_measurements']}, 1U, measurement->data}};\n"
-            f"\treturn kf_update(&{self.generated_structure_names['filter_data']}, &Z, measurement->valid, {self.preprocessor_define_expressions['num_measurements']});\n}}"
+            + self.generate_filter_call(f"kf_update(&{self.generated_structure_names['filter_data']}, &Z, measurement->valid, {self.preprocessor_define_expressions['num_measurements']})")
+            + "\n}"
         )
         # fmt: on
 
     def generate_predict_function(self, with_control):
+        if self.imm_generators:
+            return self.generate_imm_predict_function(with_control)
+        if self.block_generators:
+            parameters = (
+                f"{self.generated_structure_names['control']}_S * const control"
+                if with_control
+                else "void"
+            )
+            return (
+                f"{self.error_enum} {self.filter_name}_predict({parameters}) {{\n"
+                + self.generate_independent_block_calls(
+                    self.generate_block_predict_calls()
+                )
+                + "\n}"
+            )
         if with_control:
             # fmt: off
             return (
                 f"{self.error_enum} {self.filter_name}_predict({self.generated_structure_names['control']}_S * const control) {{\n"
                 f"\tmatrix_t U = {{{self.preprocessor_define_expressions['num_controls']}, 1U, control->data}};\n"
-                f"\treturn kf_predict(&{self.generated_structure_names['filter_data']}, &U);\n}}"
+                + self.generate_filter_call(f"kf_predict(&{self.generated_structure_names['filter_data']}, &U)")
+                + "\n}"
             )
             # fmt: on
         else:
             # fmt: off
             return (
                 f"{self.error_enum} {self.filter_name}_predict(void) {{\n"
-                f"\treturn kf_predict(&{self.generated_structure_names['filter_data']}, NULL);\n}}"
+                + self.generate_filter_call(f"kf_predict(&{self.generated_structure_names['filter_data']}, NULL)")
+                + "\n}"
             )
             # fmt: on
 
@@ -138,6 +1221,7 @@ class KalmanFilterConfigGenerator:
             "measurement": f"{self.filter_name}_measurement",
             "control": f"{self.filter_name}_control",
             "state": f"{self.filter_name}_state",
+            "snapshot": f"{self.filter_name}_snapshot",
             "filter_data": f"{self.filter_name.upper()}_data",
             "filter_config": f"{self.filter_name.upper()}_kf_config",
         }
@@ -158,6 +1242,16 @@ class KalmanFilterConfigGenerator:
             * 
             * @return {self.error_enum} Error code indicating the success or failure of the initialization.
             */
+            """ if not self.config.static_initialization else f"""
+            /**
+            * @brief Resets the {self.filter_name} Kalman Filter.
+            * 
+            * The {self.filter_name} Kalman Filter is initialized at compile time, so this
+            * function does not need to be called at system startup. Calling it resets the
+            * filter to its initial state and covariance, e.g. after a divergence.
+            * 
+            * @return {self.error_enum} Error code indicating the success or failure of the initialization.
+            */
             """,
             "str": f"{self.error_enum} {self.filter_name}_init(void);"
         }
@@ -242,6 +1336,131 @@ class KalmanFilterConfigGenerator:
             "str": f"kf_data_S * {self.filter_name}_get_data(void);"
         }
 
+        if self.block_generators:
+            headers["get_data"] = {
+                "comment": f"""
+                /**
+                * @brief Returns NULL, the {self.filter_name} Kalman Filter is split into independent sub-filters.
+                *
+                * Use {self.filter_name}_get_block_data to access the data struct of every sub-filter.
+                *
+                * @return kf_data_S* Always NULL.
+                */
+                """,
+                "str": f"kf_data_S * {self.filter_name}_get_data(void);"
+            }
+
+            # the sub-filters take a step independently, so a failed step is partial
+            for function in ["update", "predict"]:
+                comment = headers[function]["comment"]
+                tag = "* @param" if "* @param" in comment else "* @return"
+                headers[function]["comment"] = comment.replace(
+                    tag,
+                    "* Every sub-filter takes the step: a sub-filter that fails is left unchanged while the\n"
+                    "* others still take the step, and the first error is returned.\n"
+                    "*\n" + tag,
+                    1,
+                )
+
+            block_states = "\n".join(
+                f"* - block {index}: states {', '.join(str(state) for state in block['states'])}"
+                for index, block in enumerate(self.config.blocks)
+            )
+            headers["get_block_data"] = {
+                "comment": f"""
+                /**
+                * @brief Returns a pointer to the data struct of a sub-filter of the {self.filter_name} Kalman Filter.
+                *
+                * The states of the filter are split into {len(self.block_generators)} independent sub-filters:
+                {block_states}
+                *
+                * @warning Storing the pointer to the data struct is not recommended as it may be modified by the filter. Use with caution
+                *
+                * @param block Index of the sub-filter.
+                * @return kf_data_S* Pointer to the data struct of the sub-filter, or NULL if the index is out of range.
+                */
+                """,
+                "str": f"kf_data_S * {self.filter_name}_get_block_data(size_t block);"
+            }
+
+        if self.imm_generators:
+            headers["get_data"] = {
+                "comment": f"""
+                /**
+                * @brief Returns NULL, the {self.filter_name} Kalman Filter is a bank of {len(self.imm_generators)} interacting models.
+                *
+                * Use {self.filter_name}_get_model_data to access the data struct of every model.
+                *
+                * @return kf_data_S* Always NULL.
+                */
+                """,
+                "str": f"kf_data_S * {self.filter_name}_get_data(void);"
+            }
+
+            headers["get_model_data"] = {
+                "comment": f"""
+                /**
+                * @brief Returns a pointer to the data struct of a model of the {self.filter_name} Kalman Filter.
+                *
+                * The models share the scratch storage, so the temporary matrices of a model are overwritten by the next one.
+                *
+                * @warning Storing the pointer to the data struct is not recommended as it may be modified by the filter. Use with caution
+                *
+                * @param model Index of the model.
+                * @return kf_data_S* Pointer to the data struct of the model, or NULL if the index is out of range.
+                */
+                """,
+                "str": f"kf_data_S * {self.filter_name}_get_model_data(size_t model);"
+            }
+
+            headers["get_model_probability"] = {
+                "comment": f"""
+                /**
+                * @brief Retrieves the probability of a model of the {self.filter_name} Kalman Filter.
+                *
+                * The state and covariance of the filter combine the estimates of the models weighted by their probabilities.
+                *
+                * @param model Index of the model.
+                * @return matrix_data_t The probability of the model, or 0 if the index is out of range.
+                */
+                """,
+                "str": f"matrix_data_t {self.filter_name}_get_model_probability(size_t model);"
+            }
+
+        headers["get_profile"] = {
+            "comment": f"""
+            /**
+            * @brief Returns the stage timing statistics of the {self.filter_name} Kalman Filter.
+            *
+            * Only available when the library is compiled with KF_ENABLE_PROFILING defined.
+            *
+            * @return const kf_profile_S* Pointer to the min/max/mean cycles of every predict and update stage.
+            */
+            """,
+            "str": (
+                "#ifdef KF_ENABLE_PROFILING\n"
+                f"const kf_profile_S * {self.filter_name}_get_profile(void);\n"
+                "#endif"
+            )
+        }
+
+        if self.config.snapshot:
+            headers["get_snapshot"] = {
+                "comment": f"""
+                /**
+                * @brief Copies the state, and optionally the covariance, published by the last successful step of the {self.filter_name} Kalman Filter.
+                *
+                * The copy is consistent even if it is interrupted by a predict or update, without disabling interrupts.
+                * It is retried if two steps complete while it is copied. The covariance is always returned in full, row by row.
+                *
+                * @param snapshot Pointer to the snapshot to fill.
+                * @param with_covariance Also copy the covariance.
+                * @return {self.error_enum} Error code indicating the success of the copy.
+                */
+                """,
+                "str": f"{self.error_enum} {self.filter_name}_get_snapshot({self.generated_structure_names['snapshot']}_S * const snapshot, const bool with_covariance);"
+            }
+
         # fmt: on
 
         # for every comment, remove all tabbing
@@ -256,10 +1475,15 @@ class KalmanFilterConfigGenerator:
         measurement_struct = self.generate_measurement_struct_definition()
         control_struct = self.generate_control_struct_definition()
 
-        return {
+        structure_definitions = {
             "measurement": measurement_struct,
             "control": control_struct,
         }
+        if self.config.snapshot:
+            structure_definitions[
+                "snapshot"
+            ] = self.generate_snapshot_struct_definition()
+        return structure_definitions
 
     def generate_measurement_struct_definition(self):
         return [
@@ -269,6 +1493,15 @@ class KalmanFilterConfigGenerator:
             f"}} {self.generated_structure_names['measurement']}_S;",
         ]
 
+    def generate_snapshot_struct_definition(self):
+        num_states = self.preprocessor_define_expressions["num_states"]
+        return [
+            "typedef struct {",
+            f"\tmatrix_data_t X[{num_states}];",
+            f"\tmatrix_data_t P[{num_states} * {num_states}];",
+            f"}} {self.generated_structure_names['snapshot']}_S;",
+        ]
+
     def generate_control_struct_definition(self):
         return [
             "typedef struct {",
@@ -282,15 +1515,6 @@ class KalmanFilterConfigGenerator:
             for key in self.preprocessor_define_expressions
         ]
 
-    def format_matrix_with_newlines(self, matrix: np.ndarray) -> str:
-        rows, cols = matrix.shape
-        matrix_rows = []
-        for i in range(rows):
-            # Format each number to 6 decimal places and append 'f' for C float
-            row_str = ", ".join(f"{x:.6f}F" for x in matrix[i])
-            matrix_rows.append(row_str)
-        return "{\n    " + ",\n    ".join(matrix_rows) + "\n}"
-
     def generate_config_definitions(
         self,
         name: str,
@@ -299,10 +1523,13 @@ class KalmanFilterConfigGenerator:
         rows_name: str,
         cols_name: str,
     ):
-        matrix_flattened_str = self.format_matrix_with_newlines(matrix_data)
         # fmt: off
         return [
-            f"static matrix_data_t {name}_{matrix_name}_data[{rows_name} * {cols_name}] = {matrix_flattened_str};",
+            Definition(
+                f"static {self.generate_alignment()}matrix_data_t {name}_{matrix_name}_data[{rows_name} * {cols_name}] = ",
+                Initializer(matrix_data),
+                ";",
+            ),
             f"static matrix_t {name}_{matrix_name} = {{{rows_name}, {cols_name}, {name}_{matrix_name}_data}};",
         ]
         # fmt: on
@@ -332,7 +1559,11 @@ class KalmanFilterConfigGenerator:
             ("X_init", self.config.X_init, self.preprocessor_define_expressions["num_states"], "(1U)"),
         ]
         # fmt: on
-        if self.config.num_controls > 0:
+
+        # F and H are replaced by the nonlinear models of an extended Kalman filter
+        matrices = [matrix for matrix in matrices if matrix[1] is not None]
+
+        if self.config.B is not None:
             matrices.append(
                 (
                     "B",
@@ -341,13 +1572,57 @@ class KalmanFilterConfigGenerator:
                     self.preprocessor_define_expressions["num_controls"],
                 )
             )
-        return matrices
+
+        # the covariance of a decimated filter is propagated by these instead of F and Q, always dense
+        if self.config.F_decimated is not None:
+            matrices.extend(
+                (
+                    matrix_name,
+                    getattr(self.config, matrix_name),
+                    self.preprocessor_define_expressions["num_states"],
+                    self.preprocessor_define_expressions["num_states"],
+                )
+                for matrix_name in ["F_decimated", "Q_decimated"]
+            )
+
+        # sparse matrices are defined by generate_sparse_definitions instead
+        return [
+            matrix
+            for matrix in matrices
+            if matrix[0] not in self.config.sparse_matrices
+        ]
+
+    def build_sparse_matrix_list(self):
+        num_states = self.preprocessor_define_expressions["num_states"]
+        dims = {
+            "F": (num_states, num_states),
+            "B": (num_states, self.preprocessor_define_expressions["num_controls"]),
+            "H": (self.preprocessor_define_expressions["num_measurements"], num_states),
+            "Q": (num_states, num_states),
+        }
+        return [
+            (matrix_name, getattr(self.config, matrix_name), *dims[matrix_name])
+            for matrix_name in self.config.sparse_matrices
+        ]
 
     def build_storage_variables_list(self):
+        num_states = self.preprocessor_define_expressions["num_states"]
+        # a packed covariance holds num_states * (num_states + 1) / 2 elements, a block-diagonal one its blocks
+        covariance_dims = (
+            num_states,
+            (
+                f"({num_states} + 1U) / 2U"
+                if self.config.packed_covariance
+                else num_states
+            ),
+        )
+        if self.config.covariance_blocks is not None:
+            covariance_dims = (f"({self.block_covariance_size()}U)", "(1U)")
+
         # fmt: off
-        return [
+        storage_variables = [
             ("X_matrix_storage", self.preprocessor_define_expressions["num_states"], "(1U)"),
-            ("P_matrix_storage", self.preprocessor_define_expressions["num_states"], self.preprocessor_define_expressions["num_states"]),
+            ("P_matrix_storage", *covariance_dims),
             ("temp_X_hat_matrix_storage", self.preprocessor_define_expressions["num_states"], "(1U)"),
             ("temp_Bu_matrix_storage", self.preprocessor_define_expressions["num_states"], "(1U)"),
             ("temp_Z_matrix_storage", self.preprocessor_define_expressions["num_measurements"], "(1U)"),
@@ -359,40 +1634,320 @@ class KalmanFilterConfigGenerator:
             ("S_inv_matrix_storage", self.preprocessor_define_expressions["num_measurements"], self.preprocessor_define_expressions["num_measurements"]),
             ("K_matrix_storage", self.preprocessor_define_expressions["num_states"], self.preprocessor_define_expressions["num_measurements"]),
             ("K_H_storage", self.preprocessor_define_expressions["num_states"], self.preprocessor_define_expressions["num_states"]),
-            ("K_H_P_storage", self.preprocessor_define_expressions["num_states"], self.preprocessor_define_expressions["num_states"]),
+            ("K_H_P_storage", *covariance_dims),
         ]
         # fmt: on
+        if self.config.tile_size > 0:
+            # the tiled prediction copies a panel of tile_size columns of P
+            storage_variables.append(
+                ("tile_storage", num_states, f"({self.config.tile_size}U)")
+            )
+
+        has_predict_model = (self.config.model is not None) and (
+            self.config.model.f is not None
+        )
+        # a sparse H is multiplied in place like a selection is gathered
+        has_selection = (self.config.H_selection is not None) or (
+            "H" in self.config.sparse_matrices
+        )
+        reuses_P_Ht = (
+            self.covariance_update_plan["enum"] == "KF_COVARIANCE_UPDATE_K_P_HT"
+        )
+        # like the packed covariance, the blocks are updated from P * H' and predicted into the K * H * P scratch
+        own_covariance_kernels = self.config.packed_covariance or (
+            self.config.covariance_blocks is not None
+        )
+        unused_storage = set()
+        if (
+            own_covariance_kernels or has_selection or reuses_P_Ht
+        ) and not has_predict_model:
+            # only the (K * H) * P covariance update forms K * H, which otherwise holds the Jacobian of f
+            unused_storage.add("K_H_storage")
+        if has_selection:
+            # a selection or sparse H is never copied
+            unused_storage.add("H_temp_storage")
+        if (has_selection or reuses_P_Ht) and not own_covariance_kernels:
+            # K * H * P is then only the packed or block prediction scratch
+            unused_storage.add("K_H_P_storage")
+
+        return [
+            variable
+            for variable in storage_variables
+            if variable[0] not in unused_storage
+        ]
+
+    def generate_alignment(self):
+        # the vector kernels load whole vectors, aligned rows start on a vector boundary
+        return "KF_VECTOR_ALIGNED " if self.config.backend == "vector" else ""
 
     def add_storage_definitions(self, name, storage_variables: list):
+        initial_values = {}
+        if self.config.static_initialization:
+            # X and P start from X_init and P_init without being copied by kf_init
+            initial_values["X_matrix_storage"] = Initializer(self.config.X_init)
+            initial_values["P_matrix_storage"] = self.covariance_storage_initializer(
+                self.config.P_init
+            )
+
         return [
-            f"static matrix_data_t {name}_{var}[{rows} * {cols}] = {{0}};"
+            (
+                Definition(
+                    f"static {self.generate_alignment()}matrix_data_t {name}_{var}[{rows} * {cols}] = ",
+                    initial_values[var],
+                    ";",
+                )
+                if var in initial_values
+                else f"static {self.generate_alignment()}matrix_data_t {name}_{var}[{rows} * {cols}] = {{0}};"
+            )
             for var, rows, cols in storage_variables
         ]
 
+    def block_covariance_size(self):
+        # the diagonal blocks are stored one after the other
+        return sum(size * size for size in self.config.covariance_blocks)
+
+    def covariance_storage_initializer(self, covariance: np.ndarray) -> Initializer:
+        if self.config.covariance_blocks is not None:
+            # the diagonal blocks one after the other, each row by row
+            return Initializer(
+                functools.partial(block_rows, covariance, self.config.covariance_blocks)
+            )
+        if not self.config.packed_covariance:
+            return Initializer(covariance)
+        # the lower triangle, row by row
+        return Initializer(functools.partial(packed_rows, covariance))
+
     def generate_struct_config_definition(self, name: str, storage_variables: list):
+        dense_matrices = {matrix[0] for matrix in self.build_matrix_list()}
+
         # fmt: off
         struct_config = [
             f"const kf_config_S {self.generated_structure_names['filter_config']} = {{",
             "\t// Matrix Configuration Variables",
-            f"\t.X_init = &{name}_X_init,",
-            f"\t.F = &{name}_F,",
-            f"\t.B = &{name}_B," if self.config.num_controls > 0 else "\t.B = NULL,",
-            f"\t.Q = &{name}_Q,",
-            f"\t.P_init = &{name}_P_init,",
-            f"\t.H = &{name}_H,",
-            f"\t.R = &{name}_R,",
+            f"\t.X_init = &{self.symbol(name, 'X_init')},",
+            f"\t.F = &{self.symbol(name, 'F')}," if "F" in dense_matrices else "\t.F = NULL,",
+            f"\t.B = &{self.symbol(name, 'B')}," if "B" in dense_matrices else "\t.B = NULL,",
+            f"\t.Q = &{self.symbol(name, 'Q')}," if "Q" in dense_matrices else "\t.Q = NULL,",
+            f"\t.P_init = &{self.symbol(name, 'P_init')},",
+            f"\t.H = &{self.symbol(name, 'H')}," if "H" in dense_matrices else "\t.H = NULL,",
+            f"\t.R = &{self.symbol(name, 'R')},",
             "\t// Storage variables",
         ]
         # fmt: on
 
         struct_config.extend(
-            f"\t.{var} = {{{rows} * {cols}, {name}_{var}}},"
+            f"\t.{var} = {{{rows} * {cols}, {self.symbol(name, var)}}},"
             for var, rows, cols in storage_variables
         )
 
+        struct_config.extend(self.generate_innovation_threshold_definitions())
+        struct_config.extend(self.generate_steady_state_definitions())
+        struct_config.extend(self.generate_s_inversion_definition())
+
+        if self.config.packed_covariance:
+            struct_config.append("\t// Covariance storage")
+            struct_config.append("\t.packed_covariance = true,")
+        if self.config.covariance_blocks is not None:
+            struct_config.append(
+                f"\t// Approximate covariance of {len(self.config.covariance_blocks)} diagonal blocks"
+            )
+            struct_config.append(f"\t.covariance_blocks = {name}_covariance_blocks,")
+            struct_config.append(
+                f"\t.num_covariance_blocks = {len(self.config.covariance_blocks)}U,"
+            )
+
+        struct_config.extend(self.generate_covariance_update_definition())
+        struct_config.extend(self.generate_tiling_definition())
+        struct_config.extend(self.generate_decimation_definition(name))
+
+        struct_config.extend(self.generate_model_definitions())
+
+        if self.config.H_selection is not None:
+            struct_config.append("\t// Selection matrix H")
+            struct_config.append(
+                f"\t.H_selection = {self.symbol(name, 'H_selection')},"
+            )
+
+        if self.config.sparse_matrices:
+            struct_config.append("\t// Sparse matrices")
+            struct_config.extend(
+                f"\t.{matrix_name}_sparse = &{name}_{matrix_name}_sparse,"
+                for matrix_name in self.config.sparse_matrices
+            )
+
         struct_config.append("};")
         return struct_config
 
+    def symbol(self, name, key):
+        # a model of a bank refers to the definitions shared with the other models
+        return self.shared_symbols.get(key, f"{name}_{key}")
+
+    def generate_selection_definition(self):
+        if self.config.H_selection is None:
+            return []
+
+        name = self.filter_name.upper()
+        indices = ", ".join(f"{index}U" for index in self.config.H_selection)
+        return [
+            f"static const size_t {name}_H_selection[{self.preprocessor_define_expressions['num_measurements']}] = {{{indices}}};"
+        ]
+
+    def generate_covariance_blocks_definition(self):
+        if self.config.covariance_blocks is None:
+            return []
+
+        name = self.filter_name.upper()
+        sizes = ", ".join(f"{size}U" for size in self.config.covariance_blocks)
+        return [
+            f"static const size_t {name}_covariance_blocks[{len(self.config.covariance_blocks)}U] = {{{sizes}}};"
+        ]
+
+    def generate_sparse_definitions(self):
+        name = self.filter_name.upper()
+        definitions = []
+        for (
+            matrix_name,
+            matrix,
+            rows_expr,
+            cols_expr,
+        ) in self.build_sparse_matrix_list():
+            # compressed sparse row format, the nonzeros row by row
+            rows, cols = np.nonzero(matrix)
+            row_offsets = np.concatenate(
+                ([0], np.cumsum(np.bincount(rows, minlength=matrix.shape[0])))
+            )
+            # the values and column indices are written one row at a time, skipping the empty rows
+            values = Initializer(
+                functools.partial(nonempty_row_slices, matrix[rows, cols], row_offsets),
+                separator=", ",
+                braces=("{", "}"),
+            )
+            col_indices = Initializer(
+                functools.partial(nonempty_row_slices, cols, row_offsets),
+                format_row=format_indices,
+                separator=", ",
+                braces=("{", "}"),
+            )
+            offsets = format_indices(row_offsets)
+            # fmt: off
+            definitions.extend([
+                Definition(f"static const matrix_data_t {name}_{matrix_name}_values[{len(rows)}U] = ", values, ";"),
+                Definition(f"static const size_t {name}_{matrix_name}_col_indices[{len(rows)}U] = ", col_indices, ";"),
+                f"static const size_t {name}_{matrix_name}_row_offsets[{rows_expr} + 1U] = {{{offsets}}};",
+                f"static const kf_sparse_matrix_S {name}_{matrix_name}_sparse = "
+                f"{{{rows_expr}, {cols_expr}, {name}_{matrix_name}_row_offsets, {name}_{matrix_name}_col_indices, {name}_{matrix_name}_values}};",
+            ])
+            # fmt: on
+        return definitions
+
+    def generate_innovation_threshold_definitions(self):
+        thresholds = [
+            ("innovation_gate", self.config.innovation_gate),
+            ("innovation_deadband", self.config.innovation_deadband),
+        ]
+        definitions = [
+            f"\t.{field} = {value:.9g}F," for field, value in thresholds if value > 0
+        ]
+        if definitions:
+            definitions.insert(0, "\t// Innovation gating")
+        return definitions
+
+    def generate_covariance_update_definition(self):
+        # the packed and block covariances, the selection H and the sparse H always reuse P * H'
+        if (
+            self.config.packed_covariance
+            or (self.config.covariance_blocks is not None)
+            or (self.config.H_selection is not None)
+            or ("H" in self.config.sparse_matrices)
+        ):
+            return []
+        plan = self.covariance_update_plan
+        return [
+            f"\t// Covariance update: {plan['expression']}, {plan['multiply_adds']} multiply-adds",
+            f"\t.covariance_update = {plan['enum']},",
+        ]
+
+    def generate_tiling_definition(self):
+        if self.config.tile_size == 0:
+            return []
+        return [
+            f"\t// {self.config.num_states} states, the covariance products run on {self.config.tile_size} * {self.config.tile_size} tiles",
+            f"\t.tile_size = {self.config.tile_size}U,",
+        ]
+
+    def generate_decimation_definition(self, name):
+        if self.config.covariance_decimation == 1:
+            return []
+        return [
+            f"\t// Covariance propagated every {self.config.covariance_decimation} predicts",
+            f"\t.covariance_decimation = {self.config.covariance_decimation}U,",
+            f"\t.F_decimated = &{name}_F_decimated,",
+            f"\t.Q_decimated = &{name}_Q_decimated,",
+        ]
+
+    def generate_steady_state_definitions(self):
+        if self.config.steady_state_threshold == 0:
+            return []
+        return [
+            "\t// Steady-state detection",
+            f"\t.steady_state_threshold = {self.config.steady_state_threshold:.9g}F,",
+            f"\t.steady_state_updates = {self.config.steady_state_updates}U,",
+        ]
+
+    def generate_model_function_names(self):
+        return {
+            "predict_model": f"{self.filter_name}_predict_model",
+            "measurement_model": f"{self.filter_name}_measurement_model",
+        }
+
+    def generate_model_function_definitions(self):
+        model = self.config.model
+        if model is None:
+            return []
+
+        function_names = self.generate_model_function_names()
+        definitions = []
+        if model.f is not None:
+            definitions.append(
+                model.generate_predict_model_function(function_names["predict_model"])
+            )
+        if model.h is not None:
+            definitions.append(
+                model.generate_measurement_model_function(
+                    function_names["measurement_model"]
+                )
+            )
+        return definitions
+
+    def generate_model_definitions(self):
+        model = self.config.model
+        if model is None:
+            return []
+
+        function_names = self.generate_model_function_names()
+        definitions = ["\t// Extended Kalman filter models"]
+        if model.f is not None:
+            definitions.append(f"\t.predict_model = {function_names['predict_model']},")
+            definitions.append(
+                f"\t.num_model_controls = {self.preprocessor_define_expressions['num_controls']},"
+            )
+        if model.h is not None:
+            definitions.append(
+                f"\t.measurement_model = {function_names['measurement_model']},"
+            )
+        return definitions
+
+    def generate_s_inversion_definition(self):
+        s_inversion = {
+            1: "KF_S_INVERSION_SCALAR",
+            2: "KF_S_INVERSION_CLOSED_FORM_2X2",
+            3: "KF_S_INVERSION_CLOSED_FORM_3X3",
+        }.get(self.config.num_measurements, "KF_S_INVERSION_CHOLESKY")
+        return [
+            "\t// Innovation covariance inversion",
+            f"\t.S_inversion = {s_inversion},",
+        ]
+
     def write_to_file(self, c_output_file_path: str, h_output_file_path: str):
         with open(c_output_file_path, "w") as output_file:
             output_file.write('#include "kalman.h"\n')
@@ -401,13 +1956,16 @@ class KalmanFilterConfigGenerator:
             header_file_name = h_output_file_path.split("/")[-1]
             output_file.write(f'#include "{header_file_name}"\n\n')
             output_file.write(self.generated_filter_static_data_struct + "\n\n")
-            output_file.write("\n".join(self.generated_config_definitions) + "\n\n")
-            output_file.write("\n".join(self.generated_storage_definitions) + "\n\n")
+            write_definitions(output_file, self.generated_config_definitions)
+            output_file.write("\n\n")
+            write_definitions(output_file, self.generated_storage_definitions)
+            output_file.write("\n\n")
             output_file.write(
                 "\n".join(self.generated_struct_config_definition) + "\n\n"
             )
             output_file.write("/* Function Definitions */\n")
-            output_file.write("\n".join(self.generated_function_definitions) + "\n\n")
+            write_definitions(output_file, self.generated_function_definitions)
+            output_file.write("\n\n")
 
         with open(h_output_file_path, "w") as output_file:
             output_file.write('#include "kalman.h"\n\n')
@@ -1,13 +1,32 @@
-from generator.file_content_generator import KalmanFilterConfigGenerator
+import io
+
+from generator.file_content_generator import (
+    KalmanFilterConfigGenerator,
+    write_definitions,
+)
 
 
 class FileWriter:
-    def __init__(self, generator, c_output_file_path: str, h_output_file_path: str):
+    def __init__(
+        self,
+        generator,
+        c_output_file_path: str = None,
+        h_output_file_path: str = None,
+        amalgamated_source: str = None,
+    ):
         self.generated_filter_static_data_struct = (
             generator.generated_filter_static_data_struct
         )
         self.generated_config_definitions = generator.generated_config_definitions
+        self.generated_static_assertions = generator.generated_static_assertions
+        self.static_initialization = generator.config.static_initialization
+        self.backend = generator.config.backend
+        # the probabilities of the models of a bank are updated with expf
+        self.imm = generator.config.models is not None
         self.generated_storage_definitions = generator.generated_storage_definitions
+        self.generated_model_function_definitions = (
+            generator.generated_model_function_definitions
+        )
         self.generated_struct_config_definition = (
             generator.generated_struct_config_definition
         )
@@ -15,8 +34,13 @@ class FileWriter:
         self.generated_preprocessor_defines = generator.generated_preprocessor_defines
         self.generated_structure_definitions = generator.generated_structure_definitions
         self.generated_function_headers = generator.generated_function_headers
+        self.library_dimensions = generator.library_dimensions
+        # the library and matrix sources compiled into the .c file, see generator/amalgamator.py
+        self.amalgamated_source = amalgamated_source
 
-        self.write_to_file(c_output_file_path, h_output_file_path)
+        # without paths the files are only rendered in memory, see c_file_content and h_file_content
+        if (c_output_file_path is not None) and (h_output_file_path is not None):
+            self.write_to_file(c_output_file_path, h_output_file_path)
 
     def write_to_file(self, c_output_file_path: str, h_output_file_path: str):
         # Write to .c file
@@ -25,42 +49,113 @@ class FileWriter:
         # Write to .h file
         self._write_h_file(h_output_file_path)
 
+    def c_file_content(self, header_file_name: str) -> str:
+        """Contents of the .c file, including the header of the given name."""
+        output_file = io.StringIO()
+        self.write_c_file(output_file, header_file_name)
+        return output_file.getvalue()
+
+    def h_file_content(self) -> str:
+        """Contents of the .h file."""
+        output_file = io.StringIO()
+        self.write_h_file(output_file)
+        return output_file.getvalue()
+
+    def write_c_file(self, output_file, header_file_name: str):
+        """Stream the .c file to an open file, including the header of the given name."""
+        self._write_c_includes(output_file, header_file_name)
+        self._write_c_definitions(output_file)
+
+    def write_h_file(self, output_file):
+        """Stream the .h file to an open file."""
+        self._write_h_includes(output_file)
+        self._write_h_preprocessor_defines(output_file)
+        self._write_h_struct_definitions(output_file)
+        self._write_h_function_headers(output_file)
+
     def _write_c_file(self, c_output_file_path: str, h_output_file_path: str):
         """Helper function to write the .c file."""
         with open(c_output_file_path, "w") as output_file:
-            self._write_c_includes(output_file, h_output_file_path)
-            self._write_c_definitions(output_file)
+            self.write_c_file(output_file, h_output_file_path.split("/")[-1])
 
     def _write_h_file(self, h_output_file_path: str):
         """Helper function to write the .h file."""
         with open(h_output_file_path, "w") as output_file:
-            self._write_h_includes(output_file)
-            self._write_h_preprocessor_defines(output_file)
-            self._write_h_struct_definitions(output_file)
-            self._write_h_function_headers(output_file)
+            self.write_h_file(output_file)
 
-    def _write_c_includes(self, output_file, h_output_file_path):
+    def _write_c_includes(self, output_file, header_file_name):
         """Helper to write includes for the .c file."""
-        header_file_name = h_output_file_path.split("/")[-1]
-        includes = [
-            '#include "kalman.h"',
+        if self.amalgamated_source is not None:
+            self._write_c_amalgamated_includes(output_file, header_file_name)
+            return
+
+        includes = ['#include "kalman.h"']
+        if self.generated_model_function_definitions:
+            # the generated nonlinear models use the math functions and memset
+            includes += ["#include <math.h>", "#include <string.h>"]
+        elif self.imm:
+            includes += ["#include <math.h>"]
+        includes += [
             "#define EXTERN_INLINE_MATRIX STATIC_INLINE",
             '#include "matrix.h"',
             f'#include "{header_file_name}"',
         ]
         output_file.write("\n".join(includes) + "\n\n")
 
+    def _write_c_amalgamated_includes(self, output_file, header_file_name):
+        """Helper to write the library sources of an amalgamated .c file."""
+        includes = [
+            "/* Amalgamated build, the Kalman filter library and matrix routines are compiled in this file */",
+            "#define KF_API static inline",
+            f'#include "{header_file_name}"',
+        ]
+        if self.library_dimensions is not None:
+            # the library is specialized for the dimensions when every filter of the file shares them
+            includes += [
+                f"#define KF_AMALGAMATED_NUM_STATES {self.library_dimensions['num_states']}",
+                f"#define KF_AMALGAMATED_NUM_MEASUREMENTS {self.library_dimensions['num_measurements']}",
+            ]
+        if self.static_initialization:
+            # the only filter of the library is initialized at compile time
+            includes += ["#define KF_STATIC_INITIALIZATION"]
+        if self.backend == "vector":
+            includes += ["#define KF_BACKEND_VECTOR"]
+        if self.generated_model_function_definitions:
+            includes += ["#include <math.h>", "#include <string.h>"]
+        elif self.imm:
+            includes += ["#include <math.h>"]
+        includes += ["#define EXTERN_INLINE_MATRIX STATIC_INLINE"]
+        output_file.write("\n".join(includes) + "\n\n")
+        output_file.write(self.amalgamated_source + "\n")
+
     def _write_c_definitions(self, output_file):
         """Helper to write definitions for the .c file."""
+        # each section is a list of definitions and the separator between them
         sections = [
-            self.generated_filter_static_data_struct,
-            "\n".join(self.generated_config_definitions),
-            "\n".join(self.generated_storage_definitions),
-            "\n".join(self.generated_struct_config_definition),
-            "/* Function Definitions */",
-            "\n".join(self.generated_function_definitions),
+            (self.generated_config_definitions, "\n"),
+            (self.generated_storage_definitions, "\n"),
+        ]
+        if self.generated_model_function_definitions:
+            sections += [
+                (["/* Extended Kalman Filter Models */"], "\n"),
+                (self.generated_model_function_definitions, "\n\n"),
+            ]
+        sections += [(self.generated_struct_config_definition, "\n")]
+        if self.generated_static_assertions:
+            sections += [
+                (["/* Compile-time Checks */"], "\n"),
+                (self.generated_static_assertions, "\n"),
+            ]
+        # a statically initialized filter data refers to the config and its storage
+        sections += [
+            ([self.generated_filter_static_data_struct], "\n"),
+            (["/* Function Definitions */"], "\n"),
+            (self.generated_function_definitions, "\n"),
         ]
-        output_file.write("\n\n".join(sections) + "\n\n")
+        # the definitions are written one by one and their matrices row by row, never joined into one string
+        for definitions, separator in sections:
+            write_definitions(output_file, definitions, separator)
+            output_file.write("\n\n")
 
     def _write_h_includes(self, output_file):
         """Helper to write includes for the .h file."""
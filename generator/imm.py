@@ -0,0 +1,62 @@
+import numpy as np
+
+# keys of the raw config that only apply to the whole bank
+IMM_KEYS = ["models", "transition_probabilities", "model_probabilities"]
+
+
+def model_raw_config(raw_config, model, name):
+    """
+    Raw JSON config of the filter of a model of an interacting multiple model bank, the filter with the F, Q and B of
+    the model. The optional settings of the filter are kept.
+    """
+    model_config = {
+        key: value
+        for key, value in raw_config.items()
+        if key not in IMM_KEYS + ["name", "F", "Q", "B"]
+    }
+    model_config["name"] = name
+    model_config["decompose"] = False
+    # the models share the dense matrices of the bank
+    model_config["sparse_threshold"] = 0
+    model_config["F"] = model["F"].tolist()
+    model_config["Q"] = model["Q"].tolist()
+    if model["B"] is not None:
+        model_config["B"] = model["B"].tolist()
+    return model_config
+
+
+def first_equal_models(models, key):
+    """
+    For every model, the index of the first model with the same matrix key, so equal matrices are only stored once.
+    """
+    first = []
+    for index, model in enumerate(models):
+        if model[key] is None:
+            first.append(index)
+            continue
+        first.append(
+            next(
+                other
+                for other in range(index + 1)
+                if np.array_equal(models[other][key], model[key])
+            )
+        )
+    return first
+
+
+def format_imm_report(name, models):
+    """
+    One line summary of the models of a bank and of the matrices they share.
+    """
+    distinct = {
+        key: len(set(first_equal_models(models, key)))
+        for key in ["F", "Q"] + (["B"] if models[0]["B"] is not None else [])
+    }
+    distinct_list = ", ".join(
+        f"{count} distinct {key}" for key, count in list(distinct.items())[:-1]
+    )
+    last_key, last_count = list(distinct.items())[-1]
+    return (
+        f"{name}: interacting multiple model bank of {len(models)} models sharing H, R, P_init, X_init and the "
+        f"scratch storage, with {distinct_list} and {last_count} distinct {last_key}"
+    )
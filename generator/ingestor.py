@@ -25,20 +25,61 @@ NUM_CONTROLS_STR = "num_controls"
 
 # fmt: off
 supported_keys = [
-    {"key": "F", "required": True, "expected_dims": (NUM_STATES_STR, NUM_STATES_STR)},
+    {"key": "F", "required": True, "expected_dims": (NUM_STATES_STR, NUM_STATES_STR), "replaced_by": "f"},
     {"key": "Q", "required": True, "expected_dims": (NUM_STATES_STR, NUM_STATES_STR)},
-    {"key": "H", "required": True, "expected_dims": (NUM_MEASUREMENTS_STR, NUM_STATES_STR)},
+    {"key": "H", "required": True, "expected_dims": (NUM_MEASUREMENTS_STR, NUM_STATES_STR), "replaced_by": "h"},
     {"key": "R", "required": True, "expected_dims": (NUM_MEASUREMENTS_STR, NUM_MEASUREMENTS_STR)},
     {"key": "P_init", "required": True, "expected_dims": (NUM_STATES_STR, NUM_STATES_STR)},
     {"key": "X_init", "required": True, "expected_dims": (NUM_STATES_STR,)},
     {"key": "B", "required": False, "expected_dims": (NUM_STATES_STR, NUM_CONTROLS_STR)},
     {"key": "name", "required": True},
+    {"key": "innovation_gate", "required": False},
+    {"key": "innovation_deadband", "required": False},
+    {"key": "packed_covariance", "required": False},
+    {"key": "static_initialization", "required": False},
+    {"key": "snapshot", "required": False},
+    {"key": "covariance_blocks", "required": False},
+    {"key": "steady_state_threshold", "required": False},
+    {"key": "steady_state_updates", "required": False},
+    {"key": "sparse_threshold", "required": False},
+    {"key": "decompose", "required": False},
+    {"key": "backend", "required": False},
+    {"key": "tiling_threshold", "required": False},
+    {"key": "tile_size", "required": False},
+    {"key": "covariance_decimation", "required": False},
+    {"key": "models", "required": False},
+    {"key": "transition_probabilities", "required": False},
+    {"key": "model_probabilities", "required": False},
+    {"key": "states", "required": False},
+    {"key": "controls", "required": False},
+    {"key": "parameters", "required": False},
+    {"key": "f", "required": False},
+    {"key": "h", "required": False},
 ]
 # fmt: on
 
+# Consecutive converged updates before the gain is latched, and the limit of the validity bit pattern
+DEFAULT_STEADY_STATE_UPDATES = 10
+MAX_STEADY_STATE_MEASUREMENTS = 32
+
+# Density (fraction of nonzeros) below which a constant matrix is stored in compressed sparse row format
+DEFAULT_SPARSE_THRESHOLD = 0.1
+
+# Kernels the library can be compiled with, see KF_BACKEND_VECTOR in kalman.h
+SUPPORTED_BACKENDS = ["portable", "vector"]
+
+# Number of states from which the dense covariance products are tiled, and the edge of a tile. A 32 * 32 tile of
+# floats takes 4 KiB, so the tiles of the three operands of a product stay in a 32 KiB L1 data cache
+DEFAULT_TILING_THRESHOLD = 64
+DEFAULT_TILE_SIZE = 32
+
 # Collect the set of all supported keys and required keys
 supported_keys_set = {item["key"] for item in supported_keys}
 required_keys_set = {item["key"] for item in supported_keys if item["required"]}
+# Required matrices that an extended Kalman filter replaces with a nonlinear model
+replaceable_keys = {
+    item["key"]: item["replaced_by"] for item in supported_keys if "replaced_by" in item
+}
 
 
 class KalmanFilterConfig:
@@ -47,7 +88,7 @@ class KalmanFilterConfig:
 
         # Check that all required keys are present in the config
         for key in required_keys_set:
-            if key not in config:
+            if (key not in config) and (replaceable_keys.get(key) not in config):
                 raise InvalidConfigException(f"Missing required key: {key}")
 
         # Check that there are no unknown keys in the config
@@ -56,7 +97,11 @@ class KalmanFilterConfig:
                 raise InvalidConfigException(f"Unknown key: {key}")
 
         # List of keys corresponding to matrices that need conversion
-        matrix_keys = ["F", "Q", "H", "R", "P_init", "X_init"]
+        matrix_keys = [
+            key
+            for key in ["F", "Q", "H", "R", "P_init", "X_init"]
+            if replaceable_keys.get(key) not in config
+        ]
 
         if "B" in config:
             matrix_keys.append("B")
@@ -67,10 +112,22 @@ class KalmanFilterConfig:
 
         # After matrices are converted, you can access their shapes
         self.num_states = self.X_init.shape[0]
-        self.num_measurements = self.H.shape[0]
+
+        # Nonlinear models of an extended Kalman filter replace F and/or H
+        self.model = self._get_model(config)
+        if (self.model is not None) and (self.model.f is not None):
+            self.F = None
+        if (self.model is not None) and (self.model.h is not None):
+            self.H = None
+            self.num_measurements = len(self.model.h)
+        else:
+            self.num_measurements = self.H.shape[0]
 
         if "B" in config:
             self.num_controls = self.B.shape[1]
+        elif (self.model is not None) and (self.model.f is not None):
+            self.num_controls = len(self.model.control_symbols)
+            self.B = None
         else:
             self.num_controls = 0
             self.B = None
@@ -82,6 +139,456 @@ class KalmanFilterConfig:
         # Make an exception for X_init and reshape it to size (num_states, 1)
         self.X_init = self.X_init.reshape(self.num_states, 1)
 
+        # Optional normalized innovation squared thresholds, 0 disables them
+        self.innovation_gate = self._get_threshold(config, "innovation_gate")
+        self.innovation_deadband = self._get_threshold(config, "innovation_deadband")
+
+        if (self.innovation_gate > 0) and (
+            self.innovation_deadband >= self.innovation_gate
+        ):
+            raise InvalidConfigException(
+                "innovation_deadband must be smaller than innovation_gate"
+            )
+
+        # Optionally store only the lower triangle of the symmetric covariance
+        self.packed_covariance = self._get_flag(config, "packed_covariance")
+
+        # Optionally initialize the filter data at compile time instead of in kf_init
+        self.static_initialization = self._get_flag(config, "static_initialization")
+
+        # Optionally publish a consistent copy of X and P after every step for concurrent readers
+        self.snapshot = self._get_flag(config, "snapshot")
+
+        # Optional approximate filter that keeps only the diagonal blocks of the covariance
+        self.covariance_blocks = self._get_covariance_blocks(config)
+
+        # Optional latching of the gain once the covariance has converged, 0 disables it
+        self.steady_state_threshold = self._get_threshold(
+            config, "steady_state_threshold"
+        )
+        self.steady_state_updates = self._get_steady_state_updates(config)
+
+        # Optional interacting multiple model bank, the models replace F, Q and B and share the rest of the filter
+        self.models = self._get_models(config)
+        self.transition_probabilities = None
+        self.model_probabilities = None
+        if self.models is not None:
+            self.transition_probabilities = self._get_transition_probabilities(config)
+            self.model_probabilities = self._get_model_probabilities(config)
+
+        # A measurement matrix whose rows are all unit vectors only selects states
+        self.H_selection = self._get_selection(self.H)
+
+        # Constant matrices with few nonzeros are stored and multiplied in compressed sparse row format
+        self.sparse_threshold = self._get_sparse_threshold(config)
+        self.sparse_matrices = self._get_sparse_matrices()
+
+        # Decoupled groups of states run as independent sub-filters behind the same API
+        self.blocks = self._get_blocks(config)
+
+        # Kernels of the library, and the storage layout generated for them
+        self.backend = self._get_backend(config)
+
+        # Large dense filters multiply the covariance tile by tile to stay in cache
+        self.tile_size = self._get_tile_size(config)
+
+        # Optional propagation of the covariance every k predicts, with F^k and the accumulated Q
+        self.covariance_decimation = self._get_covariance_decimation(config)
+        self.F_decimated = None
+        self.Q_decimated = None
+        if self.covariance_decimation > 1:
+            try:
+                from generator.approximation import decimated_model
+            except ImportError:
+                from approximation import decimated_model
+
+            self.F_decimated, self.Q_decimated = decimated_model(
+                self.F, self.Q, self.covariance_decimation
+            )
+
+    def _get_threshold(self, config, key):
+        """
+        Read an optional non-negative scalar threshold from the config, defaulting to 0 (disabled).
+        """
+        value = config.get(key, 0.0)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise InvalidConfigException(f"Expected {key} to be a number")
+        if value < 0:
+            raise InvalidConfigException(f"Expected {key} to be non-negative")
+        return float(value)
+
+    def _get_covariance_blocks(self, config):
+        """
+        Sizes of the diagonal blocks of an approximate block-diagonal covariance, in state order, or None for the full
+        covariance. "diagonal" keeps only the variances.
+        """
+        if "covariance_blocks" not in config:
+            return None
+
+        blocks = config["covariance_blocks"]
+        if blocks == "diagonal":
+            blocks = [1] * self.num_states
+        if (
+            not isinstance(blocks, list)
+            or len(blocks) == 0
+            or any(
+                isinstance(size, bool) or not isinstance(size, int) or size < 1
+                for size in blocks
+            )
+        ):
+            raise InvalidConfigException(
+                'Expected covariance_blocks to be "diagonal" or a list of positive integers'
+            )
+        if sum(blocks) != self.num_states:
+            raise InvalidConfigException(
+                f"Expected covariance_blocks to sum to {self.num_states} states, but got {sum(blocks)}"
+            )
+        # the snapshot publishes the full covariance, and the packed layout is another storage of it
+        if self.packed_covariance or self.snapshot:
+            raise InvalidConfigException(
+                "covariance_blocks is not supported together with packed_covariance or snapshot"
+            )
+        return blocks
+
+    def _get_models(self, config):
+        """
+        F, Q and B of every model of an interacting multiple model bank, or None for a single filter. A model without
+        one of these matrices uses the one of the filter.
+        """
+        if "models" not in config:
+            for key in ["transition_probabilities", "model_probabilities"]:
+                if key in config:
+                    raise InvalidConfigException(
+                        f"{key} is only supported together with models"
+                    )
+            return None
+
+        models = config["models"]
+        if (
+            not isinstance(models, list)
+            or len(models) < 2
+            or any(not isinstance(model, dict) for model in models)
+        ):
+            raise InvalidConfigException(
+                "Expected models to be a list of at least 2 objects"
+            )
+
+        # the models are mixed through their full covariances, and a gate or a latched gain of one model would
+        # leave the others behind
+        unsupported = [
+            key
+            for key, enabled in [
+                ("f or h", self.model is not None),
+                ("packed_covariance", self.packed_covariance),
+                ("static_initialization", self.static_initialization),
+                ("snapshot", self.snapshot),
+                ("covariance_blocks", self.covariance_blocks is not None),
+                ("steady_state_threshold", self.steady_state_threshold > 0),
+                ("innovation_gate", self.innovation_gate > 0),
+                ("innovation_deadband", self.innovation_deadband > 0),
+            ]
+            if enabled
+        ]
+        if unsupported:
+            raise InvalidConfigException(
+                f"models is not supported together with {', '.join(unsupported)}"
+            )
+
+        matrix_keys = ["F", "Q"] if self.B is None else ["F", "Q", "B"]
+        expected_dims_dict = self._generate_expected_dims(matrix_keys)
+        bank = []
+        for model in models:
+            for key in model:
+                if key not in matrix_keys:
+                    raise InvalidConfigException(f"Unknown key of a model: {key}")
+            matrices = {"B": None}
+            for key, expected_dim in expected_dims_dict.items():
+                matrix = (
+                    np.array(model[key], dtype=np.float32)
+                    if key in model
+                    else getattr(self, key)
+                )
+                if matrix.shape != expected_dim:
+                    raise InvalidDimensionsException(
+                        f"models {key}", expected_dim, matrix.shape
+                    )
+                matrices[key] = matrix
+            bank.append(matrices)
+        return bank
+
+    def _get_transition_probabilities(self, config):
+        """
+        Markov matrix of the model switches between two predicts, the element (i, j) is the probability of a switch
+        from model i to model j, so every row sums to 1.
+        """
+        if "transition_probabilities" not in config:
+            raise InvalidConfigException(
+                "Missing required key for models: transition_probabilities"
+            )
+
+        num_models = len(self.models)
+        probabilities = np.array(config["transition_probabilities"], dtype=np.float32)
+        if probabilities.shape != (num_models, num_models):
+            raise InvalidDimensionsException(
+                "transition_probabilities",
+                (num_models, num_models),
+                probabilities.shape,
+            )
+        if np.any(probabilities < 0) or not np.allclose(
+            probabilities.sum(axis=1), 1, atol=1e-6
+        ):
+            raise InvalidConfigException(
+                "Expected every row of transition_probabilities to be non-negative and to sum to 1"
+            )
+        return probabilities
+
+    def _get_model_probabilities(self, config):
+        """
+        Initial probability of every model, the models are equally likely unless given.
+        """
+        num_models = len(self.models)
+        if "model_probabilities" not in config:
+            return np.full(num_models, 1 / num_models, dtype=np.float32)
+
+        probabilities = np.array(config["model_probabilities"], dtype=np.float32)
+        if probabilities.shape != (num_models,):
+            raise InvalidDimensionsException(
+                "model_probabilities", (num_models,), probabilities.shape
+            )
+        if np.any(probabilities < 0) or not np.isclose(
+            probabilities.sum(), 1, atol=1e-6
+        ):
+            raise InvalidConfigException(
+                "Expected model_probabilities to be non-negative and to sum to 1"
+            )
+        return probabilities
+
+    def _get_model(self, config):
+        """
+        Build the symbolic model of an extended Kalman filter from the f and h expressions, if any.
+        """
+        if ("f" not in config) and ("h" not in config):
+            for key in ["states", "controls", "parameters"]:
+                if key in config:
+                    raise InvalidConfigException(
+                        f"{key} is only supported together with f or h"
+                    )
+            return None
+
+        if "states" not in config:
+            raise InvalidConfigException("Missing required key for f or h: states")
+        if "controls" in config and "f" not in config:
+            raise InvalidConfigException("controls is only supported together with f")
+        if "B" in config and "f" in config:
+            raise InvalidConfigException(
+                "B is not supported together with f, list the control inputs in controls"
+            )
+        if len(config["states"]) != self.num_states:
+            raise InvalidConfigException(
+                f"Expected {self.num_states} states to match X_init, but got {len(config['states'])}"
+            )
+
+        parameters = config.get("parameters", {})
+        if not isinstance(parameters, dict):
+            raise InvalidConfigException(
+                "Expected parameters to be an object of names and values"
+            )
+
+        try:
+            from generator.symbolic_model import SymbolicModel
+        except ImportError:
+            from symbolic_model import SymbolicModel
+
+        return SymbolicModel(
+            config["states"],
+            config.get("controls", []),
+            parameters,
+            f=config.get("f"),
+            h=config.get("h"),
+        )
+
+    def _get_steady_state_updates(self, config):
+        """
+        Consecutive converged updates before the gain is latched, requires a steady_state_threshold.
+        """
+        if self.steady_state_threshold == 0:
+            if "steady_state_updates" in config:
+                raise InvalidConfigException(
+                    "steady_state_updates is only supported together with steady_state_threshold"
+                )
+            return 0
+
+        if self.num_measurements > MAX_STEADY_STATE_MEASUREMENTS:
+            raise InvalidConfigException(
+                f"Steady-state detection supports at most {MAX_STEADY_STATE_MEASUREMENTS} measurements"
+            )
+
+        value = config.get("steady_state_updates", DEFAULT_STEADY_STATE_UPDATES)
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise InvalidConfigException(
+                "Expected steady_state_updates to be a positive integer"
+            )
+        return value
+
+    def _get_selection(self, H):
+        """
+        Index of the state measured by each row of H if every row is a unit vector, None otherwise.
+        """
+        # the block-diagonal covariance has dense kernels only
+        if (H is None) or (self.covariance_blocks is not None):
+            return None
+
+        selection = []
+        for row in H:
+            nonzero = np.flatnonzero(row)
+            if (len(nonzero) != 1) or (row[nonzero[0]] != 1.0):
+                return None
+            selection.append(int(nonzero[0]))
+        return selection
+
+    def _get_sparse_threshold(self, config):
+        """
+        Density below which a constant matrix is stored sparse, 0 keeps every matrix dense.
+        """
+        if "sparse_threshold" not in config:
+            return DEFAULT_SPARSE_THRESHOLD
+
+        value = self._get_threshold(config, "sparse_threshold")
+        if value > 1:
+            raise InvalidConfigException("Expected sparse_threshold to be at most 1")
+        return value
+
+    def _get_sparse_matrices(self):
+        """
+        Names of the constant F, B, H and Q matrices whose density is below the sparse threshold. A selection H is
+        gathered without being stored, and an all-zero matrix is kept dense as C has no empty arrays.
+        """
+        sparse_matrices = []
+        # the models of a bank share the dense matrices of the filter
+        if (self.covariance_blocks is not None) or (self.models is not None):
+            return sparse_matrices
+        for key in ["F", "B", "H", "Q"]:
+            matrix = getattr(self, key)
+            if (matrix is None) or (key == "H" and self.H_selection is not None):
+                continue
+            num_nonzeros = np.count_nonzero(matrix)
+            if 0 < num_nonzeros < self.sparse_threshold * matrix.size:
+                sparse_matrices.append(key)
+        return sparse_matrices
+
+    def _get_blocks(self, config):
+        """
+        Independent blocks of a linear filter that opts in with decompose, see find_blocks, or None if the filter is not
+        decomposed or has a single block. Decomposing changes the generated API, so it is never the default.
+        """
+        if not self._get_flag(config, "decompose", default=False):
+            return None
+
+        # the models of an extended Kalman filter couple the states through their Jacobians, and the innovation
+        # thresholds, the snapshot, the covariance blocks and the models of a bank apply to the whole filter
+        unsupported = [
+            key
+            for key, enabled in [
+                ("f or h", self.model is not None),
+                ("models", self.models is not None),
+                ("innovation_gate", self.innovation_gate > 0),
+                ("innovation_deadband", self.innovation_deadband > 0),
+                ("snapshot", self.snapshot),
+                ("covariance_blocks", self.covariance_blocks is not None),
+            ]
+            if enabled
+        ]
+        if unsupported:
+            raise InvalidConfigException(
+                f"decompose is not supported together with {', '.join(unsupported)}"
+            )
+
+        try:
+            from generator.decomposition import find_blocks
+        except ImportError:
+            from decomposition import find_blocks
+
+        blocks = find_blocks(self.F, self.B, self.Q, self.H, self.R, self.P_init)
+        return blocks if len(blocks) > 1 else None
+
+    def _get_backend(self, config):
+        """
+        Kernels the library is compiled with, portable unless another one of SUPPORTED_BACKENDS is given.
+        """
+        backend = config.get("backend", SUPPORTED_BACKENDS[0])
+        if backend not in SUPPORTED_BACKENDS:
+            raise InvalidConfigException(
+                f"Expected backend to be one of {', '.join(SUPPORTED_BACKENDS)}"
+            )
+        return backend
+
+    def _get_tile_size(self, config):
+        """
+        Edge of the cache tiles of the dense covariance products, 0 if the filter has fewer states than the tiling
+        threshold. A tiling_threshold of 0 disables tiling, and the packed and block-diagonal covariances have kernels
+        of their own.
+        """
+        threshold = config.get("tiling_threshold", DEFAULT_TILING_THRESHOLD)
+        if (
+            isinstance(threshold, bool)
+            or not isinstance(threshold, int)
+            or threshold < 0
+        ):
+            raise InvalidConfigException(
+                "Expected tiling_threshold to be a non-negative integer"
+            )
+
+        tile_size = config.get("tile_size", DEFAULT_TILE_SIZE)
+        if (
+            isinstance(tile_size, bool)
+            or not isinstance(tile_size, int)
+            or tile_size < 1
+        ):
+            raise InvalidConfigException("Expected tile_size to be a positive integer")
+
+        if (
+            (threshold == 0)
+            or (self.num_states < threshold)
+            or self.packed_covariance
+            or (self.covariance_blocks is not None)
+        ):
+            return 0
+        # a tile larger than the filter would only waste scratch storage
+        return min(tile_size, self.num_states)
+
+    def _get_covariance_decimation(self, config):
+        """
+        Number of predicts per propagation of the covariance, 1 propagates it every predict. The Jacobian of an
+        extended Kalman filter changes every predict, so it has no constant F^k.
+        """
+        decimation = config.get("covariance_decimation", 1)
+        if (
+            isinstance(decimation, bool)
+            or not isinstance(decimation, int)
+            or decimation < 1
+        ):
+            raise InvalidConfigException(
+                "Expected covariance_decimation to be a positive integer"
+            )
+        if (decimation > 1) and (self.model is not None):
+            raise InvalidConfigException(
+                "covariance_decimation is only supported for linear filters, not f or h models"
+            )
+        if (decimation > 1) and (self.models is not None):
+            raise InvalidConfigException(
+                "covariance_decimation is not supported together with models"
+            )
+        return decimation
+
+    def _get_flag(self, config, key, default=False):
+        """
+        Read an optional boolean flag from the config, defaulting to False unless another default is given.
+        """
+        value = config.get(key, default)
+        if not isinstance(value, bool):
+            raise InvalidConfigException(f"Expected {key} to be a boolean")
+        return value
+
     def _generate_expected_dims(self, matrix_keys):
         """
         Generate a dictionary mapping each key in matrix_keys to its expected dimensions,
@@ -0,0 +1,104 @@
+import contextlib
+import json
+import os
+import time
+
+
+class StageProfiler:
+    """
+    Records the wall and CPU time of the stages of a generator run, optionally per config. Stages may be nested, a
+    config stage then holds the stages it runs. Disabled, it records nothing and costs a context manager per stage.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        # one dict per finished stage, in the order the stages started
+        self.events = []
+
+    @contextlib.contextmanager
+    def stage(self, name, config=None):
+        """Time the body of the with statement as the stage name, of the given config if any."""
+        if not self.enabled:
+            yield
+            return
+        event = {
+            "name": name,
+            "config": config,
+            "start": time.perf_counter() - self.origin,
+        }
+        self.events.append(event)
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            event["wall"] = time.perf_counter() - self.origin - event["start"]
+            event["cpu"] = time.process_time() - cpu_start
+
+    def chrome_trace(self):
+        """
+        The stages as complete events of the Chrome trace event format, for chrome://tracing or Perfetto. The CPU time
+        and the config of a stage are in its arguments.
+        """
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": (
+                        event["name"]
+                        if event["config"] is None
+                        else f"{event['name']} {event['config']}"
+                    ),
+                    "cat": "stage" if event["config"] is None else "config",
+                    "ph": "X",
+                    "ts": event["start"] * 1e6,
+                    "dur": event["wall"] * 1e6,
+                    "pid": pid,
+                    "tid": 0,
+                    "args": {
+                        "config": event["config"],
+                        "cpu_ms": event["cpu"] * 1e3,
+                    },
+                }
+                for event in self.events
+                if "wall" in event
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def write_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary(self):
+        """
+        Wall and CPU time of every stage, summed over the calls of the stage for the same config, in the order the
+        stages first started, and of every stage summed over the configs. A stage with much more wall than CPU time
+        waits on a subprocess or the disk.
+        """
+        rows = {}
+        totals = {}
+        for event in self.events:
+            if "wall" not in event:
+                continue
+            for table, key in [
+                (rows, (event["name"], event["config"])),
+                (totals, event["name"]),
+            ]:
+                calls, wall, cpu = table.get(key, (0, 0.0, 0.0))
+                table[key] = (calls + 1, wall + event["wall"], cpu + event["cpu"])
+
+        lines = [
+            f"{'stage':<20} {'config':<24} {'calls':>6} {'wall ms':>10} {'cpu ms':>10}"
+        ]
+        lines += [
+            f"{name:<20} {config if config is not None else '-':<24} {calls:>6} {wall * 1e3:>10.1f} {cpu * 1e3:>10.1f}"
+            for (name, config), (calls, wall, cpu) in rows.items()
+        ]
+        # the configs of a stage only need a total when the stage ran for several configs
+        lines += [
+            f"{name:<20} {'all':<24} {calls:>6} {wall * 1e3:>10.1f} {cpu * 1e3:>10.1f}"
+            for name, (calls, wall, cpu) in totals.items()
+            if len([key for key in rows if key[0] == name]) > 1
+        ]
+        return lines
@@ -0,0 +1,229 @@
+import os
+
+import numpy as np
+
+try:
+    from generator.ingestor import KalmanFilterConfig, InvalidConfigException
+except ImportError:
+    from ingestor import KalmanFilterConfig, InvalidConfigException
+
+# arrays of the on-disk store, written by the forward pass and read back by the backward pass
+STORE_ARRAYS = ["x_filtered", "P_filtered", "x_predicted", "P_predicted"]
+
+
+def _batched(values, num_steps, name):
+    """
+    View a (steps, values) or (steps, batch, values) log as (steps, batch, values), without reading it.
+    """
+    if values.ndim == 2:
+        values = values[:, None, :]
+    if (values.ndim != 3) or (values.shape[0] != num_steps):
+        raise ValueError(
+            f"Expected {name} of shape (steps, values) or (steps, batch, values) with {num_steps} steps"
+        )
+    return values
+
+
+def _open_store(store_dir, shapes, mode):
+    """
+    Memory-mapped .npy arrays of the store, created with the given shapes in mode "w+".
+    """
+    return {
+        key: np.lib.format.open_memmap(
+            os.path.join(store_dir, f"{key}.npy"),
+            mode=mode,
+            dtype=np.float64,
+            shape=shape if mode == "w+" else None,
+        )
+        for key, shape in shapes.items()
+    }
+
+
+def _update(x, P, H, R, z):
+    """
+    Measurement update of a batch, skipping the measurements that are NaN like the invalid measurements of the
+    library. The invalid rows of H are zeroed and the invalid block of S replaced by the identity, which keeps the
+    shapes of the batch and gives the same gain as an update with the valid measurements only.
+    """
+    valid = ~np.isnan(z)
+    if valid.all():
+        # the common case of a complete log skips the masking
+        H_valid = H
+        R_valid = R
+    else:
+        H_valid = np.where(valid[..., None], H, 0.0)
+        R_valid = np.where(valid[..., :, None] & valid[..., None, :], R, 0.0)
+        R_valid = R_valid + np.eye(R.shape[0]) * ~valid[..., None, :]
+        z = np.where(valid, z, 0.0)
+    y = z - (H_valid @ x[..., None])[..., 0]
+
+    P_Ht = P @ H_valid.swapaxes(-1, -2)
+    S = H_valid @ P_Ht + R_valid
+    # K = P * H' * S^-1, with S symmetric
+    K = np.linalg.solve(S, P_Ht.swapaxes(-1, -2)).swapaxes(-1, -2)
+    x = x + (K @ y[..., None])[..., 0]
+    P = P - K @ P_Ht.swapaxes(-1, -2)
+    return x, 0.5 * (P + P.swapaxes(-1, -2))
+
+
+def forward_pass(config: KalmanFilterConfig, z, store_dir, u=None, chunk_size=1024):
+    """
+    Run the filter over the measurement log z, a batch of independent logs of the same length, and store the
+    filtered and predicted X and P of every step in memory-mapped .npy files of store_dir.
+
+    Every step predicts, with the controls u of the step or with the controls held at zero, then updates with the
+    measurements of the step, NaN for a missing measurement. z and u may themselves be memory-mapped, they are read
+    chunk_size steps at a time and only one chunk of the store is kept in memory.
+    """
+    F = config.F.astype(np.float64)
+    H = config.H.astype(np.float64)
+    Q = config.Q.astype(np.float64)
+    R = config.R.astype(np.float64)
+    num_steps = z.shape[0]
+    z = _batched(z, num_steps, "measurements")
+    num_batch = z.shape[1]
+    num_states = config.num_states
+    if z.shape[2] != config.num_measurements:
+        raise ValueError(f"Expected {config.num_measurements} measurements per step")
+    if u is not None:
+        if config.B is None:
+            raise ValueError("The filter has no control input, expected no controls")
+        u = _batched(u, num_steps, "controls")
+        if u.shape[2] != config.num_controls:
+            raise ValueError(f"Expected {config.num_controls} controls per step")
+    B = config.B.astype(np.float64) if u is not None else None
+
+    vector_shape = (num_steps, num_batch, num_states)
+    matrix_shape = vector_shape + (num_states,)
+    store = _open_store(
+        store_dir,
+        {
+            "x_filtered": vector_shape,
+            "P_filtered": matrix_shape,
+            "x_predicted": vector_shape,
+            "P_predicted": matrix_shape,
+        },
+        "w+",
+    )
+
+    x = np.broadcast_to(
+        config.X_init.ravel().astype(np.float64), (num_batch, num_states)
+    ).copy()
+    P = np.broadcast_to(
+        config.P_init.astype(np.float64), (num_batch, num_states, num_states)
+    ).copy()
+
+    for start in range(0, num_steps, chunk_size):
+        end = min(start + chunk_size, num_steps)
+        z_chunk = np.asarray(z[start:end], dtype=np.float64)
+        u_chunk = np.asarray(u[start:end], dtype=np.float64) if u is not None else None
+        chunk = {
+            "x_filtered": np.empty((end - start,) + vector_shape[1:]),
+            "P_filtered": np.empty((end - start,) + matrix_shape[1:]),
+            "x_predicted": np.empty((end - start,) + vector_shape[1:]),
+            "P_predicted": np.empty((end - start,) + matrix_shape[1:]),
+        }
+        for step in range(end - start):
+            x = x @ F.T
+            if u_chunk is not None:
+                x = x + u_chunk[step] @ B.T
+            P = F @ P @ F.T + Q
+            chunk["x_predicted"][step] = x
+            chunk["P_predicted"][step] = P
+
+            x, P = _update(x, P, H, R, z_chunk[step])
+            chunk["x_filtered"][step] = x
+            chunk["P_filtered"][step] = P
+
+        for key in STORE_ARRAYS:
+            store[key][start:end] = chunk[key]
+
+    for array in store.values():
+        array.flush()
+    return store
+
+
+def backward_pass(config: KalmanFilterConfig, store_dir, chunk_size=1024):
+    """
+    Rauch-Tung-Striebel backward pass over the store of a forward pass, streamed from the last step to the first
+    chunk_size steps at a time. The smoothed X and P are written to memory-mapped .npy files of store_dir.
+    """
+    F = config.F.astype(np.float64)
+    store = _open_store(store_dir, {key: None for key in STORE_ARRAYS}, "r")
+    vector_shape = store["x_filtered"].shape
+    matrix_shape = store["P_filtered"].shape
+    num_steps = vector_shape[0]
+    smoothed = _open_store(
+        store_dir, {"x_smoothed": vector_shape, "P_smoothed": matrix_shape}, "w+"
+    )
+
+    # the last filtered estimate has seen every measurement
+    x_next = np.array(store["x_filtered"][num_steps - 1])
+    P_next = np.array(store["P_filtered"][num_steps - 1])
+    smoothed["x_smoothed"][num_steps - 1] = x_next
+    smoothed["P_smoothed"][num_steps - 1] = P_next
+
+    for end in range(num_steps - 1, 0, -chunk_size):
+        start = max(0, end - chunk_size)
+        x_filtered = np.asarray(store["x_filtered"][start:end])
+        P_filtered = np.asarray(store["P_filtered"][start:end])
+        # the predictions of the steps after the chunk
+        x_predicted = np.asarray(store["x_predicted"][start + 1 : end + 1])
+        P_predicted = np.asarray(store["P_predicted"][start + 1 : end + 1])
+        x_chunk = np.empty_like(x_filtered)
+        P_chunk = np.empty_like(P_filtered)
+
+        for step in range(end - start - 1, -1, -1):
+            # C' = P_predicted^-1 * F * P_filtered, with P_predicted and P_filtered symmetric
+            gain_t = np.linalg.solve(P_predicted[step], F @ P_filtered[step])
+            gain = gain_t.swapaxes(-1, -2)
+            x_next = (
+                x_filtered[step]
+                + (gain @ (x_next - x_predicted[step])[..., None])[..., 0]
+            )
+            P_next = P_filtered[step] + gain @ (P_next - P_predicted[step]) @ gain_t
+            P_next = 0.5 * (P_next + P_next.swapaxes(-1, -2))
+            x_chunk[step] = x_next
+            P_chunk[step] = P_next
+
+        smoothed["x_smoothed"][start:end] = x_chunk
+        smoothed["P_smoothed"][start:end] = P_chunk
+
+    for array in smoothed.values():
+        array.flush()
+    return smoothed
+
+
+def smooth(config: KalmanFilterConfig, z, store_dir, u=None, chunk_size=1024):
+    """
+    Fixed-interval smoothing of the measurement log z, a (steps, measurements) log or a (steps, batch,
+    measurements) batch of logs, with the model of the config.
+
+    The forward pass writes the filtered and predicted X and P to store_dir and the backward pass streams them back,
+    so memory holds a chunk of chunk_size steps whatever the length of the log, while the disk holds six
+    (steps, batch, num_states, num_states) or smaller arrays. Only the linear model is smoothed: the settings that
+    approximate the filter on target, like covariance_blocks or covariance_decimation, are not applied.
+
+    Returns a dict of the memory-mapped (steps, batch, ...) x_filtered, P_filtered, x_smoothed and P_smoothed.
+    """
+    if config.model is not None:
+        raise InvalidConfigException(
+            "Smoothing is only supported for linear filters, not f or h models"
+        )
+    if config.models is not None:
+        raise InvalidConfigException(
+            "Smoothing is not supported for interacting multiple models"
+        )
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    if z.shape[0] < 1:
+        raise ValueError("At least one step is required")
+
+    os.makedirs(store_dir, exist_ok=True)
+    store = forward_pass(config, z, store_dir, u=u, chunk_size=chunk_size)
+    smoothed = backward_pass(config, store_dir, chunk_size=chunk_size)
+    return {
+        "x_filtered": store["x_filtered"],
+        "P_filtered": store["P_filtered"],
+        **smoothed,
+    }
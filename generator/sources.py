@@ -0,0 +1,156 @@
+import functools
+import os
+
+try:
+    from generator.ingestor import KalmanFilterConfig
+    from generator.file_content_generator import KalmanFilterConfigGenerator
+    from generator.file_writer import FileWriter
+    from generator.amalgamator import amalgamate, reachable_includes
+except ImportError:
+    from ingestor import KalmanFilterConfig
+    from file_content_generator import KalmanFilterConfigGenerator
+    from file_writer import FileWriter
+    from amalgamator import amalgamate, reachable_includes
+
+# the repository holding the library, one level above the generator package
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def library_directories(repo_root=REPO_ROOT):
+    """
+    Include and source directories of the filter library and of the matrix library. The matrix sources come first,
+    so the matrix headers are inlined before the filter uses them in an amalgamated build.
+    """
+    inc_directories = [
+        os.path.join(repo_root, "filter/inc"),
+        os.path.join(repo_root, "libs/kalman-matrix-utils/inc"),
+    ]
+    src_directories = [
+        os.path.join(repo_root, "libs/kalman-matrix-utils/src"),
+        os.path.join(repo_root, "filter/src"),
+    ]
+    return inc_directories, src_directories
+
+
+def amalgamate_library(inc_directories, src_directories):
+    """Amalgamate the library and matrix sources, keeping the headers the generated header includes."""
+    source_paths = []
+    for directory in src_directories:
+        if not os.path.exists(directory):
+            raise FileNotFoundError(f"Source directory '{directory}' does not exist.")
+        source_paths += sorted(
+            os.path.join(directory, file)
+            for file in os.listdir(directory)
+            if file.endswith(".c")
+        )
+
+    kept_headers = reachable_includes(
+        os.path.join(inc_directories[0], "kalman.h"), inc_directories
+    )
+    return amalgamate(source_paths, inc_directories, kept_headers)
+
+
+def _read_directory(directory, output_dir):
+    """
+    Contents of the files of a directory and of its subdirectories, keyed by their path in output_dir.
+    """
+    if not os.path.exists(directory):
+        raise FileNotFoundError(f"Library directory '{directory}' does not exist.")
+    files = {}
+    for root, dirs, file_names in os.walk(directory):
+        relative_root = os.path.relpath(root, directory)
+        for file_name in sorted(file_names):
+            path = os.path.normpath(os.path.join(output_dir, relative_root, file_name))
+            with open(os.path.join(root, file_name)) as f:
+                files[path] = f.read()
+    return files
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_library_sources(repo_root, amalgamated):
+    inc_directories, src_directories = library_directories(repo_root)
+    files = {}
+    for directory in inc_directories:
+        files.update(_read_directory(directory, "inc"))
+    if amalgamated:
+        # every .c file carries its own copy of the sources
+        return files, amalgamate_library(inc_directories, src_directories)
+    for directory in src_directories:
+        files.update(_read_directory(directory, "src"))
+    return files, None
+
+
+def library_sources(amalgamated=False, repo_root=REPO_ROOT):
+    """
+    Files of the library to build the generated filters with, keyed by their path in the output directory of
+    kf_generator.py, and the amalgamated source to pass to generate_filter_sources, or None.
+
+    An amalgamated build only needs the headers. The library is read and amalgamated once per process, so it can be
+    shared by any number of generated filters.
+    """
+    files, amalgamated_source = _cached_library_sources(
+        os.path.abspath(repo_root), amalgamated
+    )
+    return dict(files), amalgamated_source
+
+
+def filter_file_paths(generator: KalmanFilterConfigGenerator):
+    """
+    Paths of the generated .c and .h files of a filter in the output directory of kf_generator.py.
+    """
+    name = generator.config.raw_config["name"]
+    return (
+        os.path.join("src", f"{name}_config.c"),
+        os.path.join("inc", f"{name}_config.h"),
+    )
+
+
+def filter_sources(generator: KalmanFilterConfigGenerator, amalgamated_source=None):
+    """
+    Generated .c and .h files of a filter, keyed by their path in the output directory of kf_generator.py.
+    """
+    c_file_path, h_file_path = filter_file_paths(generator)
+    file_writer = FileWriter(generator, amalgamated_source=amalgamated_source)
+    return {
+        c_file_path: file_writer.c_file_content(os.path.basename(h_file_path)),
+        h_file_path: file_writer.h_file_content(),
+    }
+
+
+def generate_filter_sources(config, amalgamated_source=None, encoding=None):
+    """
+    Generate the .c and .h files of a filter in memory, from a raw JSON config dict or a KalmanFilterConfig.
+
+    Returns the contents keyed by their path in the output directory of kf_generator.py, as strings, or as bytes
+    in the given encoding. Pass the amalgamated source of library_sources(amalgamated=True) for an amalgamated build.
+    """
+    if not isinstance(config, KalmanFilterConfig):
+        config = KalmanFilterConfig(config)
+    files = filter_sources(KalmanFilterConfigGenerator(config), amalgamated_source)
+    if encoding is not None:
+        return {path: content.encode(encoding) for path, content in files.items()}
+    return files
+
+
+def generate_sources(
+    configs,
+    amalgamated=False,
+    include_library=False,
+    encoding=None,
+    repo_root=REPO_ROOT,
+):
+    """
+    Generate the files of a list of filters in memory, like the output directory of kf_generator.py, optionally
+    together with the library files they are built with. The configs are raw JSON config dicts or KalmanFilterConfig.
+    """
+    amalgamated_source = None
+    files = {}
+    if amalgamated or include_library:
+        library_files, amalgamated_source = library_sources(amalgamated, repo_root)
+        if include_library:
+            files.update(library_files)
+    for config in configs:
+        files.update(generate_filter_sources(config, amalgamated_source))
+    if encoding is not None:
+        return {path: content.encode(encoding) for path, content in files.items()}
+    return files
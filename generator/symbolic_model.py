@@ -0,0 +1,261 @@
+import keyword
+import re
+
+try:
+    from generator.ingestor import InvalidConfigException
+except ImportError:
+    from ingestor import InvalidConfigException
+
+# sympy is only needed for extended Kalman filters, so it is imported lazily by SymbolicModel
+
+IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# names used by the generated model functions, which the model symbols must not shadow
+RESERVED_NAMES = {"X", "u", "X_next", "F", "Z_hat", "H", "matrix_t", "matrix_data_t"}
+CSE_PREFIX = "cse_"
+
+C_KEYWORDS = {
+    "auto", "break", "case", "char", "const", "continue", "default", "do", "double", "else", "enum", "extern",
+    "float", "for", "goto", "if", "inline", "int", "long", "register", "restrict", "return", "short", "signed",
+    "sizeof", "static", "struct", "switch", "typedef", "union", "unsigned", "void", "volatile", "while",
+}  # fmt: skip
+
+
+def _make_float_code_printer():
+    from sympy.codegen.ast import float32, real
+    from sympy.printing.c import C99CodePrinter
+    from sympy.printing.precedence import precedence
+
+    class FloatCodePrinter(C99CodePrinter):
+        """
+        C99 printer for single precision floats. Small integer powers are expanded to products
+        instead of calls to powf.
+        """
+
+        def __init__(self):
+            super().__init__(settings={"type_aliases": {real: float32}})
+
+        def _print_Pow(self, expr):
+            base, exponent = expr.as_base_exp()
+            if exponent.is_Integer and 2 <= abs(int(exponent)) <= 4:
+                factor = self.parenthesize(base, precedence(expr))
+                product = "*".join([factor] * abs(int(exponent)))
+                return product if exponent > 0 else f"1.0F/({product})"
+            return super()._print_Pow(expr)
+
+        def _print_Integer(self, expr):
+            return f"{int(expr)}.0F"
+
+        def _print_Mul(self, expr):
+            # substituted parameters can leave a coefficient of 1.0, e.g. d(0.5*x**2)/dx = 1.0*x
+            coefficient, rest = expr.as_coeff_Mul()
+            if coefficient.is_Float and abs(float(coefficient)) == 1.0 and rest != 1:
+                sign = "-" if coefficient < 0 else ""
+                return sign + self.parenthesize(rest, precedence(expr))
+            return super()._print_Mul(expr)
+
+    return FloatCodePrinter()
+
+
+class SymbolicModel:
+    """
+    Nonlinear state transition f(x, u) and/or measurement h(x) model of an extended Kalman filter,
+    given as strings of expressions over the state, control and parameter names.
+
+    The Jacobians are derived symbolically, and the C evaluation of each model shares its common
+    subexpressions with its Jacobian. Structural zeros of the Jacobians are never evaluated.
+    """
+
+    def __init__(self, states, controls, parameters, f=None, h=None):
+        try:
+            import sympy
+        except ImportError:
+            raise InvalidConfigException(
+                "sympy is required for extended Kalman filters, install it with pip install sympy"
+            )
+        self.sympy = sympy
+
+        self._validate_names(states, "states")
+        self._validate_names(controls, "controls")
+        self._validate_names(list(parameters.keys()), "parameters")
+
+        all_names = list(states) + list(controls) + list(parameters.keys())
+        if len(set(all_names)) != len(all_names):
+            raise InvalidConfigException(
+                "State, control and parameter names must be unique"
+            )
+
+        self.state_symbols = [sympy.Symbol(name, real=True) for name in states]
+        self.control_symbols = [sympy.Symbol(name, real=True) for name in controls]
+        parameter_symbols = {name: sympy.Symbol(name, real=True) for name in parameters}
+        self.symbols = {
+            symbol.name: symbol
+            for symbol in self.state_symbols
+            + self.control_symbols
+            + list(parameter_symbols.values())
+        }
+        self.parameter_values = {
+            parameter_symbols[name]: self._parse_parameter(name, value)
+            for name, value in parameters.items()
+        }
+
+        self.f = None
+        self.F_jacobian = None
+        if f is not None:
+            self.f = self._parse_expressions(f, "f", allow_controls=True)
+            if len(self.f) != len(states):
+                raise InvalidConfigException(
+                    f"Expected f to have {len(states)} expressions, one per state, but got {len(self.f)}"
+                )
+            self.F_jacobian = self.f.jacobian(self.state_symbols)
+
+        self.h = None
+        self.H_jacobian = None
+        if h is not None:
+            self.h = self._parse_expressions(h, "h", allow_controls=False)
+            self.H_jacobian = self.h.jacobian(self.state_symbols)
+
+    @staticmethod
+    def _validate_names(names, key):
+        if not isinstance(names, list):
+            raise InvalidConfigException(f"Expected {key} to be a list of names")
+        for name in names:
+            if (
+                not isinstance(name, str)
+                or not IDENTIFIER_PATTERN.match(name)
+                or keyword.iskeyword(name)
+                or name in C_KEYWORDS
+                or name in RESERVED_NAMES
+                or name.startswith(CSE_PREFIX)
+            ):
+                raise InvalidConfigException(
+                    f"Invalid name in {key}: {name!r}, names must be C identifiers "
+                    f"that do not start with {CSE_PREFIX} and are not one of {sorted(RESERVED_NAMES)}"
+                )
+
+    def _parse_parameter(self, name, value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise InvalidConfigException(f"Expected parameter {name} to be a number")
+        return self.sympy.Float(value)
+
+    def _parse_expressions(self, expressions, key, allow_controls):
+        if not isinstance(expressions, list) or not all(
+            isinstance(expression, str) for expression in expressions
+        ):
+            raise InvalidConfigException(
+                f"Expected {key} to be a list of expression strings"
+            )
+
+        allowed_symbols = set(self.state_symbols) | set(self.parameter_values.keys())
+        if allow_controls:
+            allowed_symbols |= set(self.control_symbols)
+
+        parsed = []
+        for expression in expressions:
+            try:
+                parsed_expression = self.sympy.sympify(expression, locals=self.symbols)
+            except (self.sympy.SympifyError, SyntaxError, TypeError) as e:
+                raise InvalidConfigException(
+                    f"Could not parse {key} expression {expression!r}: {e}"
+                )
+
+            unknown_symbols = parsed_expression.free_symbols - allowed_symbols
+            if unknown_symbols:
+                names = ", ".join(sorted(symbol.name for symbol in unknown_symbols))
+                raise InvalidConfigException(
+                    f"Unknown symbols in {key} expression {expression!r}: {names}"
+                )
+
+            parsed.append(parsed_expression.subs(self.parameter_values))
+
+        return self.sympy.Matrix(parsed)
+
+    def generate_predict_model_function(self, function_name):
+        """
+        C definition of the kf_predict_model_t callback evaluating f and its Jacobian.
+        """
+        signature = (
+            f"static void {function_name}(const matrix_t* const X, const matrix_t* const u, "
+            "matrix_t* const X_next, matrix_t* const F)"
+        )
+        return self._generate_model_function(
+            signature, self.f, "X_next", self.F_jacobian, "F", with_controls=True
+        )
+
+    def generate_measurement_model_function(self, function_name):
+        """
+        C definition of the kf_measurement_model_t callback evaluating h and its Jacobian.
+        """
+        signature = (
+            f"static void {function_name}(const matrix_t* const X, "
+            "matrix_t* const Z_hat, matrix_t* const H)"
+        )
+        return self._generate_model_function(
+            signature, self.h, "Z_hat", self.H_jacobian, "H", with_controls=False
+        )
+
+    def _generate_model_function(
+        self, signature, values, values_name, jacobian, jacobian_name, with_controls
+    ):
+        printer = _make_float_code_printer()
+
+        # only the structurally non-zero entries of the Jacobian are evaluated
+        jacobian_entries = [
+            (index, entry) for index, entry in enumerate(jacobian) if entry != 0
+        ]
+        expressions = list(values) + [entry for _, entry in jacobian_entries]
+
+        replacements, reduced = self.sympy.cse(
+            expressions, symbols=self.sympy.numbered_symbols(CSE_PREFIX)
+        )
+        reduced_values = reduced[: len(values)]
+        reduced_jacobian = reduced[len(values) :]
+
+        used_symbols = set()
+        for expression in [replacement for _, replacement in replacements] + reduced:
+            used_symbols |= expression.free_symbols
+
+        lines = [f"{signature} {{"]
+
+        for index, symbol in enumerate(self.state_symbols):
+            if symbol in used_symbols:
+                lines.append(f"\tconst matrix_data_t {symbol.name} = X->data[{index}];")
+
+        if with_controls:
+            used_controls = [
+                (index, symbol)
+                for index, symbol in enumerate(self.control_symbols)
+                if symbol in used_symbols
+            ]
+            for index, symbol in used_controls:
+                lines.append(f"\tconst matrix_data_t {symbol.name} = u->data[{index}];")
+            if not used_controls:
+                lines.append("\t(void)u;")
+
+        if not any(symbol in used_symbols for symbol in self.state_symbols):
+            lines.append("\t(void)X;")
+
+        for symbol, replacement in replacements:
+            lines.append(
+                f"\tconst matrix_data_t {symbol.name} = {printer.doprint(replacement)};"
+            )
+
+        for index, expression in enumerate(reduced_values):
+            lines.append(
+                f"\t{values_name}->data[{index}] = {printer.doprint(expression)};"
+            )
+
+        # the Jacobian storage is shared with other temporaries, so its zeros are cleared on every call
+        num_entries = jacobian.shape[0] * jacobian.shape[1]
+        if len(jacobian_entries) < num_entries:
+            lines.append(
+                f"\tmemset({jacobian_name}->data, 0, {num_entries}U * sizeof(matrix_data_t));"
+            )
+
+        for (index, _), expression in zip(jacobian_entries, reduced_jacobian):
+            lines.append(
+                f"\t{jacobian_name}->data[{index}] = {printer.doprint(expression)};"
+            )
+
+        lines.append("}")
+        return "\n".join(lines)
@@ -0,0 +1,162 @@
+import pytest
+import json
+
+# add the package from ../generator to the path
+import os
+import sys
+
+# Get the absolute path of the project root
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+from generator.amalgamator import *
+from generator.ingestor import KalmanFilterConfig
+from generator.file_content_generator import KalmanFilterConfigGenerator
+from generator.file_writer import FileWriter
+
+SIMPLE_CONFIG_PATH = "generator/tests/samples/simple_filter.json"
+
+
+def test_functions_and_variables_get_internal_linkage():
+    source = "\n".join(
+        [
+            "#define SQUARE(x) \\",
+            "    ((x) * (x))",
+            "void scale(matrix_t* m);",
+            "matrix_data_t gain[2] = {1, 2};",
+            "size_t count;",
+            "void scale(matrix_t* m) {",
+            '    const char* text = "} {";',
+            "    if (m) { m->data[0] = SQUARE(gain[0]); }",
+            "}",
+        ]
+    )
+
+    assert make_internal_linkage(source) == "\n".join(
+        [
+            "#define SQUARE(x) \\",
+            "    ((x) * (x))",
+            "static inline void scale(matrix_t* m);",
+            "static matrix_data_t gain[2] = {1, 2};",
+            "static size_t count;",
+            "static inline void scale(matrix_t* m) {",
+            '    const char* text = "} {";',
+            "    if (m) { m->data[0] = SQUARE(gain[0]); }",
+            "}",
+        ]
+    )
+
+
+def test_internal_and_macro_declarations_are_kept():
+    source = "\n".join(
+        [
+            "static int helper(void) { return 1; }",
+            "typedef struct { int a; } pair_t;",
+            "struct node { int value; };",
+            "extern int external_counter;",
+            "/* int commented(void); */",
+            "STATIC_INLINE int fast(void) { return 2; }",
+            "KF_API int api(void) { return helper(); }",
+            '#ifdef __cplusplus\nextern "C" {\n#endif',
+            "int wrapped(void);",
+            "#ifdef __cplusplus\n}\n#endif",
+        ]
+    )
+
+    assert make_internal_linkage(source) == source.replace(
+        "int wrapped", "static inline int wrapped"
+    )
+
+
+def test_unbalanced_braces():
+    with pytest.raises(AmalgamationException):
+        make_internal_linkage("void f(void) {")
+
+
+def test_library_functions_are_already_tagged():
+    # every public function of the library goes through KF_API, so the amalgamator has nothing to rewrite
+    with open("filter/src/kalman.c") as f:
+        source = f.read()
+
+    assert make_internal_linkage(source) == source
+
+
+def test_headers_are_inlined_once(tmp_path):
+    inc = tmp_path / "inc"
+    inc.mkdir()
+    (inc / "types.h").write_text("typedef float real_t;\n")
+    (inc / "ops.h").write_text('#include "types.h"\nreal_t twice(real_t x);\n')
+    (tmp_path / "ops.c").write_text(
+        '#include "ops.h"\n#include <math.h>\nreal_t twice(real_t x) { return 2 * x; }\n'
+    )
+    (tmp_path / "user.c").write_text(
+        '#include "ops.h"\nreal_t four_times(real_t x) { return twice(twice(x)); }\n'
+    )
+
+    source = amalgamate(
+        [tmp_path / "ops.c", tmp_path / "user.c"],
+        [str(inc)],
+        reachable_includes(inc / "types.h", [str(inc)]),
+    )
+
+    assert '#include "types.h"' in source
+    assert '#include "ops.h"' not in source
+    assert "#include <math.h>" in source
+    assert source.count("static inline real_t twice(real_t x);") == 1
+    assert "static inline real_t twice(real_t x) {" in source
+    assert "static inline real_t four_times(real_t x) {" in source
+
+
+def test_amalgamated_c_file(tmp_path):
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = KalmanFilterConfig(json.load(f)[0])
+    generator = KalmanFilterConfigGenerator(config)
+
+    c_file_path = str(tmp_path / "simple_kf_config.c")
+    h_file_path = str(tmp_path / "simple_kf_config.h")
+    FileWriter(generator, c_file_path, h_file_path, "/* library */")
+
+    with open(c_file_path) as f:
+        lines = f.read().splitlines()
+
+    # the library must see the linkage and the dimensions before it is compiled
+    library_line = lines.index("/* library */")
+    for line in [
+        "#define KF_API static inline",
+        '#include "simple_kf_config.h"',
+        "#define KF_AMALGAMATED_NUM_STATES SIMPLE_KF_NUM_STATES",
+        "#define KF_AMALGAMATED_NUM_MEASUREMENTS SIMPLE_KF_NUM_MEASUREMENTS",
+    ]:
+        assert lines.index(line) < library_line
+    assert '#include "matrix.h"' not in lines
+
+
+def test_amalgamated_c_file_with_different_block_dimensions(tmp_path):
+    with open("generator/tests/samples/two_axis_filter.json") as f:
+        config = json.load(f)[0]
+    config["H"] = config["H"][:2] + config["H"][3:]
+    config["R"] = [[0.1, 0, 0], [0, 0.1, 0], [0, 0, 0.5]]
+    generator = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+
+    c_file_path = str(tmp_path / "two_axis_kf_config.c")
+    h_file_path = str(tmp_path / "two_axis_kf_config.h")
+    FileWriter(generator, c_file_path, h_file_path, "/* library */")
+
+    # the sub-filters have different dimensions, so the library keeps reading them from the filter data
+    with open(c_file_path) as f:
+        assert "KF_AMALGAMATED_NUM_STATES" not in f.read()
+
+
+def test_amalgamated_c_file_with_vector_backend(tmp_path):
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)[0]
+    config["backend"] = "vector"
+    generator = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+
+    c_file_path = str(tmp_path / "simple_kf_config.c")
+    h_file_path = str(tmp_path / "simple_kf_config.h")
+    FileWriter(generator, c_file_path, h_file_path, "/* library */")
+
+    with open(c_file_path) as f:
+        lines = f.read().splitlines()
+    assert lines.index("#define KF_BACKEND_VECTOR") < lines.index("/* library */")
@@ -0,0 +1,163 @@
+import pytest
+import json
+
+# add the package from ../generator to the path
+import os
+import sys
+
+import numpy as np
+
+# Get the absolute path of the project root
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+from generator.ingestor import *
+from generator.approximation import *
+
+TWO_AXIS_CONFIG_PATH = "generator/tests/samples/two_axis_filter.json"
+IMU_CONFIG_PATH = "generator/tests/samples/imu_filter.json"
+
+
+def load_raw_config(config_path):
+    with open(config_path) as f:
+        return json.load(f)[0]
+
+
+def test_covariance_block_mask():
+    mask = covariance_block_mask([2, 1])
+
+    assert np.array_equal(
+        mask, [[True, True, False], [True, True, False], [False, False, True]]
+    )
+
+
+def test_block_prediction_multiply_adds():
+    # the two axes of the filter are interleaved, so the blocks of states 0 and 1 and of states 2 and 3 are coupled
+    F = KalmanFilterConfig(load_raw_config(TWO_AXIS_CONFIG_PATH)).F
+
+    assert block_prediction_multiply_adds(F, [4]) == 4 * 4 * 4 + 10 * 4
+    assert block_prediction_multiply_adds(F, [2, 2]) == 3 * (2 * 2 * 2 + 3 * 2)
+    # the Jacobian of an extended Kalman filter is dense
+    assert block_prediction_multiply_adds(None, [2, 2]) == 4 * (2 * 2 * 2 + 3 * 2)
+
+
+def test_exact_blocks_match_full_filter():
+    # the diagonal Q, R and P_init and the diagonal H keep the covariance of each axis pair separate
+    raw_config = load_raw_config(TWO_AXIS_CONFIG_PATH)
+    F = np.array(raw_config["F"])
+    order = [0, 2, 1, 3]
+    for key in ["F", "Q", "P_init"]:
+        raw_config[key] = np.array(raw_config[key])[np.ix_(order, order)].tolist()
+    raw_config["H"] = np.array(raw_config["H"])[:, order].tolist()
+    raw_config["covariance_blocks"] = [2, 2]
+    raw_config["decompose"] = False
+    config = KalmanFilterConfig(raw_config)
+
+    comparison = compare_block_covariance(config, num_seeds=4, num_steps=50)
+
+    assert comparison["approximate"]["rmse"] == pytest.approx(
+        comparison["full"]["rmse"]
+    )
+    assert comparison["approximate"]["nees"] == pytest.approx(
+        comparison["full"]["nees"]
+    )
+    assert comparison["multiply_adds"] == {"full": 128, "approximate": 28}
+
+
+def test_diagonal_filter_loses_accuracy():
+    config = KalmanFilterConfig(load_raw_config(IMU_CONFIG_PATH))
+
+    comparison = compare_block_covariance(
+        config, [1] * config.num_states, num_seeds=4, num_steps=100
+    )
+
+    # the biases of the IMU filter are only observed through their correlation with the measured states
+    assert np.all(
+        comparison["approximate"]["rmse"] >= comparison["full"]["rmse"] * 0.99
+    )
+    assert np.max(comparison["approximate"]["rmse"] / comparison["full"]["rmse"]) > 2
+    lines = format_comparison_report("imu_kf", comparison)
+    assert (
+        lines[0] == "imu_kf: full filter against covariance blocks [1, 1, 1, 1, 1, 1]"
+    )
+    assert len(lines) == config.num_states + 4
+
+
+def test_comparison_requires_blocks():
+    config = KalmanFilterConfig(load_raw_config(IMU_CONFIG_PATH))
+
+    with pytest.raises(InvalidConfigException):
+        compare_block_covariance(config)
+    with pytest.raises(InvalidConfigException):
+        compare_block_covariance(config, [1, 1])
+
+
+def test_block_covariance_report():
+    F = np.eye(4)
+
+    assert format_block_covariance_report("axes_kf", F, [1, 1, 1, 1]) == (
+        "axes_kf: approximate filter with a diagonal covariance, the covariance prediction takes "
+        "8 multiply-adds instead of 128, and P holds 4 elements instead of 16"
+    )
+    assert format_block_covariance_report("axes_kf", F, [1, 3]).startswith(
+        "axes_kf: approximate filter with 2 covariance blocks of 1 and 3 states"
+    )
+
+
+def test_decimated_model():
+    F = np.array([[1.0, 0.1], [0.0, 0.9]])
+    Q = np.array([[0.01, 0.0], [0.0, 0.02]])
+
+    F_decimated, Q_decimated = decimated_model(F, Q, 3)
+
+    # three predicts of the covariance at once
+    P = np.array([[2.0, 0.5], [0.5, 1.0]])
+    P_stepped = P
+    for _ in range(3):
+        P_stepped = F @ P_stepped @ F.T + Q
+    assert np.allclose(F_decimated @ P @ F_decimated.T + Q_decimated, P_stepped)
+    assert np.allclose(decimated_model(F, Q, 1)[0], F)
+
+
+def test_decimation_error_bound():
+    config = KalmanFilterConfig(load_raw_config(IMU_CONFIG_PATH))
+
+    bounds = [decimation_error_bound(config, decimation) for decimation in [1, 2, 10]]
+
+    assert bounds[0] == 0.0
+    # the held covariance gets staler the longer it is held
+    assert 0.0 < bounds[1] < bounds[2] < 0.1
+    # an update every k predicts sees the exact covariance, the held one only differs between the updates
+    assert decimation_error_bound(config, 2, update_interval=2) != bounds[1]
+    assert decimation_error_bound(config, 1, update_interval=3) == 0.0
+    assert format_decimation_report("imu_kf", 6, 10, 0.0123) == (
+        "imu_kf: covariance propagated every 10 predicts with F^10 and the accumulated Q, its prediction averages "
+        "43 multiply-adds per predict instead of 432, and once converged, with an update after every predict, the "
+        "covariance differs from the one of the undecimated filter by at most 1.23%"
+    )
+
+
+def test_decimation_error_bound_with_an_update_after_every_predict():
+    config = KalmanFilterConfig(load_raw_config(IMU_CONFIG_PATH))
+    F = config.F.astype(np.float64)
+    Q = config.Q.astype(np.float64)
+    H = config.H.astype(np.float64)
+    R = config.R.astype(np.float64)
+    F_decimated, Q_decimated = decimated_model(F, Q, 3)
+
+    def update(P):
+        return P - P @ H.T @ np.linalg.solve(H @ P @ H.T + R, H @ P)
+
+    # the decimated filter updates the held covariance, and propagates the updated one by F^k every k-th predict
+    P = P_exact = config.P_init.astype(np.float64)
+    differences = []
+    for tick in range(1, 3001):
+        P_exact = F @ P_exact @ F.T + Q
+        if tick % 3 == 0:
+            P = F_decimated @ P @ F_decimated.T + Q_decimated
+        P, P_exact = update(P), update(P_exact)
+        if tick > 2900:
+            differences.append(np.linalg.norm(P - P_exact) / np.linalg.norm(P_exact))
+
+    bound = decimation_error_bound(config, 3)
+    assert max(differences) <= bound * (1 + 1e-6)
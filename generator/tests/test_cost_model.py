@@ -0,0 +1,33 @@
+import pytest
+
+# add the package from ../generator to the path
+import os
+import sys
+
+# Get the absolute path of the project root
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+from generator.cost_model import *
+
+
+def test_covariance_update_multiply_adds():
+    plans = covariance_update_plans(6, 3)
+
+    assert plans[0]["enum"] == "KF_COVARIANCE_UPDATE_K_H_P"
+    assert plans[0]["multiply_adds"] == 6 * 3 * 6 + 6 * 6 * 6
+    assert plans[0]["scratch"] == 2 * 6 * 6
+    assert plans[1]["enum"] == "KF_COVARIANCE_UPDATE_K_P_HT"
+    assert plans[1]["multiply_adds"] == 21 * 3
+    assert plans[1]["scratch"] == 0
+
+
+@pytest.mark.parametrize(
+    "num_states, num_measurements", [(1, 1), (2, 1), (6, 3), (4, 8)]
+)
+def test_reusing_P_Ht_is_cheapest(num_states, num_measurements):
+    plan, baseline = choose_covariance_update(num_states, num_measurements)
+
+    assert plan["enum"] == "KF_COVARIANCE_UPDATE_K_P_HT"
+    assert baseline["enum"] == "KF_COVARIANCE_UPDATE_K_H_P"
+    assert plan["multiply_adds"] < baseline["multiply_adds"]
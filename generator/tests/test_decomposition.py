@@ -0,0 +1,98 @@
+import pytest
+import json
+import numpy as np
+
+# add the package from ../generator to the path
+import os
+import sys
+
+# Get the absolute path of the project root
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+from generator.decomposition import *
+from generator.ingestor import KalmanFilterConfig
+
+TWO_AXIS_CONFIG_PATH = "generator/tests/samples/two_axis_filter.json"
+
+
+def load_two_axis_config():
+    with open(TWO_AXIS_CONFIG_PATH) as f:
+        return json.load(f)[0]
+
+
+def test_interleaved_axes_are_split():
+    kf = KalmanFilterConfig(load_two_axis_config())
+
+    blocks = find_blocks(kf.F, kf.B, kf.Q, kf.H, kf.R, kf.P_init)
+
+    assert blocks == [
+        {"states": [0, 2], "measurements": [0, 2], "controls": [0]},
+        {"states": [1, 3], "measurements": [1, 3], "controls": [1]},
+    ]
+
+
+def test_correlations_couple_blocks():
+    kf = KalmanFilterConfig(load_two_axis_config())
+
+    # a correlation between the axes, in the initial covariance or in the measurement noise, keeps them together
+    P_init = kf.P_init.copy()
+    P_init[0, 1] = P_init[1, 0] = 0.5
+    assert len(find_blocks(kf.F, kf.B, kf.Q, kf.H, kf.R, P_init)) == 1
+
+    R = kf.R.copy()
+    R[2, 3] = R[3, 2] = 0.1
+    assert len(find_blocks(kf.F, kf.B, kf.Q, kf.H, R, kf.P_init)) == 1
+
+
+def test_unobserved_states_are_merged():
+    F = np.eye(3)
+    H = np.array([[1.0, 0, 0], [0, 1.0, 0]])
+    R = np.eye(2)
+
+    # state 2 is not measured, so it cannot run as a filter on its own
+    blocks = find_blocks(F, None, np.eye(3), H, R, np.eye(3))
+
+    assert blocks == [
+        {"states": [0, 2], "measurements": [0], "controls": []},
+        {"states": [1], "measurements": [1], "controls": []},
+    ]
+
+
+def test_no_complete_block():
+    H = np.zeros((1, 2))
+
+    blocks = find_blocks(np.eye(2), np.ones((2, 1)), np.eye(2), H, np.eye(1), np.eye(2))
+
+    assert blocks == [{"states": [0, 1], "measurements": [0], "controls": [0]}]
+
+
+def test_block_raw_config():
+    raw_config = load_two_axis_config()
+    raw_config["steady_state_threshold"] = 0.001
+    kf = KalmanFilterConfig(raw_config)
+    block = {"states": [1, 3], "measurements": [1, 3], "controls": [1]}
+
+    block_config = block_raw_config(raw_config, kf, block, "two_axis_kf_block1")
+
+    assert block_config["name"] == "two_axis_kf_block1"
+    assert block_config["decompose"] is False
+    assert block_config["steady_state_threshold"] == 0.001
+    assert block_config["X_init"] == [0, 0]
+    assert np.allclose(block_config["F"], [[1, 0.01], [0, 1]])
+    assert np.allclose(block_config["B"], [[0.00005], [0.01]])
+    assert np.allclose(block_config["H"], [[1, 0], [0, 1]])
+    assert np.allclose(block_config["R"], [[0.1, 0], [0, 0.5]])
+
+    # a block without controls has no B
+    block["controls"] = []
+    assert "B" not in block_raw_config(raw_config, kf, block, "two_axis_kf_block1")
+
+
+def test_decomposition_report():
+    blocks = [{"states": [0, 2, 4]}, {"states": [1]}, {"states": [3, 5]}]
+
+    assert format_decomposition_report("axes_kf", blocks) == (
+        "axes_kf: split into 3 independent sub-filters of 3, 1 and 2 states, "
+        "the covariance prediction takes 72 multiply-adds instead of 432"
+    )
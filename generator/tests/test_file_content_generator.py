@@ -1,5 +1,6 @@
 import pytest
 import json
+import tracemalloc
 
 # add the package from ../generator to the path
 import os
@@ -16,6 +17,7 @@ SIMPLE_CONFIG_PATH_WITH_CONTROL = (
 
 from generator.ingestor import *
 from generator.file_content_generator import *
+from generator.file_writer import FileWriter
 
 SIMPLE_CONFIG_PATH = "generator/tests/samples/simple_filter.json"
 SIMPLE_CONFIG_PATH_WITH_CONTROL = (
@@ -39,6 +41,11 @@ def format_matrix_with_newlines(matrix: np.ndarray) -> str:
     return "{\n    " + ",\n    ".join(matrix_rows) + "\n}"
 
 
+def join_definitions(definitions):
+    # the definitions with an initializer are only rendered when written
+    return "\n".join(str(definition) for definition in definitions)
+
+
 def generate_expected_matrix_output(matrix_name, matrix_str, rows_expr, cols_expr):
     matrix_data_name = f"SIMPLE_KF_{matrix_name}_data"
     matrix_name_full = f"SIMPLE_KF_{matrix_name}"
@@ -74,7 +81,9 @@ def test_config_matrix(config_path, matrix_name, rows_expr, cols_expr):
         matrix_name, matrix_str, rows_expr, cols_expr
     )
 
-    generated_definitions_str = "\n".join(generated_config.generated_config_definitions)
+    generated_definitions_str = join_definitions(
+        generated_config.generated_config_definitions
+    )
 
     expected_output_str = "\n".join(expected_matrix_output)
     assert expected_output_str in generated_definitions_str
@@ -146,18 +155,6 @@ def test_config_matrix(config_path, matrix_name, rows_expr, cols_expr):
             "SIMPLE_KF_NUM_STATES",
             "SIMPLE_KF_NUM_MEASUREMENTS",
         ),
-        (
-            SIMPLE_CONFIG_PATH,
-            "K_H_storage",
-            "SIMPLE_KF_NUM_STATES",
-            "SIMPLE_KF_NUM_STATES",
-        ),
-        (
-            SIMPLE_CONFIG_PATH,
-            "K_H_P_storage",
-            "SIMPLE_KF_NUM_STATES",
-            "SIMPLE_KF_NUM_STATES",
-        ),
     ],
 )
 # fmt: on
@@ -166,6 +163,8 @@ def test_storage_matrix(config_path, variable_name, rows_expr, cols_expr):
         config = json.load(f)
 
         simple_kf_config = config[0]
+        # a dense H, the update of a selection H does not need all of the storage
+        simple_kf_config["H"] = [[1, 1]]
         simple_kf_config_converted = KalmanFilterConfig(simple_kf_config)
 
         generated_config = KalmanFilterConfigGenerator(simple_kf_config_converted)
@@ -281,6 +280,11 @@ def test_function_headers(config_path):
             "get_data"
         ] = f"kf_data_S * {simple_kf_config['name']}_get_data(void);"
 
+        # expect a header to get the stage timing statistics, guarded by the profiling macro
+        expected_function_headers[
+            "get_profile"
+        ] = f"#ifdef KF_ENABLE_PROFILING\nconst kf_profile_S * {simple_kf_config['name']}_get_profile(void);\n#endif"
+
         # Enhanced assertion with informative error messages
         for key, expected_header in expected_function_headers.items():
             assert (
@@ -294,7 +298,7 @@ def test_function_headers(config_path):
 
 
 def assert_function_definition(expected_definition, generated_definitions):
-    generated_definitions_str = "\n".join(generated_definitions)
+    generated_definitions_str = join_definitions(generated_definitions)
     expected_definition_str = "\n".join(expected_definition)
     assert expected_definition_str in generated_definitions_str
 
@@ -354,6 +358,26 @@ def test_get_data_function_definition():
     )
 
 
+def test_get_profile_function_definition():
+    config = load_config(SIMPLE_CONFIG_PATH)
+    generated_config = KalmanFilterConfigGenerator(config)
+
+    kf_name = config.raw_config["name"]
+    data_struct_name = generated_config.generated_structure_names["filter_data"]
+
+    get_profile_function_definition = [
+        "#ifdef KF_ENABLE_PROFILING",
+        f"const kf_profile_S * {kf_name}_get_profile(void) {{",
+        f"\treturn &{data_struct_name}.profile;",
+        "}",
+        "#endif",
+    ]
+
+    assert_function_definition(
+        get_profile_function_definition, generated_config.generated_function_definitions
+    )
+
+
 @pytest.mark.parametrize("config_path", [SIMPLE_CONFIG_PATH])
 def test_init_function_definition(config_path):
     config = load_config(config_path)
@@ -421,3 +445,708 @@ def test_control_function_definition(config_path):
     assert_function_definition(
         control_function_definition, generated_config.generated_function_definitions
     )
+
+
+def test_innovation_thresholds_in_config_struct():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)[0]
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+    struct_str = "\n".join(generated_config.generated_struct_config_definition)
+    assert ".innovation_gate" not in struct_str
+    assert ".innovation_deadband" not in struct_str
+
+    config["innovation_gate"] = 6.63
+    config["innovation_deadband"] = 0.01
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+    struct_str = "\n".join(generated_config.generated_struct_config_definition)
+    assert "\t.innovation_gate = 6.63F," in struct_str
+    assert "\t.innovation_deadband = 0.01F," in struct_str
+
+
+def test_s_inversion_in_config_struct():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)[0]
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+    struct_str = "\n".join(generated_config.generated_struct_config_definition)
+    assert "\t.S_inversion = KF_S_INVERSION_SCALAR," in struct_str
+
+    with open("generator/tests/samples/imu_filter.json") as f:
+        config = json.load(f)[0]
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+    struct_str = "\n".join(generated_config.generated_struct_config_definition)
+    assert "\t.S_inversion = KF_S_INVERSION_CLOSED_FORM_3X3," in struct_str
+
+
+def test_packed_covariance_storage():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)[0]
+    config["packed_covariance"] = True
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+    storage_str = join_definitions(generated_config.generated_storage_definitions)
+    assert (
+        "static matrix_data_t SIMPLE_KF_P_matrix_storage"
+        "[SIMPLE_KF_NUM_STATES * (SIMPLE_KF_NUM_STATES + 1U) / 2U] = {0};"
+    ) in storage_str
+    assert (
+        "static matrix_data_t SIMPLE_KF_K_H_P_storage"
+        "[SIMPLE_KF_NUM_STATES * (SIMPLE_KF_NUM_STATES + 1U) / 2U] = {0};"
+    ) in storage_str
+    assert "K_H_storage" not in storage_str
+
+    struct_str = "\n".join(generated_config.generated_struct_config_definition)
+    assert "\t.packed_covariance = true," in struct_str
+
+    functions_str = join_definitions(generated_config.generated_function_definitions)
+    assert "kf_get_covariance(&SIMPLE_KF_data, row, col, &value);" in functions_str
+
+
+def test_ekf_models():
+    with open("generator/tests/samples/pendulum_ekf.json") as f:
+        config = json.load(f)[0]
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+
+    struct_str = "\n".join(generated_config.generated_struct_config_definition)
+    assert "\t.F = NULL," in struct_str
+    assert "\t.H = NULL," in struct_str
+    assert "\t.predict_model = pendulum_ekf_predict_model," in struct_str
+    assert "\t.num_model_controls = PENDULUM_EKF_NUM_CONTROLS," in struct_str
+    assert "\t.measurement_model = pendulum_ekf_measurement_model," in struct_str
+
+    config_str = join_definitions(generated_config.generated_config_definitions)
+    assert "PENDULUM_EKF_F" not in config_str
+    assert "PENDULUM_EKF_H" not in config_str
+
+    models_str = "\n".join(generated_config.generated_model_function_definitions)
+    assert "static void pendulum_ekf_predict_model(" in models_str
+    assert "static void pendulum_ekf_measurement_model(" in models_str
+
+
+def test_linear_filter_has_no_models():
+    generated_config = KalmanFilterConfigGenerator(load_config(SIMPLE_CONFIG_PATH))
+
+    assert generated_config.generated_model_function_definitions == []
+    struct_str = "\n".join(generated_config.generated_struct_config_definition)
+    assert "predict_model" not in struct_str
+
+
+def test_H_selection():
+    generated_config = KalmanFilterConfigGenerator(
+        load_config("generator/tests/samples/imu_filter.json")
+    )
+
+    config_str = join_definitions(generated_config.generated_config_definitions)
+    assert (
+        "static const size_t IMU_KF_H_selection[IMU_KF_NUM_MEASUREMENTS] = {0U, 1U, 2U};"
+        in config_str
+    )
+
+    struct_str = "\n".join(generated_config.generated_struct_config_definition)
+    assert "\t.H_selection = IMU_KF_H_selection," in struct_str
+
+    storage_str = join_definitions(generated_config.generated_storage_definitions)
+    assert "H_temp_storage" not in storage_str
+    assert "K_H_storage" not in storage_str
+    assert "K_H_P_storage" not in storage_str
+
+
+def test_dense_H_has_no_selection():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)[0]
+    config["H"] = [[1, 1]]
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+    struct_str = "\n".join(generated_config.generated_struct_config_definition)
+    assert "H_selection" not in struct_str
+
+
+def test_sparse_matrices():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)[0]
+    config["H"] = [[0, 2]]
+    config["sparse_threshold"] = 0.75
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+
+    # Q and H have a single nonzero in 2 and 4 elements, F has 3 of 4
+    config_str = join_definitions(generated_config.generated_config_definitions)
+    assert "SIMPLE_KF_Q_data" not in config_str
+    assert "SIMPLE_KF_H_data" not in config_str
+    assert "SIMPLE_KF_F_data" in config_str
+    assert (
+        "static const matrix_data_t SIMPLE_KF_Q_values[2U] = {1.000000F, 1.000000F};"
+        in config_str
+    )
+    assert "static const size_t SIMPLE_KF_Q_col_indices[2U] = {0U, 1U};" in config_str
+    assert (
+        "static const size_t SIMPLE_KF_H_row_offsets[SIMPLE_KF_NUM_MEASUREMENTS + 1U] = {0U, 1U};"
+        in config_str
+    )
+    assert (
+        "static const kf_sparse_matrix_S SIMPLE_KF_H_sparse = {SIMPLE_KF_NUM_MEASUREMENTS, SIMPLE_KF_NUM_STATES, "
+        "SIMPLE_KF_H_row_offsets, SIMPLE_KF_H_col_indices, SIMPLE_KF_H_values};"
+        in config_str
+    )
+
+    struct_str = "\n".join(generated_config.generated_struct_config_definition)
+    assert "\t.Q = NULL," in struct_str
+    assert "\t.H = NULL," in struct_str
+    assert "\t.F = &SIMPLE_KF_F," in struct_str
+    assert "\t.Q_sparse = &SIMPLE_KF_Q_sparse," in struct_str
+    assert "\t.H_sparse = &SIMPLE_KF_H_sparse," in struct_str
+    assert "F_sparse" not in struct_str
+    assert "covariance_update" not in struct_str
+
+    # like a selection, a sparse H is never copied and P * H' is reused by the covariance update
+    storage_str = join_definitions(generated_config.generated_storage_definitions)
+    assert "H_temp_storage" not in storage_str
+    assert "K_H_storage" not in storage_str
+    assert "K_H_P_storage" not in storage_str
+
+
+def test_sparse_matrices_static_assertions():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)[0]
+    config["sparse_threshold"] = 0.75
+    config["static_initialization"] = True
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+
+    assertions_str = "\n".join(generated_config.generated_static_assertions)
+    assert (
+        "KF_STATIC_ASSERT(sizeof(SIMPLE_KF_Q_row_offsets) == (SIMPLE_KF_NUM_STATES + 1U) * sizeof(size_t), "
+        '"SIMPLE_KF_Q_sparse does not match the filter dimensions");' in assertions_str
+    )
+    assert "SIMPLE_KF_Q_data" not in assertions_str
+
+
+def test_steady_state_in_config_struct():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)[0]
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+    struct_str = "\n".join(generated_config.generated_struct_config_definition)
+    assert "steady_state" not in struct_str
+
+    config["steady_state_threshold"] = 0.0001
+    config["steady_state_updates"] = 20
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+    struct_str = "\n".join(generated_config.generated_struct_config_definition)
+    assert "\t.steady_state_threshold = 0.0001F," in struct_str
+    assert "\t.steady_state_updates = 20U," in struct_str
+
+
+def test_covariance_update_plan():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)[0]
+    config["H"] = [[1, 1]]
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+
+    struct_str = "\n".join(generated_config.generated_struct_config_definition)
+    assert "\t// Covariance update: K * (P * H')', 3 multiply-adds" in struct_str
+    assert "\t.covariance_update = KF_COVARIANCE_UPDATE_K_P_HT," in struct_str
+
+    # reusing P * H' needs neither K * H nor K * H * P
+    storage_str = join_definitions(generated_config.generated_storage_definitions)
+    assert "K_H_storage" not in storage_str
+    assert "K_H_P_storage" not in storage_str
+
+    assert generated_config.covariance_update_report == (
+        "simple_kf: covariance update K * (P * H')' takes 3 multiply-adds instead of 12 "
+        "for (K * H) * P (75% fewer), and 8 fewer scratch elements"
+    )
+
+
+def test_predict_model_keeps_K_H_storage():
+    with open("generator/tests/samples/pendulum_ekf.json") as f:
+        config = json.load(f)[0]
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+
+    # the K * H storage holds the Jacobian of f
+    storage_str = join_definitions(generated_config.generated_storage_definitions)
+    assert "PENDULUM_EKF_K_H_storage" in storage_str
+    assert "K_H_P_storage" not in storage_str
+
+
+def test_static_initialization():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)[0]
+    config["static_initialization"] = True
+    config["packed_covariance"] = True
+    config["X_init"] = [3, 4]
+    config["P_init"] = [[4, 1], [1, 2]]
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+
+    # X and P start from X_init and the lower triangle of P_init
+    storage_str = join_definitions(generated_config.generated_storage_definitions)
+    assert (
+        "SIMPLE_KF_X_matrix_storage[SIMPLE_KF_NUM_STATES * (1U)] = {\n    3.000000F,\n    4.000000F\n};"
+    ) in storage_str
+    assert (
+        "SIMPLE_KF_P_matrix_storage[SIMPLE_KF_NUM_STATES * (SIMPLE_KF_NUM_STATES + 1U) / 2U] = {\n"
+        "    4.000000F,\n    1.000000F, 2.000000F\n};"
+    ) in storage_str
+
+    data_struct = generated_config.generated_filter_static_data_struct
+    assert "\t.config = &SIMPLE_KF_kf_config," in data_struct
+    assert "\t.initialized = true," in data_struct
+    assert (
+        "\t.P = {KF_PACKED_SIZE(SIMPLE_KF_NUM_STATES), 1U, SIMPLE_KF_P_matrix_storage},"
+        in data_struct
+    )
+    assert (
+        "\t.K_H_P_temp = {KF_PACKED_SIZE(SIMPLE_KF_NUM_STATES), 1U, SIMPLE_KF_K_H_P_storage},"
+        in data_struct
+    )
+    assert "K_H_temp" not in data_struct
+    assert "\t.num_measurements = SIMPLE_KF_NUM_MEASUREMENTS," in data_struct
+
+    assertions = "\n".join(generated_config.generated_static_assertions)
+    assert (
+        "KF_STATIC_ASSERT(sizeof(SIMPLE_KF_P_matrix_storage) >= KF_PACKED_SIZE(SIMPLE_KF_NUM_STATES) * sizeof(matrix_data_t), "
+        '"SIMPLE_KF_P_matrix_storage is too small");'
+    ) in assertions
+    assert "KF_STATIC_ASSERT(SIMPLE_KF_NUM_MEASUREMENTS == 1U," in assertions
+
+    # the filter is ready without kf_init, which init still calls to reset it to X_init and P_init
+    functions_str = join_definitions(generated_config.generated_function_definitions)
+    assert (
+        "kf_error_E simple_kf_init(void) {\n\treturn kf_init(&SIMPLE_KF_data, &SIMPLE_KF_kf_config);\n}"
+        in functions_str
+    )
+    assert (
+        "@brief Resets"
+        in generated_config.generated_function_headers["init"]["comment"]
+    )
+
+
+def test_dynamic_initialization_by_default():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)[0]
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+
+    assert (
+        generated_config.generated_filter_static_data_struct
+        == "static kf_data_S SIMPLE_KF_data;"
+    )
+    assert generated_config.generated_static_assertions == []
+    functions_str = join_definitions(generated_config.generated_function_definitions)
+    assert "return kf_init(&SIMPLE_KF_data, &SIMPLE_KF_kf_config);" in functions_str
+
+
+def test_snapshot():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)[0]
+    config["snapshot"] = True
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+
+    assert generated_config.generated_structure_definitions["snapshot"] == [
+        "typedef struct {",
+        "\tmatrix_data_t X[SIMPLE_KF_NUM_STATES];",
+        "\tmatrix_data_t P[SIMPLE_KF_NUM_STATES * SIMPLE_KF_NUM_STATES];",
+        "} simple_kf_snapshot_S;",
+    ]
+    assert (
+        generated_config.generated_function_headers["get_snapshot"]["str"]
+        == "kf_error_E simple_kf_get_snapshot(simple_kf_snapshot_S * const snapshot, const bool with_covariance);"
+    )
+
+    # every successful step publishes a snapshot
+    functions_str = join_definitions(generated_config.generated_function_definitions)
+    for call in [
+        "kf_init(&SIMPLE_KF_data, &SIMPLE_KF_kf_config)",
+        "kf_update(&SIMPLE_KF_data, &Z, measurement->valid, SIMPLE_KF_NUM_MEASUREMENTS)",
+        "kf_predict(&SIMPLE_KF_data, NULL)",
+    ]:
+        assert (
+            f"\tconst kf_error_E ret = {call};\n"
+            "\tif (ret == KF_ERROR_NONE) {\n"
+            "\t\tSIMPLE_KF_publish_snapshot();\n"
+            "\t}\n"
+            "\treturn ret;"
+        ) in functions_str
+    assert (
+        "static volatile SIMPLE_KF_snapshot_buffer_S SIMPLE_KF_snapshot_buffers[2];"
+        in functions_str
+    )
+    assert (
+        "\t\t\tconsistent = ((SIMPLE_KF_snapshot_begin - end) <= 1U);" in functions_str
+    )
+
+
+def test_packed_snapshot_is_unpacked():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)[0]
+    config["snapshot"] = True
+    config["packed_covariance"] = True
+    config["static_initialization"] = True
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+
+    functions_str = join_definitions(generated_config.generated_function_definitions)
+    assert "\tmatrix_data_t P[KF_PACKED_SIZE(SIMPLE_KF_NUM_STATES)];" in functions_str
+    assert (
+        "\t\t\t\t\t\tsnapshot->P[j * SIMPLE_KF_NUM_STATES + i] = buffer->P[k];"
+        in functions_str
+    )
+    # the first snapshot of a statically initialized filter is published at compile time
+    assert "SIMPLE_KF_snapshot_buffers[2] = {{{\n" in functions_str
+
+
+def test_no_snapshot_by_default():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)[0]
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+
+    assert "snapshot" not in generated_config.generated_structure_definitions
+    assert "get_snapshot" not in generated_config.generated_function_headers
+    functions_str = join_definitions(generated_config.generated_function_definitions)
+    assert "snapshot" not in functions_str
+
+
+def test_decomposed_filter():
+    generated_config = KalmanFilterConfigGenerator(
+        load_config("generator/tests/samples/two_axis_filter.json")
+    )
+
+    assert "#define TWO_AXIS_KF_NUM_BLOCKS (2U)" in (
+        generated_config.generated_preprocessor_defines
+    )
+    assert "#define TWO_AXIS_KF_BLOCK1_NUM_STATES (2U)" in (
+        generated_config.generated_preprocessor_defines
+    )
+    assert generated_config.covariance_update_report.startswith(
+        "two_axis_kf: split into 2 independent sub-filters of 2 and 2 states"
+    )
+
+    # the states of the axes are interleaved, so they are remapped to the sub-filters
+    data_str = generated_config.generated_filter_static_data_struct
+    assert "static kf_data_S TWO_AXIS_KF_BLOCK0_data;" in data_str
+    assert (
+        "static const size_t TWO_AXIS_KF_state_blocks[TWO_AXIS_KF_NUM_STATES] = {0U, 1U, 0U, 1U};"
+        in data_str
+    )
+    assert (
+        "static const size_t TWO_AXIS_KF_state_indices[TWO_AXIS_KF_NUM_STATES] = {0U, 0U, 1U, 1U};"
+        in data_str
+    )
+
+    assert_function_definition(
+        [
+            "\t{",
+            "\t\tmatrix_data_t data[TWO_AXIS_KF_BLOCK1_NUM_MEASUREMENTS] = {measurement->data[1], measurement->data[3]};",
+            "\t\tconst bool valid[TWO_AXIS_KF_BLOCK1_NUM_MEASUREMENTS] = {measurement->valid[1], measurement->valid[3]};",
+            "\t\tmatrix_t Z = {TWO_AXIS_KF_BLOCK1_NUM_MEASUREMENTS, 1U, data};",
+            "\t\tconst kf_error_E block_ret = kf_update(&TWO_AXIS_KF_BLOCK1_data, &Z, valid, TWO_AXIS_KF_BLOCK1_NUM_MEASUREMENTS);",
+            "\t\tif (ret == KF_ERROR_NONE) {",
+            "\t\t\tret = block_ret;",
+            "\t\t}",
+            "\t}",
+        ],
+        generated_config.generated_function_definitions,
+    )
+    assert_function_definition(
+        [
+            "\t\tmatrix_t U = {TWO_AXIS_KF_BLOCK1_NUM_CONTROLS, 1U, &control->data[1]};",
+            "\t\tconst kf_error_E block_ret = kf_predict(&TWO_AXIS_KF_BLOCK1_data, &U);",
+        ],
+        generated_config.generated_function_definitions,
+    )
+    assert_function_definition(
+        [
+            "matrix_data_t two_axis_kf_get_state(size_t state) {",
+            "\treturn matrix_get(&TWO_AXIS_KF_block_data[TWO_AXIS_KF_state_blocks[state]]->X, TWO_AXIS_KF_state_indices[state], 0U);",
+            "}",
+        ],
+        generated_config.generated_function_definitions,
+    )
+    assert "get_block_data" in generated_config.generated_function_headers
+    assert "the first error is returned" in (
+        generated_config.generated_function_headers["update"]["comment"]
+    )
+
+    # both sub-filters have the same dimensions, so an amalgamated library can be specialized for them
+    assert generated_config.library_dimensions == {
+        "num_states": "TWO_AXIS_KF_BLOCK0_NUM_STATES",
+        "num_measurements": "TWO_AXIS_KF_BLOCK0_NUM_MEASUREMENTS",
+    }
+
+
+def test_decomposed_filter_with_different_block_dimensions():
+    with open("generator/tests/samples/two_axis_filter.json") as f:
+        config = json.load(f)[0]
+    # the x axis has no velocity measurement
+    config["H"] = [row for index, row in enumerate(config["H"]) if index != 2]
+    config["R"] = [[0.1, 0, 0], [0, 0.1, 0], [0, 0, 0.5]]
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+
+    assert [block["measurements"] for block in generated_config.config.blocks] == [
+        [0],
+        [1, 2],
+    ]
+    assert generated_config.library_dimensions is None
+
+
+def test_vector_backend_alignment():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)[0]
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+    assert "KF_VECTOR_ALIGNED" not in "\n".join(
+        generated_config.generated_storage_definitions
+    )
+
+    config["backend"] = "vector"
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+
+    storage_str = join_definitions(generated_config.generated_storage_definitions)
+    assert (
+        "static KF_VECTOR_ALIGNED matrix_data_t SIMPLE_KF_P_matrix_storage[SIMPLE_KF_NUM_STATES * SIMPLE_KF_NUM_STATES] = {0};"
+        in storage_str
+    )
+    config_str = join_definitions(generated_config.generated_config_definitions)
+    assert "static KF_VECTOR_ALIGNED matrix_data_t SIMPLE_KF_F_data[" in config_str
+
+
+def test_tiled_filter():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)[0]
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+    assert "tile" not in "\n".join(generated_config.generated_struct_config_definition)
+
+    config["tiling_threshold"] = 2
+    config["tile_size"] = 1
+    config["static_initialization"] = True
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+
+    storage_str = join_definitions(generated_config.generated_storage_definitions)
+    assert (
+        "static matrix_data_t SIMPLE_KF_tile_storage[SIMPLE_KF_NUM_STATES * (1U)] = {0};"
+        in storage_str
+    )
+    struct_str = "\n".join(generated_config.generated_struct_config_definition)
+    assert (
+        ".tile_storage = {SIMPLE_KF_NUM_STATES * (1U), SIMPLE_KF_tile_storage},"
+        in struct_str
+    )
+    assert ".tile_size = 1U," in struct_str
+    assert (
+        ".tile_temp = {SIMPLE_KF_NUM_STATES, 1U, SIMPLE_KF_tile_storage},"
+        in generated_config.generated_filter_static_data_struct
+    )
+
+
+def test_block_covariance_filter():
+    with open("generator/tests/samples/two_axis_filter.json") as f:
+        config = json.load(f)[0]
+    config["covariance_blocks"] = [1, 3]
+    config["static_initialization"] = True
+    # the covariance blocks approximate the whole filter, it is not decomposed
+    config["decompose"] = False
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+
+    assert generated_config.block_generators == []
+    config_str = join_definitions(generated_config.generated_config_definitions)
+    assert (
+        "static const size_t TWO_AXIS_KF_covariance_blocks[2U] = {1U, 3U};"
+        in config_str
+    )
+
+    storage_str = join_definitions(generated_config.generated_storage_definitions)
+    assert (
+        "static matrix_data_t TWO_AXIS_KF_P_matrix_storage[(10U) * (1U)] = {\n"
+        "    1.000000F,\n"
+        "    1.000000F, 0.000000F, 0.000000F,\n"
+    ) in storage_str
+    assert (
+        "static matrix_data_t TWO_AXIS_KF_K_H_P_storage[(10U) * (1U)] = {0};"
+        in storage_str
+    )
+    assert "K_H_storage" not in storage_str
+
+    struct_str = "\n".join(generated_config.generated_struct_config_definition)
+    assert "\t.covariance_blocks = TWO_AXIS_KF_covariance_blocks," in struct_str
+    assert "\t.num_covariance_blocks = 2U," in struct_str
+    assert ".covariance_update" not in struct_str
+    assert (
+        ".P = {10U, 1U, TWO_AXIS_KF_P_matrix_storage},"
+        in generated_config.generated_filter_static_data_struct
+    )
+
+    functions_str = join_definitions(generated_config.generated_function_definitions)
+    assert "kf_get_covariance(&TWO_AXIS_KF_data, row, col, &value);" in functions_str
+
+
+def test_decimated_filter():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)[0]
+
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+    assert "decimat" not in "\n".join(
+        generated_config.generated_struct_config_definition
+    )
+
+    config["covariance_decimation"] = 2
+    generated_config = KalmanFilterConfigGenerator(KalmanFilterConfig(config))
+
+    config_str = join_definitions(generated_config.generated_config_definitions)
+    assert (
+        "static matrix_data_t SIMPLE_KF_F_decimated_data[SIMPLE_KF_NUM_STATES * SIMPLE_KF_NUM_STATES] = {\n"
+        "    1.000000F, 0.002000F,\n"
+        "    0.000000F, 1.000000F\n"
+        "};"
+    ) in config_str
+    assert (
+        "static matrix_data_t SIMPLE_KF_Q_decimated_data[SIMPLE_KF_NUM_STATES * SIMPLE_KF_NUM_STATES] = {\n"
+        "    2.000001F, 0.001000F,\n"
+        "    0.001000F, 2.000000F\n"
+        "};"
+    ) in config_str
+
+    struct_str = "\n".join(generated_config.generated_struct_config_definition)
+    assert "\t.covariance_decimation = 2U," in struct_str
+    assert "\t.F_decimated = &SIMPLE_KF_F_decimated," in struct_str
+    assert "\t.Q_decimated = &SIMPLE_KF_Q_decimated," in struct_str
+
+    assert (
+        "simple_kf: covariance propagated every 2 predicts with F^2 and the accumulated Q, its prediction averages "
+        "8 multiply-adds per predict instead of 16"
+    ) in generated_config.covariance_update_report
+
+
+def test_imm_filter():
+    generated_config = KalmanFilterConfigGenerator(
+        load_config("generator/tests/samples/imm_filter.json")
+    )
+
+    assert len(generated_config.imm_generators) == 3
+    assert "#define IMM_KF_NUM_MODELS (3U)" in (
+        generated_config.generated_preprocessor_defines
+    )
+
+    # H, R, P_init and X_init are defined once, and the models 0 and 1 share F while 0 and 2 share Q
+    config_str = join_definitions(generated_config.generated_config_definitions)
+    assert "static matrix_t IMM_KF_R = " in config_str
+    assert "static const size_t IMM_KF_H_selection[IMM_KF_NUM_MEASUREMENTS]" in (
+        config_str
+    )
+    assert "IMM_KF_MODEL0_F_data" in config_str
+    assert "IMM_KF_MODEL1_F_data" not in config_str
+    assert "IMM_KF_MODEL1_Q_data" in config_str
+    assert "IMM_KF_MODEL2_Q_data" not in config_str
+    assert "IMM_KF_MODEL0_R" not in config_str
+
+    # only X and P are stored per model
+    storage_str = join_definitions(generated_config.generated_storage_definitions)
+    assert (
+        "static matrix_data_t IMM_KF_S_matrix_storage[IMM_KF_NUM_MEASUREMENTS * IMM_KF_NUM_MEASUREMENTS] = {0};"
+        in storage_str
+    )
+    assert "IMM_KF_MODEL1_P_matrix_storage" in storage_str
+    assert "IMM_KF_MODEL1_S_matrix_storage" not in storage_str
+
+    struct_str = "\n".join(generated_config.generated_struct_config_definition)
+    assert "const kf_config_S IMM_KF_MODEL2_kf_config = {" in struct_str
+    assert "\t.F = &IMM_KF_MODEL2_F,\n\t.B = NULL,\n\t.Q = &IMM_KF_MODEL0_Q," in (
+        struct_str
+    )
+    assert "\t.H_selection = IMM_KF_H_selection," in struct_str
+    assert (
+        "\t.S_matrix_storage = {IMM_KF_MODEL2_NUM_MEASUREMENTS * IMM_KF_MODEL2_NUM_MEASUREMENTS, IMM_KF_S_matrix_storage},"
+        in struct_str
+    )
+
+    data_str = generated_config.generated_filter_static_data_struct
+    assert (
+        "static const matrix_data_t IMM_KF_transition_probabilities[IMM_KF_NUM_MODELS * IMM_KF_NUM_MODELS] = "
+        "{0.950000F, 0.050000F, 0.000000F, 0.050000F, 0.900000F, 0.050000F, 0.000000F, 0.100000F, 0.900000F};"
+        in data_str
+    )
+    assert (
+        "static const matrix_data_t IMM_KF_initial_model_probabilities[IMM_KF_NUM_MODELS] = "
+        "{0.800000F, 0.100000F, 0.100000F};" in data_str
+    )
+
+    functions_str = join_definitions(generated_config.generated_function_definitions)
+    assert "static void IMM_KF_mix(void) {" in functions_str
+    assert "\t\tret = kf_predict(IMM_KF_model_data[model], NULL);" in functions_str
+    assert (
+        "\t\t\tret = kf_innovation_log_likelihood(IMM_KF_model_data[model], &log_likelihoods[model]);"
+        in functions_str
+    )
+    assert "\treturn IMM_KF_X[state];" in functions_str
+    assert "\treturn IMM_KF_P[row * IMM_KF_NUM_STATES + col];" in functions_str
+    assert "matrix_data_t imm_kf_get_model_probability(size_t model) {" in (
+        functions_str
+    )
+    assert "get_model_data" in generated_config.generated_function_headers
+
+
+def test_format_rows_matches_element_formatting():
+    matrix = np.array(
+        [[1.0, -0.0, 1e-7], [123456.789, -2.5e-3, 1.0 / 3.0]], dtype=np.float32
+    )
+
+    assert format_rows(matrix) == format_matrix_with_newlines(matrix)
+    assert format_values(matrix[1]) == ", ".join(f"{x:.6f}F" for x in matrix[1])
+    assert format_values(np.array([])) == ""
+
+
+def test_initializers_are_written_row_by_row(tmp_path):
+    definition = Definition(
+        "static matrix_data_t M[2U] = ", Initializer(np.eye(2)), ";"
+    )
+    # an initializer is formatted again on every iteration, one chunk per row
+    assert list(definition)[2] == "1.000000F, 0.000000F"
+    assert str(definition) == str(definition)
+    assert str(Initializer(functools.partial(packed_rows, np.ones((3, 3))))) == (
+        "{\n    1.000000F,\n    1.000000F, 1.000000F,\n    1.000000F, 1.000000F, 1.000000F\n}"
+    )
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{}, {"static_initialization": True, "snapshot": True, "packed_covariance": True}],
+)
+def test_generation_peak_memory_does_not_grow_with_the_matrices(tmp_path, options):
+    def peak_memory(num_states):
+        raw_config = json.load(open(SIMPLE_CONFIG_PATH))[0]
+        config = KalmanFilterConfig(
+            dict(
+                raw_config,
+                F=(np.eye(num_states) + 0.001).tolist(),
+                Q=(np.eye(num_states) * 0.01).tolist(),
+                H=[[1.0] + [0.0] * (num_states - 1)],
+                R=[[1.0]],
+                P_init=np.eye(num_states).tolist(),
+                X_init=[0.0] * num_states,
+                **options,
+            )
+        )
+        tracemalloc.start()
+        FileWriter(
+            KalmanFilterConfigGenerator(config),
+            str(tmp_path / "filter.c"),
+            str(tmp_path / "filter.h"),
+        )
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+
+    # the matrices and the written file are 16 times larger, the memory only holds one row of them at a time
+    assert peak_memory(400) < 4 * peak_memory(100)
@@ -0,0 +1,57 @@
+import pytest
+import json
+import numpy as np
+
+# add the package from ../generator to the path
+import os
+import sys
+
+# Get the absolute path of the project root
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+from generator.imm import *
+from generator.ingestor import KalmanFilterConfig
+
+IMM_CONFIG_PATH = "generator/tests/samples/imm_filter.json"
+
+
+def load_imm_config():
+    with open(IMM_CONFIG_PATH) as f:
+        return json.load(f)[0]
+
+
+def test_first_equal_models():
+    kf = KalmanFilterConfig(load_imm_config())
+
+    assert first_equal_models(kf.models, "F") == [0, 0, 2]
+    assert first_equal_models(kf.models, "Q") == [0, 1, 0]
+    # without a control input there is nothing to share
+    assert first_equal_models(kf.models, "B") == [0, 1, 2]
+
+
+def test_model_raw_config():
+    raw_config = load_imm_config()
+    raw_config["backend"] = "vector"
+    kf = KalmanFilterConfig(raw_config)
+
+    model_config = model_raw_config(raw_config, kf.models[2], "imm_kf_model2")
+
+    assert model_config["name"] == "imm_kf_model2"
+    assert model_config["decompose"] is False
+    assert model_config["sparse_threshold"] == 0
+    assert model_config["backend"] == "vector"
+    assert np.allclose(model_config["F"], [[1, 0.1], [0, 0.5]])
+    assert np.allclose(model_config["Q"], [[0.0001, 0], [0, 0.001]])
+    assert "B" not in model_config
+    for key in IMM_KEYS:
+        assert key not in model_config
+
+
+def test_imm_report():
+    kf = KalmanFilterConfig(load_imm_config())
+
+    assert format_imm_report("imm_kf", kf.models) == (
+        "imm_kf: interacting multiple model bank of 3 models sharing H, R, P_init, X_init and the scratch storage, "
+        "with 2 distinct F and 2 distinct Q"
+    )
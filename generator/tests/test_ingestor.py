@@ -5,6 +5,8 @@ import json
 import os
 import sys
 
+import numpy as np
+
 # Get the absolute path of the project root
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 sys.path.insert(0, project_root)
@@ -103,3 +105,468 @@ def test_nominal_simple_filter_load(filter_to_load):
 
         if filter_to_load == SIMPLE_CONFIG_PATH_WITH_CONTROL:
             assert kf.num_controls == 1
+
+
+@pytest.mark.parametrize("threshold_key", ["innovation_gate", "innovation_deadband"])
+@pytest.mark.parametrize("invalid_value", [-1.0, "9.21", True, [1.0]])
+def test_invalid_innovation_threshold(threshold_key, invalid_value):
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)
+
+        simple_kf_config = config[0]
+        simple_kf_config[threshold_key] = invalid_value
+
+        with pytest.raises(InvalidConfigException):
+            KalmanFilterConfig(simple_kf_config)
+
+
+def test_innovation_deadband_not_below_gate():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)
+
+        simple_kf_config = config[0]
+        simple_kf_config["innovation_gate"] = 3.84
+        simple_kf_config["innovation_deadband"] = 3.84
+
+        with pytest.raises(InvalidConfigException):
+            KalmanFilterConfig(simple_kf_config)
+
+
+def test_innovation_thresholds_default_to_disabled():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)
+
+        kf = KalmanFilterConfig(config[0])
+
+        assert kf.innovation_gate == 0.0
+        assert kf.innovation_deadband == 0.0
+
+
+@pytest.mark.parametrize("invalid_value", [1, "true", None])
+def test_invalid_packed_covariance(invalid_value):
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)
+
+        simple_kf_config = config[0]
+        simple_kf_config["packed_covariance"] = invalid_value
+
+        with pytest.raises(InvalidConfigException):
+            KalmanFilterConfig(simple_kf_config)
+
+
+def test_packed_covariance_defaults_to_disabled():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)
+
+        kf = KalmanFilterConfig(config[0])
+
+        assert kf.packed_covariance is False
+
+
+@pytest.mark.parametrize("flag", ["static_initialization", "snapshot"])
+@pytest.mark.parametrize("invalid_value", [1, "false"])
+def test_invalid_flag(flag, invalid_value):
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)
+
+        simple_kf_config = config[0]
+        simple_kf_config[flag] = invalid_value
+
+        with pytest.raises(InvalidConfigException):
+            KalmanFilterConfig(simple_kf_config)
+
+        del simple_kf_config[flag]
+        assert getattr(KalmanFilterConfig(simple_kf_config), flag) is False
+
+
+EKF_CONFIG_PATH = "generator/tests/samples/pendulum_ekf.json"
+
+
+def test_nominal_ekf_load():
+    with open(EKF_CONFIG_PATH) as f:
+        config = json.load(f)
+
+        kf = KalmanFilterConfig(config[0])
+
+        assert kf.F is None
+        assert kf.H is None
+        assert kf.num_states == 2
+        assert kf.num_measurements == 3
+        assert kf.num_controls == 1
+        assert kf.model is not None
+
+
+def test_linear_config_has_no_model():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)
+
+        kf = KalmanFilterConfig(config[0])
+
+        assert kf.model is None
+
+
+@pytest.mark.parametrize("key_to_remove", ["states", "Q", "R"])
+def test_ekf_missing_key(key_to_remove):
+    with open(EKF_CONFIG_PATH) as f:
+        config = json.load(f)
+
+        ekf_config = config[0]
+        ekf_config.pop(key_to_remove)
+
+        with pytest.raises(InvalidConfigException):
+            KalmanFilterConfig(ekf_config)
+
+
+def test_ekf_with_B_is_rejected():
+    with open(EKF_CONFIG_PATH) as f:
+        config = json.load(f)
+
+        ekf_config = config[0]
+        ekf_config["B"] = [[0], [1]]
+
+        with pytest.raises(InvalidConfigException):
+            KalmanFilterConfig(ekf_config)
+
+
+def test_states_without_model_are_rejected():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)
+
+        simple_kf_config = config[0]
+        simple_kf_config["states"] = ["x", "v"]
+
+        with pytest.raises(InvalidConfigException):
+            KalmanFilterConfig(simple_kf_config)
+
+
+def test_ekf_state_count_must_match():
+    with open(EKF_CONFIG_PATH) as f:
+        config = json.load(f)
+
+        ekf_config = config[0]
+        ekf_config["X_init"] = [0.3, 0, 0]
+
+        with pytest.raises(InvalidConfigException):
+            KalmanFilterConfig(ekf_config)
+
+
+@pytest.mark.parametrize(
+    "H, expected_selection",
+    [
+        ([[1, 0]], [0]),
+        ([[0, 1], [1, 0]], [1, 0]),
+        ([[1, 1]], None),
+        ([[2, 0]], None),
+        ([[0, 0]], None),
+    ],
+)
+def test_H_selection(H, expected_selection):
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)
+
+        simple_kf_config = config[0]
+        simple_kf_config["H"] = H
+        simple_kf_config["R"] = [
+            [1 if i == j else 0 for j in range(len(H))] for i in range(len(H))
+        ]
+
+        kf = KalmanFilterConfig(simple_kf_config)
+
+        assert kf.H_selection == expected_selection
+
+
+def test_steady_state_defaults():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)
+
+        simple_kf_config = config[0]
+        kf = KalmanFilterConfig(simple_kf_config)
+        assert kf.steady_state_threshold == 0.0
+        assert kf.steady_state_updates == 0
+
+        simple_kf_config["steady_state_threshold"] = 1e-4
+        kf = KalmanFilterConfig(simple_kf_config)
+        assert kf.steady_state_updates == DEFAULT_STEADY_STATE_UPDATES
+
+
+@pytest.mark.parametrize(
+    "steady_state_keys",
+    [
+        {"steady_state_updates": 5},
+        {"steady_state_threshold": -1},
+        {"steady_state_threshold": 1e-4, "steady_state_updates": 0},
+        {"steady_state_threshold": 1e-4, "steady_state_updates": 2.5},
+    ],
+)
+def test_invalid_steady_state(steady_state_keys):
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)
+
+        simple_kf_config = config[0]
+        simple_kf_config.update(steady_state_keys)
+
+        with pytest.raises(InvalidConfigException):
+            KalmanFilterConfig(simple_kf_config)
+
+
+def test_sparse_matrices():
+    with open("generator/tests/samples/imu_filter.json") as f:
+        imu_kf_config = json.load(f)[0]
+
+    # F has 9 of 36 nonzeros, B, Q and H 1 in 6, and H is a selection
+    kf = KalmanFilterConfig(imu_kf_config)
+    assert kf.sparse_threshold == DEFAULT_SPARSE_THRESHOLD
+    assert kf.sparse_matrices == []
+
+    imu_kf_config["sparse_threshold"] = 0.2
+    assert KalmanFilterConfig(imu_kf_config).sparse_matrices == ["B", "Q"]
+
+    imu_kf_config["sparse_threshold"] = 0.3
+    assert KalmanFilterConfig(imu_kf_config).sparse_matrices == ["F", "B", "Q"]
+
+    imu_kf_config["sparse_threshold"] = 0
+    assert KalmanFilterConfig(imu_kf_config).sparse_matrices == []
+
+
+@pytest.mark.parametrize("invalid_value", [-0.1, 1.5, True, "0.1"])
+def test_invalid_sparse_threshold(invalid_value):
+    with open(SIMPLE_CONFIG_PATH) as f:
+        config = json.load(f)
+
+        simple_kf_config = config[0]
+        simple_kf_config["sparse_threshold"] = invalid_value
+
+        with pytest.raises(InvalidConfigException):
+            KalmanFilterConfig(simple_kf_config)
+
+
+def test_blocks():
+    with open("generator/tests/samples/two_axis_filter.json") as f:
+        two_axis_kf_config = json.load(f)[0]
+
+    kf = KalmanFilterConfig(two_axis_kf_config)
+    assert [block["states"] for block in kf.blocks] == [[0, 2], [1, 3]]
+
+    # a filter with a single block, or that opts out, is not decomposed
+    with open(SIMPLE_CONFIG_PATH) as f:
+        assert KalmanFilterConfig(json.load(f)[0]).blocks is None
+
+    two_axis_kf_config["decompose"] = False
+    assert KalmanFilterConfig(two_axis_kf_config).blocks is None
+
+    # decomposing changes the generated API, so a filter must opt in
+    del two_axis_kf_config["decompose"]
+    assert KalmanFilterConfig(two_axis_kf_config).blocks is None
+
+    # a single block is not decomposed, even when asked to
+    with open(SIMPLE_CONFIG_PATH) as f:
+        simple_kf_config = json.load(f)[0]
+    assert KalmanFilterConfig(dict(simple_kf_config, decompose=True)).blocks is None
+
+
+def test_invalid_decompose():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        simple_kf_config = json.load(f)[0]
+    simple_kf_config["decompose"] = 1
+
+    with pytest.raises(InvalidConfigException):
+        KalmanFilterConfig(simple_kf_config)
+
+
+@pytest.mark.parametrize(
+    "unsupported_keys",
+    [
+        {"innovation_gate": 9.0},
+        {"innovation_deadband": 0.5},
+        {"snapshot": True},
+        {"covariance_blocks": [2, 2]},
+        {
+            "models": [{}, {"Q": (np.eye(4) * 0.1).tolist()}],
+            "transition_probabilities": [[0.9, 0.1], [0.1, 0.9]],
+        },
+    ],
+)
+def test_decompose_with_unsupported_settings(unsupported_keys):
+    with open("generator/tests/samples/two_axis_filter.json") as f:
+        two_axis_kf_config = json.load(f)[0]
+    two_axis_kf_config.update(unsupported_keys)
+
+    # the settings apply to the whole filter, the filter is not silently left undecomposed
+    with pytest.raises(InvalidConfigException, match="decompose is not supported"):
+        KalmanFilterConfig(two_axis_kf_config)
+
+    two_axis_kf_config["decompose"] = False
+    assert KalmanFilterConfig(two_axis_kf_config).blocks is None
+
+
+def test_decompose_with_models():
+    with open("generator/tests/samples/pendulum_ekf.json") as f:
+        ekf_config = json.load(f)[0]
+    ekf_config["decompose"] = True
+
+    with pytest.raises(InvalidConfigException, match="together with f or h"):
+        KalmanFilterConfig(ekf_config)
+
+
+def test_backend():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        simple_kf_config = json.load(f)[0]
+
+    assert KalmanFilterConfig(simple_kf_config).backend == "portable"
+
+    simple_kf_config["backend"] = "vector"
+    assert KalmanFilterConfig(simple_kf_config).backend == "vector"
+
+    simple_kf_config["backend"] = "avx512"
+    with pytest.raises(InvalidConfigException):
+        KalmanFilterConfig(simple_kf_config)
+
+
+def test_tile_size():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        simple_kf_config = json.load(f)[0]
+
+    # the simple filter is far below the default tiling threshold
+    assert KalmanFilterConfig(simple_kf_config).tile_size == 0
+
+    simple_kf_config["tiling_threshold"] = 2
+    assert KalmanFilterConfig(simple_kf_config).tile_size == 2
+
+    simple_kf_config["tile_size"] = 1
+    assert KalmanFilterConfig(simple_kf_config).tile_size == 1
+
+    # the packed covariance is never tiled
+    simple_kf_config["packed_covariance"] = True
+    assert KalmanFilterConfig(simple_kf_config).tile_size == 0
+    simple_kf_config["packed_covariance"] = False
+
+    simple_kf_config["tiling_threshold"] = 0
+    assert KalmanFilterConfig(simple_kf_config).tile_size == 0
+
+    for key, value in [("tiling_threshold", -1), ("tile_size", 0), ("tile_size", True)]:
+        invalid_config = dict(simple_kf_config, **{key: value})
+        with pytest.raises(InvalidConfigException):
+            KalmanFilterConfig(invalid_config)
+
+
+def test_covariance_blocks():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        simple_kf_config = json.load(f)[0]
+
+    assert KalmanFilterConfig(simple_kf_config).covariance_blocks is None
+
+    simple_kf_config["covariance_blocks"] = "diagonal"
+    kf_config = KalmanFilterConfig(simple_kf_config)
+    assert kf_config.covariance_blocks == [1, 1]
+    # the blocks have dense kernels of their own
+    assert kf_config.H_selection is None
+    assert kf_config.sparse_matrices == []
+
+    simple_kf_config["covariance_blocks"] = [2]
+    simple_kf_config["tiling_threshold"] = 1
+    kf_config = KalmanFilterConfig(simple_kf_config)
+    assert kf_config.covariance_blocks == [2]
+    assert kf_config.tile_size == 0
+
+    for key, value in [
+        ("covariance_blocks", [1]),
+        ("covariance_blocks", [2, 0]),
+        ("covariance_blocks", "full"),
+        ("covariance_blocks", [True, 1]),
+        ("packed_covariance", True),
+        ("snapshot", True),
+    ]:
+        invalid_config = dict(simple_kf_config, **{key: value})
+        with pytest.raises(InvalidConfigException):
+            KalmanFilterConfig(invalid_config)
+
+
+def test_covariance_decimation():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        simple_kf_config = json.load(f)[0]
+
+    kf_config = KalmanFilterConfig(simple_kf_config)
+    assert kf_config.covariance_decimation == 1
+    assert kf_config.F_decimated is None
+
+    simple_kf_config["covariance_decimation"] = 3
+    kf_config = KalmanFilterConfig(simple_kf_config)
+    assert kf_config.covariance_decimation == 3
+    assert np.allclose(kf_config.F_decimated, [[1, 0.003], [0, 1]])
+    F = kf_config.F
+    assert np.allclose(kf_config.Q_decimated, np.eye(2) + F @ F.T + F @ F @ (F @ F).T)
+
+    for value in [0, 1.5, True]:
+        invalid_config = dict(simple_kf_config, covariance_decimation=value)
+        with pytest.raises(InvalidConfigException):
+            KalmanFilterConfig(invalid_config)
+
+    # the Jacobian of an extended Kalman filter has no constant power
+    with open("generator/tests/samples/pendulum_ekf.json") as f:
+        ekf_config = json.load(f)[0]
+    ekf_config["covariance_decimation"] = 2
+    with pytest.raises(InvalidConfigException):
+        KalmanFilterConfig(ekf_config)
+
+
+IMM_CONFIG_PATH = "generator/tests/samples/imm_filter.json"
+
+
+def test_imm_models():
+    with open(IMM_CONFIG_PATH) as f:
+        imm_config = json.load(f)[0]
+
+    kf_config = KalmanFilterConfig(imm_config)
+    assert len(kf_config.models) == 3
+    # a model without F, Q or B uses the ones of the filter
+    assert np.array_equal(kf_config.models[0]["F"], kf_config.F)
+    assert np.array_equal(kf_config.models[1]["F"], kf_config.F)
+    assert np.allclose(kf_config.models[1]["Q"], [[0.001, 0], [0, 0.1]])
+    assert kf_config.models[2]["B"] is None
+    assert kf_config.transition_probabilities.shape == (3, 3)
+    assert np.allclose(kf_config.model_probabilities, [0.8, 0.1, 0.1])
+    # the models share dense matrices and are never decomposed
+    assert kf_config.sparse_matrices == []
+    assert kf_config.blocks is None
+
+    del imm_config["model_probabilities"]
+    assert np.allclose(KalmanFilterConfig(imm_config).model_probabilities, 1 / 3)
+
+    with open(SIMPLE_CONFIG_PATH) as f:
+        assert KalmanFilterConfig(json.load(f)[0]).models is None
+
+
+@pytest.mark.parametrize(
+    "invalid_keys",
+    [
+        {"models": [{}]},
+        {"models": [{}, {"H": [[1, 0]]}]},
+        {"models": [{}, {}, {"F": [[1]]}]},
+        {"models": [{}, {}, {"B": [[1], [0]]}]},
+        {"transition_probabilities": [[0.9, 0.1], [0.1, 0.9]]},
+        {"transition_probabilities": [[1, 0, 0], [0, 1, 0], [0, 0.5, 0.6]]},
+        {"transition_probabilities": [[1, 0, 0], [0, 1, 0], [0, 1.5, -0.5]]},
+        {"model_probabilities": [0.5, 0.5]},
+        {"model_probabilities": [0.5, 0.5, 0.5]},
+        {"packed_covariance": True},
+        {"innovation_gate": 9},
+        {"steady_state_threshold": 0.01},
+        {"covariance_decimation": 2},
+    ],
+)
+def test_invalid_imm_models(invalid_keys):
+    with open(IMM_CONFIG_PATH) as f:
+        imm_config = json.load(f)[0]
+    imm_config.update(invalid_keys)
+
+    with pytest.raises((InvalidConfigException, InvalidDimensionsException)):
+        KalmanFilterConfig(imm_config)
+
+
+def test_imm_keys_require_models():
+    with open(SIMPLE_CONFIG_PATH) as f:
+        simple_kf_config = json.load(f)[0]
+    simple_kf_config["model_probabilities"] = [1]
+
+    with pytest.raises(InvalidConfigException):
+        KalmanFilterConfig(simple_kf_config)
@@ -0,0 +1,113 @@
+import pytest
+import json
+
+# add the package from ../generator to the path
+import os
+import sys
+import time
+
+# Get the absolute path of the project root
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+from generator.profiling import *
+from generator.watch import FilterWatcher
+
+SIMPLE_CONFIG_PATH = "generator/tests/samples/simple_filter.json"
+IMU_CONFIG_PATH = "generator/tests/samples/imu_filter.json"
+
+
+def test_stages_are_timed():
+    profiler = StageProfiler()
+
+    with profiler.stage("generate", "simple_kf"):
+        time.sleep(0.01)
+        with profiler.stage("write", "simple_kf"):
+            pass
+
+    generate, write = profiler.events
+    assert (generate["name"], generate["config"]) == ("generate", "simple_kf")
+    assert generate["wall"] >= 0.01
+    # sleeping does not use the CPU
+    assert generate["cpu"] < generate["wall"]
+    # the nested stage is inside its parent
+    assert generate["start"] <= write["start"]
+    assert write["start"] + write["wall"] <= generate["start"] + generate["wall"]
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = StageProfiler(enabled=False)
+
+    with profiler.stage("generate"):
+        pass
+
+    assert profiler.events == []
+    assert profiler.chrome_trace()["traceEvents"] == []
+
+
+def test_failed_stage_is_timed():
+    profiler = StageProfiler()
+
+    with pytest.raises(ValueError):
+        with profiler.stage("validate", "bad_kf"):
+            raise ValueError("invalid config")
+
+    assert profiler.events[0]["wall"] >= 0.0
+
+
+def test_chrome_trace_and_summary(tmp_path):
+    profiler = StageProfiler()
+    with profiler.stage("submodules"):
+        pass
+    for name in ["simple_kf", "imu_kf", "imu_kf"]:
+        with profiler.stage("generate", name):
+            pass
+
+    trace_path = tmp_path / "trace.json"
+    profiler.write_chrome_trace(trace_path)
+    with open(trace_path) as f:
+        events = json.load(f)["traceEvents"]
+
+    assert [event["name"] for event in events] == [
+        "submodules",
+        "generate simple_kf",
+        "generate imu_kf",
+        "generate imu_kf",
+    ]
+    assert all(event["ph"] == "X" for event in events)
+    assert events[1]["args"]["config"] == "simple_kf"
+    assert events[1]["ts"] >= events[0]["ts"] + events[0]["dur"]
+
+    summary = profiler.summary()
+    assert summary[0].split() == ["stage", "config", "calls", "wall", "ms", "cpu", "ms"]
+    assert [line.split()[:3] for line in summary[1:]] == [
+        ["submodules", "-", "1"],
+        ["generate", "simple_kf", "1"],
+        ["generate", "imu_kf", "2"],
+        ["generate", "all", "3"],
+    ]
+
+
+def test_watcher_stages(tmp_path):
+    input_file = tmp_path / "filters.json"
+    with open(SIMPLE_CONFIG_PATH) as f:
+        simple_config = json.load(f)[0]
+    with open(IMU_CONFIG_PATH) as f:
+        imu_config = json.load(f)[0]
+    with open(input_file, "w") as f:
+        json.dump([simple_config, imu_config], f)
+    profiler = StageProfiler()
+
+    FilterWatcher([input_file], tmp_path / "out", profiler=profiler).regenerate(
+        input_file
+    )
+
+    assert [(event["name"], event["config"]) for event in profiler.events] == [
+        ("json.load", "filters.json"),
+        ("validate", "simple_kf"),
+        ("generate", "simple_kf"),
+        ("validate", "imu_kf"),
+        ("generate", "imu_kf"),
+        ("write", "simple_kf"),
+        ("write", "imu_kf"),
+    ]
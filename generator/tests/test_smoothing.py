@@ -0,0 +1,152 @@
+import pytest
+import json
+
+# add the package from ../generator to the path
+import os
+import sys
+
+import numpy as np
+
+# Get the absolute path of the project root
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+from generator.ingestor import *
+from generator.smoothing import *
+from generator.tuning import simulate_truth
+
+IMU_CONFIG_PATH = "generator/tests/samples/imu_filter.json"
+CONTROL_CONFIG_PATH = "generator/tests/samples/simple_filter_with_control.json"
+EKF_CONFIG_PATH = "generator/tests/samples/pendulum_ekf.json"
+IMM_CONFIG_PATH = "generator/tests/samples/imm_filter.json"
+
+
+def load_raw_config(config_path):
+    with open(config_path) as f:
+        return json.load(f)[0]
+
+
+def reference_smoother(config, z, u=None):
+    """
+    Textbook Rauch-Tung-Striebel smoother of a single log, with every step in memory.
+    """
+    F, H, Q, R = (getattr(config, key).astype(np.float64) for key in "FHQR")
+    x = config.X_init.ravel().astype(np.float64)
+    P = config.P_init.astype(np.float64)
+    x_predicted, P_predicted, x_filtered, P_filtered = [], [], [], []
+    for step in range(len(z)):
+        x = F @ x
+        if u is not None:
+            x = x + config.B.astype(np.float64) @ u[step]
+        P = F @ P @ F.T + Q
+        x_predicted.append(x)
+        P_predicted.append(P)
+        S = H @ P @ H.T + R
+        K = P @ H.T @ np.linalg.inv(S)
+        x = x + K @ (z[step] - H @ x)
+        P = P - K @ H @ P
+        x_filtered.append(x)
+        P_filtered.append(P)
+
+    x_smoothed = [x_filtered[-1]]
+    P_smoothed = [P_filtered[-1]]
+    for step in range(len(z) - 2, -1, -1):
+        C = P_filtered[step] @ F.T @ np.linalg.inv(P_predicted[step + 1])
+        x_smoothed.insert(
+            0, x_filtered[step] + C @ (x_smoothed[0] - x_predicted[step + 1])
+        )
+        P_smoothed.insert(
+            0, P_filtered[step] + C @ (P_smoothed[0] - P_predicted[step + 1]) @ C.T
+        )
+    return np.array(x_filtered), np.array(x_smoothed), np.array(P_smoothed)
+
+
+def test_smoother_matches_reference(tmp_path):
+    config = KalmanFilterConfig(load_raw_config(IMU_CONFIG_PATH))
+    _, z = simulate_truth(config, 50, [1])
+
+    result = smooth(config, z[0], tmp_path, chunk_size=16)
+    x_filtered, x_smoothed, P_smoothed = reference_smoother(config, z[0])
+
+    assert result["x_smoothed"].shape == (50, 1, config.num_states)
+    assert result["x_filtered"][:, 0] == pytest.approx(x_filtered, rel=1e-8, abs=1e-9)
+    assert result["x_smoothed"][:, 0] == pytest.approx(x_smoothed, rel=1e-8, abs=1e-9)
+    assert result["P_smoothed"][:, 0] == pytest.approx(P_smoothed, rel=1e-6, abs=1e-9)
+    # the last step has seen every measurement either way
+    assert result["x_smoothed"][-1] == pytest.approx(result["x_filtered"][-1])
+
+
+def test_smoother_with_control(tmp_path):
+    config = KalmanFilterConfig(load_raw_config(CONTROL_CONFIG_PATH))
+    rng = np.random.default_rng(0)
+    z = rng.standard_normal((30, config.num_measurements))
+    u = rng.standard_normal((30, config.num_controls))
+
+    result = smooth(config, z, tmp_path, u=u, chunk_size=7)
+    _, x_smoothed, _ = reference_smoother(config, z, u)
+
+    assert result["x_smoothed"][:, 0] == pytest.approx(x_smoothed, rel=1e-8, abs=1e-9)
+
+    with pytest.raises(ValueError):
+        smooth(config, z, tmp_path, u=u[:10])
+
+
+def test_chunk_size_does_not_change_results(tmp_path):
+    config = KalmanFilterConfig(load_raw_config(IMU_CONFIG_PATH))
+    _, z = simulate_truth(config, 40, [1, 2, 3])
+    # a batch of three logs, stored like a long log on disk and read back memory-mapped
+    np.save(tmp_path / "z.npy", z.swapaxes(0, 1))
+    z_log = np.load(tmp_path / "z.npy", mmap_mode="r")
+
+    single_chunk = smooth(config, z_log, tmp_path / "single", chunk_size=100)
+    many_chunks = smooth(config, z_log, tmp_path / "many", chunk_size=3)
+
+    assert many_chunks["x_smoothed"].shape == (40, 3, config.num_states)
+    for key in ["x_filtered", "P_filtered", "x_smoothed", "P_smoothed"]:
+        assert np.array_equal(many_chunks[key], single_chunk[key])
+    # every log of the batch is smoothed on its own
+    _, x_smoothed, _ = reference_smoother(config, z[2])
+    assert many_chunks["x_smoothed"][:, 2] == pytest.approx(
+        x_smoothed, rel=1e-8, abs=1e-9
+    )
+
+
+def test_missing_measurements_are_skipped(tmp_path):
+    config = KalmanFilterConfig(load_raw_config(IMU_CONFIG_PATH))
+    _, z = simulate_truth(config, 20, [1])
+    z = z[0]
+    z_missing = z.copy()
+    z_missing[5:10, 0] = np.nan
+
+    result = smooth(config, z_missing, tmp_path, chunk_size=4)
+
+    # an update with the second measurement only
+    reduced_raw_config = dict(
+        load_raw_config(IMU_CONFIG_PATH),
+        H=config.H[1:].tolist(),
+        R=config.R[1:, 1:].tolist(),
+    )
+    reduced_config = KalmanFilterConfig(reduced_raw_config)
+    x = config.X_init.ravel().astype(np.float64)
+    P = config.P_init.astype(np.float64)
+    for step in range(6):
+        x = config.F @ x
+        P = config.F @ P @ config.F.T + config.Q
+        H = reduced_config.H if step == 5 else config.H
+        R = reduced_config.R if step == 5 else config.R
+        measurement = z[step, 1:] if step == 5 else z[step]
+        K = P @ H.T @ np.linalg.inv(H @ P @ H.T + R)
+        x = x + K @ (measurement - H @ x)
+        P = P - K @ H @ P
+
+    assert result["x_filtered"][5, 0] == pytest.approx(x, abs=1e-6)
+    assert np.all(np.isfinite(result["P_smoothed"]))
+
+
+def test_nonlinear_and_imm_configs_are_rejected(tmp_path):
+    for config_path in [EKF_CONFIG_PATH, IMM_CONFIG_PATH]:
+        config = KalmanFilterConfig(load_raw_config(config_path))
+        z = np.zeros((5, config.num_measurements))
+
+        with pytest.raises(InvalidConfigException):
+            smooth(config, z, tmp_path)
@@ -0,0 +1,133 @@
+import pytest
+import json
+
+# add the package from ../generator to the path
+import os
+import sys
+
+# Get the absolute path of the project root
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+from generator.sources import *
+from generator.ingestor import KalmanFilterConfig
+from generator.file_content_generator import KalmanFilterConfigGenerator
+from generator.file_writer import FileWriter
+
+SIMPLE_CONFIG_PATH = "generator/tests/samples/simple_filter.json"
+IMU_CONFIG_PATH = "generator/tests/samples/imu_filter.json"
+KALMAN_H = '#include "matrix.h"\nvoid kf_step(matrix_t* x);\n'
+MATRIX_H = (
+    "typedef struct { float* data; } matrix_t;\nvoid matrix_scale(matrix_t* m);\n"
+)
+
+
+def load_raw_config(config_path):
+    with open(config_path) as f:
+        return json.load(f)[0]
+
+
+def make_library(repo_root):
+    """A small library laid out like the repository."""
+    for directory in [
+        "filter/inc",
+        "filter/src",
+        "libs/kalman-matrix-utils/inc",
+        "libs/kalman-matrix-utils/src",
+    ]:
+        (repo_root / directory).mkdir(parents=True)
+    (repo_root / "filter/inc/kalman.h").write_text(KALMAN_H)
+    (repo_root / "filter/src/kalman.c").write_text(
+        '#include "kalman.h"\nvoid kf_step(matrix_t* x) { matrix_scale(x); }\n'
+    )
+    (repo_root / "libs/kalman-matrix-utils/inc/matrix.h").write_text(MATRIX_H)
+    (repo_root / "libs/kalman-matrix-utils/src/matrix.c").write_text(
+        '#include "matrix.h"\nvoid matrix_scale(matrix_t* m) { m->data[0] *= 2; }\n'
+    )
+
+
+def test_in_memory_files_match_written_files(tmp_path):
+    raw_config = load_raw_config(IMU_CONFIG_PATH)
+    generator = KalmanFilterConfigGenerator(KalmanFilterConfig(raw_config))
+    c_file_path = str(tmp_path / "imu_kf_config.c")
+    h_file_path = str(tmp_path / "imu_kf_config.h")
+    FileWriter(generator, c_file_path, h_file_path, "/* library */")
+
+    files = generate_filter_sources(raw_config, "/* library */")
+
+    assert sorted(files) == [
+        os.path.join("inc", "imu_kf_config.h"),
+        os.path.join("src", "imu_kf_config.c"),
+    ]
+    with open(c_file_path) as f:
+        assert files[os.path.join("src", "imu_kf_config.c")] == f.read()
+    with open(h_file_path) as f:
+        assert files[os.path.join("inc", "imu_kf_config.h")] == f.read()
+
+
+def test_config_and_encoding(tmp_path):
+    raw_config = load_raw_config(SIMPLE_CONFIG_PATH)
+
+    files = generate_filter_sources(raw_config)
+    encoded_files = generate_filter_sources(
+        KalmanFilterConfig(raw_config), encoding="utf-8"
+    )
+
+    assert encoded_files == {
+        path: content.encode("utf-8") for path, content in files.items()
+    }
+    assert '#include "kalman.h"' in files[os.path.join("src", "simple_kf_config.c")]
+
+
+def test_library_sources(tmp_path):
+    make_library(tmp_path)
+
+    files, amalgamated_source = library_sources(repo_root=tmp_path)
+    assert amalgamated_source is None
+    assert sorted(files) == [
+        os.path.join("inc", "kalman.h"),
+        os.path.join("inc", "matrix.h"),
+        os.path.join("src", "kalman.c"),
+        os.path.join("src", "matrix.c"),
+    ]
+
+    files, amalgamated_source = library_sources(amalgamated=True, repo_root=tmp_path)
+    # the sources are compiled into the .c file of each filter, only the headers are kept
+    assert sorted(files) == [
+        os.path.join("inc", "kalman.h"),
+        os.path.join("inc", "matrix.h"),
+    ]
+    assert amalgamated_source.index("matrix_scale(matrix_t* m) {") < (
+        amalgamated_source.index("kf_step(matrix_t* x) {")
+    )
+
+    with pytest.raises(FileNotFoundError):
+        library_sources(repo_root=tmp_path / "missing")
+
+
+def test_generate_sources(tmp_path):
+    make_library(tmp_path)
+    raw_configs = [
+        load_raw_config(SIMPLE_CONFIG_PATH),
+        load_raw_config(IMU_CONFIG_PATH),
+    ]
+
+    files = generate_sources(raw_configs, amalgamated=True, repo_root=tmp_path)
+    library_files = generate_sources(
+        raw_configs, amalgamated=True, include_library=True, repo_root=tmp_path
+    )
+
+    assert sorted(files) == [
+        os.path.join("inc", "imu_kf_config.h"),
+        os.path.join("inc", "simple_kf_config.h"),
+        os.path.join("src", "imu_kf_config.c"),
+        os.path.join("src", "simple_kf_config.c"),
+    ]
+    assert (
+        "matrix_scale(matrix_t* m) {" in files[os.path.join("src", "imu_kf_config.c")]
+    )
+    assert library_files == {
+        **files,
+        os.path.join("inc", "kalman.h"): KALMAN_H,
+        os.path.join("inc", "matrix.h"): MATRIX_H,
+    }
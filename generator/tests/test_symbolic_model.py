@@ -0,0 +1,108 @@
+import pytest
+
+# add the package from ../generator to the path
+import os
+import sys
+
+# Get the absolute path of the project root
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+pytest.importorskip("sympy")
+
+from generator.ingestor import InvalidConfigException
+from generator.symbolic_model import *
+
+STATES = ["theta", "omega"]
+PARAMETERS = {"dt": 0.01, "L": 0.5}
+
+
+def test_jacobians():
+    model = SymbolicModel(
+        STATES,
+        ["torque"],
+        PARAMETERS,
+        f=["theta + dt*omega", "omega + dt*torque"],
+        h=["L*sin(theta)"],
+    )
+
+    assert model.F_jacobian.shape == (2, 2)
+    assert float(model.F_jacobian[0, 1]) == pytest.approx(0.01)
+    assert model.H_jacobian.shape == (1, 2)
+    assert model.H_jacobian[0, 1] == 0
+
+
+def test_common_subexpressions_are_shared():
+    model = SymbolicModel(STATES, [], PARAMETERS, h=["L*sin(theta)", "L*cos(theta)"])
+    function = model.generate_measurement_model_function("pendulum_measurement_model")
+
+    # sin and cos are evaluated once for both the measurement and its Jacobian
+    assert function.count("sinf(theta)") == 1
+    assert function.count("cosf(theta)") == 1
+    assert "const matrix_data_t cse_0 = " in function
+
+
+def test_structural_zeros_are_not_evaluated():
+    model = SymbolicModel(STATES, [], PARAMETERS, h=["L*sin(theta)"])
+    function = model.generate_measurement_model_function("pendulum_measurement_model")
+
+    assert "memset(H->data, 0, 2U * sizeof(matrix_data_t));" in function
+    assert "H->data[0] = " in function
+    assert "H->data[1] = " not in function
+    # omega is not needed by the measurement model
+    assert "omega" not in function
+
+
+def test_dense_jacobian_is_not_cleared():
+    model = SymbolicModel(STATES, [], PARAMETERS, f=["theta*omega", "theta + omega"])
+    function = model.generate_predict_model_function("predict_model")
+
+    assert "memset" not in function
+    assert "(void)u;" in function
+
+
+def test_float_printing():
+    model = SymbolicModel(
+        STATES, ["torque"], {"k": 0.5}, f=["k*theta**2", "omega**5 + torque"]
+    )
+    function = model.generate_predict_model_function("predict_model")
+
+    # small integer powers are expanded and the 1.0 coefficient of d(0.5*theta^2)/dtheta is dropped
+    assert "X_next->data[0] = 0.5F*theta*theta;" in function
+    assert "F->data[0] = theta;" in function
+    assert "powf(omega, 5.0F)" in function
+    assert "F->data[3] = 5.0F*omega*omega*omega*omega;" in function
+    assert "const matrix_data_t torque = u->data[0];" in function
+
+
+@pytest.mark.parametrize(
+    "states", [["x", "x"], ["x", "int"], ["x", "cse_1"], ["x", "F"], ["x", "1x"], "x"]
+)
+def test_invalid_names(states):
+    with pytest.raises(InvalidConfigException):
+        SymbolicModel(states, [], {}, f=["x", "x"])
+
+
+def test_unknown_symbol():
+    with pytest.raises(InvalidConfigException):
+        SymbolicModel(STATES, [], PARAMETERS, h=["theta + unknown"])
+
+
+def test_controls_not_allowed_in_h():
+    with pytest.raises(InvalidConfigException):
+        SymbolicModel(STATES, ["torque"], PARAMETERS, h=["theta + torque"])
+
+
+def test_invalid_expression():
+    with pytest.raises(InvalidConfigException):
+        SymbolicModel(STATES, [], PARAMETERS, h=["theta +"])
+
+
+def test_f_needs_one_expression_per_state():
+    with pytest.raises(InvalidConfigException):
+        SymbolicModel(STATES, [], PARAMETERS, f=["theta + dt*omega"])
+
+
+def test_invalid_parameter_value():
+    with pytest.raises(InvalidConfigException):
+        SymbolicModel(STATES, [], {"dt": "fast"}, h=["theta"])
@@ -0,0 +1,101 @@
+import pytest
+import json
+
+# add the package from ../generator to the path
+import os
+import sys
+
+import numpy as np
+
+# Get the absolute path of the project root
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+from generator.ingestor import *
+from generator.tuning import *
+
+SIMPLE_CONFIG_PATH = "generator/tests/samples/simple_filter.json"
+IMU_CONFIG_PATH = "generator/tests/samples/imu_filter.json"
+
+
+def load_raw_config(config_path):
+    with open(config_path) as f:
+        return json.load(f)[0]
+
+
+def test_candidate_zero_is_untouched_config():
+    q_scales, r_scales = sample_candidates(8, 3, 2, 10.0, seed=0)
+
+    assert q_scales.shape == (8, 3)
+    assert r_scales.shape == (8, 2)
+    assert np.all(q_scales[0] == 1.0)
+    assert np.all(r_scales[0] == 1.0)
+    assert np.all((q_scales >= 0.1) & (q_scales <= 10.0))
+
+
+def test_scale_covariance_keeps_correlation():
+    covariance = np.array([[4.0, 1.0], [1.0, 2.0]])
+    scaled = scale_covariance(covariance, np.array([4.0, 9.0]))
+
+    assert scaled == pytest.approx(np.array([[16.0, 6.0], [6.0, 18.0]]))
+
+
+def test_sharding_does_not_change_results():
+    config = KalmanFilterConfig(load_raw_config(IMU_CONFIG_PATH))
+
+    single_shard = tune(
+        config, num_candidates=6, num_seeds=3, num_steps=30, workers=1, shard_size=6
+    )
+    many_shards = tune(
+        config, num_candidates=6, num_seeds=3, num_steps=30, workers=2, shard_size=2
+    )
+
+    assert many_shards["scores"] == pytest.approx(single_shard["scores"])
+    assert many_shards["best"] == single_shard["best"]
+
+
+def test_untouched_config_is_consistent():
+    config = KalmanFilterConfig(load_raw_config(SIMPLE_CONFIG_PATH))
+
+    result = tune(config, num_candidates=1, num_seeds=50, num_steps=100, workers=1)
+
+    # the filter matches the simulated truth, so NEES and NIS should be close to their dimensions
+    assert result["nees"][0] == pytest.approx(config.num_states, rel=0.2)
+    assert result["nis"][0] == pytest.approx(config.num_measurements, rel=0.2)
+
+
+def test_tuning_recovers_measurement_noise():
+    raw_config = load_raw_config(SIMPLE_CONFIG_PATH)
+    config = KalmanFilterConfig(raw_config)
+
+    # the real sensor is 4 times noisier than the config claims
+    truth_raw_config = dict(raw_config, R=[[4.0]])
+    truth_config = KalmanFilterConfig(truth_raw_config)
+
+    result = tune(
+        config,
+        truth_config,
+        num_candidates=64,
+        num_seeds=20,
+        num_steps=100,
+        workers=1,
+    )
+
+    best = result["best"]
+    assert result["scores"][best] < result["scores"][0]
+    # the untouched config is overconfident about its measurements
+    assert result["nis"][0] > 2.0
+    assert abs(result["nis"][best] - 1.0) < abs(result["nis"][0] - 1.0)
+
+    tuned_config = KalmanFilterConfig(
+        tuned_raw_config(config, result["q_scales"][best], result["r_scales"][best])
+    )
+    assert tuned_config.R[0][0] == pytest.approx(result["r_scales"][best][0], rel=1e-5)
+
+
+def test_truth_config_dimensions_must_match():
+    config = KalmanFilterConfig(load_raw_config(SIMPLE_CONFIG_PATH))
+    truth_config = KalmanFilterConfig(load_raw_config(IMU_CONFIG_PATH))
+
+    with pytest.raises(InvalidConfigException):
+        tune(config, truth_config, num_candidates=1, workers=1)
@@ -0,0 +1,115 @@
+import pytest
+import glob
+import json
+
+# add the package from ../generator to the path
+import os
+import sys
+
+# Get the absolute path of the project root
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+from generator.validation import *
+
+SIMPLE_CONFIG_PATH = "generator/tests/samples/simple_filter.json"
+
+
+def load_raw_config(config_path):
+    with open(config_path) as f:
+        return json.load(f)[0]
+
+
+def codes(diagnostics):
+    return [(item["code"], item["key"]) for item in diagnostics]
+
+
+@pytest.mark.parametrize(
+    "config_path", sorted(glob.glob("generator/tests/samples/*.json"))
+)
+def test_samples_are_valid(config_path):
+    with open(config_path, "rb") as f:
+        assert validate_content(f.read()) == []
+
+
+def test_schema_reports_every_structural_error():
+    config = load_raw_config(SIMPLE_CONFIG_PATH)
+    del config["R"]
+    config["Q"] = [[1, 0], [0]]
+    config["X_init"] = [0, "0"]
+    config["bogus"] = 1
+
+    assert codes(check_schema(config, 0)) == [
+        ("missing_key", "R"),
+        ("unknown_key", "bogus"),
+        ("invalid_type", "Q"),
+        ("invalid_type", "X_init"),
+    ]
+    assert SCHEMA["matrix_ranks"]["X_init"] == 1
+    # a nonlinear model replaces F
+    del config["F"]
+    config["f"] = ["x"]
+    assert ("missing_key", "F") not in codes(check_schema(config, 0))
+
+
+def test_config_checks():
+    config = load_raw_config(SIMPLE_CONFIG_PATH)
+    invalid_dimensions = dict(config, R=[[1, 0], [0, 1]])
+    invalid_config = dict(config, name="gated_kf", innovation_gate=-1)
+
+    diagnostics = validate_content(
+        json.dumps([config, invalid_dimensions, invalid_config, config])
+    )
+
+    assert codes(diagnostics) == [
+        ("invalid_dimensions", "R"),
+        ("duplicate_name", "name"),
+        ("invalid_config", None),
+        ("duplicate_name", "name"),
+    ]
+    assert [item["index"] for item in diagnostics] == [1, 1, 2, 3]
+    assert diagnostics[2]["config"] == "gated_kf"
+    assert codes(validate_content(b"[{")) == [("invalid_json", None)]
+    assert codes(validate_content(b"{}")) == [("invalid_type", None)]
+
+
+def test_validate_directory_caches_results(tmp_path):
+    config = load_raw_config(SIMPLE_CONFIG_PATH)
+    (tmp_path / "nested").mkdir()
+    (tmp_path / ".git").mkdir()
+    for index in range(4):
+        with open(tmp_path / "nested" / f"filter{index}.json", "w") as f:
+            json.dump([dict(config, name=f"filter{index}")], f)
+    with open(tmp_path / "bad.json", "w") as f:
+        json.dump([dict(config, bogus=1)], f)
+    (tmp_path / ".git" / "ignored.json").write_text("[{")
+
+    result = validate_directory(tmp_path, workers=2)
+    assert (result["files"], result["validated"], result["cached"]) == (5, 5, 0)
+    assert [(item["file"], item["code"]) for item in result["diagnostics"]] == [
+        ("bad.json", "unknown_key")
+    ]
+    assert (tmp_path / DEFAULT_CACHE_FILE).exists()
+
+    # an unchanged repository is read from the cache
+    cached_result = validate_directory(tmp_path, workers=2)
+    assert (cached_result["validated"], cached_result["cached"]) == (0, 5)
+    assert cached_result["diagnostics"] == result["diagnostics"]
+
+    with open(tmp_path / "bad.json", "w") as f:
+        json.dump([config], f)
+    fixed_result = validate_directory(tmp_path, workers=1)
+    assert (fixed_result["validated"], fixed_result["cached"]) == (1, 4)
+    assert fixed_result["diagnostics"] == []
+
+
+def test_cache_of_another_validator_is_ignored(tmp_path):
+    with open(tmp_path / "filter.json", "w") as f:
+        json.dump([load_raw_config(SIMPLE_CONFIG_PATH)], f)
+    cache_file = tmp_path / "cache.json"
+    validate_directory(tmp_path, cache_file=cache_file)
+
+    with open(cache_file) as f:
+        cache = json.load(f)
+    assert load_cache(cache_file, cache["validator"]) == cache["files"]
+    assert load_cache(cache_file, "older validator") == {}
@@ -0,0 +1,136 @@
+import pytest
+import asyncio
+import json
+
+# add the package from ../generator to the path
+import os
+import sys
+
+# Get the absolute path of the project root
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+from generator.watch import *
+from generator.ingestor import InvalidDimensionsException
+from generator.sources import generate_filter_sources
+
+SIMPLE_CONFIG_PATH = "generator/tests/samples/simple_filter.json"
+IMU_CONFIG_PATH = "generator/tests/samples/imu_filter.json"
+
+
+def load_raw_config(config_path):
+    with open(config_path) as f:
+        return json.load(f)[0]
+
+
+def write_configs(path, configs):
+    with open(path, "w") as f:
+        json.dump(configs, f)
+
+
+def test_atomic_write(tmp_path):
+    path = tmp_path / "inc" / "simple_kf_config.h"
+    (tmp_path / "other").write_text("")
+
+    atomic_write(path, "old")
+    atomic_write(path, "new")
+
+    assert path.read_text() == "new"
+    assert os.stat(path).st_mode & 0o777 == os.stat(tmp_path / "other").st_mode & 0o777
+    # the temporary files are renamed over the file
+    assert os.listdir(tmp_path / "inc") == ["simple_kf_config.h"]
+
+
+def test_atomic_write_follows_the_current_umask(tmp_path):
+    # the umask is applied when the file is created, not read once when the module is imported
+    umask = os.umask(0o077)
+    try:
+        atomic_write(tmp_path / "private.h", "private")
+    finally:
+        os.umask(umask)
+
+    assert os.stat(tmp_path / "private.h").st_mode & 0o777 == 0o600
+
+
+def test_only_changed_configs_are_regenerated(tmp_path):
+    input_file = tmp_path / "filters.json"
+    simple_config = load_raw_config(SIMPLE_CONFIG_PATH)
+    imu_config = load_raw_config(IMU_CONFIG_PATH)
+    write_configs(input_file, [simple_config, imu_config])
+    watcher = FilterWatcher([input_file], tmp_path / "out")
+
+    assert watcher.regenerate(input_file) == ["simple_kf", "imu_kf"]
+    assert (tmp_path / "out" / "src" / "imu_kf_config.c").exists()
+    assert watcher.regenerate(input_file) == []
+
+    imu_config["R"] = [[0.5, 0, 0], [0, 0.5, 0], [0, 0, 0.5]]
+    write_configs(input_file, [simple_config, imu_config])
+    assert watcher.changed_files() == [str(input_file)]
+    assert watcher.regenerate(input_file) == ["imu_kf"]
+    assert watcher.changed_files() == []
+    with open(tmp_path / "out" / "src" / "imu_kf_config.c") as f:
+        assert "0.5" in f.read()
+
+
+def test_invalid_config_writes_nothing(tmp_path):
+    input_file = tmp_path / "filters.json"
+    simple_config = load_raw_config(SIMPLE_CONFIG_PATH)
+    write_configs(input_file, [simple_config])
+    watcher = FilterWatcher([input_file], tmp_path / "out")
+    watcher.regenerate(input_file)
+    c_file_path = tmp_path / "out" / "src" / "simple_kf_config.c"
+    c_file = c_file_path.read_text()
+
+    changed_config = dict(simple_config, Q=[[2, 0], [0, 2]])
+    write_configs(
+        input_file, [changed_config, dict(simple_config, name="bad", R=[[1, 0]])]
+    )
+
+    with pytest.raises(InvalidDimensionsException):
+        watcher.regenerate(input_file)
+    assert c_file_path.read_text() == c_file
+    assert not (tmp_path / "out" / "src" / "bad_config.c").exists()
+
+
+def test_watch_debounces_edits(tmp_path, capsys):
+    input_file = tmp_path / "filters.json"
+    simple_config = load_raw_config(SIMPLE_CONFIG_PATH)
+    write_configs(input_file, [simple_config])
+    watcher = FilterWatcher([input_file], tmp_path / "out")
+    watcher.regenerate(input_file)
+    regenerations = []
+    regenerate = watcher.regenerate
+    watcher.regenerate = lambda path: regenerations.append(path) or regenerate(path)
+
+    async def edit_and_stop():
+        stop = asyncio.Event()
+        watch = asyncio.ensure_future(
+            watcher.watch(poll_interval=0.01, debounce=0.2, stop=stop)
+        )
+        # a burst of saves, then a half-edited file that is fixed later
+        for variance in [2, 3, 4]:
+            write_configs(
+                input_file, [dict(simple_config, Q=[[variance, 0], [0, variance]])]
+            )
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.4)
+        input_file.write_text("[{")
+        await asyncio.sleep(0.4)
+        write_configs(input_file, [simple_config])
+        await asyncio.sleep(0.4)
+        stop.set()
+        await watch
+
+    asyncio.run(edit_and_stop())
+
+    assert len(regenerations) == 3
+    output = capsys.readouterr().out
+    assert "invalid JSON" in output
+    assert output.count("Regenerated simple_kf") == 2
+    with open(tmp_path / "out" / "src" / "simple_kf_config.c") as f:
+        assert (
+            f.read()
+            == generate_filter_sources(simple_config)[
+                os.path.join("src", "simple_kf_config.c")
+            ]
+        )
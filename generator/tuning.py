@@ -0,0 +1,281 @@
+import copy
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    from generator.ingestor import KalmanFilterConfig, InvalidConfigException
+except ImportError:
+    from ingestor import KalmanFilterConfig, InvalidConfigException
+
+
+def sample_candidates(num_candidates, num_states, num_measurements, scale_range, seed):
+    """
+    Draw per-diagonal Q and R scale factors, log-uniform in [1 / scale_range, scale_range].
+    Candidate 0 is always the untouched config so the sweep can never do worse than it.
+    """
+    if num_candidates < 1:
+        raise ValueError("At least one candidate is required")
+    if scale_range < 1:
+        raise ValueError("scale_range must be at least 1")
+
+    rng = np.random.default_rng(seed)
+    log_range = math.log(scale_range)
+    q_scales = np.exp(
+        rng.uniform(-log_range, log_range, size=(num_candidates, num_states))
+    )
+    r_scales = np.exp(
+        rng.uniform(-log_range, log_range, size=(num_candidates, num_measurements))
+    )
+    q_scales[0] = 1.0
+    r_scales[0] = 1.0
+    return q_scales, r_scales
+
+
+def _psd_sqrt(matrix):
+    """
+    Square root of a symmetric positive semi-definite matrix, tolerating the singular
+    covariances that are common in P_init.
+    """
+    eigenvalues, eigenvectors = np.linalg.eigh(matrix.astype(np.float64))
+    return eigenvectors * np.sqrt(np.clip(eigenvalues, 0.0, None))
+
+
+def simulate_truth(truth_config: KalmanFilterConfig, num_steps, seeds):
+    """
+    Simulate ground truth trajectories and measurements of the model described by the config,
+    one per seed. Control inputs are held at zero.
+
+    Returns the true states (seeds, steps, num_states) and measurements (seeds, steps, num_measurements).
+    """
+    F = truth_config.F.astype(np.float64)
+    H = truth_config.H.astype(np.float64)
+    P_init_sqrt = _psd_sqrt(truth_config.P_init)
+    Q_sqrt = _psd_sqrt(truth_config.Q)
+    R_sqrt = _psd_sqrt(truth_config.R)
+
+    num_states = truth_config.num_states
+    num_measurements = truth_config.num_measurements
+
+    x_true = np.empty((len(seeds), num_steps, num_states))
+    z = np.empty((len(seeds), num_steps, num_measurements))
+
+    # one generator per seed, so the truth of a seed does not depend on the other seeds
+    for i, seed in enumerate(seeds):
+        rng = np.random.default_rng(seed)
+        x = truth_config.X_init.ravel().astype(np.float64)
+        x = x + P_init_sqrt @ rng.standard_normal(num_states)
+        for step in range(num_steps):
+            x = F @ x + Q_sqrt @ rng.standard_normal(num_states)
+            x_true[i, step] = x
+            z[i, step] = H @ x + R_sqrt @ rng.standard_normal(num_measurements)
+
+    return x_true, z
+
+
+def scale_covariance(covariance, scales):
+    """
+    Scale the variances of a covariance matrix by the given factors, keeping the correlations.
+    """
+    scales_sqrt = np.sqrt(scales)
+    return scales_sqrt[..., :, None] * covariance * scales_sqrt[..., None, :]
+
+
+def run_batch_filter(
+    model, q_scales, r_scales, x_true, z, burn_in, covariance_mask=None
+):
+    """
+    Run one filter per (candidate, seed) pair as a single vectorized batch.
+
+    model is a dict of the F, H, Q, R, P_init and X_init matrices. A boolean covariance_mask runs the approximate
+    filter that zeroes the covariances outside the mask after every predict and update. Returns the per-state mean
+    squared error (candidates, num_states) and the average NEES and NIS (candidates,) over all seeds and over the
+    steps after burn_in.
+    """
+    F = model["F"]
+    H = model["H"]
+    num_candidates = q_scales.shape[0]
+    num_seeds, num_steps, num_states = x_true.shape
+
+    Q = scale_covariance(model["Q"], q_scales)[:, None]
+    R = scale_covariance(model["R"], r_scales)[:, None]
+
+    x = np.broadcast_to(
+        model["X_init"].ravel(), (num_candidates, num_seeds, num_states)
+    )
+    x = x.copy()
+    P_init = model["P_init"]
+    if covariance_mask is not None:
+        P_init = np.where(covariance_mask, P_init, 0.0)
+    P = np.broadcast_to(
+        P_init, (num_candidates, num_seeds, num_states, num_states)
+    ).copy()
+
+    squared_error = np.zeros((num_candidates, num_states))
+    nees = np.zeros(num_candidates)
+    nis = np.zeros(num_candidates)
+
+    for step in range(num_steps):
+        x = x @ F.T
+        P = F @ P @ F.T + Q
+        if covariance_mask is not None:
+            P = np.where(covariance_mask, P, 0.0)
+
+        P_Ht = P @ H.T
+        S = H @ P_Ht + R
+        y = z[None, :, step] - x @ H.T
+
+        # K = P * H' * S^-1, with S symmetric
+        K = np.linalg.solve(S, P_Ht.swapaxes(-1, -2)).swapaxes(-1, -2)
+        x = x + (K @ y[..., None])[..., 0]
+        P = P - K @ P_Ht.swapaxes(-1, -2)
+        P = 0.5 * (P + P.swapaxes(-1, -2))
+        if covariance_mask is not None:
+            P = np.where(covariance_mask, P, 0.0)
+
+        if step >= burn_in:
+            error = x_true[None, :, step] - x
+            squared_error += np.sum(error**2, axis=1)
+            nees += np.sum(
+                np.sum(error * np.linalg.solve(P, error[..., None])[..., 0], axis=-1),
+                axis=1,
+            )
+            nis += np.sum(
+                np.sum(y * np.linalg.solve(S, y[..., None])[..., 0], axis=-1), axis=1
+            )
+
+    num_samples = num_seeds * (num_steps - burn_in)
+    return squared_error / num_samples, nees / num_samples, nis / num_samples
+
+
+def score_candidates(
+    mean_squared_error, average_nees, average_nis, num_states, num_measurements
+):
+    """
+    Combine accuracy and consistency into a single score, lower is better.
+
+    Accuracy is the mean log RMSE of each state relative to candidate 0, so states with different units
+    weigh the same. Consistency is the log distance of the average NEES and NIS from their expected
+    values, num_states and num_measurements.
+    """
+    rmse = np.sqrt(mean_squared_error)
+    reference_rmse = np.maximum(rmse[0], np.finfo(np.float64).tiny)
+    accuracy = np.mean(
+        np.log(np.maximum(rmse, np.finfo(np.float64).tiny) / reference_rmse), axis=1
+    )
+    consistency = np.abs(np.log(average_nees / num_states)) + np.abs(
+        np.log(average_nis / num_measurements)
+    )
+    return accuracy + consistency
+
+
+def tune(
+    config: KalmanFilterConfig,
+    truth_config: KalmanFilterConfig = None,
+    num_candidates=1000,
+    num_seeds=20,
+    num_steps=200,
+    scale_range=10.0,
+    workers=None,
+    shard_size=None,
+    seed=0,
+):
+    """
+    Monte Carlo sweep of Q and R scale factors for the filter described by config.
+
+    The ground truth is simulated from truth_config, or from config itself if it is not given. Every
+    candidate is evaluated on the same truth trajectories (common random numbers), so the comparison
+    between candidates is not drowned in simulation noise. Candidates are split into shards that run
+    in a process pool.
+
+    Returns a dict with the candidate scale factors, their metrics and scores, and the index of the best.
+    """
+    truth_config = truth_config if truth_config is not None else config
+    if config.model is not None or truth_config.model is not None:
+        raise InvalidConfigException(
+            "Tuning is only supported for linear filters, not f or h models"
+        )
+    if (truth_config.num_states != config.num_states) or (
+        truth_config.num_measurements != config.num_measurements
+    ):
+        raise InvalidConfigException(
+            "The truth config must have the same number of states and measurements"
+        )
+    if num_steps < 2:
+        raise ValueError("At least two steps are required")
+
+    q_scales, r_scales = sample_candidates(
+        num_candidates, config.num_states, config.num_measurements, scale_range, seed
+    )
+    seeds = [seed + 1 + i for i in range(num_seeds)]
+    x_true, z = simulate_truth(truth_config, num_steps, seeds)
+    burn_in = num_steps // 10
+
+    model = {
+        key: getattr(config, key).astype(np.float64)
+        for key in ["F", "H", "Q", "R", "P_init", "X_init"]
+    }
+
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    if shard_size is None:
+        shard_size = max(1, math.ceil(num_candidates / (4 * workers)))
+    shards = [
+        slice(start, min(start + shard_size, num_candidates))
+        for start in range(0, num_candidates, shard_size)
+    ]
+
+    if workers == 1:
+        results = [
+            run_batch_filter(model, q_scales[s], r_scales[s], x_true, z, burn_in)
+            for s in shards
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    run_batch_filter,
+                    model,
+                    q_scales[s],
+                    r_scales[s],
+                    x_true,
+                    z,
+                    burn_in,
+                )
+                for s in shards
+            ]
+            results = [future.result() for future in futures]
+
+    mean_squared_error = np.concatenate([result[0] for result in results])
+    average_nees = np.concatenate([result[1] for result in results])
+    average_nis = np.concatenate([result[2] for result in results])
+    scores = score_candidates(
+        mean_squared_error,
+        average_nees,
+        average_nis,
+        config.num_states,
+        config.num_measurements,
+    )
+
+    return {
+        "q_scales": q_scales,
+        "r_scales": r_scales,
+        "rmse": np.sqrt(mean_squared_error),
+        "nees": average_nees,
+        "nis": average_nis,
+        "scores": scores,
+        "best": int(np.argmin(scores)),
+    }
+
+
+def tuned_raw_config(config: KalmanFilterConfig, q_scale, r_scale):
+    """
+    Copy of the raw JSON config with Q and R scaled, ready to be passed to the generator.
+    """
+    raw_config = copy.deepcopy(config.raw_config)
+    Q = scale_covariance(config.Q.astype(np.float64), np.asarray(q_scale))
+    R = scale_covariance(config.R.astype(np.float64), np.asarray(r_scale))
+    raw_config["Q"] = [[float(f"{value:.9g}") for value in row] for row in Q]
+    raw_config["R"] = [[float(f"{value:.9g}") for value in row] for row in R]
+    return raw_config
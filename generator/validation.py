@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from generator.ingestor import (
+        KalmanFilterConfig,
+        InvalidConfigException,
+        InvalidDimensionsException,
+        supported_keys,
+    )
+    from generator.watch import atomic_write
+except ImportError:
+    from ingestor import (
+        KalmanFilterConfig,
+        InvalidConfigException,
+        InvalidDimensionsException,
+        supported_keys,
+    )
+    from watch import atomic_write
+
+# name of the cache of the results, kept in the validated directory unless given
+DEFAULT_CACHE_FILE = ".kf_validate_cache.json"
+
+
+def compile_schema(keys):
+    """
+    Structural schema of a filter config derived from the supported keys: the required keys, the keys that a
+    nonlinear model may replace, and the rank of every matrix.
+    """
+    return {
+        "required": [item["key"] for item in keys if item["required"]],
+        "supported": {item["key"] for item in keys},
+        "replaced_by": {
+            item["key"]: item["replaced_by"] for item in keys if "replaced_by" in item
+        },
+        "matrix_ranks": {
+            item["key"]: len(item["expected_dims"])
+            for item in keys
+            if "expected_dims" in item
+        },
+    }
+
+
+SCHEMA = compile_schema(supported_keys)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_matrix(value, rank):
+    """Whether the value is a rectangular nested list of numbers of the given rank."""
+    if rank == 1:
+        return isinstance(value, list) and all(_is_number(x) for x in value)
+    return (
+        isinstance(value, list)
+        and all(isinstance(row, list) for row in value)
+        and len({len(row) for row in value}) <= 1
+        and all(_is_matrix(row, rank - 1) for row in value)
+    )
+
+
+def diagnostic(code, message, config=None, index=None, key=None):
+    return {
+        "config": config,
+        "index": index,
+        "key": key,
+        "code": code,
+        "message": message,
+    }
+
+
+def check_schema(config, index, schema=SCHEMA):
+    """
+    Diagnostics of the structure of a config, every missing and unknown key and every malformed matrix at once,
+    without building the filter.
+    """
+    if not isinstance(config, dict):
+        return [diagnostic("invalid_type", "Expected a config object", index=index)]
+    name = config.get("name")
+    diagnostics = []
+    if ("name" in config) and not isinstance(name, str):
+        diagnostics.append(
+            diagnostic("invalid_type", "Expected name to be a string", index=index)
+        )
+        name = None
+
+    for key in schema["required"]:
+        if (key not in config) and (schema["replaced_by"].get(key) not in config):
+            diagnostics.append(
+                diagnostic(
+                    "missing_key", f"Missing required key: {key}", name, index, key
+                )
+            )
+    for key in config:
+        if key not in schema["supported"]:
+            diagnostics.append(
+                diagnostic("unknown_key", f"Unknown key: {key}", name, index, key)
+            )
+    for key, rank in schema["matrix_ranks"].items():
+        if (key in config) and not _is_matrix(config[key], rank):
+            shape = "a list of numbers" if rank == 1 else "a list of rows of numbers"
+            diagnostics.append(
+                diagnostic(
+                    "invalid_type", f"Expected {key} to be {shape}", name, index, key
+                )
+            )
+    return diagnostics
+
+
+def check_config(config, index):
+    """
+    Diagnostics of a config that passes the schema, from the checks of KalmanFilterConfig. Nothing is generated.
+    """
+    name = config["name"]
+    try:
+        KalmanFilterConfig(config)
+    except InvalidDimensionsException as e:
+        return [diagnostic("invalid_dimensions", e.message, name, index, e.key)]
+    except InvalidConfigException as e:
+        return [diagnostic("invalid_config", str(e), name, index)]
+    except Exception as e:
+        # e.g. a model expression that does not parse
+        return [diagnostic("invalid_config", f"{type(e).__name__}: {e}", name, index)]
+    return []
+
+
+def validate_content(content):
+    """
+    Diagnostics of the contents of a filter JSON file, a list of configs.
+    """
+    try:
+        configs = json.loads(content)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        return [diagnostic("invalid_json", f"Invalid JSON: {e}")]
+    if not isinstance(configs, list):
+        return [diagnostic("invalid_type", "Expected a list of configs")]
+
+    diagnostics = []
+    names = set()
+    for index, config in enumerate(configs):
+        config_diagnostics = check_schema(config, index)
+        if not config_diagnostics:
+            config_diagnostics = check_config(config, index)
+        diagnostics += config_diagnostics
+        name = config.get("name") if isinstance(config, dict) else None
+        if isinstance(name, str):
+            if name in names:
+                # the generated files of the first filter would be overwritten
+                diagnostics.append(
+                    diagnostic(
+                        "duplicate_name", f"Duplicate name: {name}", name, index, "name"
+                    )
+                )
+            names.add(name)
+    return diagnostics
+
+
+def validate_file(path):
+    """Hash and diagnostics of a filter JSON file."""
+    with open(path, "rb") as f:
+        content = f.read()
+    return hashlib.sha256(content).hexdigest(), validate_content(content)
+
+
+def find_config_files(directory, cache_file):
+    """
+    Paths of the .json files of a directory and of its subdirectories, relative to it, skipping hidden directories
+    and the cache.
+    """
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for file in sorted(files):
+            path = os.path.join(root, file)
+            if file.endswith(".json") and (
+                os.path.abspath(path) != os.path.abspath(cache_file)
+            ):
+                paths.append(os.path.relpath(path, directory))
+    return paths
+
+
+def validator_fingerprint():
+    """
+    Hash of the sources of the generator package, so results cached by an older validator are not reused.
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for file in sorted(os.listdir(package_dir)):
+        if file.endswith(".py"):
+            with open(os.path.join(package_dir, file), "rb") as f:
+                digest.update(file.encode() + b"\0" + f.read())
+    return digest.hexdigest()
+
+
+def load_cache(cache_file, fingerprint):
+    """Cached results by relative path, empty if there is no cache or it was written by another validator."""
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("validator") != fingerprint:
+        return {}
+    return cache.get("files", {})
+
+
+def validate_directory(directory, cache_file=None, workers=None):
+    """
+    Validate every filter JSON file of a directory, the changed files in a process pool, and cache the results by
+    the SHA-256 of the files in cache_file, by default .kf_validate_cache.json in the directory.
+
+    Returns a dict with the number of files, of files validated and taken from the cache, and the diagnostics of
+    every file, each with the file path relative to the directory.
+    """
+    cache_file = (
+        cache_file
+        if cache_file is not None
+        else os.path.join(directory, DEFAULT_CACHE_FILE)
+    )
+    paths = find_config_files(directory, cache_file)
+    fingerprint = validator_fingerprint()
+    cache = load_cache(cache_file, fingerprint)
+
+    results = {}
+    stale = []
+    for path in paths:
+        with open(os.path.join(directory, path), "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        cached = cache.get(path)
+        if (cached is not None) and (cached["sha256"] == digest):
+            results[path] = cached
+        else:
+            stale.append(path)
+
+    full_paths = [os.path.join(directory, path) for path in stale]
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    if (workers == 1) or (len(stale) < 2):
+        validated = [validate_file(path) for path in full_paths]
+    else:
+        # the pool only pays off for many files, a warm cache never starts it
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            validated = list(
+                executor.map(
+                    validate_file,
+                    full_paths,
+                    chunksize=max(1, len(full_paths) // (4 * workers)),
+                )
+            )
+    for path, (digest, diagnostics) in zip(stale, validated):
+        results[path] = {"sha256": digest, "diagnostics": diagnostics}
+
+    atomic_write(cache_file, json.dumps({"validator": fingerprint, "files": results}))
+
+    return {
+        "files": len(paths),
+        "validated": len(stale),
+        "cached": len(paths) - len(stale),
+        "diagnostics": [
+            dict(diagnostic, file=path)
+            for path in paths
+            for diagnostic in results[path]["diagnostics"]
+        ],
+    }
@@ -0,0 +1,162 @@
+import asyncio
+import contextlib
+import json
+import os
+import time
+import uuid
+
+try:
+    from generator.ingestor import KalmanFilterConfig
+    from generator.file_content_generator import KalmanFilterConfigGenerator
+    from generator.file_writer import FileWriter
+    from generator.sources import filter_file_paths
+    from generator.profiling import StageProfiler
+except ImportError:
+    from ingestor import KalmanFilterConfig
+    from file_content_generator import KalmanFilterConfigGenerator
+    from file_writer import FileWriter
+    from sources import filter_file_paths
+    from profiling import StageProfiler
+
+
+@contextlib.contextmanager
+def atomic_open(path):
+    """
+    Open a file for writing through a temporary file of the same directory, renamed over it once it is closed, so a
+    reader sees either the old or the new contents and never a half-written file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temporary_path = os.path.join(
+        directory, f".{os.path.basename(path)}.{uuid.uuid4().hex}.tmp"
+    )
+    # created like a regular open, with the permissions of the umask of the process
+    fd = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, "w") as f:
+            yield f
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def atomic_write(path, content):
+    """Write a file atomically, see atomic_open."""
+    with atomic_open(path) as f:
+        f.write(content)
+
+
+def write_files(files, output_dir):
+    """Atomically write in-memory files keyed by their path relative to the output directory."""
+    for path, content in files.items():
+        atomic_write(os.path.join(output_dir, path), content)
+
+
+def file_signature(path):
+    """Modification time and size of a file, None while it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class FilterWatcher:
+    """
+    Regenerates the filters of a set of input JSON files whose configs changed, keeping the parsed configs of the
+    previous run in memory.
+    """
+
+    def __init__(self, input_files, output_dir, amalgamated_source=None, profiler=None):
+        self.input_files = [os.path.abspath(path) for path in input_files]
+        self.output_dir = output_dir
+        self.amalgamated_source = amalgamated_source
+        self.profiler = profiler if profiler is not None else StageProfiler(False)
+        # raw config of every generated filter, by input file and name
+        self.generated_configs = {path: {} for path in self.input_files}
+        self.signatures = {path: None for path in self.input_files}
+
+    def regenerate(self, input_file):
+        """
+        Regenerate the filters of an input file whose raw config changed since the last run, returning their names.
+        Filters removed from the file are forgotten, their generated files are kept.
+        """
+        input_file = os.path.abspath(input_file)
+        self.signatures[input_file] = file_signature(input_file)
+        try:
+            with self.profiler.stage("json.load", os.path.basename(input_file)):
+                with open(input_file) as f:
+                    configs = json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Input file '{input_file}' not found.")
+        except json.JSONDecodeError:
+            raise ValueError(f"Input file '{input_file}' contains invalid JSON.")
+
+        previous_configs = self.generated_configs[input_file]
+        # every changed config is generated before any file is written, so an invalid config writes nothing
+        generators = []
+        for config in configs:
+            name = config.get("name")
+            if previous_configs.get(name) == config:
+                continue
+            with self.profiler.stage("validate", name):
+                kf_config = KalmanFilterConfig(config)
+            with self.profiler.stage("generate", name):
+                generators.append(KalmanFilterConfigGenerator(kf_config))
+        for generator in generators:
+            # streamed to the temporary files, a large filter is never held as a whole file in memory
+            c_file_path, h_file_path = filter_file_paths(generator)
+            with self.profiler.stage("write", generator.config.raw_config["name"]):
+                file_writer = FileWriter(
+                    generator, amalgamated_source=self.amalgamated_source
+                )
+                with atomic_open(os.path.join(self.output_dir, c_file_path)) as f:
+                    file_writer.write_c_file(f, os.path.basename(h_file_path))
+                with atomic_open(os.path.join(self.output_dir, h_file_path)) as f:
+                    file_writer.write_h_file(f)
+            print(generator.covariance_update_report)
+        self.generated_configs[input_file] = {
+            config["name"]: config for config in configs
+        }
+        return [generator.config.raw_config["name"] for generator in generators]
+
+    def changed_files(self):
+        """Input files whose modification time or size changed since they were last generated."""
+        return [
+            path
+            for path in self.input_files
+            if file_signature(path) != self.signatures[path]
+        ]
+
+    async def watch(self, poll_interval=0.5, debounce=0.3, stop=None):
+        """
+        Poll the input files until the stop event is set, and regenerate a changed file once it has not changed for
+        debounce seconds, so a burst of saves from an editor regenerates once. An invalid config is reported and the
+        watch goes on, the previously generated files are kept until the config is fixed.
+        """
+        stop = stop if stop is not None else asyncio.Event()
+        pending = {}
+        while not stop.is_set():
+            now = time.monotonic()
+            for path in self.changed_files():
+                signature = file_signature(path)
+                if (path not in pending) or (pending[path][0] != signature):
+                    pending[path] = (signature, now)
+            for path, (signature, changed_time) in list(pending.items()):
+                if now - changed_time < debounce:
+                    continue
+                del pending[path]
+                try:
+                    regenerated = self.regenerate(path)
+                except Exception as e:
+                    # the editor may have saved a half-edited config, wait for the next change
+                    self.signatures[path] = signature
+                    print(f"Failed to regenerate '{path}': {e}")
+                    continue
+                if regenerated:
+                    print(f"Regenerated {', '.join(regenerated)} from '{path}'")
+            try:
+                await asyncio.wait_for(stop.wait(), poll_interval)
+            except asyncio.TimeoutError:
+                pass
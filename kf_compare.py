@@ -0,0 +1,48 @@
+import argparse
+
+from generator.ingestor import KalmanFilterConfig
+from generator.approximation import compare_block_covariance, format_comparison_report
+from kf_tuner import load_configs, select_config
+
+
+def parse_covariance_blocks(value):
+    """Read "diagonal" or a comma separated list of block sizes."""
+    if value is None or value == "diagonal":
+        return value
+    return [int(size) for size in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the accuracy of the approximate block-diagonal covariance filter with the full filter"
+    )
+    parser.add_argument("input_file", help="The input JSON file with the filter config")
+    parser.add_argument(
+        "--name", help="Name of the config to compare, defaults to the first one"
+    )
+    parser.add_argument(
+        "--covariance_blocks",
+        help='"diagonal" or comma separated block sizes, defaults to the covariance_blocks of the config',
+    )
+    parser.add_argument("--seeds", type=int, default=20)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    configs = load_configs(args.input_file)
+    raw_config = configs[select_config(configs, args.name)]
+    covariance_blocks = parse_covariance_blocks(args.covariance_blocks)
+    if covariance_blocks is not None:
+        # validated by the ingestor like the covariance_blocks of the config
+        raw_config = dict(raw_config, covariance_blocks=covariance_blocks)
+    config = KalmanFilterConfig(raw_config)
+
+    comparison = compare_block_covariance(
+        config, num_seeds=args.seeds, num_steps=args.steps, seed=args.seed
+    )
+    print("\n".join(format_comparison_report(raw_config["name"], comparison)))
+
+
+if __name__ == "__main__":
+    main()
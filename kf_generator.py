@@ -1,12 +1,12 @@
-import json
 import argparse
+import asyncio
 import os
 import shutil
 import subprocess
 
-from generator.ingestor import KalmanFilterConfig
-from generator.file_content_generator import KalmanFilterConfigGenerator
-from generator.file_writer import FileWriter
+from generator.sources import library_sources
+from generator.watch import FilterWatcher, write_files
+from generator.profiling import StageProfiler
 
 
 def get_repo_root():
@@ -35,35 +35,76 @@ def copy_directory(input_dir, output_dir):
             shutil.copy2(input_file_path, output_file_path)
 
 
+def write_profile(profiler, trace_file):
+    """Print the summary table of the profiled stages and write their Chrome trace."""
+    print("\n".join(profiler.summary()))
+    profiler.write_chrome_trace(trace_file)
+    print(f"Wrote the Chrome trace to '{trace_file}', open it in chrome://tracing")
+
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("input_file", help="The input JSON file to be processed")
+    parser.add_argument(
+        "input_files", nargs="+", help="The input JSON files to be processed"
+    )
     parser.add_argument(
         "--output_dir",
         help="The output directory for the generated files",
         default="kf_output",
     )
+    parser.add_argument(
+        "--amalgamate",
+        action="store_true",
+        help="Compile the library and matrix sources into the .c file of each filter",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and regenerate the filters whose configs changed when an input file is saved",
+    )
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=0.5,
+        help="Seconds between two checks of the input files with --watch",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.3,
+        help="Seconds an input file must stay unchanged before it is regenerated with --watch",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="kf_profile.json",
+        help="Time every stage of the run and of each config, print a summary and write a Chrome trace, "
+        "to kf_profile.json by default",
+    )
 
     args = parser.parse_args()
 
     repo_root = get_repo_root()  # Get the repository root
+    profiler = StageProfiler(enabled=args.profile is not None)
 
     try:
-        subprocess.run(
-            ["git", "submodule", "update", "--init", "--recursive"],
-            cwd=repo_root,
-            check=True,
-        )
+        with profiler.stage("submodules"):
+            subprocess.run(
+                ["git", "submodule", "update", "--init", "--recursive"],
+                cwd=repo_root,
+                check=True,
+            )
     except subprocess.CalledProcessError as e:
         raise RuntimeError(f"Failed to update submodules: {e}")
 
     # install the required packages from the requirements.txt file
     try:
-        subprocess.run(
-            ["pip", "install", "-r", "requirements.txt"],
-            cwd=repo_root,
-            check=True,
-        )
+        with profiler.stage("requirements"):
+            subprocess.run(
+                ["pip", "install", "-r", "requirements.txt"],
+                cwd=repo_root,
+                check=True,
+            )
     except subprocess.CalledProcessError as e:
         raise RuntimeError(f"Failed to install required packages: {e}")
 
@@ -77,65 +118,46 @@ def main():
         if not os.path.exists(path):
             os.makedirs(path)
 
-    # Open the input file and process the JSON configs
-    try:
-        with open(args.input_file) as f:
-            configs = json.load(f)
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Input file '{args.input_file}' not found.")
-    except json.JSONDecodeError:
-        raise ValueError(f"Input file '{args.input_file}' contains invalid JSON.")
-
-    # Process each config
-    for config in configs:
-        kf_config = KalmanFilterConfig(config)
-        generator = KalmanFilterConfigGenerator(kf_config)
-        c_file_name = f'{kf_config.raw_config["name"]}_config.c'
-        h_file_name = f'{kf_config.raw_config["name"]}_config.h'
-
-        c_file_path = os.path.join(directory_paths["src"], c_file_name)
-        h_file_path = os.path.join(directory_paths["inc"], h_file_name)
-
-        # Write the generated files using the FileWriter class
-        file_writer = FileWriter(generator, c_file_path, h_file_path)
-        file_writer.write_to_file(c_file_path, h_file_path)
-
-    # Prepare directories to copy from, resolving relative paths based on repo root
-    inc_directories_to_copy = [
-        os.path.join(repo_root, "filter/inc"),
-        os.path.join(repo_root, "libs/kalman-matrix-utils/inc"),
-    ]
+    # the library files are read once and the filters are generated in memory, see generator/sources.py
+    with profiler.stage("library"):
+        library_files, amalgamated_source = library_sources(args.amalgamate, repo_root)
+        write_files(library_files, directory_paths["output_dir"])
 
-    src_directories_to_copy = [
-        os.path.join(repo_root, "filter/src"),
-        os.path.join(repo_root, "libs/kalman-matrix-utils/src"),
-    ]
+    # Process each config of each input file
+    watcher = FilterWatcher(
+        args.input_files, directory_paths["output_dir"], amalgamated_source, profiler
+    )
+    for input_file in args.input_files:
+        watcher.regenerate(input_file)
 
     info_directories_to_copy = [
         os.path.join(repo_root, "info"),
     ]
 
-    # Copy include directories
-    for directory in inc_directories_to_copy:
-        if os.path.exists(directory):
-            copy_directory(directory, directory_paths["inc"])
-        else:
-            raise FileNotFoundError(f"Include directory '{directory}' does not exist.")
-
-    # Copy source directories
-    for directory in src_directories_to_copy:
-        if os.path.exists(directory):
-            copy_directory(directory, directory_paths["src"])
-        else:
-            raise FileNotFoundError(f"Source directory '{directory}' does not exist.")
-
     # Copy info directories
     for directory in info_directories_to_copy:
         if os.path.exists(directory):
-            copy_directory(directory, directory_paths["output_dir"])
+            with profiler.stage("copy_directory"):
+                copy_directory(directory, directory_paths["output_dir"])
         else:
             raise FileNotFoundError(f"Info directory '{directory}' does not exist.")
 
+    if args.profile is not None:
+        write_profile(profiler, args.profile)
+
+    if args.watch:
+        # the generator, NumPy and the parsed configs stay loaded between regenerations
+        print(f"Watching {', '.join(args.input_files)}, press Ctrl+C to stop")
+        try:
+            asyncio.run(
+                watcher.watch(poll_interval=args.poll_interval, debounce=args.debounce)
+            )
+        except KeyboardInterrupt:
+            pass
+        if args.profile is not None:
+            # the regenerations of the watch are added to the trace
+            write_profile(profiler, args.profile)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,71 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from generator.ingestor import KalmanFilterConfig
+from generator.smoothing import smooth
+from kf_tuner import load_configs, select_config
+
+
+def load_log(log_file):
+    """Memory-map a .npy log, or read a CSV log with one row per step."""
+    if log_file is None:
+        return None
+    if log_file.endswith(".npy"):
+        return np.load(log_file, mmap_mode="r")
+    return np.loadtxt(log_file, delimiter=",", ndmin=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fixed-interval Rauch-Tung-Striebel smoothing of a measurement log with a filter config"
+    )
+    parser.add_argument("input_file", help="The input JSON file with the filter config")
+    parser.add_argument(
+        "measurements_file",
+        help="The measurements, a (steps, measurements) or (steps, batch, measurements) .npy file or a CSV file, "
+        "NaN for a missing measurement",
+    )
+    parser.add_argument(
+        "--name", help="Name of the config to smooth with, defaults to the first one"
+    )
+    parser.add_argument(
+        "--controls_file",
+        help="The controls, like the measurements, defaults to controls held at zero",
+    )
+    parser.add_argument(
+        "--output_dir",
+        help="Directory of the filtered and smoothed .npy arrays, defaults to <measurements>_smoothed",
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=1024,
+        help="Steps kept in memory at a time",
+    )
+
+    args = parser.parse_args()
+
+    configs = load_configs(args.input_file)
+    config = KalmanFilterConfig(configs[select_config(configs, args.name)])
+    z = load_log(args.measurements_file)
+    u = load_log(args.controls_file)
+
+    output_dir = args.output_dir
+    if output_dir is None:
+        output_dir = f"{os.path.splitext(args.measurements_file)[0]}_smoothed"
+
+    start = time.perf_counter()
+    result = smooth(config, z, output_dir, u=u, chunk_size=args.chunk_size)
+    elapsed = time.perf_counter() - start
+
+    num_steps, num_batch = result["x_smoothed"].shape[:2]
+    print(
+        f"Smoothed {num_batch} log(s) of {num_steps} steps in {elapsed:.1f} s to '{output_dir}'"
+    )
+
+
+if __name__ == "__main__":
+    main()
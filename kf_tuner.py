@@ -0,0 +1,122 @@
+import json
+import argparse
+import os
+import time
+
+from generator.ingestor import KalmanFilterConfig
+from generator.tuning import tune, tuned_raw_config
+
+
+def load_configs(input_file):
+    """Load the list of filter configs from a JSON file."""
+    try:
+        with open(input_file) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Input file '{input_file}' not found.")
+    except json.JSONDecodeError:
+        raise ValueError(f"Input file '{input_file}' contains invalid JSON.")
+
+
+def select_config(configs, name):
+    """Find a config by name, defaulting to the first one."""
+    if name is None:
+        return 0
+    for index, config in enumerate(configs):
+        if config.get("name") == name:
+            return index
+    raise ValueError(f"No config named '{name}'.")
+
+
+def format_scales(scales):
+    return "[" + ", ".join(f"{scale:.3g}" for scale in scales) + "]"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Monte Carlo tuning of the Q and R matrices of a filter config"
+    )
+    parser.add_argument("input_file", help="The input JSON file with the filter config")
+    parser.add_argument(
+        "--name", help="Name of the config to tune, defaults to the first one"
+    )
+    parser.add_argument(
+        "--truth_file",
+        help="JSON file with the config used to simulate the ground truth, defaults to the config being tuned",
+    )
+    parser.add_argument(
+        "--output_file",
+        help="The output JSON file with the tuned config, defaults to <input>_tuned.json",
+    )
+    parser.add_argument("--candidates", type=int, default=1000)
+    parser.add_argument("--seeds", type=int, default=20)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument(
+        "--scale_range",
+        type=float,
+        default=10.0,
+        help="Candidate variances are scaled by factors in [1 / scale_range, scale_range]",
+    )
+    parser.add_argument(
+        "--workers", type=int, help="Number of processes, defaults to the CPU count"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    configs = load_configs(args.input_file)
+    config_index = select_config(configs, args.name)
+    config = KalmanFilterConfig(configs[config_index])
+
+    truth_config = None
+    if args.truth_file is not None:
+        truth_configs = load_configs(args.truth_file)
+        truth_config = KalmanFilterConfig(
+            truth_configs[select_config(truth_configs, args.name)]
+        )
+
+    start = time.perf_counter()
+    result = tune(
+        config,
+        truth_config,
+        num_candidates=args.candidates,
+        num_seeds=args.seeds,
+        num_steps=args.steps,
+        scale_range=args.scale_range,
+        workers=args.workers,
+        seed=args.seed,
+    )
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"Evaluated {args.candidates} candidates x {args.seeds} seeds x {args.steps} steps in {elapsed:.1f} s"
+    )
+    print(f"{'rank':>4} {'score':>8} {'ANEES':>8} {'ANIS':>8}  Q scales / R scales")
+    for rank, index in enumerate(result["scores"].argsort()[:5]):
+        print(
+            f"{rank + 1:>4} {result['scores'][index]:>8.3f} {result['nees'][index]:>8.3f} "
+            f"{result['nis'][index]:>8.3f}  {format_scales(result['q_scales'][index])} / "
+            f"{format_scales(result['r_scales'][index])}"
+        )
+    print(
+        f"untouched config: score {result['scores'][0]:.3f}, "
+        f"ANEES {result['nees'][0]:.3f} (expected {config.num_states}), "
+        f"ANIS {result['nis'][0]:.3f} (expected {config.num_measurements})"
+    )
+
+    best = result["best"]
+    configs[config_index] = tuned_raw_config(
+        config, result["q_scales"][best], result["r_scales"][best]
+    )
+
+    output_file = args.output_file
+    if output_file is None:
+        output_file = f"{os.path.splitext(args.input_file)[0]}_tuned.json"
+
+    with open(output_file, "w") as f:
+        json.dump(configs, f, indent=4)
+    print(f"Wrote the tuned config to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
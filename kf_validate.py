@@ -0,0 +1,53 @@
+import argparse
+import json
+import sys
+import time
+
+from generator.validation import validate_directory
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Validate every filter JSON file of a directory without generating the filters"
+    )
+    parser.add_argument("directory", help="The directory of the filter JSON files")
+    parser.add_argument(
+        "--cache_file",
+        help="The cache of the results by file hash, defaults to <directory>/.kf_validate_cache.json",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Processes validating the changed files, defaults to the number of CPUs",
+    )
+    parser.add_argument(
+        "--output_file",
+        help="The output JSON file with the diagnostics, defaults to the standard output",
+    )
+
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = validate_directory(
+        args.directory, cache_file=args.cache_file, workers=args.workers
+    )
+    elapsed = time.perf_counter() - start
+
+    output = json.dumps(result, indent=2)
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    # the summary goes to stderr so the standard output stays machine-readable
+    print(
+        f"Validated {result['validated']} and reused {result['cached']} of {result['files']} files in "
+        f"{elapsed:.2f} s, {len(result['diagnostics'])} diagnostics",
+        file=sys.stderr,
+    )
+    sys.exit(1 if result["diagnostics"] else 0)
+
+
+if __name__ == "__main__":
+    main()
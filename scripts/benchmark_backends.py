@@ -0,0 +1,246 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+# run from the repository root, like the other scripts
+sys.path.insert(0, os.getcwd())
+
+from generator.ingestor import KalmanFilterConfig, SUPPORTED_BACKENDS
+from generator.file_content_generator import KalmanFilterConfigGenerator
+from generator.file_writer import FileWriter
+from generator.amalgamator import amalgamate, reachable_includes
+
+# the fastest of a few runs is the least disturbed by the rest of the host
+REPEATS = 5
+
+
+def benchmark_config(num_states, label, options):
+    """
+    Dense filter of num_states states and num_states / 4 measurements. F is upper triangular, like the
+    integrator chains of kinematic models, and every matrix is kept dense so the kernels do all the work.
+    options selects the kernels, like the backend or the tiling threshold.
+    """
+    rng = np.random.default_rng(num_states)
+    num_measurements = max(1, num_states // 4)
+    F = np.eye(num_states) + 0.01 * np.triu(
+        rng.uniform(-1, 1, (num_states, num_states))
+    )
+    return {
+        "name": f"bench{num_states}_{label}",
+        "F": F.tolist(),
+        "Q": (0.01 * np.eye(num_states)).tolist(),
+        "H": rng.uniform(-1, 1, (num_measurements, num_states)).tolist(),
+        "R": (0.5 * np.eye(num_measurements)).tolist(),
+        "P_init": np.eye(num_states).tolist(),
+        "X_init": [0] * num_states,
+        "sparse_threshold": 0,
+        "decompose": False,
+        **options,
+    }
+
+
+def benchmark_main(name, num_measurements, iterations):
+    """
+    Timing loop of predict and update, printing the nanoseconds per step of the fastest of REPEATS runs and the final
+    state.
+    """
+    measurements = ", ".join(f"{0.1 * (i + 1)}F" for i in range(num_measurements))
+    valid = ", ".join(["true"] * num_measurements)
+    return "\n".join(
+        [
+            "#define _POSIX_C_SOURCE 199309L",
+            "#include <stdio.h>",
+            "#include <time.h>",
+            f'#include "{name}_config.h"',
+            "int main(void) {",
+            f"\t{name}_measurement_S measurement = {{{{{measurements}}}, {{{valid}}}}};",
+            "\tstruct timespec start;",
+            "\tstruct timespec end;",
+            f"\tif ({name}_init() != KF_ERROR_NONE) {{",
+            "\t\treturn 1;",
+            "\t}",
+            "\tdouble best = -1.0;",
+            f"\tfor (int repeat = 0; repeat < {REPEATS}; repeat++) {{",
+            "\t\tclock_gettime(CLOCK_MONOTONIC, &start);",
+            f"\t\tfor (int i = 0; i < {iterations}; i++) {{",
+            f"\t\t\t(void){name}_predict();",
+            f"\t\t\t(void){name}_update(&measurement);",
+            "\t\t}",
+            "\t\tclock_gettime(CLOCK_MONOTONIC, &end);",
+            "\t\tconst double elapsed = (double)(end.tv_sec - start.tv_sec) * 1e9 + (double)(end.tv_nsec - start.tv_nsec);",
+            "\t\tif ((best < 0.0) || (elapsed < best)) {",
+            "\t\t\tbest = elapsed;",
+            "\t\t}",
+            "\t}",
+            f'\tprintf("%f\\n", best / {iterations});',
+            f"\tfor (size_t i = 0; i < {name.upper()}_NUM_STATES; i++) {{",
+            f'\t\tprintf("%.9g\\n", (double){name}_get_state(i));',
+            "\t}",
+            "\treturn 0;",
+            "}",
+        ]
+    )
+
+
+def benchmark_variants(args):
+    """
+    Labels and config options of the compared kernels, the first one is the reference of the speedup.
+    """
+    if args.tiling:
+        return [
+            ("untiled", {"backend": args.backend, "tiling_threshold": 0}),
+            (
+                "tiled",
+                {
+                    "backend": args.backend,
+                    "tiling_threshold": 1,
+                    "tile_size": args.tile_size,
+                },
+            ),
+        ]
+    # the backends are compared on the untiled products
+    return [
+        (backend, {"backend": backend, "tiling_threshold": 0})
+        for backend in SUPPORTED_BACKENDS
+    ]
+
+
+def benchmark_iterations(num_states, args):
+    """
+    Predict and update steps of a run, the products take num_states^3 multiply-adds so larger filters run fewer steps.
+    """
+    if args.iterations is not None:
+        return args.iterations
+    return max(2, int(1e8 / num_states**3))
+
+
+def run_benchmark(num_states, variant, library_source, args, build_dir):
+    """
+    Build a self-contained amalgamated benchmark of the variant, returning the nanoseconds per step and the final state.
+    """
+    raw_config = benchmark_config(num_states, *variant)
+    name = raw_config["name"]
+    config = KalmanFilterConfig(raw_config)
+    generator = KalmanFilterConfigGenerator(config)
+
+    c_file_path = os.path.join(build_dir, f"{name}_config.c")
+    h_file_path = os.path.join(build_dir, f"{name}_config.h")
+    main_path = os.path.join(build_dir, f"{name}_main.c")
+    executable_path = os.path.join(build_dir, name)
+    FileWriter(generator, c_file_path, h_file_path, library_source)
+    with open(main_path, "w") as f:
+        f.write(
+            benchmark_main(
+                name, config.num_measurements, benchmark_iterations(num_states, args)
+            )
+        )
+
+    command = [
+        args.cc,
+        "-std=c99",
+        *args.cflags.split(),
+        f"-I{build_dir}",
+        *[f"-I{directory}" for directory in include_directories(args)],
+        c_file_path,
+        main_path,
+        "-lm",
+        "-o",
+        executable_path,
+    ]
+    subprocess.run(command, check=True)
+    output = subprocess.run(
+        [executable_path], check=True, capture_output=True, text=True
+    ).stdout.split()
+    return float(output[0]), np.array([float(value) for value in output[1:]])
+
+
+def include_directories(args):
+    return ["filter/inc", os.path.join(args.matrix_lib, "inc")]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the predict and update time of the library backends, or of the untiled and tiled "
+        "covariance products, on dense filters."
+    )
+    parser.add_argument(
+        "--states",
+        type=int,
+        nargs="+",
+        help="Number of states of the benchmarked filters, 16 32 64 for the backends and 8 to 512 for the tiling",
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        help="Predict and update steps, by default fewer for larger filters",
+    )
+    parser.add_argument(
+        "--tiling",
+        action="store_true",
+        help="Compare the untiled and tiled covariance products instead of the backends",
+    )
+    parser.add_argument(
+        "--tile_size", type=int, default=32, help="Edge of the tiles with --tiling"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=SUPPORTED_BACKENDS,
+        default=SUPPORTED_BACKENDS[0],
+        help="Backend of the tiling comparison",
+    )
+    parser.add_argument("--cc", default="cc", help="C compiler")
+    parser.add_argument(
+        "--cflags", default="-O2 -march=native", help="Compiler optimization flags"
+    )
+    parser.add_argument(
+        "--matrix_lib",
+        default="libs/kalman-matrix-utils",
+        help="Directory of the matrix library",
+    )
+    args = parser.parse_args()
+    if args.states is None:
+        args.states = [8, 16, 32, 64, 128, 256, 512] if args.tiling else [16, 32, 64]
+    variants = benchmark_variants(args)
+
+    sources = sorted(
+        os.path.join(args.matrix_lib, "src", file)
+        for file in os.listdir(os.path.join(args.matrix_lib, "src"))
+        if file.endswith(".c")
+    ) + ["filter/src/kalman.c"]
+    library_source = amalgamate(
+        sources,
+        include_directories(args),
+        reachable_includes("filter/inc/kalman.h", include_directories(args)),
+    )
+
+    print(
+        f"{'states':>6} "
+        + " ".join(f"{label + ' ns':>14}" for label, _ in variants)
+        + f" {'speedup':>8} {'max rel diff':>12}"
+    )
+    with tempfile.TemporaryDirectory() as build_dir:
+        for num_states in args.states:
+            results = [
+                run_benchmark(num_states, variant, library_source, args, build_dir)
+                for variant in variants
+            ]
+            times = [result[0] for result in results]
+            reference = results[0][1]
+            # the variants sum the products in a different order, so the states agree to rounding
+            difference = max(
+                np.max(np.abs(result[1] - reference) / (1 + np.abs(reference)))
+                for result in results[1:]
+            )
+            print(
+                f"{num_states:>6} "
+                + " ".join(f"{time:>14.0f}" for time in times)
+                + f" {times[0] / min(times[1:]):>7.2f}x {difference:>12.2e}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
+import json
 import os
+import subprocess
 import sys
 
+import numpy as np
+
+# predicts and updates run by test_e2e_imu.c
+E2E_STEPS = 30
+
 
 def run_command(command):
     retcode = os.system(command)
@@ -8,6 +15,62 @@ def run_command(command):
         raise RuntimeError(f"Command failed with return code {retcode}: {command}")
 
 
+def reference_imu_filter(config_file, steps):
+    """
+    State and covariance diagonal of the imu filter after the predicts and updates of test_e2e_imu.c, in double precision.
+    """
+    with open(config_file) as f:
+        config = json.load(f)[0]
+    F, Q, H, R, P, B = [
+        np.array(config[key], dtype=float)
+        for key in ["F", "Q", "H", "R", "P_init", "B"]
+    ]
+    x = np.array(config["X_init"], dtype=float)
+    u = np.array([0.1, -0.2, 0.3])
+
+    for step in range(steps):
+        x = F @ x + B @ u
+        P = F @ P @ F.T + Q
+        z = np.array([0.01 * step, -0.02 * step, 0.5])
+        K = P @ H.T @ np.linalg.inv(H @ P @ H.T + R)
+        x = x + K @ (z - H @ x)
+        P = P - K @ H @ P
+
+    return x, np.diag(P)
+
+
+def run_imu_filter(config_file):
+    """
+    Run the generated imu filter against the built library and compare it with the double precision reference.
+    """
+    run_command(
+        f"gcc -std=c99 -DE2E_STEPS={E2E_STEPS} -Iinc ../scripts/test_e2e_imu.c -Lbuild -lkalman_filter -lm -o build/test_e2e_imu"
+    )
+    output = subprocess.run(
+        ["build/test_e2e_imu"],
+        env=dict(os.environ, LD_LIBRARY_PATH="build"),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split("\n")
+
+    errors = [line.split() for line in output[:E2E_STEPS]]
+    if any(error != ["0", "0"] for error in errors):
+        raise RuntimeError(f"kf_predict/kf_update failed: {errors}")
+
+    x, P_diagonal = np.array(
+        [line.split() for line in output[E2E_STEPS:] if line], dtype=float
+    ).T
+    x_expected, P_diagonal_expected = reference_imu_filter(config_file, E2E_STEPS)
+    if np.any(P_diagonal <= 0):
+        raise RuntimeError(f"Covariance is not positive: {P_diagonal}")
+    # the measured states, the biases are barely observable from the singular P_init in single precision
+    if not np.allclose(x[:3], x_expected[:3], rtol=1e-3, atol=1e-3) or not np.allclose(
+        P_diagonal[:3], P_diagonal_expected[:3], rtol=1e-3
+    ):
+        raise RuntimeError(f"Filter does not match the reference: {x}, {P_diagonal}")
+
+
 def main():
     OUTPUT_DIR = "kf_output"
 
@@ -37,6 +100,9 @@ def main():
     if not os.path.exists("build"):
         raise FileNotFoundError("Build directory not found. Build might have failed.")
 
+    # Run the filter through predicts and updates, a build alone does not catch numerical issues
+    run_imu_filter(os.path.join("..", sample_input_file))
+
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,27 @@
+#include <stdio.h>
+
+#include "imu_kf_config.h"
+
+// runs the generated imu_kf through predicts and updates and prints the result of every update, then the state and the
+// diagonal of the covariance, for scripts/test_e2e.py to compare with a double precision reference
+int main(void) {
+    if (imu_kf_init() != KF_ERROR_NONE) {
+        return 1;
+    }
+
+    imu_kf_control_S control = {{0.1F, -0.2F, 0.3F}};
+
+    for (size_t step = 0; step < E2E_STEPS; step++) {
+        imu_kf_measurement_S measurement = {{0.01F * (matrix_data_t)step, -0.02F * (matrix_data_t)step, 0.5F},
+                                            {true, true, true}};
+
+        printf("%d ", (int)imu_kf_predict(&control));
+        printf("%d\n", (int)imu_kf_update(&measurement));
+    }
+
+    for (size_t i = 0; i < IMU_KF_NUM_STATES; i++) {
+        printf("%.9g %.9g\n", (double)imu_kf_get_state(i), (double)imu_kf_get_covariance(i, i));
+    }
+
+    return 0;
+}
@@ -2,6 +2,8 @@ import os
 import argparse
 
 TESTS_EXE_NAME = "kalman_tests"
+# the same tests built with the profiling hooks compiled in, plus the profiling tests
+PROFILING_TESTS_EXE_NAME = "kalman_tests_profiling"
 
 
 def main(debug):
@@ -25,7 +27,11 @@ def main(debug):
     if debug:
         os.system(f"gdb ./{TESTS_EXE_NAME}")
     else:
-        os.system(f"./{TESTS_EXE_NAME}")
+        ret = 0
+        for exe_name in [TESTS_EXE_NAME, PROFILING_TESTS_EXE_NAME]:
+            ret |= os.system(f"./{exe_name}")
+        if ret != 0:
+            exit(1)
 
 
 if __name__ == "__main__":